@@ -15,6 +15,12 @@ class Settings(BaseSettings):
     supabase_url: str = ""
     supabase_key: str = ""
     
+    # Database Settings (direct Postgres access; empty disables persistence)
+    database_url: str = ""
+    database_pool_min_size: int = 1
+    database_pool_max_size: int = 10
+    database_statement_cache_size: int = 512
+    
     # CORS Settings
     allowed_origins: list[str] = [
         "http://localhost:3000",
@@ -27,6 +33,76 @@ class Settings(BaseSettings):
     prediction_confidence_threshold: float = 0.7
     anomaly_detection_sensitivity: float = 0.1
     
+    # Document Processing Settings
+    document_cache_max_entries: int = 10000
+    document_storage_dir: str = "uploads"
+    document_batch_concurrency: int = 8
+    document_batch_max_concurrency: int = 64
+    document_max_page_dimension: int = 2000
+    document_max_pages_in_flight: int = 4
+    document_page_workers: int = 0  # 0 uses one worker per CPU
+    
+    # Natural Language Search Settings
+    search_parse_cache_max_entries: int = 4096
+    search_plan_cache_max_entries: int = 512
+    search_index_refresh_seconds: float = 30.0
+    search_index_batch_size: int = 5000
+    search_index_sync_overlap_seconds: float = 300.0  # Re-read behind the watermark for late commits
+    search_index_max_scan: int = 10000  # Candidates scored per text query
+    search_rollup_refresh_seconds: float = 300.0
+    search_autocomplete_refresh_seconds: float = 300.0
+    search_autocomplete_top_k: int = 20  # Completions kept per trie node
+    search_autocomplete_query_days: int = 90  # Query log history used
+    search_autocomplete_max_queries: int = 20000
+    
+    # Workflow Engine Settings
+    workflow_workers: int = 8
+    workflow_timer_horizon_seconds: float = 3600.0  # Wait timers held in memory
+    workflow_timer_batch_size: int = 10000
+    workflow_step_timeout_seconds: float = 300.0
+    workflow_event_batch_size: int = 1000  # Instances inserted per batch
+    workflow_event_batch_delay_ms: float = 50.0  # Burst window for notifications
+    workflow_dispatch_concurrency: int = 1000  # Instances advanced at once per batch
+    workflow_batch_max_size: int = 500  # Service calls coalesced per step batch
+    workflow_batch_max_delay_ms: float = 20.0
+    
+    # AI Insights Settings
+    insight_refresh_seconds: float = 900.0  # Active insights recomputed at least this often
+    insight_change_check_seconds: float = 30.0
+    insight_change_threshold: float = 0.02  # Relative change in fleet totals that forces a refresh
+    insight_segment_workers: int = 0  # Segmented generation processes; 0 uses one per CPU
+    
+    # Notification Delivery Settings
+    notification_delivery_workers: int = 4  # Concurrent batches per channel
+    notification_delivery_normal_share: float = 0.25  # Batch slots kept for non-urgent deliveries
+    notification_delivery_max_attempts: int = 5
+    notification_delivery_retry_base_seconds: float = 2.0  # Doubled per attempt
+    notification_delivery_retry_max_seconds: float = 300.0
+    notification_delivery_max_queued: int = 50000  # Deliveries held in memory per channel
+    notification_delivery_poll_seconds: float = 1.0  # Claim interval for undelivered rows
+    notification_delivery_lease_seconds: float = 120.0  # Claims renewed while held; lapsed claims are retaken
+    notification_email_rate_per_second: float = 1000.0
+    notification_email_batch_size: int = 100
+    notification_sms_rate_per_second: float = 250.0
+    notification_sms_batch_size: int = 50
+    notification_webhook_rate_per_second: float = 500.0
+    notification_webhook_batch_size: int = 100
+    notification_stub_latency_ms: float = 20.0  # Local stand-in adapters
+    notification_stub_failure_rate: float = 0.0
+    
+    # Notification Streaming Settings
+    notification_stream_heartbeat_seconds: float = 15.0
+    notification_stream_max_pending: int = 100  # Events buffered per stream before a resync
+    notification_stream_batch_delay_ms: float = 20.0  # Burst window for LISTEN notifications
+    notification_counter_reconcile_seconds: float = 300.0  # Summary counters rebuilt from the table
+    
+    # Notification Digest Settings
+    # Seconds a notification of each priority may wait to be coalesced with others
+    # for the same owner and category; urgent notifications are never coalesced
+    notification_digest_windows: dict[str, float] = {"low": 86400.0, "medium": 14400.0, "high": 3600.0}
+    notification_digest_flush_seconds: float = 60.0
+    notification_digest_max_closed: int = 1000  # Read digests whose items stay in memory (no database)
+    
     # Mock Mode (for demo without real APIs)
     use_mock_apis: bool = True
     
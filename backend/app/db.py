@@ -0,0 +1,49 @@
+"""Database connection pool.
+
+Provides a lazily created asyncpg pool shared by services that persist
+to Postgres. When ``DATABASE_URL`` is not configured the pool is ``None``
+and services fall back to their in-memory behaviour.
+"""
+import asyncio
+from typing import Optional
+
+import asyncpg
+
+from app.config import get_settings
+
+
+class DatabaseUnavailableError(RuntimeError):
+    """Raised when an operation needs Postgres but none is configured or reachable."""
+
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool() -> Optional[asyncpg.Pool]:
+    """Get the shared connection pool, creating it on first use."""
+    global _pool
+
+    settings = get_settings()
+    if not settings.database_url:
+        return None
+
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    dsn=settings.database_url,
+                    min_size=settings.database_pool_min_size,
+                    max_size=settings.database_pool_max_size,
+                    statement_cache_size=settings.database_statement_cache_size
+                )
+    return _pool
+
+
+async def close_pool() -> None:
+    """Close the shared connection pool if it was created."""
+    global _pool
+
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
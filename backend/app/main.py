@@ -1,8 +1,19 @@
 """FastAPI Application for Automotive AI Services."""
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
+from app.db import close_pool
+from app.services.document_pages import shutdown_page_pool
+from app.services.insight_segments import shutdown_segment_pool
+from app.services.insights import ai_insights_service
+from app.services.notifications import notification_service
+from app.services.search_autocomplete import search_autocomplete
+from app.services.search_index import search_index
+from app.services.search_rollups import rollup_refresher
+from app.services.workflows import workflow_automation_service
 from app.routers import (
     vin_decoder,
     predictions,
@@ -18,12 +29,35 @@ from app.routers import (
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop shared resources with the application."""
+    await search_index.start()
+    await rollup_refresher.start()
+    await search_autocomplete.start()
+    await workflow_automation_service.start()
+    await ai_insights_service.start()
+    await notification_service.start()
+    yield
+    await notification_service.stop()
+    await ai_insights_service.stop()
+    await workflow_automation_service.stop()
+    await search_autocomplete.stop()
+    await rollup_refresher.stop()
+    await search_index.stop()
+    shutdown_page_pool()
+    shutdown_segment_pool()
+    await close_pool()
+
+
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="AI-powered automotive database management services",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -1,9 +1,19 @@
 """Document Processing API Router."""
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from typing import Optional
+import json
 
-from app.schemas.documents import DocumentProcessRequest, DocumentProcessResponse
+from app.config import get_settings
+
+from app.schemas.documents import (
+    DocumentProcessRequest,
+    DocumentProcessResponse,
+    DocumentBatchRequest,
+    DocumentCacheStats
+)
 from app.services.documents import document_processing_service
+from app.services.document_pages import DocumentFormatError
 
 router = APIRouter()
 
@@ -18,9 +28,42 @@ async def process_document(request: DocumentProcessRequest):
     - insurance_card: Extracts policy information
     - registration: Extracts vehicle and registration info
     
+    Inline PDF or multi-page TIFF content is split into pages that are
+    processed in parallel and merged into one result.
+    
     Returns structured data extracted from the document.
     """
-    return await document_processing_service.process(request)
+    try:
+        return await document_processing_service.process(request)
+    except DocumentFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.post("/process/batch")
+async def process_document_batch(request: DocumentBatchRequest):
+    """
+    Process a batch of documents with bounded concurrency.
+    
+    Documents are referenced by `file_url` (local storage) or inline
+    `base64_content`. Results stream back as newline-delimited JSON in
+    completion order, one `result` or `error` record per document,
+    followed by a final `summary` record with aggregate throughput and
+    per-stage latency (load, preprocess, ocr, extract).
+    """
+    settings = get_settings()
+    concurrency = min(
+        request.concurrency or settings.document_batch_concurrency,
+        settings.document_batch_max_concurrency,
+        len(request.documents)
+    )
+    
+    async def stream():
+        async for record in document_processing_service.process_batch(
+            request.documents, concurrency
+        ):
+            yield json.dumps(record) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @router.post("/upload")
@@ -32,11 +75,10 @@ async def upload_and_process(
     """
     Upload and process a document file.
     
-    Note: In this mock implementation, actual file content is not processed.
-    Returns mock extracted data based on document type.
+    The file content is fingerprinted so re-uploads of the same file
+    return the earlier extraction without running OCR again. Extraction itself is mocked based on document type.
     """
-    # In a real implementation, we would read the file and process it
-    # For mock, we just use the document type
+    content = await file.read()
     
     request = DocumentProcessRequest(
         document_id=f"doc-{file.filename}",
@@ -45,7 +87,10 @@ async def upload_and_process(
         file_url=f"/uploads/{file.filename}"
     )
     
-    result = await document_processing_service.process(request)
+    try:
+        result = await document_processing_service.process(request, content=content)
+    except DocumentFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
     return {
         "filename": file.filename,
@@ -54,6 +99,40 @@ async def upload_and_process(
     }
 
 
+@router.post("/upload/pages")
+async def upload_and_process_pages(
+    file: UploadFile = File(...),
+    document_type: str = Form("dealer_packet"),
+    vehicle_id: Optional[str] = Form(None)
+):
+    """
+    Upload a multi-page document (PDF or multi-frame TIFF) and stream
+    page-level results.
+    
+    Pages are rasterized lazily and extracted in parallel worker
+    processes. A `page` record is streamed as soon as each page is done
+    (in page order), followed by a `document` record holding the merged
+    result. Use `document_type=dealer_packet` to classify each page
+    individually.
+    """
+    content = await file.read()
+    request = DocumentProcessRequest(
+        document_id=f"doc-{file.filename}",
+        vehicle_id=vehicle_id,
+        document_type=document_type,
+        file_url=f"/uploads/{file.filename}"
+    )
+    
+    async def stream():
+        try:
+            async for record in document_processing_service.process_pages(request, content):
+                yield json.dumps(record) + "\n"
+        except DocumentFormatError as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/demo/{document_type}")
 async def demo_document_processing(document_type: str = "service_receipt"):
     """
@@ -81,6 +160,12 @@ async def demo_document_processing(document_type: str = "service_receipt"):
     }
 
 
+@router.get("/cache/stats", response_model=DocumentCacheStats)
+async def get_cache_stats():
+    """Get hit-rate metrics for the document fingerprint cache."""
+    return document_processing_service.cache_stats()
+
+
 @router.get("/supported-types")
 async def get_supported_types():
     """Get list of supported document types."""
@@ -117,6 +202,13 @@ async def get_supported_types():
                     "vehicle_vin", "owner_name", "title_number",
                     "issue_date", "lien_holder"
                 ]
+            },
+            {
+                "type": "dealer_packet",
+                "description": "Multi-page scanned packets (PDF or TIFF); each page is classified and extracted",
+                "extracted_fields": [
+                    "all fields of the page types found, tagged with page_number"
+                ]
             }
         ]
     }
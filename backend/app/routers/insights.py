@@ -1,11 +1,15 @@
 """AI Insights API Router."""
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 
+from app.db import DatabaseUnavailableError
 from app.schemas.insights import (
     AIInsight,
+    CostTrendResponse,
     InsightGenerationRequest,
-    InsightGenerationResponse
+    InsightGenerationResponse,
+    SegmentedInsightRequest,
+    SegmentedInsightResponse
 )
 from app.services.insights import ai_insights_service
 
@@ -21,10 +25,54 @@ async def generate_insights(request: InsightGenerationRequest):
     - Cost trends
     - Maintenance patterns
     - Fleet health
-    - Anomalies
+    - Compliance and open recalls
     - Optimization recommendations
+    
+    Insights are computed from incrementally maintained fleet aggregates.
+    """
+    try:
+        return await ai_insights_service.generate(request)
+    except DatabaseUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/segments", response_model=SegmentedInsightResponse)
+async def generate_segment_insights(request: SegmentedInsightRequest):
+    """
+    Generate insights for every owner or owner type.
+    
+    Segments are computed in parallel across worker processes. Unless
+    ``persist`` is false, the results replace the segmentation's active
+    insights in the database.
+    """
+    try:
+        return await ai_insights_service.generate_segmented(request)
+    except DatabaseUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/cost-trends", response_model=CostTrendResponse)
+async def get_cost_trends(
+    group_by: str = "segment",
+    alpha: float = Query(0.05, gt=0, lt=1),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Detect service cost trends per group.
+    
+    Builds a monthly average-cost series for every group (segment, owner,
+    owner_type, manufacturer or the whole fleet) over the full service
+    history and returns the statistically significant trends
+    (Mann-Kendall with Sen's slope), largest change first.
     """
-    return await ai_insights_service.generate(request)
+    try:
+        return await ai_insights_service.cost_trends(group_by, alpha, limit)
+    except DatabaseUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/active", response_model=list[AIInsight])
@@ -81,7 +129,7 @@ async def demo_insights():
     """
     # Generate insights with default parameters
     request = InsightGenerationRequest(time_range_days=30)
-    result = await ai_insights_service.generate(request)
+    result = await generate_insights(request)
     
     return {
         "insights": result.insights,
@@ -90,7 +138,11 @@ async def demo_insights():
             "generation_time_ms": result.generation_time_ms,
             "data_analyzed": result.data_analyzed
         },
-        "note": "These insights are generated from mock data analysis"
+        "note": (
+            "These insights are computed from fleet aggregates"
+            if result.data_analyzed["source"] == "postgres"
+            else "These insights are computed from a sample fleet (no database configured)"
+        )
     }
 
 
@@ -98,5 +150,5 @@ async def demo_insights():
 async def get_insights_by_type(insight_types: list[str]):
     """Generate insights filtered by specific types."""
     request = InsightGenerationRequest(insight_types=insight_types)
-    return await ai_insights_service.generate(request)
+    return await generate_insights(request)
 
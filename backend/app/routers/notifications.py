@@ -1,13 +1,21 @@
 """Notifications API Router."""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional
 
 from app.schemas.notifications import (
+    DeliveryStats,
+    DigestFlushResponse,
+    DigestItemsResponse,
     Notification,
     NotificationGenerateRequest,
-    NotificationGenerateResponse
+    NotificationGenerateResponse,
+    NotificationStreamStats,
+    NotificationSummary
 )
 from app.schemas.common import Priority
+from app.services.notification_delivery import notification_delivery
+from app.services.notification_stream import notification_stream
 from app.services.notifications import notification_service
 
 router = APIRouter()
@@ -16,7 +24,7 @@ router = APIRouter()
 @router.post("/generate", response_model=NotificationGenerateResponse)
 async def generate_notifications(request: NotificationGenerateRequest):
     """
-    Generate notifications based on current data.
+    Generate notifications from the active notification rules.
     
     Checks for and generates notifications about:
     - Due services
@@ -24,7 +32,13 @@ async def generate_notifications(request: NotificationGenerateRequest):
     - Due inspections
     - Expiring warranties
     - Open recalls
-    - Expiring documents
+    
+    A vehicle is not notified again about the same record while an
+    earlier notification is unread. New notifications are delivered
+    in the background on the email, SMS and webhook channels their
+    rule lists. Urgent notifications are sent individually; others are
+    held (``notifications_coalesced``) and sent as one digest per owner
+    and category once their priority's window passes.
     """
     return await notification_service.generate(request)
 
@@ -33,9 +47,10 @@ async def generate_notifications(request: NotificationGenerateRequest):
 async def get_notifications(
     status: Optional[str] = None,
     priority: Optional[str] = None,
-    limit: int = 50
+    owner_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000)
 ):
-    """Get notifications with optional filters."""
+    """Get the newest notifications with optional filters."""
     priority_enum = None
     if priority:
         try:
@@ -46,24 +61,78 @@ async def get_notifications(
     return await notification_service.get_notifications(
         status=status,
         priority=priority_enum,
+        owner_id=owner_id,
         limit=limit
     )
 
 
 @router.get("/unread", response_model=list[Notification])
-async def get_unread_notifications(limit: int = 50):
+async def get_unread_notifications(
+    owner_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=1000)
+):
     """Get unread notifications."""
     return await notification_service.get_notifications(
         status="unread",
+        owner_id=owner_id,
         limit=limit
     )
 
 
+@router.get("/stream")
+async def stream_notifications(owner_id: Optional[str] = None):
+    """
+    Stream new notifications as server-sent events.
+    
+    Each new notification for the owner (every owner when omitted) is
+    sent as a ``notification`` event whose data is the notification.
+    A ``resync`` event means events were dropped because the client fell
+    behind, so it should reload its list. Keep-alive comments are sent
+    while idle.
+    """
+    return StreamingResponse(
+        notification_stream.events(owner_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stream/stats", response_model=NotificationStreamStats)
+async def get_stream_stats():
+    """Get connected stream and fan-out metrics."""
+    return notification_stream.stats()
+
+
 @router.get("/urgent", response_model=list[Notification])
-async def get_urgent_notifications():
-    """Get urgent and high priority notifications."""
-    all_notifs = await notification_service.get_notifications(limit=100)
-    return [n for n in all_notifs if n.priority in [Priority.URGENT, Priority.HIGH]]
+async def get_urgent_notifications(owner_id: Optional[str] = None, limit: int = 100):
+    """Get urgent and high priority notifications, newest first."""
+    notifications = []
+    for priority in (Priority.URGENT, Priority.HIGH):
+        notifications.extend(await notification_service.get_notifications(
+            priority=priority, owner_id=owner_id, limit=limit
+        ))
+    notifications.sort(key=lambda n: (n.created_at, n.id), reverse=True)
+    return notifications[:limit]
+
+
+@router.post("/digests/flush", response_model=DigestFlushResponse)
+async def flush_digests(force: bool = False):
+    """
+    Send digests for coalesced notifications whose window has passed.
+    
+    Runs periodically in the background; ``force`` sends every pending
+    group now.
+    """
+    return await notification_service.flush_digests(force)
+
+
+@router.get("/{notification_id}/items", response_model=DigestItemsResponse)
+async def get_digest_items(notification_id: str, limit: int = Query(100, ge=1, le=5000)):
+    """Get the per-vehicle notifications summarized by a digest, most urgent and soonest due first."""
+    items = await notification_service.digest_items(notification_id, limit)
+    if items is None:
+        raise HTTPException(status_code=404, detail="Digest not found")
+    return items
 
 
 @router.post("/{notification_id}/read")
@@ -84,26 +153,29 @@ async def dismiss_notification(notification_id: str):
     return {"success": True, "notification_id": notification_id}
 
 
-@router.get("/summary")
-async def get_notification_summary():
-    """Get summary of notifications."""
-    all_notifs = await notification_service.get_notifications(limit=1000)
-    
-    by_status = {}
-    by_priority = {}
-    by_category = {}
+@router.get("/delivery/stats", response_model=DeliveryStats)
+async def get_delivery_stats():
+    """
+    Get delivery pipeline metrics.
     
-    for n in all_notifs:
-        by_status[n.status] = by_status.get(n.status, 0) + 1
-        by_priority[n.priority.value] = by_priority.get(n.priority.value, 0) + 1
-        by_category[n.category] = by_category.get(n.category, 0) + 1
+    Per channel (email, SMS, webhook): queued urgent and normal
+    deliveries, in flight and backing off, sent with average queue wait
+    per lane, failed attempts, retries, dead letters and the provider
+    rate limit.
+    """
+    return notification_delivery.stats()
+
+
+@router.get("/summary", response_model=NotificationSummary)
+async def get_notification_summary(owner_id: Optional[str] = None):
+    """
+    Get notification counts by status, priority and category.
     
-    return {
-        "total": len(all_notifs),
-        "by_status": by_status,
-        "by_priority": by_priority,
-        "by_category": by_category
-    }
+    Counts cover every notification of the owner (the whole fleet when
+    omitted) and are maintained as notifications change, so this does
+    not scan notifications.
+    """
+    return await notification_service.summary(owner_id)
 
 
 @router.get("/demo")
@@ -123,11 +195,15 @@ async def demo_notifications():
     )
     
     result = await notification_service.generate(request)
+    await notification_service.flush_digests(force=True)
     notifications = await notification_service.get_notifications(limit=20)
     
     return {
         "generation_result": result,
         "sample_notifications": notifications[:10],
-        "note": "These are mock notifications for demonstration"
+        "note": (
+            "These notifications come from the default rules applied to a sample fleet; "
+            "non-urgent ones are grouped into digests"
+        )
     }
 
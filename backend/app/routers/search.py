@@ -1,8 +1,20 @@
 """Natural Language Search API Router."""
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
 
-from app.schemas.search import NLSearchRequest, NLSearchResponse
+from app.db import DatabaseUnavailableError
+from app.schemas.search import (
+    NLSearchRequest,
+    NLSearchResponse,
+    NLSearchExecuteRequest,
+    NLSearchExecuteResponse,
+    SearchCacheStatsResponse,
+    TextSearchResponse
+)
 from app.services.search import natural_language_search_service
+from app.services.search_autocomplete import search_autocomplete
+from app.services.search_executor import nl_query_executor
+from app.services.search_index import ENTITY_TYPES, search_index
 
 router = APIRouter()
 
@@ -31,6 +43,64 @@ async def parse_query_get(q: str, max_results: int = 50):
     return await natural_language_search_service.parse(request)
 
 
+@router.post("/execute", response_model=NLSearchExecuteResponse)
+async def execute_query(request: NLSearchExecuteRequest):
+    """
+    Parse a natural language query and run it against the database.
+    
+    The parsed query is compiled into parameterized SQL and results are
+    returned one page at a time. Pass `next_cursor` from a response as
+    `cursor` to fetch the following page. Every execution is recorded in
+    `nl_query_log`.
+    """
+    try:
+        return await nl_query_executor.execute(request)
+    except DatabaseUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/execute", response_model=NLSearchExecuteResponse)
+async def execute_query_get(q: str, page_size: int = 50, cursor: Optional[str] = None):
+    """Execute a natural language query (GET method for convenience)."""
+    request = NLSearchExecuteRequest(query=q, page_size=page_size, cursor=cursor)
+    return await execute_query(request)
+
+
+@router.get("/text", response_model=TextSearchResponse)
+async def text_search(
+    q: str,
+    types: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100)
+):
+    """
+    Free-text and type-ahead search over vehicles, owners and service records.
+    
+    Matches partial VINs and license plates, owner names and emails, and
+    service descriptions (e.g. "brake squeal"). The last word is matched as
+    a prefix and misspelled words are matched approximately.
+    
+    - **types**: Comma-separated entity types to search (vehicle, owner, service_record)
+    """
+    entities = None
+    if types:
+        entities = [t.strip() for t in types.split(",") if t.strip()]
+        unknown = [t for t in entities if t not in ENTITY_TYPES]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown entity types: {', '.join(unknown)}"
+            )
+    return search_index.search(q, entities, limit)
+
+
+@router.get("/cache/stats", response_model=SearchCacheStatsResponse)
+async def get_cache_stats():
+    """Get hit-rate metrics for the parse-result and query-plan caches."""
+    return natural_language_search_service.cache_stats()
+
+
 @router.get("/demo")
 async def demo_natural_language_search():
     """
@@ -63,8 +133,26 @@ async def demo_natural_language_search():
 
 
 @router.get("/suggestions")
-async def get_query_suggestions(entity: str = "vehicle"):
-    """Get suggested queries for an entity type."""
+async def get_query_suggestions(
+    entity: str = "vehicle",
+    q: Optional[str] = None,
+    limit: int = Query(8, ge=1, le=20)
+):
+    """
+    Get suggested queries.
+    
+    With `q`, returns type-ahead completions of the partially typed query,
+    ranked by how often similar queries were run, how common the make or
+    model is, and the parser's field vocabulary. Without `q`, returns
+    example queries for the entity type.
+    """
+    if q is not None:
+        return {
+            "entity": entity,
+            "query": q,
+            "suggestions": search_autocomplete.complete(q, limit)
+        }
+    
     suggestions = {
         "vehicle": [
             "Show all active vehicles",
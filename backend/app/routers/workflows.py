@@ -1,13 +1,18 @@
 """Workflow Automation API Router."""
-from fastapi import APIRouter, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
 from typing import Optional
 
 from app.schemas.workflows import (
     WorkflowTemplate,
     WorkflowInstance,
+    WorkflowInstancePage,
     WorkflowStatus,
     WorkflowTriggerRequest,
-    WorkflowExecuteResponse
+    WorkflowExecuteResponse,
+    WorkflowEngineStats,
+    WorkflowEventBatch,
+    WorkflowEventIngestResponse
 )
 from app.services.workflows import workflow_automation_service
 
@@ -43,8 +48,9 @@ async def trigger_workflow(request: WorkflowTriggerRequest):
     """
     Trigger a workflow execution.
     
-    Starts a workflow instance based on the specified template.
-    Returns execution status and log.
+    Starts a workflow instance based on the specified template and runs it
+    until its first wait step. Waiting instances are persisted and resumed
+    by the engine when the wait elapses. Returns execution status and log.
     """
     try:
         return await workflow_automation_service.trigger_workflow(request)
@@ -52,10 +58,48 @@ async def trigger_workflow(request: WorkflowTriggerRequest):
         raise HTTPException(status_code=404, detail=str(e))
 
 
-@router.get("/instances", response_model=list[WorkflowInstance])
-async def list_instances(status: Optional[WorkflowStatus] = None):
-    """List workflow instances with optional status filter."""
-    return await workflow_automation_service.list_instances(status)
+@router.post("/events", response_model=WorkflowEventIngestResponse)
+async def ingest_events(batch: WorkflowEventBatch):
+    """
+    Ingest a batch of domain events.
+    
+    Each event is matched against the active event-triggered templates
+    (by event name, then by the template's filter) and the matching
+    workflows are started. Send bulk imports as one batch so instances
+    are created together.
+    """
+    return await workflow_automation_service.ingest_events(batch.events)
+
+
+@router.get("/instances", response_model=WorkflowInstancePage)
+async def list_instances(
+    status: Optional[WorkflowStatus] = None,
+    template_id: Optional[str] = None,
+    vehicle_id: Optional[str] = None,
+    started_after: Optional[datetime] = None,
+    started_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """
+    List workflow instances, newest first.
+    
+    Filter by status, template, vehicle and start time
+    (`started_after` inclusive, `started_before` exclusive). Pass
+    `next_cursor` from a response as `cursor` to fetch the following page.
+    """
+    try:
+        return await workflow_automation_service.list_instances(
+            status, template_id, vehicle_id, started_after, started_before, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/engine/stats", response_model=WorkflowEngineStats)
+async def get_engine_stats():
+    """Get workflow engine scheduler and worker metrics."""
+    return workflow_automation_service.engine_stats()
 
 
 @router.get("/instances/{instance_id}", response_model=WorkflowInstance)
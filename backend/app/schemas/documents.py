@@ -1,5 +1,5 @@
 """Document processing schemas."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import date
 
@@ -13,12 +13,19 @@ class DocumentProcessRequest(BaseModel):
     base64_content: Optional[str] = None
 
 
+class DocumentBatchRequest(BaseModel):
+    """Request to process many documents from local storage."""
+    documents: list[DocumentProcessRequest] = Field(..., min_length=1, max_length=5000)
+    concurrency: Optional[int] = Field(None, ge=1)
+
+
 class ExtractedField(BaseModel):
     """Extracted field from document."""
     field_name: str
     value: str
     confidence: float
     bounding_box: Optional[dict] = None
+    page_number: Optional[int] = None
 
 
 class ServiceReceiptData(BaseModel):
@@ -58,4 +65,18 @@ class DocumentProcessResponse(BaseModel):
     raw_text: Optional[str] = None
     warnings: list[str] = []
     processing_time_ms: int
+    content_sha256: Optional[str] = None
+    cache_hit: bool = False
+
+
+class DocumentCacheStats(BaseModel):
+    """Hit-rate metrics for the document fingerprint cache."""
+    entries: int
+    max_entries: int
+    lookups: int
+    hits: int
+    exact_hits: int
+    persistent_hits: int
+    misses: int
+    hit_rate: float
 
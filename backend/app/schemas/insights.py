@@ -1,7 +1,7 @@
 """AI Insights schemas."""
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from typing import Literal, Optional
+from datetime import date, datetime
 from .common import Severity
 
 
@@ -24,7 +24,7 @@ class AIInsight(BaseModel):
 
 class InsightGenerationRequest(BaseModel):
     """Request to generate insights."""
-    vehicle_ids: Optional[list[str]] = None  # None means all vehicles
+    vehicle_ids: Optional[list[str]] = None  # Not supported; insights are per fleet segment
     insight_types: Optional[list[str]] = None  # None means all types
     time_range_days: int = 30
 
@@ -36,3 +36,53 @@ class InsightGenerationResponse(BaseModel):
     generation_time_ms: int
     data_analyzed: dict
 
+
+class SegmentedInsightRequest(BaseModel):
+    """Request to generate insights for every fleet segment."""
+    segment_by: Literal["owner", "owner_type"] = "owner"
+    insight_types: Optional[list[str]] = None  # None means all types
+    time_range_days: int = 30
+    persist: bool = True  # Replace this segmentation's active insights in ai_insight
+
+
+class SegmentInsights(BaseModel):
+    """Insights generated for one segment."""
+    segment: str
+    vehicles: int
+    insights: list[AIInsight]
+
+
+class SegmentedInsightResponse(BaseModel):
+    """Response with insights per segment."""
+    segment_by: str
+    segments: list[SegmentInsights]  # Segments with at least one insight
+    segments_analyzed: int
+    total_generated: int
+    workers: int
+    generation_time_ms: int
+    data_analyzed: dict
+
+
+class CostTrendResult(BaseModel):
+    """A significant trend in average cost per service for one group."""
+    group: dict[str, str]  # Segment fields of the group, e.g. {"manufacturer": "Ford"}
+    percent_change: float  # Along the fitted trend line, start to end
+    slope_per_month: float  # Sen's slope, dollars per service per month
+    p_value: float  # Mann-Kendall, two-sided
+    start_month: date
+    end_month: date
+    months: int
+    services: int
+    start_average_cost: float
+    end_average_cost: float
+    change_point: Optional[date] = None  # Month of the largest significant shift
+
+
+class CostTrendResponse(BaseModel):
+    """Cost trend detection across service cost series."""
+    group_by: str
+    series_analyzed: int
+    trends: list[CostTrendResult]  # Largest changes first
+    total_significant: int
+    analysis_time_ms: int
+    data_analyzed: dict
@@ -1,7 +1,7 @@
 """Notification schemas."""
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 from .common import Priority
 
 
@@ -15,6 +15,7 @@ class NotificationStatus(str):
 class Notification(BaseModel):
     """Notification model."""
     id: str
+    rule_id: Optional[str] = None
     vehicle_id: Optional[str] = None
     owner_id: Optional[str] = None
     title: str
@@ -25,10 +26,25 @@ class Notification(BaseModel):
     status: str = "unread"
     action_url: Optional[str] = None
     action_label: Optional[str] = None
+    metadata: Optional[dict] = None
     created_at: datetime
     read_at: Optional[datetime] = None
 
 
+class NotificationRule(BaseModel):
+    """A row of ``notification_rule``."""
+    id: str
+    name: str
+    description: Optional[str] = None
+    rule_type: str  # service_due, insurance_expiring, inspection_due, warranty_expiring, recall_notice, ...
+    trigger_condition: dict  # e.g. {"days_before": 30}; recalls: {"severity": ["high", "critical"]}
+    notification_channels: list[str] = ["in_app"]
+    priority: Priority = Priority.MEDIUM
+    template_subject: Optional[str] = None
+    template_body: Optional[str] = None  # {{due_date}} / {{expiration_date}} placeholders
+    is_active: bool = True
+
+
 class NotificationGenerateRequest(BaseModel):
     """Request to generate notifications."""
     check_services: bool = True
@@ -44,4 +60,93 @@ class NotificationGenerateResponse(BaseModel):
     notifications_generated: int
     by_type: dict
     by_priority: dict
+    notifications_coalesced: int = 0  # Held for a digest rather than notified individually
+    rules_evaluated: int = 0
+    rules_skipped: list[str] = []  # Active rules of a type the engine cannot evaluate
+    generation_time_ms: int = 0
+
+
+
+class DeadLetter(BaseModel):
+    """A delivery that failed its last attempt."""
+    notification_id: str
+    channel: str
+    provider: str
+    attempts: int
+    last_error: Optional[str] = None
+    failed_at: datetime
+
+
+class DeliveryChannelStats(BaseModel):
+    """Queue, throughput and failure metrics of one delivery channel."""
+    channel: str
+    provider: str
+    queued_urgent: int
+    queued_normal: int
+    in_flight: int
+    retrying: int  # Waiting out a backoff
+    sent: int
+    sent_urgent: int
+    sent_normal: int
+    avg_wait_ms: dict[str, float]  # Queued to sent, per lane
+    batches: int
+    failed_attempts: int
+    retried: int
+    dead_lettered: int
+    rate_per_second: float
+    tokens_available: float
+
+
+class DeliveryStats(BaseModel):
+    """Notification delivery pipeline metrics."""
+    running: bool
+    source: str  # postgres (claims undelivered rows) or memory (direct submission)
+    claimed: int
+    channels: list[DeliveryChannelStats]
+    recent_dead_letters: list[DeadLetter] = []
+
+
+class NotificationStreamStats(BaseModel):
+    """Server-sent event stream metrics."""
+    source: str  # postgres (LISTEN bridge) or memory (published in process)
+    connections: int
+    owners: int  # Owners with at least one stream
+    published: int
+    frames_queued: int
+    overflows: int  # Events dropped from streams that fell behind
+    fetched: int  # Rows loaded for LISTEN notifications
+
+
+class NotificationSummary(BaseModel):
+    """Notification counts for one owner or the whole fleet."""
+    owner_id: Optional[str] = None
+    total: int
+    by_status: dict[str, int]
+    by_priority: dict[str, int]
+    by_category: dict[str, int]
+    reconciled_at: Optional[datetime] = None  # Last rebuild from the table; None without a database
+
+
+class DigestItem(BaseModel):
+    """One vehicle's notification within a digest."""
+    vehicle_id: Optional[str] = None
+    notification_type: str
+    priority: Priority
+    title: str
+    message: str
+    action_url: Optional[str] = None
+    due_on: Optional[date] = None
+    created_at: datetime
+
+
+class DigestItemsResponse(BaseModel):
+    """Per-vehicle detail of a digest notification."""
+    digest_id: str
+    total: int
+    items: list[DigestItem]
+
 
+class DigestFlushResponse(BaseModel):
+    """Result of turning pending notifications into digests."""
+    digests: int
+    items: int
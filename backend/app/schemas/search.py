@@ -1,5 +1,5 @@
 """Natural language search schemas."""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Any
 
 
@@ -26,6 +26,8 @@ class ParsedQuery(BaseModel):
     sort_direction: str = "desc"
     limit: Optional[int] = None
     intent: str  # search, count, aggregate, compare
+    aggregate_function: Optional[str] = None  # count, avg, sum, min, max
+    aggregate_field: Optional[str] = None  # Numeric field for avg/sum/min/max
 
 
 class NLSearchResponse(BaseModel):
@@ -37,3 +39,58 @@ class NLSearchResponse(BaseModel):
     suggestions: list[str] = []
     explanation: str
 
+
+
+class NLSearchExecuteRequest(BaseModel):
+    """Request to parse and execute a natural language query."""
+    query: str
+    page_size: int = Field(50, ge=1, le=500)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+
+
+class NLSearchExecuteResponse(BaseModel):
+    """Rows returned by an executed natural language query."""
+    original_query: str
+    parsed_query: ParsedQuery
+    sql: str
+    rows: list[dict]
+    result_count: int
+    next_cursor: Optional[str] = None
+    execution_time_ms: int
+    source: Optional[str] = None  # rollup or scan, for count/aggregate intents
+    warnings: list[str] = []
+
+
+class SearchCacheStats(BaseModel):
+    """Hit-rate metrics for one search cache."""
+    entries: int
+    max_entries: int
+    lookups: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class SearchCacheStatsResponse(BaseModel):
+    """Metrics for the parse-result and query-plan caches."""
+    parse: SearchCacheStats
+    plans: SearchCacheStats
+    date_refreshes: int  # Cached parses re-resolved for a new day
+
+
+class TextSearchHit(BaseModel):
+    """A document matched by full-text search."""
+    entity: str  # vehicle, owner, service_record
+    id: str
+    title: str
+    score: float
+    matched_terms: list[str]
+
+
+class TextSearchResponse(BaseModel):
+    """Ranked full-text search results."""
+    query: str
+    hits: list[TextSearchHit]
+    documents_scanned: int
+    indexed_documents: int
+    took_ms: float
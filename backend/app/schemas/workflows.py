@@ -27,6 +27,9 @@ class WorkflowStep(BaseModel):
     step_type: str  # send_email, send_sms, wait, condition, create_notification
     config: dict
     name: Optional[str] = None
+    id: Optional[str] = None  # Defaults to "step-<position>"
+    depends_on: Optional[list[str]] = None  # None: the previous step; []: none
+    timeout_seconds: Optional[float] = None  # Defaults to workflow_step_timeout_seconds
 
 
 class WorkflowTemplate(BaseModel):
@@ -53,9 +56,18 @@ class WorkflowInstance(BaseModel):
     total_steps: int
     started_at: datetime
     completed_at: Optional[datetime] = None
+    resume_at: Optional[datetime] = None  # When a waiting instance resumes
+    error_message: Optional[str] = None
+    trigger_data: dict = {}
     execution_log: list[dict] = []
 
 
+class WorkflowInstancePage(BaseModel):
+    """One page of workflow instances, newest first."""
+    items: list[WorkflowInstance]
+    next_cursor: Optional[str] = None  # Pass as cursor for the following page
+
+
 class WorkflowTriggerRequest(BaseModel):
     """Request to trigger a workflow."""
     template_id: str
@@ -73,3 +85,45 @@ class WorkflowExecuteResponse(BaseModel):
     execution_log: list[dict]
     next_scheduled_step: Optional[dict] = None
 
+
+
+class WorkflowEvent(BaseModel):
+    """A domain event that may trigger workflows."""
+    event: str  # e.g. service_record_created, vehicle_created, recall_matched
+    payload: dict = {}
+    vehicle_id: Optional[str] = None  # Defaults to payload["vehicle_id"]
+    owner_id: Optional[str] = None  # Defaults to payload["owner_id"]
+
+
+class WorkflowEventBatch(BaseModel):
+    """A batch of events to ingest."""
+    events: list[WorkflowEvent]
+
+
+class WorkflowEventIngestResponse(BaseModel):
+    """Result of dispatching a batch of events."""
+    events: int
+    instances_started: int
+    by_template: dict[str, int]
+    took_ms: float
+
+
+class MicroBatcherStats(BaseModel):
+    """Batching metrics for a coalesced step call."""
+    batches: int
+    items: int
+    average_batch_size: float
+    max_size: int
+    max_delay_ms: float
+
+
+class WorkflowEngineStats(BaseModel):
+    """Workflow engine scheduler and worker metrics."""
+    store: str  # memory or postgres
+    workers: int
+    queued: int  # Due instances waiting for a worker
+    timers_loaded: int  # Wait timers held in the in-memory scheduler
+    horizon_seconds: float
+    resumed: int
+    recovered: int
+    step_batches: dict[str, MicroBatcherStats] = {}
@@ -0,0 +1,87 @@
+"""Micro-batching.
+
+Coalesces concurrent single-item calls into batched calls. Callers await
+``submit(item)`` as if it were a single call; items are collected until
+the batch reaches ``max_size`` or the first item has waited ``max_delay``
+seconds, and then the whole batch is passed to one handler call.
+"""
+import asyncio
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+from app.schemas.workflows import MicroBatcherStats
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Batches items for a handler that maps a list of items to a list of results.
+
+    The handler must return one result per item, in order. If it raises,
+    every caller in that batch receives the exception.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list[T]], Awaitable[list[R]]],
+        max_size: int,
+        max_delay: float
+    ):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.batches = 0
+        self.items = 0
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        """Queue an item and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            # Keep a reference so the task is not garbage collected mid-batch
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch handler returned {len(results)} results for {len(batch)} items"
+                )
+        except Exception as e:  # Delivered to every waiting caller
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> MicroBatcherStats:
+        """Get batch counts and the average batch size."""
+        return MicroBatcherStats(
+            batches=self.batches,
+            items=self.items,
+            average_batch_size=round(self.items / self.batches, 2) if self.batches else 0.0,
+            max_size=self.max_size,
+            max_delay_ms=self.max_delay * 1000
+        )
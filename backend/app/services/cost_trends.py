@@ -0,0 +1,283 @@
+"""Service Cost Trends.
+
+Detects trends in the average cost per service of many monthly series at
+once. Each series (one fleet segment's average cost per service, one
+value per complete month) is tested with Mann-Kendall for a monotonic
+trend, its size is estimated with Sen's slope, and the month of the
+largest level shift is located with Pettitt's test. All three come from
+the pairwise differences of a block of series, computed with numpy, so
+thousands of series over years of history cost a few array operations
+rather than a loop per series.
+
+Months with too few services for a meaningful average are left out of a
+series rather than counted as zero. A trend is only reported when it is
+significant and large enough to act on. Testing thousands of series at a
+fixed level would flag about ``alpha`` of the flat ones, so significance
+is decided with the Benjamini-Hochberg procedure, which bounds the share
+of reported trends that are false instead.
+"""
+import math
+from datetime import date
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from app.services.fleet_aggregates import FleetAggregates, month_from_index, month_index
+
+# Significance level for Mann-Kendall (as a false discovery rate) and Pettitt
+TREND_ALPHA = 0.05
+# Fewest services in a month for its average to enter a series
+MIN_MONTH_SERVICES = 3
+# Fewest usable months for a series to be tested
+MIN_TREND_MONTHS = 6
+# Smallest fitted change over the series worth reporting
+MIN_TREND_PERCENT = 5.0
+# Pairwise cells (series x months x months) held in memory per block
+BLOCK_CELLS = 4_000_000
+
+# Segment fields each grouping keeps
+GROUP_KEYS = {
+    "fleet": (),
+    "owner": ("owner_id",),
+    "owner_type": ("owner_type",),
+    "manufacturer": ("manufacturer",),
+    "segment": ("owner_id", "owner_type", "manufacturer"),
+}
+
+
+class CostSeries(NamedTuple):
+    """Monthly service counts and costs; one row per series."""
+    first_month: int  # month_index() of column 0
+    services: np.ndarray
+    total_cost: np.ndarray
+
+    def averages(self) -> np.ndarray:
+        """Average cost per service, NaN for months with too few services."""
+        usable = self.services >= MIN_MONTH_SERVICES
+        return np.divide(
+            self.total_cost, self.services,
+            out=np.full(self.services.shape, np.nan), where=usable
+        )
+
+
+class TrendTable(NamedTuple):
+    """Test results per series, aligned with the series rows.
+
+    Column positions (``start``, ``end``, ``change_point``) are relative
+    to the series' ``first_month``.
+    """
+    first_month: int
+    months: np.ndarray  # Usable months
+    services: np.ndarray  # Services in usable months
+    p_value: np.ndarray  # Mann-Kendall, two-sided
+    slope: np.ndarray  # Sen's slope, cost per month
+    start: np.ndarray
+    end: np.ndarray
+    start_cost: np.ndarray  # Sen line at the first usable month
+    end_cost: np.ndarray  # Sen line at the last usable month
+    change_point: np.ndarray  # First month after the largest shift
+    change_p: np.ndarray  # Pettitt, approximate
+
+
+class CostTrend(NamedTuple):
+    """A significant cost trend in one series."""
+    percent_change: float
+    slope_per_month: float
+    p_value: float
+    start_month: date
+    end_month: date
+    months: int
+    services: int
+    start_cost: float
+    end_cost: float
+    change_point: Optional[date]  # Only set when the shift is itself significant
+
+    @property
+    def rising(self) -> bool:
+        return self.percent_change > 0
+
+
+def monthly_series(
+    codes: np.ndarray,
+    months: np.ndarray,
+    services: np.ndarray,
+    total_cost: np.ndarray,
+    series: int,
+    end_month: int
+) -> CostSeries:
+    """Pivot aggregate rows into series, up to ``end_month`` (exclusive).
+
+    ``codes`` are series rows in ``range(series)``; ``months`` are
+    ``month_index()`` values.
+    """
+    keep = months < end_month
+    if not keep.any():
+        return CostSeries(end_month, np.zeros((series, 0)), np.zeros((series, 0)))
+    first = int(months[keep].min())
+    width = end_month - first
+    cells = codes[keep] * width + (months[keep] - first)
+    shape = (series, width)
+    return CostSeries(
+        first,
+        np.bincount(cells, weights=services[keep], minlength=series * width).reshape(shape),
+        np.bincount(cells, weights=total_cost[keep], minlength=series * width).reshape(shape)
+    )
+
+
+def aggregate_series(
+    aggregates: FleetAggregates, group_by: str, end_month: int
+) -> tuple[list[tuple], CostSeries]:
+    """Cost series of the aggregates grouped by segment fields.
+
+    Returns the group keys (tuples of the ``GROUP_KEYS`` fields) and the
+    series, one row per key. Raises ValueError for an unknown grouping.
+    """
+    if group_by not in GROUP_KEYS:
+        raise ValueError(f"Unknown group_by {group_by!r}; use one of {sorted(GROUP_KEYS)}")
+    fields = GROUP_KEYS[group_by]
+    codes: dict[tuple, int] = {}
+    rows = aggregates.services.items()
+    row_codes = [
+        codes.setdefault(tuple(getattr(segment, name) for name in fields), len(codes))
+        for (segment, _), _ in rows
+    ]
+    series = monthly_series(
+        np.asarray(row_codes, dtype=np.int64),
+        np.asarray([month_index(month) for (_, month), _ in rows], dtype=np.int64),
+        np.asarray([c.services for c in aggregates.services.values()], dtype=np.float64),
+        np.asarray([c.total_cost for c in aggregates.services.values()], dtype=np.float64),
+        len(codes),
+        end_month
+    )
+    return list(codes), series
+
+
+def _two_sided_p(z: np.ndarray) -> np.ndarray:
+    return np.array([math.erfc(abs(value) / math.sqrt(2)) for value in z])
+
+
+def _analyze_block(x: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Mann-Kendall, Sen and Pettitt for a block of series with no empty rows."""
+    rows, n = x.shape
+    usable = ~np.isnan(x)
+    m = usable.sum(axis=1)
+    i, j = np.triu_indices(n, k=1)
+    d = x[:, j] - x[:, i]
+    paired = ~np.isnan(d)
+    signs = np.sign(np.where(paired, d, 0.0)).astype(np.int32)
+
+    # Mann-Kendall; averages of continuous costs make ties negligible
+    s = signs.sum(axis=1)
+    variance = m * (m - 1) * (2 * m + 5) / 18
+    z = (s - np.sign(s)) / np.sqrt(variance)
+    p_value = _two_sided_p(z)
+
+    # Sen's slope and a line through the median residual
+    slope = np.nanmedian(np.where(paired, d / (j - i), np.nan), axis=1)
+    t = np.arange(n)
+    intercept = np.nanmedian(x - slope[:, None] * t, axis=1)
+    start = usable.argmax(axis=1)
+    end = n - 1 - usable[:, ::-1].argmax(axis=1)
+
+    # Pettitt: U[t] sums the signs of pairs with i <= t < j
+    matrix = np.zeros((rows, n, n), dtype=np.int32)
+    matrix[:, i, j] = signs
+    below = np.cumsum(np.cumsum(matrix, axis=1), axis=2)
+    u = below[:, :, -1] - np.diagonal(below, axis1=1, axis2=2)
+    shift = np.abs(u[:, :-1]).argmax(axis=1)
+    k = np.abs(u[np.arange(rows), shift]).astype(np.float64)
+    change_p = np.minimum(1.0, 2 * np.exp(-6 * k ** 2 / (m ** 3 + m ** 2)))
+
+    return (
+        p_value, slope, start, end,
+        intercept + slope * start, intercept + slope * end,
+        shift + 1, change_p
+    )
+
+
+def analyze(series: CostSeries) -> TrendTable:
+    """Test every series; rows with too few usable months get p = 1."""
+    x = series.averages()
+    rows, n = x.shape
+    months = (~np.isnan(x)).sum(axis=1)
+    services = np.where(np.isnan(x), 0, series.services).sum(axis=1)
+    columns = [
+        np.ones(rows), np.zeros(rows),
+        np.zeros(rows, dtype=np.int64), np.zeros(rows, dtype=np.int64),
+        np.zeros(rows), np.zeros(rows),
+        np.zeros(rows, dtype=np.int64), np.ones(rows)
+    ]
+    tested = np.flatnonzero(months >= MIN_TREND_MONTHS)
+    block = max(1, BLOCK_CELLS // max(n * n, 1))
+    for offset in range(0, len(tested), block):
+        picked = tested[offset:offset + block]
+        for column, values in zip(columns, _analyze_block(x[picked])):
+            column[picked] = values
+    return TrendTable(series.first_month, months, services, *columns)
+
+
+def discoveries(p_value: np.ndarray, tested: np.ndarray, alpha: float) -> np.ndarray:
+    """Benjamini-Hochberg: which tested p-values are discoveries at rate ``alpha``."""
+    rows = np.flatnonzero(tested)
+    found = np.zeros(len(p_value), dtype=bool)
+    if not len(rows):
+        return found
+    order = rows[np.argsort(p_value[rows], kind="stable")]
+    passing = np.flatnonzero(p_value[order] <= alpha * np.arange(1, len(order) + 1) / len(order))
+    if len(passing):
+        found[order[:passing[-1] + 1]] = True
+    return found
+
+
+def trend_candidates(
+    table: TrendTable,
+    alpha: float = TREND_ALPHA,
+    min_percent: float = MIN_TREND_PERCENT
+) -> tuple[np.ndarray, dict[int, CostTrend]]:
+    """Unadjusted p-values and the trend of every tested series large enough to report.
+
+    p-values are NaN for series with too few months to test. Significance
+    is left to ``discoveries`` over every tested series, which may span
+    several tables (see ``insight_segments.py``).
+    """
+    start_cost = table.start_cost
+    percent = np.divide(
+        table.end_cost - start_cost, start_cost,
+        out=np.zeros(len(start_cost)), where=start_cost > 0
+    ) * 100
+    tested = table.months >= MIN_TREND_MONTHS
+    p_value = np.where(tested, table.p_value, np.nan)
+    rows = np.flatnonzero(tested & (np.abs(percent) >= min_percent))
+    return p_value, {
+        int(row): CostTrend(
+            percent_change=round(float(percent[row]), 1),
+            slope_per_month=round(float(table.slope[row]), 2),
+            p_value=round(float(table.p_value[row]), 4),
+            start_month=month_from_index(table.first_month + int(table.start[row])),
+            end_month=month_from_index(table.first_month + int(table.end[row])),
+            months=int(table.months[row]),
+            services=int(table.services[row]),
+            start_cost=round(float(start_cost[row]), 2),
+            end_cost=round(float(table.end_cost[row]), 2),
+            change_point=(
+                month_from_index(table.first_month + int(table.change_point[row]))
+                if table.change_p[row] < alpha else None
+            )
+        )
+        for row in rows
+    }
+
+
+def significant_trends(
+    table: TrendTable,
+    alpha: float = TREND_ALPHA,
+    min_percent: float = MIN_TREND_PERCENT
+) -> dict[int, CostTrend]:
+    """Significant trends of at least ``min_percent``, by series row.
+
+    ``alpha`` bounds the expected share of false trends among those
+    returned.
+    """
+    p_value, candidates = trend_candidates(table, alpha, min_percent)
+    found = discoveries(p_value, ~np.isnan(p_value), alpha)
+    return {row: trend for row, trend in candidates.items() if found[row]}
@@ -0,0 +1,33 @@
+"""Keyset Pagination Cursors.
+
+Opaque cursors for paginated listings ordered by a sort value and a row
+id. A cursor is the URL-safe base64 of the last row's position, so
+clients pass it back unchanged to fetch the next page.
+"""
+import base64
+from datetime import date, datetime
+import json
+from typing import Any
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """Encode a keyset position as an opaque cursor."""
+    if isinstance(sort_value, (date, datetime)):
+        sort_value = sort_value.isoformat()
+    elif sort_value is not None and not isinstance(sort_value, (int, str)):
+        sort_value = float(sort_value)
+    payload = json.dumps({"v": sort_value, "id": str(row_id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Any, str]:
+    """Decode a cursor produced by encode_cursor.
+
+    Raises ValueError for a malformed cursor.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return payload["v"], payload["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
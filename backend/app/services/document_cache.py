@@ -0,0 +1,188 @@
+"""Document Fingerprint Cache.
+
+Deduplicates document processing by content fingerprint: re-uploads of
+identical bytes (SHA-256) reuse the earlier extraction. Rescans are not
+matched by image similarity, since documents printed on the same
+template look alike and would be served another customer's data.
+Results are kept in an in-memory LRU and persisted to
+``document_processing_job.extracted_data`` so that the cache survives
+restarts.
+"""
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import logging
+from typing import Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.db import get_pool
+from app.schemas.documents import DocumentCacheStats, DocumentProcessResponse
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentFingerprint:
+    """Content fingerprint of an uploaded document."""
+
+    __slots__ = ("sha256",)
+
+    def __init__(self, sha256: str):
+        self.sha256 = sha256
+
+
+def fingerprint_content(content: bytes) -> DocumentFingerprint:
+    """Fingerprint raw document bytes."""
+    return DocumentFingerprint(sha256=hashlib.sha256(content).hexdigest())
+
+
+def normalize_document_type(document_type: str) -> str:
+    """Document type an extraction produces for a requested type."""
+    doc_type = document_type.lower()
+    if "receipt" in doc_type or "service" in doc_type:
+        return "service_receipt"
+    if "insurance" in doc_type:
+        return "insurance_card"
+    if "registration" in doc_type:
+        return "registration"
+    return doc_type
+
+
+def _cache_key(sha256: str, document_type: str) -> str:
+    return f"{document_type}:{sha256}"
+
+
+class DocumentCache:
+    """LRU cache of processed documents keyed by content fingerprint."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, DocumentProcessResponse] = OrderedDict()
+        self.exact_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _put(self, key: str, response: DocumentProcessResponse) -> None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = response
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def lookup(
+        self,
+        fingerprint: DocumentFingerprint,
+        document_type: str
+    ) -> Optional[DocumentProcessResponse]:
+        """Return a previously processed result for this content, if any."""
+        document_type = normalize_document_type(document_type)
+        key = _cache_key(fingerprint.sha256, document_type)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry
+
+        response = await self._load_persisted(fingerprint.sha256, document_type)
+        if response is not None:
+            self._put(key, response)
+            self.persistent_hits += 1
+            return response
+
+        self.misses += 1
+        return None
+
+    async def store(
+        self,
+        fingerprint: DocumentFingerprint,
+        document_type: str,
+        response: DocumentProcessResponse,
+        file_url: Optional[str] = None
+    ) -> None:
+        """Cache a freshly processed result and persist it."""
+        document_type = normalize_document_type(document_type)
+        self._put(_cache_key(fingerprint.sha256, document_type), response)
+        await self._persist(fingerprint, document_type, response, file_url)
+
+    async def _load_persisted(
+        self, sha256: str, document_type: str
+    ) -> Optional[DocumentProcessResponse]:
+        pool = await get_pool()
+        if pool is None:
+            return None
+        try:
+            row = await pool.fetchrow(
+                """
+                SELECT extracted_data
+                FROM document_processing_job
+                WHERE content_sha256 = $1
+                  AND lower(extracted_data->>'document_type') = $2
+                  AND status = 'completed'
+                ORDER BY completed_at DESC
+                LIMIT 1
+                """,
+                sha256,
+                document_type
+            )
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.warning("Document cache lookup failed: %s", e)
+            return None
+        if row is None:
+            return None
+        return DocumentProcessResponse.model_validate_json(row["extracted_data"])
+
+    async def _persist(
+        self,
+        fingerprint: DocumentFingerprint,
+        document_type: str,
+        response: DocumentProcessResponse,
+        file_url: Optional[str]
+    ) -> None:
+        pool = await get_pool()
+        if pool is None:
+            return
+        now = datetime.now()
+        confidence_scores = {
+            f.field_name: f.confidence for f in response.extracted_fields
+        }
+        try:
+            await pool.execute(
+                """
+                INSERT INTO document_processing_job (
+                    job_type, status, input_file_url, extracted_data,
+                    confidence_scores, content_sha256, started_at, completed_at
+                ) VALUES ('ocr_extract', 'completed', $1, $2::jsonb, $3::jsonb, $4, $5, $5)
+                """,
+                file_url,
+                response.model_dump_json(),
+                json.dumps(confidence_scores),
+                fingerprint.sha256,
+                now
+            )
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.warning("Document cache persist failed for %s: %s", document_type, e)
+
+    def stats(self) -> DocumentCacheStats:
+        """Get cache hit-rate metrics."""
+        hits = self.exact_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return DocumentCacheStats(
+            entries=len(self._entries),
+            max_entries=self.max_entries,
+            lookups=lookups,
+            hits=hits,
+            exact_hits=self.exact_hits,
+            persistent_hits=self.persistent_hits,
+            misses=self.misses,
+            hit_rate=round(hits / lookups, 4) if lookups else 0.0
+        )
+
+
+_settings = get_settings()
+
+# Singleton instance
+document_cache = DocumentCache(max_entries=_settings.document_cache_max_entries)
@@ -0,0 +1,285 @@
+"""Multi-Page Document Processing.
+
+Splits scanned multi-page documents (PDF dealer packets, multi-frame TIFF
+scans) into pages lazily, runs page-level extraction in a process pool
+and merges the page results into a single document response.
+
+Only a small window of rasterized pages is held in memory at once: a
+page is rendered when a slot frees up and its slot is released as soon
+as its result has been emitted.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import hashlib
+import io
+import os
+import time
+from typing import AsyncIterator, Optional
+
+from PIL import Image
+
+from app.config import get_settings
+from app.schemas.documents import (
+    DocumentProcessRequest,
+    DocumentProcessResponse,
+    ExtractedField
+)
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional dependency
+    pdfium = None
+
+
+# Page images are rendered at this resolution before OCR
+RENDER_DPI = 150
+
+# Document types a single page can be classified as
+PAGE_DOCUMENT_TYPES = ("service_receipt", "insurance_card", "registration")
+
+# Request types that mean "classify each page"
+PACKET_DOCUMENT_TYPES = ("dealer_packet", "packet", "pdf")
+
+# Rasterization runs on one thread: PDFium is not thread-safe
+_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-render")
+_page_pool: Optional[ProcessPoolExecutor] = None
+
+
+class DocumentFormatError(ValueError):
+    """Raised when document pages cannot be read."""
+
+
+def is_multipage(content: bytes) -> bool:
+    """Check whether content is a PDF or a multi-frame TIFF."""
+    if content[:5] == b"%PDF-":
+        return True
+    if content[:4] in (b"II*\x00", b"MM\x00*"):
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                return getattr(image, "n_frames", 1) > 1
+        except OSError:
+            return False
+    return False
+
+
+def _page_to_png(image: Image.Image) -> bytes:
+    """Normalize a rendered page and encode it for a worker process."""
+    max_dimension = get_settings().document_max_page_dimension
+    page = image.convert("L")
+    page.thumbnail((max_dimension, max_dimension))
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+class _PageSource:
+    """Lazy page renderer over PDF or TIFF content."""
+
+    def __init__(self, content: bytes):
+        self._pdf = None
+        self._tiff = None
+        if content[:5] == b"%PDF-":
+            if pdfium is None:
+                raise DocumentFormatError("PDF support requires the pypdfium2 package")
+            try:
+                self._pdf = pdfium.PdfDocument(content)
+            except pdfium.PdfiumError as e:
+                raise DocumentFormatError(f"Unreadable PDF: {e}") from e
+            self.page_count = len(self._pdf)
+        else:
+            try:
+                self._tiff = Image.open(io.BytesIO(content))
+            except OSError as e:
+                raise DocumentFormatError(f"Unreadable image: {e}") from e
+            self.page_count = getattr(self._tiff, "n_frames", 1)
+
+    def render(self, index: int) -> bytes:
+        """Rasterize one page to PNG bytes."""
+        if self._pdf is not None:
+            page = self._pdf[index]
+            try:
+                bitmap = page.render(scale=RENDER_DPI / 72)
+                return _page_to_png(bitmap.to_pil())
+            finally:
+                page.close()
+        self._tiff.seek(index)
+        return _page_to_png(self._tiff)
+
+    def close(self) -> None:
+        if self._pdf is not None:
+            self._pdf.close()
+        if self._tiff is not None:
+            self._tiff.close()
+
+
+def _classify_page(png: bytes, document_type: str) -> str:
+    """Pick the document type for a page (mock classifier)."""
+    document_type = document_type.lower()
+    if document_type not in PACKET_DOCUMENT_TYPES:
+        return document_type
+    digest = hashlib.sha256(png).digest()
+    return PAGE_DOCUMENT_TYPES[digest[0] % len(PAGE_DOCUMENT_TYPES)]
+
+
+def extract_page(png: bytes, page_number: int, document_type: str) -> dict:
+    """Extract fields from one rasterized page.
+
+    Runs inside a worker process, so it takes and returns plain data.
+    """
+    # Imported here so worker processes only load what they need
+    from app.services.documents import document_processing_service
+
+    start = time.perf_counter()
+    page_type = _classify_page(png, document_type)
+    result = document_processing_service.ocr_page(
+        DocumentProcessRequest(
+            document_id=f"page-{page_number}",
+            document_type=page_type
+        ),
+        Image.open(io.BytesIO(png))
+    )
+    return {
+        "page_number": page_number,
+        "document_type": result.document_type,
+        "processing_status": result.processing_status,
+        "confidence_score": result.confidence_score,
+        "extracted_fields": [
+            {**f.model_dump(), "page_number": page_number}
+            for f in result.extracted_fields
+        ],
+        "structured_data": result.structured_data,
+        "raw_text": result.raw_text,
+        "warnings": result.warnings,
+        "processing_time_ms": round((time.perf_counter() - start) * 1000, 3)
+    }
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _page_pool
+    if _page_pool is None:
+        workers = get_settings().document_page_workers or os.cpu_count() or 1
+        _page_pool = ProcessPoolExecutor(max_workers=workers)
+    return _page_pool
+
+
+def shutdown_page_pool() -> None:
+    """Stop page worker processes."""
+    global _page_pool
+    if _page_pool is not None:
+        _page_pool.shutdown(cancel_futures=True)
+        _page_pool = None
+
+
+async def iter_page_results(
+    content: bytes,
+    document_type: str,
+    max_in_flight: Optional[int] = None
+) -> AsyncIterator[dict]:
+    """Process pages in parallel, yielding results in page order.
+
+    At most ``max_in_flight`` pages are rendered but not yet emitted, so
+    memory stays bounded regardless of page count. Page 1 is yielded as
+    soon as it completes, before later pages have been processed.
+    """
+    loop = asyncio.get_running_loop()
+    max_in_flight = max_in_flight or get_settings().document_max_pages_in_flight
+    source = await loop.run_in_executor(_render_executor, _PageSource, content)
+    slots = asyncio.Semaphore(max_in_flight)
+    pool = _get_page_pool()
+
+    async def process(index: int) -> dict:
+        try:
+            png = await loop.run_in_executor(_render_executor, source.render, index)
+            return await loop.run_in_executor(
+                pool, extract_page, png, index + 1, document_type
+            )
+        except Exception:
+            slots.release()
+            raise
+
+    async def schedule() -> None:
+        for index in range(source.page_count):
+            await slots.acquire()
+            pending.put_nowait(asyncio.create_task(process(index)))
+
+    pending: asyncio.Queue = asyncio.Queue()
+    scheduler = asyncio.create_task(schedule())
+    try:
+        for _ in range(source.page_count):
+            task = await pending.get()
+            page = await task
+            page["page_count"] = source.page_count
+            slots.release()
+            yield page
+    finally:
+        scheduler.cancel()
+        while not pending.empty():
+            pending.get_nowait().cancel()
+        await loop.run_in_executor(_render_executor, source.close)
+
+
+def merge_page_results(
+    request: DocumentProcessRequest,
+    pages: list[dict],
+    elapsed_ms: int
+) -> DocumentProcessResponse:
+    """Merge page-level extractions into one document response.
+
+    Each field keeps its highest-confidence value; per-page structured
+    data is preserved under ``structured_data["pages"]``.
+    """
+    best: dict[str, dict] = {}
+    merged_data: dict = {}
+    warnings: list[str] = []
+    page_types: list[str] = []
+
+    for page in pages:
+        page_types.append(page["document_type"])
+        for field in page["extracted_fields"]:
+            current = best.get(field["field_name"])
+            if current is None or field["confidence"] > current["confidence"]:
+                best[field["field_name"]] = field
+        for key, value in (page["structured_data"] or {}).items():
+            merged_data.setdefault(key, value)
+        warnings.extend(f"Page {page['page_number']}: {w}" for w in page["warnings"])
+
+    distinct_types = sorted(set(page_types))
+    document_type = distinct_types[0] if len(distinct_types) == 1 else "dealer_packet"
+    confidence = (
+        sum(p["confidence_score"] for p in pages) / len(pages) if pages else 0.0
+    )
+    statuses = {p["processing_status"] for p in pages}
+
+    merged_data["page_count"] = len(pages)
+    merged_data["pages"] = [
+        {
+            "page_number": p["page_number"],
+            "document_type": p["document_type"],
+            "structured_data": p["structured_data"]
+        }
+        for p in pages
+    ]
+
+    return DocumentProcessResponse(
+        document_id=request.document_id,
+        document_type=document_type,
+        processing_status="success" if statuses == {"success"} else "partial",
+        confidence_score=round(confidence, 2),
+        extracted_fields=[ExtractedField(**f) for f in best.values()],
+        structured_data=merged_data,
+        raw_text="\f".join(p["raw_text"] or "" for p in pages),
+        warnings=warnings,
+        processing_time_ms=elapsed_ms
+    )
+
+
+async def process_multipage(
+    request: DocumentProcessRequest,
+    content: bytes
+) -> DocumentProcessResponse:
+    """Process every page and return the merged response."""
+    start = time.perf_counter()
+    pages = [page async for page in iter_page_results(content, request.document_type)]
+    return merge_page_results(
+        request, pages, int((time.perf_counter() - start) * 1000)
+    )
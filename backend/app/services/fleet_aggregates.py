@@ -0,0 +1,329 @@
+"""Fleet Aggregates.
+
+Additive fleet counters that AI insights are computed from, so generating
+insights costs O(aggregates) rather than O(fleet). Counters are keyed by
+segment (owner and manufacturer, with the owner's type) and by model
+year, expiry day or service month.
+
+With a database the counters are the ``fleet_*_aggregate`` tables, kept
+current on every write by the triggers in
+``migrations/add_fleet_aggregates.sql``; a snapshot reads them as they
+are. When a read fails the last snapshot read is reused; sample data
+never stands in for the database. Without one, ``FleetAggregates``
+applies the same deltas in process (``record_vehicle`` /
+``record_service``), seeded in mock mode with a reproducible sample
+fleet.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+import logging
+import random
+from typing import NamedTuple, Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.db import DatabaseUnavailableError, get_pool
+
+logger = logging.getLogger(__name__)
+
+# Must match the threshold in the fleet_state_delta trigger function
+HIGH_MILEAGE = 100_000
+
+EXPIRY_KINDS = ("inspection", "insurance", "compliance")
+
+
+class Segment(NamedTuple):
+    """Aggregation segment of a vehicle."""
+    owner_id: str
+    owner_type: str  # individual, dealership, fleet
+    manufacturer: str
+
+
+class VehicleState(NamedTuple):
+    """Everything about a vehicle that the aggregates count."""
+    segment: Segment
+    model_year: int
+    mileage: int = 0
+    active: bool = True
+    inspection_expires: Optional[date] = None
+    insurance_expires: Optional[date] = None
+    open_recalls: int = 0
+
+
+class FleetTotalsMarker(NamedTuple):
+    """Fleet-wide totals; comparing two shows how much the fleet changed."""
+    vehicles: int
+    high_mileage: int
+    open_recall_vehicles: int
+    services: int
+
+    def drift(self, other: "FleetTotalsMarker") -> float:
+        """Largest relative change of any total since ``other``."""
+        return max(
+            abs(new - old) / max(old, 1) for new, old in zip(self, other)
+        )
+
+
+@dataclass
+class VehicleCounts:
+    vehicles: int = 0
+    high_mileage: int = 0
+    mileage_sum: int = 0
+    open_recall_vehicles: int = 0
+
+
+@dataclass
+class ServiceCounts:
+    services: int = 0
+    repairs: int = 0
+    total_cost: float = 0.0
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def month_index(day: date) -> int:
+    """Months since year 0, so month windows are integer ranges."""
+    return day.year * 12 + day.month - 1
+
+
+def month_from_index(index: int) -> date:
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class FleetAggregates:
+    """Fleet counters by segment; the in-process twin of the aggregate tables."""
+
+    def __init__(self, source: str = "memory"):
+        self.source = source
+        self.vehicles: dict[tuple[Segment, int], VehicleCounts] = {}
+        self.expirations: dict[tuple[Segment, str, date], int] = {}
+        self.services: dict[tuple[Segment, date], ServiceCounts] = {}
+
+    def __len__(self) -> int:
+        return len(self.vehicles) + len(self.expirations) + len(self.services)
+
+    def _expiry_delta(self, segment: Segment, kind: str, expires: Optional[date], delta: int) -> None:
+        if expires is None:
+            return
+        key = (segment, kind, expires)
+        count = self.expirations.get(key, 0) + delta
+        if count:
+            self.expirations[key] = count
+        else:
+            self.expirations.pop(key, None)
+
+    def _vehicle_delta(self, state: VehicleState, delta: int) -> None:
+        if not state.active:
+            return
+        key = (state.segment, state.model_year)
+        counts = self.vehicles.setdefault(key, VehicleCounts())
+        counts.vehicles += delta
+        counts.high_mileage += delta if state.mileage >= HIGH_MILEAGE else 0
+        counts.mileage_sum += delta * state.mileage
+        counts.open_recall_vehicles += delta if state.open_recalls > 0 else 0
+        if counts.vehicles == 0:
+            del self.vehicles[key]
+
+        self._expiry_delta(state.segment, "inspection", state.inspection_expires, delta)
+        self._expiry_delta(state.segment, "insurance", state.insurance_expires, delta)
+        if state.inspection_expires is not None and state.insurance_expires is not None:
+            self._expiry_delta(
+                state.segment,
+                "compliance",
+                min(state.inspection_expires, state.insurance_expires),
+                delta
+            )
+
+    def apply_vehicle(self, old: Optional[VehicleState], new: Optional[VehicleState]) -> None:
+        """Apply a vehicle change: remove the old state, add the new one."""
+        if old is not None:
+            self._vehicle_delta(old, -1)
+        if new is not None:
+            self._vehicle_delta(new, 1)
+
+    def apply_service(
+        self,
+        segment: Segment,
+        service_date: date,
+        service_type: str,
+        total_cost: float,
+        delta: int = 1
+    ) -> None:
+        """Add (or with ``delta=-1`` remove) a service record."""
+        key = (segment, month_start(service_date))
+        counts = self.services.setdefault(key, ServiceCounts())
+        counts.services += delta
+        counts.repairs += delta if service_type == "repair" else 0
+        counts.total_cost += delta * total_cost
+        if counts.services == 0:
+            del self.services[key]
+
+    def totals(self) -> FleetTotalsMarker:
+        """Fleet-wide counters used to notice significant change."""
+        return FleetTotalsMarker(
+            vehicles=sum(c.vehicles for c in self.vehicles.values()),
+            high_mileage=sum(c.high_mileage for c in self.vehicles.values()),
+            open_recall_vehicles=sum(c.open_recall_vehicles for c in self.vehicles.values()),
+            services=sum(c.services for c in self.services.values())
+        )
+
+    def segments(self) -> set[Segment]:
+        """Every segment with vehicles or service history."""
+        return (
+            {segment for segment, _ in self.vehicles}
+            | {segment for segment, _ in self.services}
+        )
+
+
+_VEHICLES_SQL = """
+    SELECT owner_id, owner_type, manufacturer, model_year,
+           vehicle_count, high_mileage_count, mileage_sum, open_recall_vehicles
+    FROM fleet_vehicle_aggregate
+"""
+
+_EXPIRY_SQL = """
+    SELECT owner_id, owner_type, manufacturer, kind, expires_on, vehicle_count
+    FROM fleet_expiry_aggregate
+"""
+
+_TOTALS_SQL = """
+    SELECT
+        (SELECT COALESCE(SUM(vehicle_count), 0) FROM fleet_vehicle_aggregate) AS vehicles,
+        (SELECT COALESCE(SUM(high_mileage_count), 0) FROM fleet_vehicle_aggregate) AS high_mileage,
+        (SELECT COALESCE(SUM(open_recall_vehicles), 0) FROM fleet_vehicle_aggregate) AS open_recall_vehicles,
+        (SELECT COALESCE(SUM(service_count), 0) FROM fleet_service_aggregate) AS services
+"""
+
+_SERVICES_SQL = """
+    SELECT owner_id, owner_type, manufacturer, month,
+           service_count, repair_count, total_cost_sum
+    FROM fleet_service_aggregate
+"""
+
+
+def _segment(row: asyncpg.Record) -> Segment:
+    return Segment(str(row["owner_id"]), row["owner_type"], row["manufacturer"])
+
+
+async def load_aggregates(pool: asyncpg.Pool) -> FleetAggregates:
+    """Read the aggregate tables into a snapshot."""
+    aggregates = FleetAggregates(source="postgres")
+    for row in await pool.fetch(_VEHICLES_SQL):
+        aggregates.vehicles[(_segment(row), row["model_year"])] = VehicleCounts(
+            vehicles=row["vehicle_count"],
+            high_mileage=row["high_mileage_count"],
+            mileage_sum=row["mileage_sum"],
+            open_recall_vehicles=row["open_recall_vehicles"]
+        )
+    for row in await pool.fetch(_EXPIRY_SQL):
+        aggregates.expirations[(_segment(row), row["kind"], row["expires_on"])] = row["vehicle_count"]
+    for row in await pool.fetch(_SERVICES_SQL):
+        aggregates.services[(_segment(row), row["month"])] = ServiceCounts(
+            services=row["service_count"],
+            repairs=row["repair_count"],
+            total_cost=float(row["total_cost_sum"])
+        )
+    return aggregates
+
+
+SAMPLE_MANUFACTURERS = ["Toyota", "Honda", "Ford", "Chevrolet", "BMW", "Tesla", "Nissan", "Hyundai"]
+SAMPLE_SERVICE_TYPES = ["maintenance", "maintenance", "repair", "inspection", "warranty"]
+
+
+class FleetAggregateService:
+    """Fleet aggregates from the database, or maintained in process."""
+
+    def __init__(self):
+        self._memory = FleetAggregates()
+        self._states: dict[str, VehicleState] = {}
+        self._seeded = False
+        self._loaded: Optional[FleetAggregates] = None  # Last snapshot read from the database
+
+    def record_vehicle(self, vehicle_id: str, state: Optional[VehicleState]) -> None:
+        """Record a vehicle write; ``None`` records a deletion."""
+        old = self._states.pop(vehicle_id, None)
+        if state is not None:
+            self._states[vehicle_id] = state
+        self._memory.apply_vehicle(old, state)
+
+    def record_service(
+        self,
+        vehicle_id: str,
+        service_date: date,
+        service_type: str,
+        total_cost: float,
+        delta: int = 1
+    ) -> None:
+        """Record a service record write against the vehicle's segment."""
+        state = self._states.get(vehicle_id)
+        if state is not None:
+            self._memory.apply_service(state.segment, service_date, service_type, total_cost, delta)
+
+    def _seed_sample_fleet(self, vehicles: int = 240, seed: int = 7) -> None:
+        """Populate mock mode with a reproducible fleet relative to today."""
+        rng = random.Random(seed)
+        today = date.today()
+        owners = [
+            (f"sample-owner-{i:02d}", rng.choice(["individual", "dealership", "fleet"]))
+            for i in range(12)
+        ]
+        for i in range(vehicles):
+            owner_id, owner_type = rng.choice(owners)
+            year = rng.randint(today.year - 15, today.year)
+            state = VehicleState(
+                segment=Segment(owner_id, owner_type, rng.choice(SAMPLE_MANUFACTURERS)),
+                model_year=year,
+                mileage=max(0, int((today.year - year + 0.5) * rng.gauss(12_000, 3_000))),
+                active=rng.random() > 0.04,
+                inspection_expires=today + timedelta(days=rng.randint(-60, 365)) if rng.random() > 0.05 else None,
+                insurance_expires=today + timedelta(days=rng.randint(-30, 365)) if rng.random() > 0.03 else None,
+                open_recalls=1 if rng.random() < 0.06 else 0
+            )
+            vehicle_id = f"sample-vehicle-{i:04d}"
+            self.record_vehicle(vehicle_id, state)
+            # Two years of service history with costs drifting upward
+            for _ in range(rng.randint(2, 10)):
+                days_ago = rng.randint(0, 730)
+                drift = 1 + (730 - days_ago) / 730 * 0.15
+                self.record_service(
+                    vehicle_id,
+                    today - timedelta(days=days_ago),
+                    rng.choice(SAMPLE_SERVICE_TYPES),
+                    round(rng.uniform(60, 900) * drift, 2)
+                )
+
+    async def totals(self) -> FleetTotalsMarker:
+        """Fleet-wide totals, without loading the aggregates."""
+        pool = await get_pool()
+        if pool is not None:
+            row = await pool.fetchrow(_TOTALS_SQL)
+            return FleetTotalsMarker(*(int(value) for value in row.values()))
+        return (await self.snapshot()).totals()
+
+    async def snapshot(self) -> FleetAggregates:
+        """Current aggregates: read from the database, or the in-process counters.
+
+        Raises DatabaseUnavailableError when the database cannot be read
+        and no earlier snapshot was.
+        """
+        pool = await get_pool()
+        if pool is not None:
+            try:
+                self._loaded = await load_aggregates(pool)
+            except (asyncpg.PostgresError, OSError) as e:
+                if self._loaded is None:
+                    raise DatabaseUnavailableError(f"Fleet aggregates unavailable: {e}") from e
+                logger.warning("Fleet aggregates unavailable, reusing the last snapshot: %s", e)
+            return self._loaded
+        if not self._seeded:
+            self._seeded = True
+            if get_settings().use_mock_apis and not self._states:
+                self._seed_sample_fleet()
+        return self._memory
+
+
+# Singleton instance
+fleet_aggregate_service = FleetAggregateService()
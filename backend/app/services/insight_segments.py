@@ -0,0 +1,333 @@
+"""Segmented Insight Generation.
+
+Computes insights for every owner (or owner type) in the fleet rather
+than for the fleet as a whole. The fleet aggregates are converted to
+columns (numpy arrays) sorted by segment, cut into contiguous partitions
+of segments and fanned out to a process pool. Each worker sums its
+columnar slice per segment with ``np.bincount`` and runs the same insight
+builders as fleet-wide generation, so the work per partition is
+vectorized and partitions share nothing. The one exception is cost trend
+significance: workers return each segment's unadjusted p-value and
+Benjamini-Hochberg runs once over every segment, so which trends are
+reported does not depend on how the fleet was partitioned.
+
+Partitions are sized so there are several per worker, which keeps every
+core busy when segment sizes are uneven.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+import os
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.schemas.insights import AIInsight
+from app.services.cost_trends import (
+    TREND_ALPHA,
+    CostTrend,
+    analyze,
+    discoveries,
+    monthly_series,
+    trend_candidates
+)
+from app.services.fleet_aggregates import FleetAggregates, Segment, ServiceCounts, month_index
+from app.services.insights import (
+    AGING_YEARS,
+    EXPIRY_WINDOW_DAYS,
+    FleetTotals,
+    build_insights,
+    cost_trend_insight
+)
+
+SEGMENT_KEYS = {
+    "owner": lambda segment: segment.owner_id,
+    "owner_type": lambda segment: segment.owner_type,
+}
+
+# Partitions per worker process
+PARTITIONS_PER_WORKER = 4
+
+_KIND_CODES = {"inspection": 0, "insurance": 1, "compliance": 2}
+
+_segment_pool: Optional[ProcessPoolExecutor] = None
+
+
+class SegmentColumns(NamedTuple):
+    """A columnar slice of the fleet aggregates.
+
+    ``keys[i]`` is the segment of code ``i``; every ``*_segment`` column
+    holds codes into ``keys`` and is sorted ascending.
+    """
+    keys: list[str]
+    vehicle_segment: np.ndarray
+    model_year: np.ndarray
+    vehicles: np.ndarray
+    high_mileage: np.ndarray
+    open_recall_vehicles: np.ndarray
+    expiry_segment: np.ndarray
+    expiry_kind: np.ndarray
+    expires_on: np.ndarray  # date.toordinal()
+    expiry_count: np.ndarray
+    service_segment: np.ndarray
+    service_month: np.ndarray  # month_index()
+    services: np.ndarray
+    repairs: np.ndarray
+    total_cost: np.ndarray
+
+
+# Columns of each aggregate table, segment codes first
+_TABLE_COLUMNS = (
+    ("vehicle_segment", "model_year", "vehicles", "high_mileage", "open_recall_vehicles"),
+    ("expiry_segment", "expiry_kind", "expires_on", "expiry_count"),
+    ("service_segment", "service_month", "services", "repairs", "total_cost"),
+)
+
+
+class PartitionResult(NamedTuple):
+    """Insights for a slice, before cost trends are tested.
+
+    ``p_value[i]`` is the unadjusted trend p-value of ``segments[i]`` (NaN
+    when untested) and ``trends`` the trend of each row that would be
+    reported if significant.
+    """
+    segments: list[tuple[str, int, list[AIInsight]]]
+    p_value: np.ndarray
+    trends: dict[int, CostTrend]
+
+
+def _sorted_columns(codes: list[int], *columns: list, dtypes: tuple) -> list[np.ndarray]:
+    order = np.argsort(np.asarray(codes, dtype=np.int64), kind="stable")
+    arrays = [np.asarray(codes, dtype=np.int64)[order]]
+    for values, dtype in zip(columns, dtypes):
+        arrays.append(np.asarray(values, dtype=dtype)[order])
+    return arrays
+
+
+def to_columns(aggregates: FleetAggregates, segment_by: str) -> SegmentColumns:
+    """Convert aggregates to columns keyed by the chosen segment.
+
+    Raises ValueError for an unknown ``segment_by``.
+    """
+    if segment_by not in SEGMENT_KEYS:
+        raise ValueError(f"Unknown segment_by {segment_by!r}; use one of {sorted(SEGMENT_KEYS)}")
+    key_of = SEGMENT_KEYS[segment_by]
+    keys = sorted({key_of(segment) for segment in aggregates.segments()})
+    codes = {key: code for code, key in enumerate(keys)}
+
+    def code(segment: Segment) -> int:
+        return codes[key_of(segment)]
+
+    vehicle_rows = aggregates.vehicles.items()
+    vehicle_columns = _sorted_columns(
+        [code(segment) for (segment, _), _ in vehicle_rows],
+        [model_year for (_, model_year), _ in vehicle_rows],
+        [c.vehicles for c in aggregates.vehicles.values()],
+        [c.high_mileage for c in aggregates.vehicles.values()],
+        [c.open_recall_vehicles for c in aggregates.vehicles.values()],
+        dtypes=(np.int32, np.int64, np.int64, np.int64)
+    )
+    expiry_rows = aggregates.expirations.items()
+    expiry_columns = _sorted_columns(
+        [code(segment) for (segment, _, _), _ in expiry_rows],
+        [_KIND_CODES[kind] for (_, kind, _), _ in expiry_rows],
+        [expires_on.toordinal() for (_, _, expires_on), _ in expiry_rows],
+        [count for count in aggregates.expirations.values()],
+        dtypes=(np.int8, np.int64, np.int64)
+    )
+    service_rows = aggregates.services.items()
+    service_columns = _sorted_columns(
+        [code(segment) for (segment, _), _ in service_rows],
+        [month_index(month) for (_, month), _ in service_rows],
+        [c.services for c in aggregates.services.values()],
+        [c.repairs for c in aggregates.services.values()],
+        [c.total_cost for c in aggregates.services.values()],
+        dtypes=(np.int32, np.int64, np.int64, np.float64)
+    )
+    return SegmentColumns(keys, *vehicle_columns, *expiry_columns, *service_columns)
+
+
+def partition(columns: SegmentColumns, parts: int) -> list[SegmentColumns]:
+    """Cut the columns into up to ``parts`` slices of whole segments.
+
+    Slices are balanced by aggregate rows, and their codes are rebased to
+    start at zero.
+    """
+    segments = len(columns.keys)
+    if segments == 0:
+        return []
+    rows = (
+        np.bincount(columns.vehicle_segment, minlength=segments)
+        + np.bincount(columns.expiry_segment, minlength=segments)
+        + np.bincount(columns.service_segment, minlength=segments)
+    )
+    targets = np.linspace(0, rows.sum(), min(parts, segments) + 1)[1:-1]
+    bounds = np.unique(np.concatenate((
+        [0], np.searchsorted(np.cumsum(rows), targets, side="right"), [segments]
+    )))
+
+    slices = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        picked = {}
+        for table in _TABLE_COLUMNS:
+            segment_column = getattr(columns, table[0])
+            start, stop = np.searchsorted(segment_column, [lo, hi])
+            for name in table[1:]:
+                picked[name] = getattr(columns, name)[start:stop]
+            picked[table[0]] = segment_column[start:stop] - lo
+        slices.append(SegmentColumns(keys=columns.keys[lo:hi], **picked))
+    return slices
+
+
+def _sums(codes: np.ndarray, values: np.ndarray, mask: Optional[np.ndarray], segments: int) -> np.ndarray:
+    if mask is not None:
+        codes, values = codes[mask], values[mask]
+    return np.bincount(codes, weights=values, minlength=segments)
+
+
+def segment_totals(columns: SegmentColumns, today: date, months: int) -> list[FleetTotals]:
+    """Per-segment totals for a slice; the columnar form of ``summarize``.
+
+    ``cost_trend`` is left unset; see ``trend_candidates``.
+    """
+    n = len(columns.keys)
+    vehicle_codes = columns.vehicle_segment
+    aging = (today.year - columns.model_year) > AGING_YEARS
+    vehicles = _sums(vehicle_codes, columns.vehicles, None, n)
+    high_mileage = _sums(vehicle_codes, columns.high_mileage, None, n)
+    open_recalls = _sums(vehicle_codes, columns.open_recall_vehicles, None, n)
+    aging_vehicles = _sums(vehicle_codes, columns.vehicles, aging, n)
+
+    expiry_codes = columns.expiry_segment
+    current = columns.expires_on >= today.toordinal()
+    soon = current & (columns.expires_on <= (today + timedelta(days=EXPIRY_WINDOW_DAYS)).toordinal())
+    counts = columns.expiry_count
+    compliant = _sums(expiry_codes, counts, current & (columns.expiry_kind == _KIND_CODES["compliance"]), n)
+    inspections = _sums(expiry_codes, counts, soon & (columns.expiry_kind == _KIND_CODES["inspection"]), n)
+    insurance = _sums(expiry_codes, counts, soon & (columns.expiry_kind == _KIND_CODES["insurance"]), n)
+
+    service_codes = columns.service_segment
+    age = month_index(today) - columns.service_month
+    windows = []
+    for mask in ((age > 0) & (age <= months), (age > months) & (age <= 2 * months)):
+        windows.append((
+            _sums(service_codes, columns.services, mask, n),
+            _sums(service_codes, columns.repairs, mask, n),
+            _sums(service_codes, columns.total_cost, mask, n)
+        ))
+    (recent_services, recent_repairs, recent_cost), (prior_services, prior_repairs, prior_cost) = windows
+
+    return [
+        FleetTotals(
+            vehicles=int(vehicles[i]),
+            high_mileage=int(high_mileage[i]),
+            open_recall_vehicles=int(open_recalls[i]),
+            aging=int(aging_vehicles[i]),
+            compliant=int(compliant[i]),
+            inspections_expiring=int(inspections[i]),
+            insurance_expiring=int(insurance[i]),
+            recent=ServiceCounts(int(recent_services[i]), int(recent_repairs[i]), float(recent_cost[i])),
+            prior=ServiceCounts(int(prior_services[i]), int(prior_repairs[i]), float(prior_cost[i]))
+        )
+        for i in range(n)
+    ]
+
+
+def _tag(insights: list[AIInsight], segment_by: str, key: str) -> list[AIInsight]:
+    for insight in insights:
+        insight.details = {**(insight.details or {}), "segment_by": segment_by, "segment": key}
+        insight.action_url = f"{insight.action_url}&{segment_by}={key}"
+    return insights
+
+
+def generate_partition(
+    columns: SegmentColumns,
+    segment_by: str,
+    today: date,
+    months: int,
+    insight_types: Optional[list[str]] = None
+) -> PartitionResult:
+    """Insights other than cost trends for every segment in a slice.
+
+    Runs in a worker process; ``merge_partitions`` completes the results.
+    """
+    n = len(columns.keys)
+    p_value, trends = trend_candidates(analyze(monthly_series(
+        columns.service_segment, columns.service_month, columns.services, columns.total_cost,
+        n, month_index(today)
+    )))
+    segments = [
+        (key, totals.vehicles, _tag(build_insights(totals, months, insight_types), segment_by, key))
+        for key, totals in zip(columns.keys, segment_totals(columns, today, months))
+    ]
+    return PartitionResult(segments, p_value, trends)
+
+
+def merge_partitions(
+    parts: list[PartitionResult],
+    segment_by: str,
+    insight_types: Optional[list[str]] = None
+) -> list[tuple[str, int, list[AIInsight]]]:
+    """Insights per segment: ``(segment, vehicles, insights)``.
+
+    Tests every segment's cost trend together, so the false discovery
+    rate holds across the whole segmentation.
+    """
+    p_value = np.concatenate([part.p_value for part in parts]) if parts else np.empty(0)
+    found = discoveries(p_value, ~np.isnan(p_value), TREND_ALPHA)
+    results = []
+    for part in parts:
+        offset = len(results)
+        for row, trend in part.trends.items():
+            if found[offset + row]:
+                key, vehicles, insights = part.segments[row]
+                totals = FleetTotals(vehicles=vehicles, cost_trend=trend)
+                insight = cost_trend_insight(totals, insight_types)
+                if insight is not None:
+                    insights[:0] = _tag([insight], segment_by, key)
+        results.extend(part.segments)
+    return results
+
+
+def segment_workers() -> int:
+    """Worker processes used for segmented generation."""
+    return get_settings().insight_segment_workers or os.cpu_count() or 1
+
+
+def _get_segment_pool() -> ProcessPoolExecutor:
+    global _segment_pool
+    if _segment_pool is None:
+        _segment_pool = ProcessPoolExecutor(max_workers=segment_workers())
+    return _segment_pool
+
+
+def shutdown_segment_pool() -> None:
+    """Stop segment worker processes."""
+    global _segment_pool
+    if _segment_pool is not None:
+        _segment_pool.shutdown(cancel_futures=True)
+        _segment_pool = None
+
+
+async def generate_segments(
+    aggregates: FleetAggregates,
+    segment_by: str,
+    today: date,
+    months: int,
+    insight_types: Optional[list[str]] = None
+) -> list[tuple[str, int, list[AIInsight]]]:
+    """Insights per segment, computed across the worker pool.
+
+    Raises ValueError for an unknown ``segment_by``.
+    """
+    loop = asyncio.get_running_loop()
+    # Conversion is a pass over every aggregate row; keep it off the event loop
+    columns = await loop.run_in_executor(None, to_columns, aggregates, segment_by)
+    pool = _get_segment_pool()
+    slices = partition(columns, segment_workers() * PARTITIONS_PER_WORKER)
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(pool, generate_partition, part, segment_by, today, months, insight_types)
+        for part in slices
+    ))
+    return merge_partitions(parts, segment_by, insight_types)
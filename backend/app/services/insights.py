@@ -1,247 +1,679 @@
-"""Mock AI Insights Service.
+"""AI Insights Service.
 
-Generates AI-powered insights and recommendations.
+Generates insights and recommendations from fleet aggregates (see
+``fleet_aggregates.py``): service cost trends (``cost_trends.py``), high-mileage vehicles,
+compliance rates, expiring inspections and insurance, open recalls and
+fleet age. Every figure in an insight comes from the aggregates, and an
+insight is only produced when the data supports it.
+
+Active insights are served from an in-memory snapshot that a background
+task replaces whenever it recomputes them: on a schedule, or sooner when
+the fleet totals drift past a threshold. Requests never wait on a
+recomputation; a stale snapshot is served while a refresh runs. With a
+database, each refresh replaces its rows in ``ai_insight`` (``is_active``,
+``expires_at``) and the last persisted set is served after a restart.
 """
-from datetime import datetime, date, timedelta
-from typing import Optional
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta, timezone
+import json
+import logging
+import time
+from typing import NamedTuple, Optional
 import uuid
-import random
 
+import asyncpg
+
+from app.config import get_settings
+from app.db import DatabaseUnavailableError, get_pool
 from app.schemas.insights import (
     AIInsight,
+    CostTrendResponse,
+    CostTrendResult,
     InsightGenerationRequest,
-    InsightGenerationResponse
+    InsightGenerationResponse,
+    SegmentedInsightRequest,
+    SegmentedInsightResponse,
+    SegmentInsights
 )
 from app.schemas.common import Severity
+from app.services.cost_trends import (
+    GROUP_KEYS,
+    TREND_ALPHA,
+    CostTrend,
+    aggregate_series,
+    analyze,
+    significant_trends
+)
+from app.services.fleet_aggregates import (
+    FleetAggregates,
+    FleetTotalsMarker,
+    ServiceCounts,
+    fleet_aggregate_service,
+    month_index
+)
 
+logger = logging.getLogger(__name__)
 
-# Insight templates
-INSIGHT_TEMPLATES = [
-    {
-        "type": "cost_trend",
-        "category": "financial",
-        "templates": [
-            {
-                "title": "Service Costs Trending Higher",
-                "summary": "Average service costs have increased by {percent}% over the past {days} days compared to the previous period.",
-                "severity": Severity.WARNING,
-                "action": "Review service records for potential optimization opportunities"
-            },
-            {
-                "title": "Fuel Efficiency Declining",
-                "summary": "Fleet fuel efficiency has dropped by {percent}% this month. Consider maintenance checks.",
-                "severity": Severity.INFO,
-                "action": "Schedule fuel system inspections for affected vehicles"
-            }
-        ]
-    },
-    {
-        "type": "maintenance_pattern",
-        "category": "maintenance",
-        "templates": [
-            {
-                "title": "High-Mileage Vehicles Need Attention",
-                "summary": "{count} vehicles have exceeded 100,000 miles and may require more frequent maintenance schedules.",
-                "severity": Severity.INFO,
-                "action": "Review maintenance intervals for high-mileage fleet vehicles"
-            },
-            {
-                "title": "Brake Services Due Across Fleet",
-                "summary": "{count} vehicles are approaching brake service intervals within the next 30 days.",
-                "severity": Severity.WARNING,
-                "action": "Schedule brake inspections proactively"
-            }
-        ]
-    },
-    {
-        "type": "fleet_health",
-        "category": "operations",
-        "templates": [
-            {
-                "title": "Fleet Compliance Status",
-                "summary": "{percent}% of vehicles have current inspections and insurance. {count} require immediate attention.",
-                "severity": Severity.ALERT,
-                "action": "Address compliance gaps for flagged vehicles"
-            },
-            {
-                "title": "Vehicle Age Distribution Alert",
-                "summary": "{percent}% of the fleet is over 5 years old. Consider replacement planning.",
-                "severity": Severity.INFO,
-                "action": "Evaluate total cost of ownership for aging vehicles"
-            }
-        ]
-    },
-    {
-        "type": "anomaly",
-        "category": "financial",
-        "templates": [
-            {
-                "title": "Unusual Service Costs Detected",
-                "summary": "{count} service records in the past 30 days show costs significantly above average.",
-                "severity": Severity.ALERT,
-                "action": "Review flagged service records for accuracy"
-            },
-            {
-                "title": "Duplicate Charges Possible",
-                "summary": "Pattern analysis suggests {count} potential duplicate service entries.",
-                "severity": Severity.WARNING,
-                "action": "Audit identified service records"
-            }
-        ]
-    },
-    {
-        "type": "recommendation",
-        "category": "optimization",
-        "templates": [
-            {
-                "title": "Consolidate Service Providers",
-                "summary": "Using {count} different service centers. Consolidation could reduce costs by 10-15%.",
-                "severity": Severity.INFO,
-                "action": "Evaluate service center performance and negotiate fleet rates"
-            },
-            {
-                "title": "Preventive Maintenance Opportunity",
-                "summary": "Switching {count} vehicles to preventive maintenance schedules could reduce repair costs by 25%.",
-                "severity": Severity.INFO,
-                "action": "Implement preventive maintenance program"
-            },
-            {
-                "title": "Insurance Premium Optimization",
-                "summary": "Fleet has {percent}% claim-free rate. Consider renegotiating premiums.",
-                "severity": Severity.INFO,
-                "action": "Review insurance policies at renewal"
-            }
-        ]
-    },
-    {
-        "type": "compliance",
-        "category": "regulatory",
-        "templates": [
-            {
-                "title": "Inspections Expiring Soon",
-                "summary": "{count} vehicle inspections expire within the next 30 days.",
-                "severity": Severity.WARNING,
-                "action": "Schedule inspection appointments"
-            },
-            {
-                "title": "Open Recalls Require Action",
-                "summary": "{count} vehicles have unaddressed safety recalls.",
-                "severity": Severity.CRITICAL,
-                "action": "Contact dealers to schedule recall repairs immediately"
-            },
-            {
-                "title": "Registration Renewals Due",
-                "summary": "{count} vehicle registrations need renewal this month.",
-                "severity": Severity.WARNING,
-                "action": "Process registration renewals"
-            }
-        ]
-    }
-]
+# Days ahead that count as "expiring soon"
+EXPIRY_WINDOW_DAYS = 30
+# Vehicles older than this many model years count as aging
+AGING_YEARS = 5
+MIN_REPAIR_SHARE_SERVICES = 20
+REPAIR_SHARE_THRESHOLD = 0.4
+
+
+@dataclass
+class FleetTotals:
+    """Aggregates summed over the segments being analyzed.
+
+    ``recent`` covers the last ``months`` complete months and ``prior``
+    the same number of months before them. ``cost_trend`` is the
+    significant trend in average service cost over the full history, if
+    there is one.
+    """
+    vehicles: int = 0
+    high_mileage: int = 0
+    open_recall_vehicles: int = 0
+    aging: int = 0
+    compliant: int = 0
+    inspections_expiring: int = 0
+    insurance_expiring: int = 0
+    recent: ServiceCounts = field(default_factory=ServiceCounts)
+    prior: ServiceCounts = field(default_factory=ServiceCounts)
+    cost_trend: Optional[CostTrend] = None
+
+
+def analysis_months(time_range_days: int) -> int:
+    """Length of the compared service periods, in months."""
+    return max(1, round(time_range_days / 30))
+
+
+def summarize(aggregates: FleetAggregates, today: date, months: int) -> FleetTotals:
+    """Sum the aggregates into fleet totals as of ``today``."""
+    totals = FleetTotals()
+    for (_, model_year), counts in aggregates.vehicles.items():
+        totals.vehicles += counts.vehicles
+        totals.high_mileage += counts.high_mileage
+        totals.open_recall_vehicles += counts.open_recall_vehicles
+        if today.year - model_year > AGING_YEARS:
+            totals.aging += counts.vehicles
+
+    soon = today + timedelta(days=EXPIRY_WINDOW_DAYS)
+    for (_, kind, expires_on), count in aggregates.expirations.items():
+        if expires_on < today:
+            continue
+        if kind == "compliance":
+            totals.compliant += count
+        elif expires_on <= soon:
+            if kind == "inspection":
+                totals.inspections_expiring += count
+            else:
+                totals.insurance_expiring += count
+
+    current = month_index(today)
+    for (_, month), counts in aggregates.services.items():
+        age = current - month_index(month)
+        if 0 < age <= months:
+            window = totals.recent
+        elif months < age <= 2 * months:
+            window = totals.prior
+        else:
+            continue
+        window.services += counts.services
+        window.repairs += counts.repairs
+        window.total_cost += counts.total_cost
+
+    _, series = aggregate_series(aggregates, "fleet", current)
+    totals.cost_trend = significant_trends(analyze(series)).get(0)
+    return totals
+
+
+def _months_label(months: int) -> str:
+    return "month" if months == 1 else f"{months} months"
+
+
+def _confidence(samples: int) -> float:
+    """Confidence that grows with the number of records behind an insight."""
+    return round(min(0.95, 0.5 + 0.45 * samples / (samples + 50)), 2)
+
+
+def _insight(
+    insight_type: str,
+    category: str,
+    title: str,
+    summary: str,
+    severity: Severity,
+    action: str,
+    affected: int,
+    samples: int,
+    details: dict
+) -> AIInsight:
+    now = datetime.now(timezone.utc)
+    return AIInsight(
+        id=str(uuid.uuid4()),
+        insight_type=insight_type,
+        category=category,
+        title=title,
+        summary=summary,
+        details=details,
+        affected_vehicle_count=affected,
+        severity=severity,
+        confidence_score=_confidence(samples),
+        action_recommended=action,
+        action_url=f"/dashboard?insight={insight_type}",
+        created_at=now,
+        expires_at=now + timedelta(days=7)
+    )
+
+
+def _cost_trend(totals: FleetTotals) -> Optional[AIInsight]:
+    """Significant trend in average cost per service over the full history."""
+    trend = totals.cost_trend
+    if trend is None:
+        return None
+    change = trend.percent_change
+    if not trend.rising:
+        severity = Severity.INFO
+    elif change >= 25:
+        severity = Severity.ALERT
+    elif change >= 10:
+        severity = Severity.WARNING
+    else:
+        severity = Severity.INFO
+    summary = (
+        f"Average service cost {'rose' if trend.rising else 'fell'} {abs(change):.0f}% from "
+        f"${trend.start_cost:,.0f} to ${trend.end_cost:,.0f} between "
+        f"{trend.start_month:%B %Y} and {trend.end_month:%B %Y}."
+    )
+    if trend.change_point is not None:
+        summary += f" The largest shift came in {trend.change_point:%B %Y}."
+    return _insight(
+        "cost_trend",
+        "financial",
+        "Service Costs Trending Higher" if trend.rising else "Service Costs Trending Lower",
+        summary,
+        severity,
+        "Review service records for potential optimization opportunities" if trend.rising
+        else "Keep the current service mix and providers under review",
+        totals.vehicles,
+        trend.services,
+        {
+            "percent_change": change,
+            "slope_per_month": trend.slope_per_month,
+            "p_value": trend.p_value,
+            "start_month": trend.start_month.isoformat(),
+            "end_month": trend.end_month.isoformat(),
+            "months": trend.months,
+            "start_average_cost": trend.start_cost,
+            "end_average_cost": trend.end_cost,
+            "change_point": trend.change_point.isoformat() if trend.change_point else None
+        }
+    )
+
+
+def _repair_share(totals: FleetTotals, months: int) -> Optional[AIInsight]:
+    recent = totals.recent
+    if recent.services < MIN_REPAIR_SHARE_SERVICES:
+        return None
+    share = recent.repairs / recent.services
+    if share < REPAIR_SHARE_THRESHOLD:
+        return None
+    return _insight(
+        "recommendation",
+        "optimization",
+        "Preventive Maintenance Opportunity",
+        f"{share:.0%} of the {recent.services} services in the past {_months_label(months)} "
+        "were repairs. Preventive maintenance schedules could reduce repair costs.",
+        Severity.INFO,
+        "Implement preventive maintenance program",
+        totals.vehicles,
+        recent.services,
+        {"repairs": recent.repairs, "services": recent.services, "repair_share": round(share, 3)}
+    )
+
+
+def _high_mileage(totals: FleetTotals) -> Optional[AIInsight]:
+    if not totals.high_mileage:
+        return None
+    share = totals.high_mileage / totals.vehicles
+    return _insight(
+        "maintenance_pattern",
+        "maintenance",
+        "High-Mileage Vehicles Need Attention",
+        f"{totals.high_mileage} vehicles ({share:.0%} of the fleet) have exceeded 100,000 miles "
+        "and may require more frequent maintenance schedules.",
+        Severity.WARNING if share >= 0.3 else Severity.INFO,
+        "Review maintenance intervals for high-mileage fleet vehicles",
+        totals.high_mileage,
+        totals.vehicles,
+        {"high_mileage_vehicles": totals.high_mileage, "share": round(share, 3)}
+    )
+
+
+def _compliance(totals: FleetTotals) -> Optional[AIInsight]:
+    if not totals.vehicles:
+        return None
+    rate = totals.compliant / totals.vehicles
+    gaps = totals.vehicles - totals.compliant
+    if rate < 0.8:
+        severity = Severity.ALERT
+    elif rate < 0.95:
+        severity = Severity.WARNING
+    else:
+        severity = Severity.INFO
+    return _insight(
+        "fleet_health",
+        "operations",
+        "Fleet Compliance Status",
+        f"{rate:.0%} of vehicles have current inspections and insurance. "
+        f"{gaps} require immediate attention.",
+        severity,
+        "Address compliance gaps for flagged vehicles",
+        gaps,
+        totals.vehicles,
+        {"compliant_vehicles": totals.compliant, "compliance_rate": round(rate, 3)}
+    )
+
+
+def _expiring(totals: FleetTotals, kind: str) -> Optional[AIInsight]:
+    count = totals.inspections_expiring if kind == "inspection" else totals.insurance_expiring
+    if not count:
+        return None
+    if kind == "inspection":
+        title = "Inspections Expiring Soon"
+        summary = f"{count} vehicle inspections expire within the next {EXPIRY_WINDOW_DAYS} days."
+        action = "Schedule inspection appointments"
+    else:
+        title = "Insurance Policies Expiring Soon"
+        summary = f"{count} vehicle insurance policies end within the next {EXPIRY_WINDOW_DAYS} days."
+        action = "Renew expiring insurance policies"
+    return _insight(
+        "compliance", "regulatory", title, summary, Severity.WARNING, action,
+        count, totals.vehicles, {"expiring": count, "window_days": EXPIRY_WINDOW_DAYS}
+    )
+
+
+def _open_recalls(totals: FleetTotals) -> Optional[AIInsight]:
+    if not totals.open_recall_vehicles:
+        return None
+    return _insight(
+        "compliance",
+        "regulatory",
+        "Open Recalls Require Action",
+        f"{totals.open_recall_vehicles} vehicles have unaddressed safety recalls.",
+        Severity.CRITICAL,
+        "Contact dealers to schedule recall repairs immediately",
+        totals.open_recall_vehicles,
+        totals.vehicles,
+        {"open_recall_vehicles": totals.open_recall_vehicles}
+    )
+
+
+def _age_distribution(totals: FleetTotals) -> Optional[AIInsight]:
+    if not totals.aging:
+        return None
+    share = totals.aging / totals.vehicles
+    return _insight(
+        "fleet_health",
+        "operations",
+        "Vehicle Age Distribution Alert",
+        f"{share:.0%} of the fleet is over {AGING_YEARS} years old. Consider replacement planning.",
+        Severity.WARNING if share >= 0.4 else Severity.INFO,
+        "Evaluate total cost of ownership for aging vehicles",
+        totals.aging,
+        totals.vehicles,
+        {"aging_vehicles": totals.aging, "share": round(share, 3), "age_years": AGING_YEARS}
+    )
+
+
+def build_insights(
+    totals: FleetTotals, months: int, insight_types: Optional[list[str]] = None
+) -> list[AIInsight]:
+    """Insights supported by a set of totals."""
+    candidates = [
+        _cost_trend(totals),
+        _high_mileage(totals),
+        _compliance(totals),
+        _age_distribution(totals),
+        _open_recalls(totals),
+        _expiring(totals, "inspection"),
+        _expiring(totals, "insurance"),
+        _repair_share(totals, months),
+    ]
+    return [
+        insight for insight in candidates
+        if insight is not None and (not insight_types or insight.insight_type in insight_types)
+    ]
+
+
+def cost_trend_insight(
+    totals: FleetTotals, insight_types: Optional[list[str]] = None
+) -> Optional[AIInsight]:
+    """The cost trend insight alone, if there is one and its type was requested."""
+    insight = _cost_trend(totals)
+    if insight is None or (insight_types and insight.insight_type not in insight_types):
+        return None
+    return insight
 
 
-def _generate_mock_value(template_type: str) -> dict:
-    """Generate mock values for template placeholders."""
-    return {
-        "percent": random.randint(5, 35),
-        "count": random.randint(2, 15),
-        "days": random.choice([7, 14, 30, 60, 90]),
-        "amount": random.randint(500, 5000)
+def compute_insights(
+    aggregates: FleetAggregates, request: InsightGenerationRequest, today: date
+) -> tuple[list[AIInsight], dict]:
+    """Insights supported by the aggregates, and what was analyzed."""
+    months = analysis_months(request.time_range_days)
+    totals = summarize(aggregates, today, months)
+    data_analyzed = {
+        "vehicles": totals.vehicles,
+        "service_records": totals.recent.services + totals.prior.services,
+        "segments": len(aggregates.segments()),
+        "aggregate_rows": len(aggregates),
+        "time_range_days": request.time_range_days,
+        "source": aggregates.source
     }
+    return build_insights(totals, months, request.insight_types), data_analyzed
 
 
-def _select_insights(
-    insight_types: Optional[list[str]] = None,
-    count: int = 5
-) -> list[dict]:
-    """Select relevant insight templates."""
-    selected = []
-    
-    available = INSIGHT_TEMPLATES.copy()
-    if insight_types:
-        available = [t for t in available if t["type"] in insight_types]
-    
-    # Randomly select from available templates
-    for template_group in available:
-        if len(selected) >= count:
-            break
-        
-        for template in template_group["templates"]:
-            if len(selected) >= count:
-                break
-            if random.random() > 0.5:  # 50% chance to include each
-                selected.append({
-                    "type": template_group["type"],
-                    "category": template_group["category"],
-                    **template
-                })
-    
-    return selected[:count]
+_ACTIVE_SQL = """
+    SELECT id, insight_type, category, title, summary, details, severity,
+           confidence_score, action_recommended, action_url, created_at, expires_at
+    FROM ai_insight
+    WHERE is_active AND (expires_at IS NULL OR expires_at > now())
+      AND details->>'segment_by' IS NULL
+    ORDER BY created_at DESC
+"""
+
+_INSERT_SQL = """
+    INSERT INTO ai_insight (
+        id, insight_type, category, title, summary, details, severity,
+        confidence_score, action_recommended, action_url, is_active,
+        expires_at, created_at
+    ) VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7, $8, $9, $10, TRUE, $11, $12)
+"""
+
+
+def _insight_from_row(row: asyncpg.Record) -> AIInsight:
+    details = json.loads(row["details"]) if row["details"] else {}
+    return AIInsight(
+        id=str(row["id"]),
+        insight_type=row["insight_type"],
+        category=row["category"],
+        title=row["title"],
+        summary=row["summary"],
+        details=details,
+        # Stored in details; ai_insight only has a vehicle id array
+        affected_vehicle_count=details.pop("affected_vehicle_count", 0),
+        severity=Severity(row["severity"]),
+        confidence_score=float(row["confidence_score"] or 0),
+        action_recommended=row["action_recommended"],
+        action_url=row["action_url"],
+        created_at=row["created_at"],
+        expires_at=row["expires_at"]
+    )
+
+
+def _insight_params(insight: AIInsight) -> tuple:
+    return (
+        uuid.UUID(insight.id),
+        insight.insight_type,
+        insight.category,
+        insight.title,
+        insight.summary,
+        json.dumps({
+            **(insight.details or {}),
+            "affected_vehicle_count": insight.affected_vehicle_count
+        }),
+        insight.severity.value,
+        insight.confidence_score,
+        insight.action_recommended,
+        insight.action_url,
+        insight.expires_at,
+        insight.created_at
+    )
+
+
+async def _persist_active(
+    pool: asyncpg.Pool, insights: list[AIInsight], segment_by: Optional[str] = None
+) -> None:
+    """Replace the active rows in ai_insight with a new set.
+
+    Fleet-wide and segmented insights are replaced separately: the rows
+    replaced are those whose ``details->>'segment_by'`` matches. Replaced
+    rows are deleted rather than deactivated, so the table holds one set
+    per segmentation instead of every set ever computed.
+    """
+    async with pool.acquire() as connection:
+        async with connection.transaction():
+            if segment_by is None:
+                await connection.execute(
+                    "DELETE FROM ai_insight "
+                    "WHERE is_active AND details->>'segment_by' IS NULL"
+                )
+            else:
+                await connection.execute(
+                    "DELETE FROM ai_insight "
+                    "WHERE is_active AND details->>'segment_by' = $1",
+                    segment_by
+                )
+            await connection.executemany(_INSERT_SQL, [_insight_params(i) for i in insights])
+
+
+class ActiveInsights(NamedTuple):
+    """An immutable set of active insights and when it was computed."""
+    insights: list[AIInsight]
+    computed_at: float  # time.monotonic()
+    totals: Optional[FleetTotalsMarker]  # None when loaded from ai_insight
 
 
 class AIInsightsService:
-    """Mock AI insights service."""
+    """AI insights computed from fleet aggregates."""
+    
+    def __init__(self):
+        self._active: Optional[ActiveInsights] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
     
     async def generate(
         self, request: InsightGenerationRequest
     ) -> InsightGenerationResponse:
-        """Generate AI insights."""
-        start_time = datetime.now()
-        
-        # Select insight templates
-        templates = _select_insights(
-            insight_types=request.insight_types,
-            count=random.randint(4, 8)
-        )
-        
-        insights = []
-        for template in templates:
-            values = _generate_mock_value(template["type"])
-            
-            # Format title and summary with values
-            title = template["title"]
-            summary = template["summary"].format(**values)
-            
-            insight = AIInsight(
-                id=f"insight-{uuid.uuid4().hex[:8]}",
-                insight_type=template["type"],
-                category=template["category"],
-                title=title,
-                summary=summary,
-                details={
-                    "values": values,
-                    "analysis_period_days": request.time_range_days
-                },
-                affected_vehicle_count=values["count"],
-                severity=template["severity"],
-                confidence_score=round(random.uniform(0.75, 0.95), 2),
-                action_recommended=template["action"],
-                action_url=f"/dashboard?insight={template['type']}",
-                created_at=datetime.now(),
-                expires_at=datetime.now() + timedelta(days=7)
-            )
-            insights.append(insight)
-        
-        # Calculate processing time
-        processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
+        """Generate insights from the current fleet aggregates.
         
+        Raises ValueError for ``vehicle_ids``: aggregates are kept per
+        segment, not per vehicle.
+        """
+        if request.vehicle_ids:
+            raise ValueError("Insights are computed per fleet segment; vehicle_ids is not supported")
+        start = time.perf_counter()
+        aggregates = await fleet_aggregate_service.snapshot()
+        insights, data_analyzed = compute_insights(aggregates, request, date.today())
         return InsightGenerationResponse(
             insights=insights,
             total_generated=len(insights),
-            generation_time_ms=processing_time + random.randint(100, 500),
+            generation_time_ms=int((time.perf_counter() - start) * 1000),
+            data_analyzed=data_analyzed
+        )
+    
+    async def generate_segmented(
+        self, request: SegmentedInsightRequest
+    ) -> SegmentedInsightResponse:
+        """Generate insights for every owner or owner type in parallel.
+        
+        With a database and ``persist``, the segmentation's active rows in
+        ai_insight are replaced by the new insights.
+        """
+        from app.services.insight_segments import generate_segments, segment_workers
+
+        start = time.perf_counter()
+        aggregates = await fleet_aggregate_service.snapshot()
+        results = await generate_segments(
+            aggregates,
+            request.segment_by,
+            date.today(),
+            analysis_months(request.time_range_days),
+            request.insight_types
+        )
+        insights = [insight for _, _, segment_insights in results for insight in segment_insights]
+        if request.persist:
+            pool = await get_pool()
+            if pool is not None:
+                await _persist_active(pool, insights, request.segment_by)
+        return SegmentedInsightResponse(
+            segment_by=request.segment_by,
+            segments=[
+                SegmentInsights(segment=segment, vehicles=vehicles, insights=segment_insights)
+                for segment, vehicles, segment_insights in results if segment_insights
+            ],
+            segments_analyzed=len(results),
+            total_generated=len(insights),
+            workers=segment_workers(),
+            generation_time_ms=int((time.perf_counter() - start) * 1000),
+            data_analyzed={
+                "vehicles": sum(vehicles for _, vehicles, _ in results),
+                "aggregate_rows": len(aggregates),
+                "time_range_days": request.time_range_days,
+                "source": aggregates.source
+            }
+        )
+    
+    async def cost_trends(
+        self, group_by: str = "segment", alpha: float = TREND_ALPHA, limit: int = 100
+    ) -> CostTrendResponse:
+        """Significant service cost trends per group over the full history.
+        
+        Raises ValueError for an unknown ``group_by``.
+        """
+        start = time.perf_counter()
+        aggregates = await fleet_aggregate_service.snapshot()
+        keys, series = await asyncio.get_running_loop().run_in_executor(
+            None, aggregate_series, aggregates, group_by, month_index(date.today())
+        )
+        table = await asyncio.get_running_loop().run_in_executor(None, analyze, series)
+        found = significant_trends(table, alpha)
+        ranked = sorted(found.items(), key=lambda item: -abs(item[1].percent_change))
+        return CostTrendResponse(
+            group_by=group_by,
+            series_analyzed=len(keys),
+            trends=[
+                CostTrendResult(
+                    group=dict(zip(GROUP_KEYS[group_by], keys[row])),
+                    percent_change=trend.percent_change,
+                    slope_per_month=trend.slope_per_month,
+                    p_value=trend.p_value,
+                    start_month=trend.start_month,
+                    end_month=trend.end_month,
+                    months=trend.months,
+                    services=trend.services,
+                    start_average_cost=trend.start_cost,
+                    end_average_cost=trend.end_cost,
+                    change_point=trend.change_point
+                )
+                for row, trend in ranked[:limit]
+            ],
+            total_significant=len(found),
+            analysis_time_ms=int((time.perf_counter() - start) * 1000),
             data_analyzed={
-                "vehicles": random.randint(20, 100),
-                "service_records": random.randint(100, 500),
-                "time_range_days": request.time_range_days
+                "months": series.services.shape[1],
+                "aggregate_rows": len(aggregates.services),
+                "alpha": alpha,
+                "source": aggregates.source
             }
         )
     
+    async def refresh(self) -> ActiveInsights:
+        """Recompute the active insights, swap them in and persist them.
+        
+        A failed write to ai_insight is logged; requests are served the
+        new snapshot regardless.
+        """
+        aggregates = await fleet_aggregate_service.snapshot()
+        insights, _ = compute_insights(aggregates, InsightGenerationRequest(), date.today())
+        active = ActiveInsights(insights, time.monotonic(), aggregates.totals())
+        self._active = active
+        self.refreshes += 1
+        pool = await get_pool()
+        if pool is not None:
+            try:
+                await _persist_active(pool, insights)
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Persisting active insights failed: %s", e)
+        return active
+    
+    async def _refresh_logged(self) -> None:
+        try:
+            await self.refresh()
+        except (asyncpg.PostgresError, OSError, DatabaseUnavailableError) as e:
+            logger.warning("Active insight refresh failed: %s", e)
+        except Exception:
+            logger.exception("Active insight refresh failed")
+    
+    def _revalidate(self) -> None:
+        """Start a background refresh unless one is already running."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_logged())
+    
+    def _is_stale(self, active: ActiveInsights) -> bool:
+        return time.monotonic() - active.computed_at >= get_settings().insight_refresh_seconds
+    
     async def get_active_insights(self) -> list[AIInsight]:
-        """Get currently active insights."""
-        response = await self.generate(InsightGenerationRequest())
-        return response.insights
+        """Get currently active insights from the snapshot.
+        
+        Never recomputes inline: a stale or missing snapshot starts a
+        background refresh and the current one (or nothing) is returned.
+        """
+        active = self._active
+        if active is None or self._is_stale(active):
+            self._revalidate()
+        return active.insights if active is not None else []
+    
+    async def _changed(self, active: ActiveInsights) -> bool:
+        """Whether the fleet totals drifted past the threshold since ``active``."""
+        if active.totals is None:
+            return True
+        totals = await fleet_aggregate_service.totals()
+        return totals.drift(active.totals) >= get_settings().insight_change_threshold
+    
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            active = self._active
+            try:
+                if active is None or self._is_stale(active) or await self._changed(active):
+                    self._revalidate()
+                    await asyncio.shield(self._refresh_task)
+            except (asyncpg.PostgresError, OSError, DatabaseUnavailableError) as e:
+                logger.warning("Active insight change check failed: %s", e)
+            except Exception:
+                logger.exception("Active insight change check failed")
+    
+    async def start(self) -> None:
+        """Load the last persisted insights, then keep them refreshed."""
+        if self._task is not None:
+            return
+        pool = await get_pool()
+        if pool is not None:
+            try:
+                rows = await pool.fetch(_ACTIVE_SQL)
+                if rows:
+                    self._active = ActiveInsights(
+                        [_insight_from_row(row) for row in rows], time.monotonic(), None
+                    )
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Could not load persisted insights: %s", e)
+        if self._active is None:
+            # Compute before serving so the first requests have a snapshot
+            await self._refresh_logged()
+        self._task = asyncio.create_task(self._run(get_settings().insight_change_check_seconds))
+    
+    async def stop(self) -> None:
+        """Stop background refreshes."""
+        tasks = [t for t in (self._task, self._refresh_task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._refresh_task = None
 
 
 # Singleton instance
 ai_insights_service = AIInsightsService()
-
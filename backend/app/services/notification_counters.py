@@ -0,0 +1,228 @@
+"""Notification Counters.
+
+Per-owner notification counts by status, priority and category, kept in
+memory and updated as notifications are inserted, read, dismissed and
+deleted, so the notification summary is a lookup rather than a scan.
+
+Without a database the in-memory notification store reports each change
+directly. With one, every change reaches the counters as a trigger
+event on the notification event channel
+(``migrations/add_notification_events.sql``), whichever process
+made it; a status change carries the status the row held under its row
+lock, so concurrent reads and dismissals of the same notification count
+once. The counters are periodically rebuilt from a ``GROUP BY`` over
+``notification``. Events carry the id of the transaction that wrote
+them; an event whose transaction the rebuild's snapshot already sees is
+in its counts and is skipped, whether it arrives while the query runs
+or after, and every other event is applied on top.
+"""
+import asyncio
+from datetime import datetime, timezone
+import logging
+from typing import NamedTuple, Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.schemas.notifications import Notification, NotificationSummary
+
+logger = logging.getLogger(__name__)
+
+_COUNTS_SQL = """
+    SELECT owner_id, status, priority, category, count(*) AS count
+    FROM notification
+    GROUP BY owner_id, status, priority, category
+"""
+
+_SNAPSHOT_SQL = "SELECT txid_current_snapshot()::text"
+
+_KINDS = ("status", "priority", "category")
+
+
+# An owner and the counters it changes: ((kind, value, delta), ...)
+Change = tuple[Optional[str], tuple[tuple[str, Optional[str], int], ...]]
+
+
+class _Counts:
+    """Counts per owner and fleet-wide; each is a list indexed by counter slot."""
+
+    def __init__(self):
+        self.owners: dict[Optional[str], list[int]] = {}
+        self.fleet: list[int] = []
+
+
+class _Snapshot(NamedTuple):
+    """A Postgres snapshot (``xmin:xmax:xip,...``)."""
+    xmin: int
+    xmax: int
+    in_progress: frozenset[int]
+
+    @classmethod
+    def parse(cls, text: str) -> "_Snapshot":
+        xmin, xmax, xip = text.split(":")
+        return cls(int(xmin), int(xmax), frozenset(int(x) for x in xip.split(",") if x))
+
+    def sees(self, xid: Optional[int]) -> bool:
+        """Whether a transaction's changes are visible in this snapshot."""
+        if xid is None:
+            return False
+        return xid < self.xmin or (xid < self.xmax and xid not in self.in_progress)
+
+
+def _padded(row: list[int], width: int) -> list[int]:
+    return row + [0] * (width - len(row))
+
+
+class NotificationCounters:
+    """Incrementally maintained notification counts."""
+
+    def __init__(self):
+        # (kind, value) -> position in every count list
+        self._slots: dict[tuple[str, str], int] = {}
+        self._counts = _Counts()
+        self._journal: Optional[list[tuple[Optional[int], Change]]] = None
+        self._snapshot: Optional[_Snapshot] = None  # Of the last rebuild
+        self._task: Optional[asyncio.Task] = None
+        self.reconciled_at: Optional[datetime] = None
+        self.corrections = 0  # Notifications miscounted, found by the last reconciliation
+
+    def _slot(self, kind: str, value: Optional[str]) -> int:
+        key = (kind, value or "unknown")
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = len(self._slots)
+        return slot
+
+    def _apply(self, counts: _Counts, change: Change) -> None:
+        owner_id, deltas = change
+        slots = [(self._slot(kind, value), delta) for kind, value, delta in deltas]
+        width = len(self._slots)
+        for row in (counts.owners.setdefault(owner_id, []), counts.fleet):
+            if len(row) < width:
+                row.extend([0] * (width - len(row)))
+            for slot, delta in slots:
+                row[slot] += delta
+
+    def _record(self, change: Change, xid: Optional[int] = None) -> None:
+        if self._journal is not None:
+            self._journal.append((xid, change))
+        if self._snapshot is not None and self._snapshot.sees(xid):
+            return
+        self._apply(self._counts, change)
+
+    @staticmethod
+    def _counted(
+        owner_id: Optional[str], status: str, priority: str, category: str, delta: int
+    ) -> Change:
+        return (owner_id, (
+            ("status", status, delta), ("priority", priority, delta), ("category", category, delta)
+        ))
+
+    def added(self, notification: Notification) -> None:
+        self._record(self._counted(
+            notification.owner_id, notification.status,
+            notification.priority.value, notification.category, 1
+        ))
+
+    def removed(self, notification: Notification) -> None:
+        self._record(self._counted(
+            notification.owner_id, notification.status,
+            notification.priority.value, notification.category, -1
+        ))
+
+    def status_changed(
+        self, owner_id: Optional[str], old: str, new: str, xid: Optional[int] = None
+    ) -> None:
+        if old != new:
+            self._record((owner_id, (("status", old, -1), ("status", new, 1))), xid)
+
+    def apply_event(self, op: str, rows: list, xid: Optional[int] = None) -> None:
+        """Apply a trigger event written by transaction ``xid``.
+
+        ``insert`` and ``delete`` rows are ``[id, owner_id, status,
+        priority, category]``; ``status`` rows are ``[owner_id,
+        old_status, new_status]``.
+        """
+        for row in rows:
+            if op == "status":
+                self.status_changed(row[0], row[1], row[2], xid)
+            elif op in ("insert", "delete") and len(row) >= 5:
+                self._record(
+                    self._counted(row[1], row[2], row[3], row[4], 1 if op == "insert" else -1), xid
+                )
+
+    def summary(self, owner_id: Optional[str] = None) -> NotificationSummary:
+        """Counts for one owner, or the whole fleet when ``owner_id`` is omitted."""
+        row = self._counts.fleet if owner_id is None else self._counts.owners.get(owner_id, [])
+        by_kind: dict[str, dict[str, int]] = {kind: {} for kind in _KINDS}
+        for (kind, value), slot in self._slots.items():
+            if slot < len(row) and row[slot]:
+                by_kind[kind][value] = row[slot]
+        return NotificationSummary(
+            owner_id=owner_id,
+            total=sum(by_kind["status"].values()),
+            by_status=by_kind["status"],
+            by_priority=by_kind["priority"],
+            by_category=by_kind["category"],
+            reconciled_at=self.reconciled_at
+        )
+
+    async def reconcile(self, pool: asyncpg.Pool) -> None:
+        """Rebuild the counts from the table, keeping events it does not include."""
+        self._journal = []
+        try:
+            async with pool.acquire() as connection:
+                # One snapshot for the counts and the transactions they include
+                async with connection.transaction(isolation="repeatable_read", readonly=True):
+                    snapshot = _Snapshot.parse(await connection.fetchval(_SNAPSHOT_SQL))
+                    rows = await connection.fetch(_COUNTS_SQL)
+        finally:
+            journal, self._journal = self._journal, None
+        counts = _Counts()
+        for row in rows:
+            owner_id = str(row["owner_id"]) if row["owner_id"] else None
+            self._apply(counts, self._counted(
+                owner_id, row["status"], row["priority"], row["category"], row["count"]
+            ))
+        for xid, change in journal:
+            if not snapshot.sees(xid):
+                self._apply(counts, change)
+
+        width = len(self._slots)
+        status_slots = [slot for (kind, _), slot in self._slots.items() if kind == "status"]
+        old = self._counts
+        corrections = 0
+        for owner_id in old.owners.keys() | counts.owners.keys():
+            before = _padded(old.owners.get(owner_id, []), width)
+            after = _padded(counts.owners.get(owner_id, []), width)
+            corrections += sum(abs(before[slot] - after[slot]) for slot in status_slots)
+        self.corrections = corrections
+        self._counts = counts
+        self._snapshot = snapshot
+        self.reconciled_at = datetime.now(timezone.utc)
+
+    async def _reconcile_loop(self, pool: asyncpg.Pool, interval: float) -> None:
+        while True:
+            try:
+                await self.reconcile(pool)
+                if self.corrections:
+                    logger.info("Notification counters corrected by %d", self.corrections)
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Notification counter reconciliation failed: %s", e)
+            await asyncio.sleep(interval)
+
+    def start(self, pool: asyncpg.Pool) -> None:
+        """Load the counts from the table now and reconcile periodically."""
+        if self._task is None:
+            interval = get_settings().notification_counter_reconcile_seconds
+            self._task = asyncio.create_task(self._reconcile_loop(pool, interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Singleton instance
+notification_counters = NotificationCounters()
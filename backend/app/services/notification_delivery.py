@@ -0,0 +1,564 @@
+"""Notification Delivery.
+
+Sends stored notifications out over email, SMS and webhooks. Each
+notification is fanned out to the non in-app channels its rule lists
+(``metadata["channels"]``) as one delivery per channel.
+
+Every channel has its own queue, workers, provider adapter and token
+bucket, so a slow or throttled provider only holds up its own channel.
+Workers take deliveries in batches and spend one token per delivery
+before handing the batch to the provider. Urgent deliveries have their
+own lane and go first, but a share of every batch is kept for normal
+traffic while any is waiting, so a recall blast cannot starve routine
+reminders. Failed deliveries are retried with exponential backoff and
+jitter; after the last attempt they go to the dead letters (and the
+``notification_dead_letter`` table when a database is configured).
+
+With a database the pipeline is fed from the ``notification`` table:
+undelivered rows (``sent_at IS NULL``) are claimed in batches, urgent
+first, as the queues have room. A claim is a lease that this process
+renews while it holds the notification, retries included, so if the
+process dies the rows are claimed again elsewhere once the lease lapses.
+Each channel is recorded as it completes (sent or dead-lettered) and is
+not sent again when a notification is reclaimed; the row is marked sent
+when all its channels have completed. Stopping releases the leases of
+everything unfinished. Without a database, newly generated notifications
+are submitted directly.
+
+The adapters here are local stand-ins that simulate provider latency
+and failures; real providers implement ``DeliveryAdapter.send_batch``.
+"""
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+import json
+import logging
+import random
+import time
+from typing import Iterable, Optional
+import uuid
+
+import asyncpg
+
+from app.config import get_settings
+from app.db import get_pool
+from app.schemas.common import Priority
+from app.schemas.notifications import (
+    DeliveryChannelStats,
+    DeadLetter,
+    DeliveryStats,
+    Notification
+)
+from app.services.notification_store import PostgresNotificationStore
+
+logger = logging.getLogger(__name__)
+
+_DEAD_LETTER_SQL = """
+    INSERT INTO notification_dead_letter (
+        notification_id, channel, provider, attempts, last_error, payload, first_queued_at
+    ) VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
+"""
+
+# Lanes within a channel queue
+URGENT = "urgent"
+NORMAL = "normal"
+
+
+class Delivery:
+    """One notification on one channel."""
+
+    __slots__ = (
+        "notification_id", "owner_id", "channel", "lane", "subject", "body",
+        "action_url", "attempts", "queued_at", "last_error"
+    )
+
+    def __init__(self, notification: Notification, channel: str):
+        self.notification_id = notification.id
+        self.owner_id = notification.owner_id
+        self.channel = channel
+        self.lane = URGENT if notification.priority == Priority.URGENT else NORMAL
+        self.subject = notification.title
+        self.body = notification.message
+        self.action_url = notification.action_url
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self.last_error: Optional[str] = None
+
+    def payload(self) -> dict:
+        return {
+            "owner_id": self.owner_id,
+            "subject": self.subject,
+            "body": self.body,
+            "action_url": self.action_url,
+            "lane": self.lane
+        }
+
+
+class TokenBucket:
+    """Allows ``rate`` tokens per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        return min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+
+    async def acquire(self, tokens: float) -> None:
+        """Wait until ``tokens`` (at most ``capacity``) are available and take them."""
+        # Waiters queue on the lock, so a large request is not overtaken by small ones
+        async with self._lock:
+            while True:
+                self._tokens = self.available()
+                self._updated = time.monotonic()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class DeliveryAdapter:
+    """A provider for one channel.
+
+    ``send_batch`` returns one result per delivery, in order: ``None``
+    when it was accepted, otherwise an error message. Raising fails the
+    whole batch.
+    """
+
+    channel = ""
+    provider = ""
+
+    def __init__(self, rate_per_second: float, batch_size: int):
+        self.rate_per_second = rate_per_second
+        self.batch_size = batch_size
+
+    async def send_batch(self, deliveries: list[Delivery]) -> list[Optional[str]]:
+        raise NotImplementedError
+
+
+class LocalAdapter(DeliveryAdapter):
+    """Stand-in provider that waits ``latency`` per batch and fails a share of sends."""
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        batch_size: int,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        super().__init__(rate_per_second, batch_size)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+
+    async def send_batch(self, deliveries: list[Delivery]) -> list[Optional[str]]:
+        await asyncio.sleep(self.latency)
+        return [
+            f"{self.provider}: simulated failure" if self._rng.random() < self.failure_rate else None
+            for _ in deliveries
+        ]
+
+
+class LocalEmailAdapter(LocalAdapter):
+    channel = "email"
+    provider = "local-email"
+
+
+class LocalSmsAdapter(LocalAdapter):
+    channel = "sms"
+    provider = "local-sms"
+
+
+class LocalWebhookAdapter(LocalAdapter):
+    channel = "webhook"
+    provider = "local-webhook"
+
+
+class ChannelQueue:
+    """Urgent and normal lanes of one channel.
+
+    A batch takes urgent deliveries first but keeps ``normal_share`` of
+    its slots for normal deliveries while any are waiting; slots either
+    lane leaves unused go to the other.
+    """
+
+    def __init__(self, normal_share: float):
+        self.normal_share = normal_share
+        self._lanes = {URGENT: deque(), NORMAL: deque()}
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._lanes[URGENT]) + len(self._lanes[NORMAL])
+
+    def depth(self, lane: str) -> int:
+        return len(self._lanes[lane])
+
+    def put(self, delivery: Delivery) -> None:
+        self._lanes[delivery.lane].append(delivery)
+        self._ready.set()
+
+    def drain(self) -> list[Delivery]:
+        """Remove and return everything queued."""
+        items = [*self._lanes[URGENT], *self._lanes[NORMAL]]
+        for lane in self._lanes.values():
+            lane.clear()
+        return items
+
+    async def take(self, size: int) -> list[Delivery]:
+        """Wait for deliveries and take a batch of up to ``size``."""
+        while not len(self):
+            self._ready.clear()
+            await self._ready.wait()
+        urgent, normal = self._lanes[URGENT], self._lanes[NORMAL]
+        reserved = min(len(normal), max(1, int(size * self.normal_share))) if normal else 0
+        batch = [urgent.popleft() for _ in range(min(len(urgent), size - reserved))]
+        batch.extend(normal.popleft() for _ in range(min(len(normal), size - len(batch))))
+        batch.extend(urgent.popleft() for _ in range(min(len(urgent), size - len(batch))))
+        return batch
+
+
+class _Channel:
+    """A channel's adapter, queue, rate limit and counters."""
+
+    def __init__(self, adapter: DeliveryAdapter, normal_share: float):
+        self.adapter = adapter
+        self.queue = ChannelQueue(normal_share)
+        self.bucket = TokenBucket(adapter.rate_per_second, max(adapter.rate_per_second, adapter.batch_size))
+        self.in_flight = 0
+        self.retrying = 0
+        self.batches = 0
+        self.sent = {URGENT: 0, NORMAL: 0}
+        self.wait_seconds = {URGENT: 0.0, NORMAL: 0.0}
+        self.failed_attempts = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def stats(self) -> DeliveryChannelStats:
+        return DeliveryChannelStats(
+            channel=self.adapter.channel,
+            provider=self.adapter.provider,
+            queued_urgent=self.queue.depth(URGENT),
+            queued_normal=self.queue.depth(NORMAL),
+            in_flight=self.in_flight,
+            retrying=self.retrying,
+            sent=sum(self.sent.values()),
+            sent_urgent=self.sent[URGENT],
+            sent_normal=self.sent[NORMAL],
+            avg_wait_ms={
+                lane: round(self.wait_seconds[lane] / count * 1000, 1)
+                for lane, count in self.sent.items() if count
+            },
+            batches=self.batches,
+            failed_attempts=self.failed_attempts,
+            retried=self.retried,
+            dead_lettered=self.dead_lettered,
+            rate_per_second=self.adapter.rate_per_second,
+            tokens_available=round(self.bucket.available(), 1)
+        )
+
+
+class DeliveryPipeline:
+    """Per-channel queues and workers in front of the delivery adapters."""
+
+    def __init__(
+        self,
+        adapters: list[DeliveryAdapter],
+        workers_per_channel: int = 4,
+        normal_share: float = 0.25,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 2.0,
+        retry_max_seconds: float = 300.0,
+        max_queued: int = 50_000,
+        poll_seconds: float = 1.0,
+        lease_seconds: float = 120.0,
+        dead_letters_kept: int = 1000
+    ):
+        self.channels = {a.channel: _Channel(a, normal_share) for a in adapters}
+        self.workers_per_channel = workers_per_channel
+        self.normal_share = normal_share
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_queued = max_queued
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.dead_letters: deque[DeadLetter] = deque(maxlen=dead_letters_kept)
+        self.claimed = 0
+        self._store: Optional[PostgresNotificationStore] = None
+        self._pool: Optional[asyncpg.Pool] = None
+        self._tasks: list[asyncio.Task] = []
+        self._retries: dict[Delivery, asyncio.TimerHandle] = {}
+        # Claimed notification id -> channel deliveries not yet completed
+        self._outstanding: dict[str, int] = {}
+        self._renewed_at = 0.0
+        self._wake = asyncio.Event()
+        self._rng = random.Random()
+
+    @classmethod
+    def from_settings(cls) -> "DeliveryPipeline":
+        settings = get_settings()
+        latency = settings.notification_stub_latency_ms / 1000
+        failure_rate = settings.notification_stub_failure_rate
+        return cls(
+            [
+                LocalEmailAdapter(
+                    settings.notification_email_rate_per_second,
+                    settings.notification_email_batch_size,
+                    latency, failure_rate
+                ),
+                LocalSmsAdapter(
+                    settings.notification_sms_rate_per_second,
+                    settings.notification_sms_batch_size,
+                    latency, failure_rate
+                ),
+                LocalWebhookAdapter(
+                    settings.notification_webhook_rate_per_second,
+                    settings.notification_webhook_batch_size,
+                    latency, failure_rate
+                ),
+            ],
+            workers_per_channel=settings.notification_delivery_workers,
+            normal_share=settings.notification_delivery_normal_share,
+            max_attempts=settings.notification_delivery_max_attempts,
+            retry_base_seconds=settings.notification_delivery_retry_base_seconds,
+            retry_max_seconds=settings.notification_delivery_retry_max_seconds,
+            max_queued=settings.notification_delivery_max_queued,
+            poll_seconds=settings.notification_delivery_poll_seconds,
+            lease_seconds=settings.notification_delivery_lease_seconds
+        )
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _queue(self, notification: Notification, skip: Iterable[str] = ()) -> int:
+        queued = 0
+        for channel_name in (notification.metadata or {}).get("channels") or ():
+            channel = self.channels.get(channel_name)
+            if channel is not None and channel_name not in skip:
+                channel.queue.put(Delivery(notification, channel_name))
+                queued += 1
+        return queued
+
+    def submit(self, notifications: Iterable[Notification]) -> int:
+        """Queue each notification on its channels; returns deliveries queued."""
+        return sum(self._queue(notification) for notification in notifications)
+
+    async def _submit_claimed(self, claimed: list[tuple[Notification, list[str]]]) -> None:
+        """Queue claimed notifications on the channels not completed yet."""
+        finished = []
+        for notification, delivered in claimed:
+            queued = self._queue(notification, delivered)
+            if queued:
+                self._outstanding[notification.id] = queued
+            else:
+                finished.append(notification.id)
+        if finished:
+            await self._store.complete_deliveries([], finished)
+
+    async def _complete(self, deliveries: list[Delivery]) -> None:
+        """Record deliveries that will not be attempted again (claimed notifications only)."""
+        if self._store is None or not deliveries:
+            return
+        finished = []
+        for delivery in deliveries:
+            remaining = self._outstanding.get(delivery.notification_id)
+            if remaining is None:
+                continue
+            if remaining <= 1:
+                del self._outstanding[delivery.notification_id]
+                finished.append(delivery.notification_id)
+            else:
+                self._outstanding[delivery.notification_id] = remaining - 1
+        try:
+            await self._store.complete_deliveries(
+                [(d.notification_id, d.channel) for d in deliveries], finished
+            )
+        except (asyncpg.PostgresError, OSError) as e:
+            # The lease lapses and the channels are retried: at least once, not exactly once
+            logger.warning("Recording %d completed deliveries failed: %s", len(deliveries), e)
+
+    async def _renew_leases(self) -> None:
+        now = time.monotonic()
+        if not self._outstanding or now - self._renewed_at < self.lease_seconds / 3:
+            return
+        self._renewed_at = now
+        try:
+            await self._store.renew_claims(list(self._outstanding))
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.warning("Renewing %d delivery leases failed: %s", len(self._outstanding), e)
+
+    def wake(self) -> None:
+        """Claim undelivered notifications now rather than at the next poll."""
+        self._wake.set()
+
+    def _room(self) -> int:
+        return self.max_queued - max((len(c.queue) for c in self.channels.values()), default=0)
+
+    async def _poll(self) -> None:
+        """Feed the queues from undelivered rows in ``notification``."""
+        while True:
+            claimed = 0
+            room = self._room()
+            if room > 0:
+                try:
+                    # Mirror the batch split so normal rows are claimed during a blast
+                    urgent = await self._store.claim_undelivered(
+                        True, room - int(room * self.normal_share), self.lease_seconds
+                    )
+                    normal = await self._store.claim_undelivered(
+                        False, room - len(urgent), self.lease_seconds
+                    )
+                    claimed = len(urgent) + len(normal)
+                    self.claimed += claimed
+                    await self._submit_claimed(urgent)
+                    await self._submit_claimed(normal)
+                except (asyncpg.PostgresError, OSError) as e:
+                    logger.warning("Claiming notifications for delivery failed: %s", e)
+            await self._renew_leases()
+            if claimed and claimed >= room:
+                await asyncio.sleep(0)
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self, channel: _Channel) -> None:
+        adapter = channel.adapter
+        while True:
+            batch = await channel.queue.take(adapter.batch_size)
+            channel.in_flight += len(batch)
+            try:
+                await channel.bucket.acquire(len(batch))
+                try:
+                    results = await adapter.send_batch(batch)
+                except Exception as e:
+                    logger.warning("%s batch failed: %s", adapter.provider, e)
+                    results = [str(e) or type(e).__name__] * len(batch)
+            except asyncio.CancelledError:
+                # Put the batch back so stop() can release it
+                for delivery in batch:
+                    channel.queue.put(delivery)
+                raise
+            finally:
+                channel.in_flight -= len(batch)
+            channel.batches += 1
+
+            now = time.monotonic()
+            dead = []
+            completed = []
+            for delivery, error in zip(batch, results):
+                delivery.attempts += 1
+                if error is None:
+                    channel.sent[delivery.lane] += 1
+                    channel.wait_seconds[delivery.lane] += now - delivery.queued_at
+                    completed.append(delivery)
+                    continue
+                channel.failed_attempts += 1
+                delivery.last_error = error
+                if delivery.attempts >= self.max_attempts:
+                    dead.append(delivery)
+                    completed.append(delivery)
+                else:
+                    self._schedule_retry(channel, delivery)
+            if dead:
+                await self._dead_letter(channel, dead)
+            await self._complete(completed)
+
+    def _schedule_retry(self, channel: _Channel, delivery: Delivery) -> None:
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (delivery.attempts - 1))
+        delay *= self._rng.uniform(0.5, 1.0)
+        channel.retried += 1
+        channel.retrying += 1
+
+        def requeue() -> None:
+            self._retries.pop(delivery, None)
+            channel.retrying -= 1
+            channel.queue.put(delivery)
+
+        self._retries[delivery] = asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _dead_letter(self, channel: _Channel, deliveries: list[Delivery]) -> None:
+        channel.dead_lettered += len(deliveries)
+        failed_at = datetime.now(timezone.utc)
+        for delivery in deliveries:
+            self.dead_letters.append(DeadLetter(
+                notification_id=delivery.notification_id,
+                channel=delivery.channel,
+                provider=channel.adapter.provider,
+                attempts=delivery.attempts,
+                last_error=delivery.last_error,
+                failed_at=failed_at
+            ))
+        if self._pool is None:
+            return
+        wall_offset = time.time() - time.monotonic()
+        try:
+            await self._pool.executemany(_DEAD_LETTER_SQL, [
+                (
+                    uuid.UUID(d.notification_id),
+                    d.channel,
+                    channel.adapter.provider,
+                    d.attempts,
+                    d.last_error,
+                    json.dumps(d.payload()),
+                    datetime.fromtimestamp(d.queued_at + wall_offset, timezone.utc)
+                )
+                for d in deliveries
+            ])
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.warning("Writing %d dead letters failed: %s", len(deliveries), e)
+
+    async def start(self, store: Optional[PostgresNotificationStore] = None) -> None:
+        """Start the channel workers, and the claim loop when given the table store."""
+        if self._tasks:
+            return
+        self._store = store
+        self._pool = await get_pool() if store is not None else None
+        for channel in self.channels.values():
+            self._tasks.extend(
+                asyncio.create_task(self._work(channel)) for _ in range(self.workers_per_channel)
+            )
+        if store is not None:
+            self._tasks.append(asyncio.create_task(self._poll()))
+
+    async def stop(self) -> None:
+        """Stop the workers; with the table, unfinished notifications are released for the next run."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for channel in self.channels.values():
+            channel.queue.drain()
+        for delivery, handle in self._retries.items():
+            handle.cancel()
+            self.channels[delivery.channel].retrying -= 1
+        self._retries.clear()
+        outstanding, self._outstanding = list(self._outstanding), {}
+        if self._store is not None and outstanding:
+            # Completed channels are recorded, so only the rest are sent again
+            try:
+                await self._store.release_claims(outstanding)
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Releasing %d delivery leases failed: %s", len(outstanding), e)
+
+    def stats(self) -> DeliveryStats:
+        return DeliveryStats(
+            running=self.running,
+            source="postgres" if self._store is not None else "memory",
+            claimed=self.claimed,
+            channels=[channel.stats() for channel in self.channels.values()],
+            recent_dead_letters=list(self.dead_letters)[-20:]
+        )
+
+
+# Singleton instance
+notification_delivery = DeliveryPipeline.from_settings()
@@ -0,0 +1,360 @@
+"""Notification Digests.
+
+Coalesces notifications into digests so that an owner with thousands of
+vehicles gets one "Vehicle Inspection Due (2,000 vehicles)" notification
+instead of thousands. Notifications wait, grouped by owner and category,
+for up to the window configured for their priority
+(``notification_digest_windows``); a group becomes one digest
+notification when the earliest of its items' windows has passed. Urgent
+notifications and priorities without a window are never held back.
+
+With a database, rule evaluation stages matches of a coalesced priority
+in ``notification_digest_item`` instead of ``notification`` (see
+``migrations/add_notification_digests.sql``), and a periodic set-based
+statement turns every due group into a digest row and attaches its
+items. Only digests reach the notification table, its indexes and
+triggers, streams, counters and delivery; the items stay available per
+digest. Items are deduplicated while pending or while their digest is
+unread, like individual notifications. Without a database the same
+grouping happens in memory; the items of the most recently closed
+digests are kept there too, up to ``notification_digest_max_closed``.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+import time
+from typing import Optional
+import uuid
+
+import asyncpg
+
+from app.config import get_settings
+from app.schemas.common import Priority
+from app.schemas.notifications import (
+    DigestFlushResponse,
+    DigestItem,
+    DigestItemsResponse,
+    Notification
+)
+from app.services.notification_store import DedupKey, dedup_key
+
+# notification_type of digest notifications
+DIGEST_TYPE = "digest"
+
+_PRIORITY_ORDER = [p.value for p in (Priority.LOW, Priority.MEDIUM, Priority.HIGH, Priority.URGENT)]
+
+_FLUSH_SQL = """
+    WITH windows AS (
+        SELECT * FROM unnest($1::text[], $2::float8[]) AS w(priority, seconds)
+    ),
+    due AS (
+        SELECT i.owner_id, i.category
+        FROM notification_digest_item i
+        LEFT JOIN windows w ON w.priority = i.priority
+        WHERE i.digest_id IS NULL
+        GROUP BY i.owner_id, i.category
+        HAVING $3 OR min(i.created_at + coalesce(w.seconds, 0) * interval '1 second') <= now()
+    ),
+    picked AS (
+        SELECT i.id, i.owner_id, i.category, i.priority, i.notification_type, i.vehicle_id,
+               i.title, i.message, i.action_url, i.channels, i.created_at
+        FROM notification_digest_item i
+        JOIN due d ON d.owner_id IS NOT DISTINCT FROM i.owner_id AND d.category = i.category
+        WHERE i.digest_id IS NULL
+        FOR UPDATE OF i SKIP LOCKED
+    ),
+    groups AS (
+        SELECT uuid_generate_v4() AS digest_id, owner_id, category,
+               count(*) AS items,
+               count(DISTINCT vehicle_id) AS vehicles,
+               count(DISTINCT notification_type) AS types,
+               min(title) AS title,
+               min(message) AS message,
+               min(action_url) AS action_url,
+               ($4::text[])[max(array_position($4::text[], priority::text))] AS priority,
+               min(created_at) AS window_start
+        FROM picked
+        GROUP BY owner_id, category
+    ),
+    group_types AS (
+        SELECT owner_id, category, jsonb_object_agg(notification_type, n) AS by_type
+        FROM (
+            SELECT owner_id, category, notification_type, count(*) AS n
+            FROM picked
+            GROUP BY owner_id, category, notification_type
+        ) t
+        GROUP BY owner_id, category
+    ),
+    group_channels AS (
+        SELECT p.owner_id, p.category, jsonb_agg(DISTINCT c.channel) AS channels
+        FROM picked p, unnest(p.channels) AS c(channel)
+        GROUP BY p.owner_id, p.category
+    ),
+    digests AS (
+        INSERT INTO notification (
+            id, owner_id, title, message, priority, notification_type, category,
+            action_url, action_label, metadata
+        )
+        SELECT g.digest_id, g.owner_id,
+               CASE
+                   WHEN g.items = 1 THEN g.title
+                   WHEN g.types = 1 THEN g.title || ' (' || g.vehicles
+                       || CASE WHEN g.vehicles = 1 THEN ' vehicle)' ELSE ' vehicles)' END
+                   ELSE g.items || ' ' || g.category || ' notifications'
+               END,
+               CASE
+                   WHEN g.items = 1 THEN g.message
+                   ELSE g.items || ' notifications for ' || g.vehicles
+                       || CASE WHEN g.vehicles = 1 THEN ' vehicle' ELSE ' vehicles' END
+                       || '. View the digest for each vehicle''s details.'
+               END,
+               g.priority, 'digest', g.category,
+               CASE WHEN g.items = 1 THEN g.action_url ELSE '/notifications/' || g.digest_id END,
+               'View details',
+               jsonb_build_object(
+                   'items', g.items,
+                   'vehicles', g.vehicles,
+                   'by_type', t.by_type,
+                   'channels', coalesce(c.channels, '[]'::jsonb),
+                   'window_start', g.window_start
+               )
+        FROM groups g
+        JOIN group_types t ON t.owner_id IS NOT DISTINCT FROM g.owner_id AND t.category = g.category
+        LEFT JOIN group_channels c ON c.owner_id IS NOT DISTINCT FROM g.owner_id AND c.category = g.category
+        RETURNING id
+    ),
+    assigned AS (
+        UPDATE notification_digest_item i
+        SET digest_id = g.digest_id
+        FROM picked p
+        JOIN groups g ON g.owner_id IS NOT DISTINCT FROM p.owner_id AND g.category = p.category
+        WHERE i.id = p.id
+        RETURNING i.id
+    )
+    SELECT (SELECT count(*) FROM digests) AS digests, (SELECT count(*) FROM assigned) AS items
+"""
+
+_ITEMS_SQL = """
+    SELECT vehicle_id, notification_type, priority, title, message, action_url, due_on, created_at,
+           count(*) OVER () AS total
+    FROM notification_digest_item
+    WHERE digest_id = $1
+    ORDER BY array_position($2::text[], priority::text) DESC, due_on, vehicle_id
+    LIMIT $3
+"""
+
+
+def _item(notification: Notification) -> DigestItem:
+    due_on = (notification.metadata or {}).get("due_on")
+    return DigestItem.model_construct(
+        vehicle_id=notification.vehicle_id,
+        notification_type=notification.notification_type,
+        priority=notification.priority,
+        title=notification.title,
+        message=notification.message,
+        action_url=notification.action_url,
+        due_on=date.fromisoformat(due_on) if isinstance(due_on, str) else due_on,
+        created_at=notification.created_at
+    )
+
+
+def _item_order(item: DigestItem) -> tuple:
+    return (-_PRIORITY_ORDER.index(item.priority.value), item.due_on or date.max, item.vehicle_id or "")
+
+
+def build_digest(owner_id: Optional[str], category: str, items: list[Notification]) -> Notification:
+    """Digest notification for a group; mirrors the text of ``_FLUSH_SQL``."""
+    digest_id = str(uuid.uuid4())
+    first = items[0]
+    vehicles = len({n.vehicle_id for n in items})
+    by_type: dict[str, int] = {}
+    channels: set[str] = set()
+    for n in items:
+        by_type[n.notification_type] = by_type.get(n.notification_type, 0) + 1
+        channels.update((n.metadata or {}).get("channels") or ())
+    vehicles_text = f"{vehicles} vehicle" if vehicles == 1 else f"{vehicles} vehicles"
+    if len(items) == 1:
+        title, message, action_url = first.title, first.message, first.action_url
+    else:
+        title = (
+            f"{min(n.title for n in items)} ({vehicles_text})" if len(by_type) == 1
+            else f"{len(items)} {category} notifications"
+        )
+        message = (
+            f"{len(items)} notifications for {vehicles_text}. "
+            "View the digest for each vehicle's details."
+        )
+        action_url = f"/notifications/{digest_id}"
+    return Notification.model_construct(
+        id=digest_id,
+        rule_id=None,
+        vehicle_id=None,
+        owner_id=owner_id,
+        title=title,
+        message=message,
+        priority=Priority(max((n.priority.value for n in items), key=_PRIORITY_ORDER.index)),
+        notification_type=DIGEST_TYPE,
+        category=category,
+        status="unread",
+        action_url=action_url,
+        action_label="View details",
+        metadata={
+            "items": len(items),
+            "vehicles": vehicles,
+            "by_type": by_type,
+            "channels": sorted(channels),
+            "window_start": min(n.created_at for n in items).isoformat()
+        },
+        created_at=datetime.now(timezone.utc),
+        read_at=None
+    )
+
+
+class _Group:
+    """Notifications waiting to be coalesced for one owner and category."""
+
+    __slots__ = ("items", "keys", "deadline")
+
+    def __init__(self):
+        self.items: list[Notification] = []
+        self.keys: set[DedupKey] = set()
+        self.deadline = float("inf")
+
+
+class DigestCoalescer:
+    """Groups notifications by owner and category into digests."""
+
+    def __init__(self, windows: dict[str, float], max_closed: int = 1000):
+        # Urgent notifications always bypass coalescing
+        self.windows = {
+            priority: seconds for priority, seconds in windows.items()
+            if seconds > 0 and priority != Priority.URGENT.value
+        }
+        self._groups: dict[tuple[Optional[str], str], _Group] = {}
+        self.max_closed = max_closed
+        # Items of unread digests, and of the most recently closed ones
+        self._digests: dict[str, list[DigestItem]] = {}
+        self._closed: OrderedDict[str, list[DigestItem]] = OrderedDict()
+        self._open_keys: dict[str, set[DedupKey]] = {}
+        self.coalesced = 0
+        self.digests = 0
+
+    @classmethod
+    def from_settings(cls) -> "DigestCoalescer":
+        settings = get_settings()
+        return cls(settings.notification_digest_windows, settings.notification_digest_max_closed)
+
+    def coalesced_priorities(self) -> list[str]:
+        """Priorities held for digests."""
+        return sorted(self.windows, key=_PRIORITY_ORDER.index)
+
+    # In-memory coalescing
+
+    def submit(self, notifications: list[Notification], now: Optional[float] = None) -> list[Notification]:
+        """Hold notifications of coalesced priorities; returns those to notify now."""
+        now = time.monotonic() if now is None else now
+        immediate = []
+        for notification in notifications:
+            window = self.windows.get(notification.priority.value)
+            if window is None:
+                immediate.append(notification)
+                continue
+            group = self._groups.get((notification.owner_id, notification.category))
+            if group is None:
+                group = self._groups[(notification.owner_id, notification.category)] = _Group()
+            group.items.append(notification)
+            group.deadline = min(group.deadline, now + window)
+            key = dedup_key(notification)
+            if key is not None:
+                group.keys.add(key)
+            self.coalesced += 1
+        return immediate
+
+    def pending(self) -> int:
+        return sum(len(group.items) for group in self._groups.values())
+
+    def open_keys(self) -> set[DedupKey]:
+        """Dedup keys of items that are pending or in an unread digest."""
+        keys: set[DedupKey] = set()
+        for group in self._groups.values():
+            keys |= group.keys
+        for digest_keys in self._open_keys.values():
+            keys |= digest_keys
+        return keys
+
+    def flush(self, now: Optional[float] = None, force: bool = False) -> list[Notification]:
+        """Digests of the groups whose window has passed (all groups when ``force``)."""
+        now = time.monotonic() if now is None else now
+        due = [key for key, group in self._groups.items() if force or group.deadline <= now]
+        digests = []
+        for owner_id, category in due:
+            group = self._groups.pop((owner_id, category))
+            digest = build_digest(owner_id, category, group.items)
+            self._digests[digest.id] = sorted(map(_item, group.items), key=_item_order)
+            self._open_keys[digest.id] = group.keys
+            digests.append(digest)
+        self.digests += len(digests)
+        return digests
+
+    def closed(self, digest_id: str) -> None:
+        """A digest left unread; its items no longer suppress new notifications."""
+        self._open_keys.pop(digest_id, None)
+        items = self._digests.pop(digest_id, None)
+        if items is not None:
+            self._closed[digest_id] = items
+            while len(self._closed) > self.max_closed:
+                self._closed.popitem(last=False)
+
+    def items(self, digest_id: str, limit: int) -> Optional[DigestItemsResponse]:
+        items = self._digests.get(digest_id)
+        if items is None:
+            items = self._closed.get(digest_id)
+        if items is None:
+            return None
+        return DigestItemsResponse(digest_id=digest_id, total=len(items), items=items[:limit])
+
+    # notification_digest_item
+
+    async def flush_table(self, pool: asyncpg.Pool, force: bool = False) -> DigestFlushResponse:
+        """Turn due groups of staged items into digest notifications."""
+        priorities = list(self.windows)
+        row = await pool.fetchrow(
+            _FLUSH_SQL,
+            priorities, [self.windows[p] for p in priorities], force, _PRIORITY_ORDER
+        )
+        self.digests += row["digests"]
+        return DigestFlushResponse(digests=row["digests"], items=row["items"])
+
+    async def table_items(
+        self, pool: asyncpg.Pool, digest_id: str, limit: int
+    ) -> Optional[DigestItemsResponse]:
+        try:
+            key = uuid.UUID(digest_id)
+        except ValueError:
+            return None
+        rows = await pool.fetch(_ITEMS_SQL, key, _PRIORITY_ORDER, limit)
+        if not rows:
+            is_digest = await pool.fetchval(
+                "SELECT notification_type = $2 FROM notification WHERE id = $1", key, DIGEST_TYPE
+            )
+            return DigestItemsResponse(digest_id=digest_id, total=0, items=[]) if is_digest else None
+        return DigestItemsResponse(
+            digest_id=digest_id,
+            total=rows[0]["total"],
+            items=[
+                DigestItem(
+                    vehicle_id=str(row["vehicle_id"]) if row["vehicle_id"] else None,
+                    notification_type=row["notification_type"],
+                    priority=Priority(row["priority"]),
+                    title=row["title"],
+                    message=row["message"],
+                    action_url=row["action_url"],
+                    due_on=row["due_on"],
+                    created_at=row["created_at"]
+                )
+                for row in rows
+            ]
+        )
+
+
+# Singleton instance
+notification_digests = DigestCoalescer.from_settings()
@@ -0,0 +1,434 @@
+"""Notification Rule Engine.
+
+Turns ``notification_rule`` rows into notifications. Each rule is
+evaluated as a single set-based statement: the vehicles it matches are
+selected with one query (an index range scan on the relevant date) and
+inserted into ``notification`` by the same statement, so a rule costs
+one round trip however many vehicles it matches. Rules run concurrently
+on separate connections.
+
+A rule does not notify a vehicle again while an earlier notification
+for the same source record (policy, inspection, warranty, service
+record or recall) is still unread; the partial unique index from
+``migrations/add_notification_rule_dedup.sql`` enforces this with
+``ON CONFLICT DO NOTHING``. Matches of a priority that is coalesced
+into digests are staged as digest items instead (see
+``notification_digests.py``).
+
+Without a database the same rules (the defaults from
+``sample_data_ai.sql``) are evaluated against an in-memory sample fleet
+whose records are kept sorted by date, so a rule reads only the records
+inside its window.
+"""
+import asyncio
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+import json
+import random
+from typing import NamedTuple, Optional, Sequence
+import uuid
+
+import asyncpg
+
+from app.schemas.common import Priority
+from app.schemas.notifications import Notification, NotificationRule
+
+class RuleType(NamedTuple):
+    """How notifications of one rule type are found and presented."""
+    category: str
+    action_url: str  # Vehicle id is appended
+    action_label: str
+    default_days: int
+    default_body: str
+    source: str  # SELECT vehicle_id, owner_id, source_id, due_on; $1 is the rule's window or filter
+
+
+RULE_TYPES: dict[str, RuleType] = {
+    "service_due": RuleType(
+        category="maintenance",
+        action_url="/service-records?vehicle_id=",
+        action_label="Schedule Service",
+        default_days=14,
+        default_body="Your vehicle is due for service on {{due_date}}.",
+        # Latest service record per vehicle, due (or overdue) within the window
+        source="""
+            SELECT sr.vehicle_id, v.owner_id, sr.id AS source_id, sr.next_service_due_date AS due_on
+            FROM service_record sr
+            JOIN vehicle v ON v.id = sr.vehicle_id AND v.status = 'active'
+            WHERE sr.next_service_due_date <= CURRENT_DATE + $1::int
+              AND NOT EXISTS (
+                  SELECT 1 FROM service_record later
+                  WHERE later.vehicle_id = sr.vehicle_id AND later.service_date > sr.service_date
+              )
+        """
+    ),
+    "insurance_expiring": RuleType(
+        category="insurance",
+        action_url="/insurance?vehicle_id=",
+        action_label="Renew Policy",
+        default_days=30,
+        default_body="Your insurance policy expires on {{expiration_date}}.",
+        # A vehicle's latest policy only: a renewal supersedes the expiring one
+        source="""
+            SELECT ip.vehicle_id, v.owner_id, ip.id AS source_id, ip.end_date AS due_on
+            FROM insurance_policy ip
+            JOIN vehicle v ON v.id = ip.vehicle_id AND v.status = 'active'
+            WHERE ip.end_date BETWEEN CURRENT_DATE AND CURRENT_DATE + $1::int
+              AND NOT EXISTS (
+                  SELECT 1 FROM insurance_policy later
+                  WHERE later.vehicle_id = ip.vehicle_id AND later.end_date > ip.end_date
+              )
+        """
+    ),
+    "inspection_due": RuleType(
+        category="compliance",
+        action_url="/inspections?vehicle_id=",
+        action_label="Schedule Inspection",
+        default_days=30,
+        default_body="Your vehicle inspection expires on {{expiration_date}}.",
+        source="""
+            SELECT i.vehicle_id, v.owner_id, i.id AS source_id, i.expiration_date AS due_on
+            FROM inspection i
+            JOIN vehicle v ON v.id = i.vehicle_id AND v.status = 'active'
+            WHERE i.expiration_date BETWEEN CURRENT_DATE AND CURRENT_DATE + $1::int
+              AND NOT EXISTS (
+                  SELECT 1 FROM inspection later
+                  WHERE later.vehicle_id = i.vehicle_id AND later.expiration_date > i.expiration_date
+              )
+        """
+    ),
+    "warranty_expiring": RuleType(
+        category="warranty",
+        action_url="/warranties?vehicle_id=",
+        action_label="View Options",
+        default_days=60,
+        default_body="Your warranty coverage ends on {{expiration_date}}.",
+        source="""
+            SELECT w.vehicle_id, v.owner_id, w.id AS source_id, w.end_date AS due_on
+            FROM warranty w
+            JOIN vehicle v ON v.id = w.vehicle_id AND v.status = 'active'
+            WHERE w.end_date BETWEEN CURRENT_DATE AND CURRENT_DATE + $1::int
+        """
+    ),
+    "recall_notice": RuleType(
+        category="safety",
+        action_url="/recalls?vehicle_id=",
+        action_label="Contact Dealer",
+        default_days=0,
+        default_body="Your vehicle is affected by a safety recall. Please contact your dealer.",
+        # $1 is the severities to notify about; empty means all
+        source="""
+            SELECT vrs.vehicle_id, v.owner_id, vrs.recall_id AS source_id, r.recall_date AS due_on
+            FROM vehicle_recall_status vrs
+            JOIN recall r ON r.id = vrs.recall_id AND r.status = 'open'
+            JOIN vehicle v ON v.id = vrs.vehicle_id AND v.status = 'active'
+            WHERE vrs.status NOT IN ('completed', 'declined')
+              AND (cardinality($1::text[]) = 0 OR r.severity = ANY($1::text[]))
+        """
+    ),
+}
+
+_DATE_FORMAT = "FMMonth FMDD, YYYY"
+
+_INSERT_SQL = """
+    WITH matches AS (%(source)s),
+    rendered AS (
+        SELECT m.vehicle_id, m.owner_id, m.source_id, m.due_on,
+               $5::text AS priority,
+               replace(
+                   replace($4, '{{due_date}}', to_char(m.due_on, '%(date_format)s')),
+                   '{{expiration_date}}', to_char(m.due_on, '%(date_format)s')
+               ) AS message
+        FROM matches m
+    ),
+    inserted AS (
+        INSERT INTO notification (
+            rule_id, vehicle_id, owner_id, title, message, priority,
+            notification_type, category, action_url, action_label, metadata, dedup_key
+        )
+        SELECT $2, r.vehicle_id, r.owner_id, $3, r.message, r.priority,
+               $6, $7, $8::text || r.vehicle_id::text, $9,
+               jsonb_build_object('source_id', r.source_id, 'due_on', r.due_on, 'channels', $10::text[]),
+               r.source_id::text
+        FROM rendered r
+        WHERE r.priority <> ALL($11::text[])
+        ON CONFLICT (notification_type, vehicle_id, dedup_key) WHERE status = 'unread' DO NOTHING
+        RETURNING priority, false AS coalesced
+    )%(staged)s
+    SELECT priority, coalesced, count(*) AS count
+    FROM (SELECT * FROM inserted%(staged_rows)s) new_rows
+    GROUP BY priority, coalesced
+"""
+
+# Matches of a coalesced priority are staged for a digest instead (see
+# notification_digests.py); open items dedup like unread notifications
+_STAGE_SQL = """,
+    staged AS (
+        INSERT INTO notification_digest_item (
+            rule_id, vehicle_id, owner_id, notification_type, category, priority,
+            title, message, action_url, channels, dedup_key, due_on
+        )
+        SELECT $2, r.vehicle_id, r.owner_id, $6, $7, r.priority,
+               $3, r.message, $8::text || r.vehicle_id::text, $10::text[], r.source_id::text, r.due_on
+        FROM rendered r
+        WHERE r.priority = ANY($11::text[])
+        ON CONFLICT (notification_type, vehicle_id, dedup_key) WHERE is_open DO NOTHING
+        RETURNING priority, true AS coalesced
+    )
+"""
+
+_RULES_SQL = """
+    SELECT id, name, description, rule_type, trigger_condition, notification_channels,
+           priority, template_subject, template_body, is_active
+    FROM notification_rule
+    WHERE is_active
+    ORDER BY created_at
+"""
+
+# The rules sample_data_ai.sql installs; used when there is no database
+DEFAULT_RULES = [
+    NotificationRule(
+        id="default-service-due",
+        name="Service Due Reminder",
+        rule_type="service_due",
+        trigger_condition={"days_before": 14, "check_field": "next_service_due_date"},
+        notification_channels=["in_app", "email"],
+        priority=Priority.MEDIUM,
+        template_subject="Service Due Soon for Your Vehicle",
+        template_body="Your vehicle is due for service on {{due_date}}. Schedule your appointment "
+                      "today to keep your vehicle running smoothly."
+    ),
+    NotificationRule(
+        id="default-insurance-expiring",
+        name="Insurance Expiration Alert",
+        rule_type="insurance_expiring",
+        trigger_condition={"days_before": 30, "check_field": "end_date"},
+        notification_channels=["in_app", "email"],
+        priority=Priority.HIGH,
+        template_subject="Your Insurance Policy is Expiring Soon",
+        template_body="Your insurance policy expires on {{expiration_date}}. Renew now to maintain "
+                      "continuous coverage."
+    ),
+    NotificationRule(
+        id="default-inspection-due",
+        name="Inspection Due Notice",
+        rule_type="inspection_due",
+        trigger_condition={"days_before": 30, "check_field": "expiration_date"},
+        notification_channels=["in_app"],
+        priority=Priority.HIGH,
+        template_subject="Vehicle Inspection Due",
+        template_body="Your vehicle inspection expires on {{expiration_date}}. Schedule your "
+                      "inspection to stay compliant."
+    ),
+    NotificationRule(
+        id="default-warranty-expiring",
+        name="Warranty Expiration Notice",
+        rule_type="warranty_expiring",
+        trigger_condition={"days_before": 60, "check_field": "end_date"},
+        notification_channels=["in_app", "email"],
+        priority=Priority.MEDIUM,
+        template_subject="Your Warranty is Expiring",
+        template_body="Your warranty coverage ends on {{expiration_date}}. Consider extended "
+                      "warranty options."
+    ),
+    NotificationRule(
+        id="default-recall-notice",
+        name="Safety Recall Alert",
+        rule_type="recall_notice",
+        trigger_condition={"immediate": True, "severity": ["high", "critical"]},
+        notification_channels=["in_app", "email", "sms"],
+        priority=Priority.URGENT,
+        template_subject="Important Safety Recall Notice",
+        template_body="Your vehicle has been affected by a safety recall. Please contact your "
+                      "dealer immediately."
+    ),
+]
+
+
+def _rule_from_row(row: asyncpg.Record) -> NotificationRule:
+    condition = row["trigger_condition"]
+    return NotificationRule(
+        id=str(row["id"]),
+        name=row["name"],
+        description=row["description"],
+        rule_type=row["rule_type"],
+        trigger_condition=json.loads(condition) if isinstance(condition, str) else condition,
+        notification_channels=list(row["notification_channels"] or ["in_app"]),
+        priority=Priority(row["priority"] or "medium"),
+        template_subject=row["template_subject"],
+        template_body=row["template_body"],
+        is_active=row["is_active"]
+    )
+
+
+async def load_rules(pool: asyncpg.Pool) -> list[NotificationRule]:
+    """Active rules from ``notification_rule``."""
+    return [_rule_from_row(row) for row in await pool.fetch(_RULES_SQL)]
+
+
+def _window(rule: NotificationRule, rule_type: RuleType) -> int:
+    return int(rule.trigger_condition.get("days_before", rule_type.default_days))
+
+
+def _severities(rule: NotificationRule) -> list[str]:
+    return [str(s) for s in rule.trigger_condition.get("severity") or []]
+
+
+class RuleResult(NamedTuple):
+    """New notifications of a rule evaluation, including those held for a digest."""
+    by_priority: dict[str, int]
+    coalesced: int
+
+
+async def evaluate_rule(
+    pool: asyncpg.Pool, rule: NotificationRule, coalesce: Sequence[str] = ()
+) -> RuleResult:
+    """Insert the rule's new notifications.
+
+    Matches whose priority is in ``coalesce`` are staged as digest items
+    rather than inserted as notifications.
+    """
+    rule_type = RULE_TYPES[rule.rule_type]
+    sql = _INSERT_SQL % {
+        "source": rule_type.source,
+        "date_format": _DATE_FORMAT,
+        "staged": _STAGE_SQL if coalesce else "",
+        "staged_rows": " UNION ALL SELECT * FROM staged" if coalesce else ""
+    }
+    rows = await pool.fetch(
+        sql,
+        _severities(rule) if rule.rule_type == "recall_notice" else _window(rule, rule_type),
+        uuid.UUID(rule.id),
+        rule.template_subject or rule.name,
+        rule.template_body or rule_type.default_body,
+        rule.priority.value,
+        rule.rule_type,
+        rule_type.category,
+        rule_type.action_url,
+        rule_type.action_label,
+        rule.notification_channels,
+        list(coalesce)
+    )
+    by_priority: dict[str, int] = {}
+    for row in rows:
+        by_priority[row["priority"]] = by_priority.get(row["priority"], 0) + row["count"]
+    return RuleResult(by_priority, sum(row["count"] for row in rows if row["coalesced"]))
+
+
+async def evaluate_rules(
+    pool: asyncpg.Pool, rules: list[NotificationRule], coalesce: Sequence[str] = ()
+) -> dict[str, RuleResult]:
+    """Evaluate rules concurrently; results per rule type."""
+    results = await asyncio.gather(*(evaluate_rule(pool, rule, coalesce) for rule in rules))
+    by_type: dict[str, RuleResult] = {}
+    for rule, result in zip(rules, results):
+        merged = by_type.get(rule.rule_type, RuleResult({}, 0))
+        by_priority = dict(merged.by_priority)
+        for priority, count in result.by_priority.items():
+            by_priority[priority] = by_priority.get(priority, 0) + count
+        by_type[rule.rule_type] = RuleResult(by_priority, merged.coalesced + result.coalesced)
+    return by_type
+
+
+class SourceRecord(NamedTuple):
+    """A record a rule can match: the in-memory counterpart of a source row."""
+    vehicle_id: str
+    owner_id: str
+    source_id: str
+    due_on: date
+    severity: Optional[str] = None  # Recalls only
+
+
+def _render(template: str, due_on: date) -> str:
+    formatted = f"{due_on:%B} {due_on.day}, {due_on.year}"
+    return template.replace("{{due_date}}", formatted).replace("{{expiration_date}}", formatted)
+
+
+class SampleRecords:
+    """Source records of an in-memory fleet, sorted by due date per rule type."""
+
+    def __init__(self, records: dict[str, list[SourceRecord]]):
+        self._records = {
+            rule_type: sorted(items, key=lambda record: record.due_on)
+            for rule_type, items in records.items()
+        }
+        self._dates = {
+            rule_type: [record.due_on for record in items]
+            for rule_type, items in self._records.items()
+        }
+
+    @classmethod
+    def generate(cls, vehicles: int = 500, seed: int = 11, today: Optional[date] = None) -> "SampleRecords":
+        """A reproducible fleet with due dates spread around ``today``."""
+        rng = random.Random(seed)
+        today = today or date.today()
+        owners = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(max(1, vehicles // 20))]
+        records: dict[str, list[SourceRecord]] = {rule_type: [] for rule_type in RULE_TYPES}
+
+        def record(vehicle_id: str, owner_id: str, low: int, high: int, **extra) -> SourceRecord:
+            return SourceRecord(
+                vehicle_id, owner_id, str(uuid.UUID(int=rng.getrandbits(128))),
+                today + timedelta(days=rng.randint(low, high)), **extra
+            )
+
+        for _ in range(vehicles):
+            vehicle_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            owner_id = rng.choice(owners)
+            records["service_due"].append(record(vehicle_id, owner_id, -30, 180))
+            records["insurance_expiring"].append(record(vehicle_id, owner_id, -30, 365))
+            records["inspection_due"].append(record(vehicle_id, owner_id, -60, 365))
+            records["warranty_expiring"].append(record(vehicle_id, owner_id, -365, 1095))
+            if rng.random() < 0.03:
+                records["recall_notice"].append(record(
+                    vehicle_id, owner_id, -180, 0,
+                    severity=rng.choice(["low", "medium", "high", "critical"])
+                ))
+        return cls(records)
+
+    def matches(self, rule: NotificationRule, today: date) -> list[SourceRecord]:
+        """Records the rule selects, as its SQL source would."""
+        rule_type = RULE_TYPES[rule.rule_type]
+        records, dates = self._records[rule.rule_type], self._dates[rule.rule_type]
+        if rule.rule_type == "recall_notice":
+            severities = set(_severities(rule))
+            return [r for r in records if not severities or r.severity in severities]
+        # Service reminders include overdue services; expiries start today
+        low = 0 if rule.rule_type == "service_due" else bisect_left(dates, today)
+        high = bisect_right(dates, today + timedelta(days=_window(rule, rule_type)))
+        return records[low:high]
+
+    def evaluate(
+        self, rule: NotificationRule, today: date, unread: set[tuple[str, str, str]]
+    ) -> list[Notification]:
+        """New notifications for a rule; ``unread`` holds the dedup keys of unread ones."""
+        rule_type = RULE_TYPES[rule.rule_type]
+        created_at = datetime.now(timezone.utc)
+        notifications = []
+        for record in self.matches(rule, today):
+            key = (rule.rule_type, record.vehicle_id, record.source_id)
+            if key in unread:
+                continue
+            unread.add(key)
+            # Fields are built here, so validation is skipped
+            notifications.append(Notification.model_construct(
+                id=str(uuid.uuid4()),
+                rule_id=rule.id,
+                vehicle_id=record.vehicle_id,
+                owner_id=record.owner_id,
+                title=rule.template_subject or rule.name,
+                message=_render(rule.template_body or rule_type.default_body, record.due_on),
+                priority=rule.priority,
+                notification_type=rule.rule_type,
+                category=rule_type.category,
+                status="unread",
+                action_url=rule_type.action_url + record.vehicle_id,
+                action_label=rule_type.action_label,
+                metadata={
+                    "source_id": record.source_id,
+                    "due_on": record.due_on.isoformat(),
+                    "channels": rule.notification_channels
+                },
+                created_at=created_at,
+                read_at=None
+            ))
+        return notifications
@@ -0,0 +1,380 @@
+"""Notification Store.
+
+Persistence for notifications. ``PostgresNotificationStore`` reads and
+updates the ``notification`` table; ``InMemoryNotificationStore`` keeps
+the same interface in process memory when no database is configured.
+
+Notifications are listed newest first, by ``(created_at, id)``. Both
+stores answer a listing from an index rather than by copying, filtering
+and sorting everything: the table through the composite indexes in
+``migrations/add_notification_store_indexes.sql``, the in-memory store
+through a time-ordered list per owner and overall plus status sets.
+Marking a notification read or dismissed is a single keyed update.
+
+The table store also acts as the delivery outbox (see
+``notification_delivery.py``): undelivered notifications are claimed
+under a renewable lease (``delivery_claimed_at``), completed channels
+are recorded in ``notification_delivery_channel``, and ``sent_at`` is
+set once every channel has completed.
+"""
+import bisect
+from collections import defaultdict
+from datetime import datetime
+import heapq
+import json
+from typing import NamedTuple, Optional
+import uuid
+
+import asyncpg
+
+from app.schemas.common import Priority
+from app.schemas.notifications import Notification
+from app.services.notification_counters import NotificationCounters
+
+# Position of a notification in listings, which are newest first
+NotificationKey = tuple[datetime, str]
+
+# Unread dedup key: (notification_type, vehicle_id, source record id)
+DedupKey = tuple[str, str, str]
+
+_COLUMNS = """
+    id, rule_id, vehicle_id, owner_id, title, message, priority, notification_type,
+    category, status, action_url, action_label, metadata, created_at, read_at
+"""
+
+_INSERT_SQL = """
+    INSERT INTO notification (
+        id, rule_id, vehicle_id, owner_id, title, message, priority, notification_type,
+        category, status, action_url, action_label, metadata, dedup_key, created_at
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13::jsonb, $14, $15)
+    ON CONFLICT DO NOTHING
+"""
+
+# Served by idx_notification_undelivered; SKIP LOCKED lets several
+# backend processes claim side by side, and a lapsed lease (its process
+# died) makes a row claimable again
+_CLAIM_SQL = f"""
+    UPDATE notification n
+    SET delivery_claimed_at = now()
+    FROM (
+        SELECT id AS claim_id FROM notification
+        WHERE sent_at IS NULL AND (priority = 'urgent') = $1
+          AND (delivery_claimed_at IS NULL OR delivery_claimed_at < now() - $3 * interval '1 second')
+        ORDER BY created_at
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    ) c
+    WHERE n.id = c.claim_id
+    RETURNING {_COLUMNS},
+        array(
+            SELECT d.channel FROM notification_delivery_channel d WHERE d.notification_id = n.id
+        ) AS delivered_channels
+"""
+
+# Record completed channels and mark notifications whose channels are all complete
+_COMPLETE_SQL = """
+    WITH completed AS (
+        INSERT INTO notification_delivery_channel (notification_id, channel)
+        SELECT * FROM unnest($1::uuid[], $2::text[])
+        ON CONFLICT DO NOTHING
+    )
+    UPDATE notification
+    SET sent_at = now(), delivery_claimed_at = NULL
+    WHERE id = ANY($3::uuid[])
+"""
+
+
+class NotificationFilter(NamedTuple):
+    """Notification listing filters."""
+    owner_id: Optional[str] = None
+    status: Optional[str] = None
+    priority: Optional[Priority] = None
+
+
+def _uuid_or_none(value: Optional[str]) -> Optional[uuid.UUID]:
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def _key(notification: Notification) -> NotificationKey:
+    return (notification.created_at, notification.id)
+
+
+def dedup_key(notification: Notification) -> Optional[DedupKey]:
+    """Key under which an unread notification suppresses duplicates."""
+    source_id = (notification.metadata or {}).get("source_id")
+    if source_id is None or notification.vehicle_id is None:
+        return None
+    return (notification.notification_type, notification.vehicle_id, str(source_id))
+
+
+class InMemoryNotificationStore:
+    """Process-local store used when no database is configured.
+
+    Notifications are held by id, with status sets and time-ordered
+    ``(created_at, id)`` lists overall and per owner. Newest-N reads the
+    end of a time-ordered list, skipping non-matching entries, unless a
+    status set is small enough to read whole. Each insert and status
+    change is reported to ``counters`` when given.
+    """
+
+    name = "memory"
+
+    def __init__(self, counters: Optional[NotificationCounters] = None):
+        self._counters = counters
+        self._records: dict[str, Notification] = {}
+        self._by_status: dict[str, set[str]] = defaultdict(set)
+        self._timeline: list[NotificationKey] = []
+        self._by_owner: dict[str, list[NotificationKey]] = defaultdict(list)
+        self._unread_keys: set[DedupKey] = set()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @staticmethod
+    def _insert(timeline: list[NotificationKey], key: NotificationKey) -> None:
+        # Notifications mostly arrive newest last, making this an append
+        if not timeline or timeline[-1] <= key:
+            timeline.append(key)
+        else:
+            bisect.insort(timeline, key)
+
+    async def add_many(self, notifications: list[Notification]) -> list[Notification]:
+        """Store notifications, skipping unread duplicates; returns those stored."""
+        added = []
+        for notification in notifications:
+            if notification.id in self._records:
+                continue
+            key = dedup_key(notification) if notification.status == "unread" else None
+            if key is not None:
+                if key in self._unread_keys:
+                    continue
+                self._unread_keys.add(key)
+            self._records[notification.id] = notification
+            self._by_status[notification.status].add(notification.id)
+            self._insert(self._timeline, _key(notification))
+            if notification.owner_id:
+                self._insert(self._by_owner[notification.owner_id], _key(notification))
+            if self._counters is not None:
+                self._counters.added(notification)
+            added.append(notification)
+        return added
+
+    async def get(self, notification_id: str) -> Optional[Notification]:
+        return self._records.get(notification_id)
+
+    async def set_status(
+        self, notification_id: str, status: str, at: datetime
+    ) -> Optional[Notification]:
+        """Change a notification's status; ``None`` if it does not exist."""
+        notification = self._records.get(notification_id)
+        if notification is None:
+            return None
+        if notification.status != status:
+            self._by_status[notification.status].discard(notification_id)
+            self._by_status[status].add(notification_id)
+            if notification.status == "unread":
+                self._unread_keys.discard(dedup_key(notification))
+            if self._counters is not None:
+                self._counters.status_changed(notification.owner_id, notification.status, status)
+            notification.status = status
+        if status == "read" and notification.read_at is None:
+            notification.read_at = at
+        return notification
+
+    def unread_keys(self) -> set[DedupKey]:
+        """Dedup keys of unread notifications (live view)."""
+        return self._unread_keys
+
+    async def list(self, where: NotificationFilter, limit: int) -> list[Notification]:
+        """Matching notifications, newest first."""
+        def matches(notification: Notification) -> bool:
+            return (
+                (where.owner_id is None or notification.owner_id == where.owner_id)
+                and (where.status is None or notification.status == where.status)
+                and (where.priority is None or notification.priority == where.priority)
+            )
+
+        timeline = self._timeline if where.owner_id is None else self._by_owner.get(where.owner_id, [])
+        if where.status is not None:
+            index = self._by_status.get(where.status, set())
+            # Reading the set costs len(index); walking the timeline costs
+            # about limit * len(timeline) / len(index) entries
+            if len(index) ** 2 <= limit * len(timeline):
+                candidates = (self._records[i] for i in index)
+                return heapq.nlargest(limit, filter(matches, candidates), key=_key)
+
+        page = []
+        for position in range(len(timeline) - 1, -1, -1):
+            notification = self._records[timeline[position][1]]
+            if matches(notification):
+                page.append(notification)
+                if len(page) >= limit:
+                    break
+        return page
+
+
+class PostgresNotificationStore:
+    """Notifications in the ``notification`` table."""
+
+    name = "postgres"
+
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+
+    @staticmethod
+    def _to_notification(row: asyncpg.Record) -> Notification:
+        metadata = row["metadata"]
+        return Notification(
+            id=str(row["id"]),
+            rule_id=str(row["rule_id"]) if row["rule_id"] else None,
+            vehicle_id=str(row["vehicle_id"]) if row["vehicle_id"] else None,
+            owner_id=str(row["owner_id"]) if row["owner_id"] else None,
+            title=row["title"],
+            message=row["message"],
+            priority=Priority(row["priority"]),
+            notification_type=row["notification_type"],
+            category=row["category"],
+            status=row["status"],
+            action_url=row["action_url"],
+            action_label=row["action_label"],
+            metadata=json.loads(metadata) if metadata else None,
+            created_at=row["created_at"],
+            read_at=row["read_at"]
+        )
+
+    async def add_many(self, notifications: list[Notification]) -> list[Notification]:
+        """Insert notifications; unread duplicates are skipped by the dedup index."""
+        async with self._pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.executemany(_INSERT_SQL, [
+                    (
+                        uuid.UUID(n.id),
+                        _uuid_or_none(n.rule_id),
+                        _uuid_or_none(n.vehicle_id),
+                        _uuid_or_none(n.owner_id),
+                        n.title,
+                        n.message,
+                        n.priority.value,
+                        n.notification_type,
+                        n.category,
+                        n.status,
+                        n.action_url,
+                        n.action_label,
+                        json.dumps(n.metadata) if n.metadata is not None else None,
+                        (dedup_key(n) or (None, None, None))[2],
+                        n.created_at
+                    )
+                    for n in notifications
+                ])
+        return notifications
+
+    async def get(self, notification_id: str) -> Optional[Notification]:
+        key = _uuid_or_none(notification_id)
+        if key is None:
+            return None
+        row = await self._pool.fetchrow(f"SELECT {_COLUMNS} FROM notification WHERE id = $1", key)
+        return self._to_notification(row) if row else None
+
+    async def get_many(self, notification_ids: list[str]) -> list[Notification]:
+        """Notifications by id, in no particular order; unknown ids are skipped."""
+        keys = [key for key in map(_uuid_or_none, notification_ids) if key is not None]
+        rows = await self._pool.fetch(
+            f"SELECT {_COLUMNS} FROM notification WHERE id = ANY($1::uuid[])", keys
+        )
+        return [self._to_notification(row) for row in rows]
+
+    async def set_status(
+        self, notification_id: str, status: str, at: datetime
+    ) -> Optional[Notification]:
+        """Change a notification's status by primary key; ``None`` if it does not exist."""
+        key = _uuid_or_none(notification_id)
+        if key is None:
+            return None
+        row = await self._pool.fetchrow(
+            f"""
+            UPDATE notification
+            SET status = $2,
+                read_at = CASE WHEN $2 = 'read' THEN COALESCE(read_at, $3) ELSE read_at END
+            WHERE id = $1
+            RETURNING {_COLUMNS}
+            """,
+            key, status, at
+        )
+        return self._to_notification(row) if row else None
+
+    async def claim_undelivered(
+        self, urgent: bool, limit: int, lease_seconds: float
+    ) -> list[tuple[Notification, list[str]]]:
+        """Lease up to ``limit`` undelivered notifications, oldest first.
+
+        Returns each with the channels already completed for it.
+        """
+        rows = await self._pool.fetch(_CLAIM_SQL, urgent, limit, lease_seconds)
+        return [(self._to_notification(row), list(row["delivered_channels"])) for row in rows]
+
+    async def renew_claims(self, notification_ids: list[str]) -> None:
+        """Extend the delivery lease of notifications still being delivered."""
+        await self._pool.execute(
+            "UPDATE notification SET delivery_claimed_at = now() WHERE id = ANY($1::uuid[]) AND sent_at IS NULL",
+            [uuid.UUID(i) for i in notification_ids]
+        )
+
+    async def release_claims(self, notification_ids: list[str]) -> None:
+        """Give up delivery leases so the notifications can be claimed again at once."""
+        await self._pool.execute(
+            "UPDATE notification SET delivery_claimed_at = NULL WHERE id = ANY($1::uuid[]) AND sent_at IS NULL",
+            [uuid.UUID(i) for i in notification_ids]
+        )
+
+    async def complete_deliveries(
+        self, channels: list[tuple[str, str]], sent_ids: list[str]
+    ) -> None:
+        """Record completed ``(notification_id, channel)`` deliveries and mark ``sent_ids`` sent."""
+        await self._pool.execute(
+            _COMPLETE_SQL,
+            [uuid.UUID(notification_id) for notification_id, _ in channels],
+            [channel for _, channel in channels],
+            [uuid.UUID(i) for i in sent_ids]
+        )
+
+    async def list(self, where: NotificationFilter, limit: int) -> list[Notification]:
+        """Matching notifications, newest first.
+
+        Owner and status filters are served by the ``(owner_id, status,
+        created_at DESC)``, ``(owner_id, created_at DESC)`` and
+        ``(status, created_at DESC)`` indexes; priority is checked on
+        the rows read.
+        """
+        conditions: list[str] = []
+        params: list = []
+
+        def param(value) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        if where.owner_id is not None:
+            owner_key = _uuid_or_none(where.owner_id)
+            if owner_key is None:
+                return []
+            conditions.append(f"owner_id = {param(owner_key)}")
+        if where.status is not None:
+            conditions.append(f"status = {param(where.status)}")
+        if where.priority is not None:
+            conditions.append(f"priority = {param(where.priority.value)}")
+
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = await self._pool.fetch(
+            f"""
+            SELECT {_COLUMNS} FROM notification
+            {where_sql}
+            ORDER BY created_at DESC, id DESC
+            LIMIT {param(limit)}
+            """,
+            *params
+        )
+        return [self._to_notification(row) for row in rows]
@@ -0,0 +1,269 @@
+"""Notification Streaming.
+
+Pushes new notifications to connected clients as server-sent events, one
+stream per owner (or one for every owner), so clients no longer poll
+``/api/notifications/unread``.
+
+New notifications are published to an in-process broker that fans them
+out to the streams subscribed to their owner. Each notification is
+encoded as an event frame once, however many streams receive it. With a
+database, the publisher is the ``notification`` table itself: a trigger
+(``migrations/add_notification_events.sql``) sends the ids and owners of
+inserted rows on the ``notification_events`` channel, and every backend
+process LISTENs and fetches only the rows some local stream is waiting
+for, so multi-worker deployments stream notifications created anywhere.
+The same events keep the notification counters current (see
+``notification_counters.py``).
+Without a database the notification service publishes directly.
+
+Idle streams are cheap: a subscriber is a small slotted object with no
+task or timer of its own and a buffer that only exists while events are
+pending. One loop sends keep-alive comments to every stream. A stream
+that falls ``max_pending`` events behind loses the oldest and is sent a
+``resync`` event, telling the client to reload its list.
+"""
+import asyncio
+from collections import defaultdict
+import json
+import logging
+from typing import Any, AsyncIterator, Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.schemas.notifications import Notification, NotificationStreamStats
+from app.services.notification_counters import notification_counters
+from app.services.notification_store import PostgresNotificationStore
+
+logger = logging.getLogger(__name__)
+
+# Reconnect delay clients should use, then a comment to flush headers through proxies
+OPEN_FRAME = b"retry: 5000\n: connected\n\n"
+HEARTBEAT_FRAME = b": keepalive\n\n"
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+# Subscription key for streams that receive every owner's notifications
+ALL_OWNERS = None
+
+# Channel notify_notification_events() publishes on
+NOTIFICATION_EVENT_CHANNEL = "notification_events"
+
+
+def encode_event(notification: Notification) -> bytes:
+    """Server-sent event frame for a notification."""
+    return (
+        f"id: {notification.id}\nevent: notification\ndata: {notification.model_dump_json()}\n\n"
+    ).encode()
+
+
+class Subscriber:
+    """One connected stream: pending frames and the waiter of its response."""
+
+    __slots__ = ("owner_id", "_frames", "_waiter", "_overflowed")
+
+    def __init__(self, owner_id: Optional[str]):
+        self.owner_id = owner_id
+        self._frames: Optional[list[bytes]] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._overflowed = False
+
+    def push(self, frame: bytes, max_pending: int) -> bool:
+        """Queue a frame; returns False when it pushed out an older one."""
+        if self._frames is None:
+            self._frames = []
+        self._frames.append(frame)
+        kept = len(self._frames) <= max_pending
+        if not kept:
+            del self._frames[0]
+            self._overflowed = True
+        self.wake()
+        return kept
+
+    def wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def next(self) -> list[bytes]:
+        """Wait for frames; an empty list means a keep-alive is due."""
+        if self._frames is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        frames, self._frames = self._frames or [], None
+        if self._overflowed:
+            self._overflowed = False
+            frames.insert(0, RESYNC_FRAME)
+        return frames
+
+
+class NotificationBroker:
+    """In-process pub/sub of new notifications, keyed by owner."""
+
+    def __init__(self, heartbeat_seconds: float = 15.0, max_pending: int = 100):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_pending = max_pending
+        self._subscribers: dict[Optional[str], set[Subscriber]] = defaultdict(set)
+        self._store: Optional[PostgresNotificationStore] = None
+        self._pending_ids: list[str] = []
+        self._pending = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.connections = 0
+        self.published = 0
+        self.frames_queued = 0
+        self.overflows = 0
+        self.fetched = 0
+
+    @classmethod
+    def from_settings(cls) -> "NotificationBroker":
+        settings = get_settings()
+        return cls(
+            heartbeat_seconds=settings.notification_stream_heartbeat_seconds,
+            max_pending=settings.notification_stream_max_pending
+        )
+
+    def subscribe(self, owner_id: Optional[str]) -> Subscriber:
+        subscriber = Subscriber(owner_id)
+        self._subscribers[owner_id].add(subscriber)
+        self.connections += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscribers = self._subscribers.get(subscriber.owner_id)
+        if subscribers is not None and subscriber in subscribers:
+            subscribers.discard(subscriber)
+            self.connections -= 1
+            if not subscribers:
+                del self._subscribers[subscriber.owner_id]
+
+    def wanted(self, owner_id: Optional[str]) -> bool:
+        """Whether any stream would receive a notification for this owner."""
+        return owner_id in self._subscribers or ALL_OWNERS in self._subscribers
+
+    def publish(self, notifications: list[Notification]) -> int:
+        """Fan notifications out to their owners' streams; returns frames queued."""
+        everyone = self._subscribers.get(ALL_OWNERS, ())
+        queued = 0
+        for notification in notifications:
+            owners = self._subscribers.get(notification.owner_id, ()) if notification.owner_id else ()
+            if not owners and not everyone:
+                continue
+            frame = encode_event(notification)
+            for subscriber in (*owners, *everyone):
+                if not subscriber.push(frame, self.max_pending):
+                    self.overflows += 1
+                queued += 1
+        self.published += len(notifications)
+        self.frames_queued += queued
+        return queued
+
+    async def events(self, owner_id: Optional[str]) -> AsyncIterator[bytes]:
+        """Event stream body for one connection."""
+        subscriber = self.subscribe(owner_id)
+        try:
+            yield OPEN_FRAME
+            while True:
+                frames = await subscriber.next()
+                yield b"".join(frames) if frames else HEARTBEAT_FRAME
+        finally:
+            self.unsubscribe(subscriber)
+
+    def heartbeat(self) -> None:
+        """Wake every idle stream to send a keep-alive."""
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in subscribers:
+                subscriber.wake()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self.heartbeat()
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        """Count a trigger notification and queue the inserted rows a local stream wants.
+
+        Notifications carry ``{"op", "xid", "rows"}``; insert rows start
+        with ``[id, owner_id, ...]`` (see ``NotificationCounters.apply_event``).
+        """
+        try:
+            message = json.loads(payload)
+            op, rows = message.get("op", "insert"), message["rows"] or []
+            notification_counters.apply_event(op, rows, message.get("xid"))
+        except (ValueError, KeyError, TypeError, IndexError):
+            logger.warning("Ignoring malformed notification event on %s", channel)
+            return
+        if op != "insert":
+            return
+        wanted = [row[0] for row in rows if self.wanted(row[1])]
+        if wanted:
+            self._pending_ids.extend(wanted)
+            self._pending.set()
+
+    async def _fetch_loop(self, delay: float) -> None:
+        """Load queued rows in one query per burst and publish them."""
+        while True:
+            await self._pending.wait()
+            await asyncio.sleep(delay)
+            ids, self._pending_ids = self._pending_ids, []
+            self._pending.clear()
+            try:
+                notifications = await self._store.get_many(ids)
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Loading %d streamed notifications failed: %s", len(ids), e)
+                continue
+            self.fetched += len(notifications)
+            notifications.sort(key=lambda n: (n.created_at, n.id))
+            self.publish(notifications)
+
+    async def _listen(self, dsn: str, channel: str) -> None:
+        """Hold a LISTEN connection, reconnecting after failures."""
+        while True:
+            closed = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(dsn)
+                connection.add_termination_listener(lambda c: closed.set())
+                await connection.add_listener(channel, self._on_notify)
+                try:
+                    await closed.wait()
+                finally:
+                    await connection.close()
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Notification event listener failed: %s", e)
+            await asyncio.sleep(5)
+
+    async def start(self, store: Optional[PostgresNotificationStore] = None) -> None:
+        """Start keep-alives and, when given the table store, the LISTEN bridge."""
+        if self._tasks:
+            return
+        settings = get_settings()
+        self._store = store
+        self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        if store is not None:
+            self._tasks.append(asyncio.create_task(
+                self._fetch_loop(settings.notification_stream_batch_delay_ms / 1000)
+            ))
+            self._tasks.append(asyncio.create_task(
+                self._listen(settings.database_url, NOTIFICATION_EVENT_CHANNEL)
+            ))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> NotificationStreamStats:
+        return NotificationStreamStats(
+            source="postgres" if self._store is not None else "memory",
+            connections=self.connections,
+            owners=sum(1 for owner in self._subscribers if owner is not ALL_OWNERS),
+            published=self.published,
+            frames_queued=self.frames_queued,
+            overflows=self.overflows,
+            fetched=self.fetched
+        )
+
+
+# Singleton instance
+notification_stream = NotificationBroker.from_settings()
@@ -1,286 +1,269 @@
-"""Mock Notification Service.
+"""Notification Service.
 
-Generates and manages notifications.
+Generates notifications from ``notification_rule`` (see
+``notification_rules.py``) and manages them through a notification store
+(see ``notification_store.py``): the ``notification`` table when a
+database is configured, an indexed in-memory store otherwise. Low,
+medium and high priority notifications are coalesced into per-owner,
+per-category digests (see ``notification_digests.py``).
 """
-from datetime import datetime, date, timedelta
+import asyncio
+from datetime import datetime, date, timezone
+import logging
+import time
 from typing import Optional
-import uuid
-import random
 
+import asyncpg
+
+from app.config import get_settings
+from app.db import get_pool
 from app.schemas.notifications import (
+    DigestFlushResponse,
+    DigestItemsResponse,
     Notification,
     NotificationGenerateRequest,
-    NotificationGenerateResponse
+    NotificationGenerateResponse,
+    NotificationRule,
+    NotificationSummary
 )
 from app.schemas.common import Priority
+from app.services.notification_rules import (
+    DEFAULT_RULES,
+    RULE_TYPES,
+    SampleRecords,
+    evaluate_rules,
+    load_rules
+)
+from app.services.notification_counters import notification_counters
+from app.services.notification_delivery import notification_delivery
+from app.services.notification_digests import DIGEST_TYPE, notification_digests
+from app.services.notification_stream import notification_stream
+from app.services.notification_store import (
+    InMemoryNotificationStore,
+    NotificationFilter,
+    PostgresNotificationStore
+)
 
+logger = logging.getLogger(__name__)
 
-# Notification templates
-NOTIFICATION_TYPES = {
-    "service_due": {
-        "titles": [
-            "Service Due Soon",
-            "Maintenance Reminder",
-            "Scheduled Service Approaching"
-        ],
-        "messages": [
-            "Your vehicle is due for {service_type} service on {date}.",
-            "Maintenance is recommended within the next {days} days.",
-            "Service milestone approaching at {mileage} miles."
-        ],
-        "priority": Priority.MEDIUM,
-        "category": "maintenance"
-    },
-    "insurance_expiring": {
-        "titles": [
-            "Insurance Expiring Soon",
-            "Policy Renewal Required",
-            "Insurance Coverage Alert"
-        ],
-        "messages": [
-            "Your insurance policy expires on {date}. Renew to maintain coverage.",
-            "Insurance renewal due in {days} days for your {vehicle}.",
-            "Action required: Insurance policy ending {date}."
-        ],
-        "priority": Priority.HIGH,
-        "category": "insurance"
-    },
-    "inspection_due": {
-        "titles": [
-            "Inspection Due",
-            "State Inspection Required",
-            "Inspection Expiring"
-        ],
-        "messages": [
-            "Vehicle inspection expires on {date}. Schedule soon.",
-            "Inspection due within {days} days to remain compliant.",
-            "Your {vehicle} needs inspection before {date}."
-        ],
-        "priority": Priority.HIGH,
-        "category": "compliance"
-    },
-    "warranty_expiring": {
-        "titles": [
-            "Warranty Expiring Soon",
-            "Extended Warranty Opportunity",
-            "Coverage Ending"
-        ],
-        "messages": [
-            "Your warranty expires on {date}. Consider extended coverage.",
-            "Warranty coverage ends in {days} days for your {vehicle}.",
-            "Last chance to extend warranty coverage before {date}."
-        ],
-        "priority": Priority.MEDIUM,
-        "category": "warranty"
-    },
-    "recall_notice": {
-        "titles": [
-            "Safety Recall Notice",
-            "Manufacturer Recall",
-            "Important Safety Alert"
-        ],
-        "messages": [
-            "Your vehicle has an open recall for {component}. Contact dealer immediately.",
-            "Safety recall issued. Schedule repair at your earliest convenience.",
-            "Action required: Your {vehicle} is affected by recall {recall_number}."
-        ],
-        "priority": Priority.URGENT,
-        "category": "safety"
-    },
-    "document_expiring": {
-        "titles": [
-            "Document Expiring",
-            "Registration Renewal Due",
-            "Document Update Required"
-        ],
-        "messages": [
-            "Your {document_type} expires on {date}. Update before expiration.",
-            "Registration renewal due in {days} days.",
-            "Document expires soon. Upload updated version."
-        ],
-        "priority": Priority.MEDIUM,
-        "category": "documents"
-    },
-    "payment_due": {
-        "titles": [
-            "Payment Due",
-            "Financing Payment Reminder",
-            "Payment Scheduled"
-        ],
-        "messages": [
-            "Payment of ${amount} due on {date}.",
-            "Your monthly payment is due in {days} days.",
-            "Reminder: Financing payment upcoming on {date}."
-        ],
-        "priority": Priority.HIGH,
-        "category": "financial"
-    },
-    "prediction_alert": {
-        "titles": [
-            "Maintenance Predicted",
-            "Proactive Service Recommended",
-            "Predictive Alert"
-        ],
-        "messages": [
-            "AI analysis suggests {service_type} service within {days} days.",
-            "Predictive maintenance: {component} may need attention soon.",
-            "Based on usage patterns, schedule service before {date}."
-        ],
-        "priority": Priority.MEDIUM,
-        "category": "ai_insights"
-    }
+# Rule types each generate request flag enables
+REQUEST_RULE_TYPES = {
+    "check_services": ("service_due",),
+    "check_insurance": ("insurance_expiring",),
+    "check_inspections": ("inspection_due",),
+    "check_warranties": ("warranty_expiring",),
+    "check_recalls": ("recall_notice",),
+    "check_documents": ("document_expiring",),
 }
 
 
-def _generate_mock_notification(
-    notification_type: str,
-    vehicle_id: Optional[str] = None,
-    owner_id: Optional[str] = None
-) -> Notification:
-    """Generate a mock notification."""
-    template = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["service_due"])
+class NotificationService:
+    """Rule-driven notification service."""
     
-    # Generate placeholder values
-    future_date = date.today() + timedelta(days=random.randint(7, 60))
-    values = {
-        "date": future_date.strftime("%B %d, %Y"),
-        "days": random.randint(7, 30),
-        "mileage": f"{random.randint(50, 150) * 1000:,}",
-        "vehicle": random.choice(["2022 Toyota Camry", "2021 Honda CR-V", "2023 Ford F-150"]),
-        "service_type": random.choice(["oil change", "brake inspection", "tire rotation"]),
-        "component": random.choice(["airbag", "fuel pump", "brake caliper"]),
-        "recall_number": f"23V-{random.randint(100, 999)}",
-        "document_type": random.choice(["registration", "title", "insurance card"]),
-        "amount": f"{random.randint(200, 800):.2f}"
-    }
+    def __init__(self):
+        self.store: InMemoryNotificationStore | PostgresNotificationStore = (
+            InMemoryNotificationStore(notification_counters)
+        )
+        self._sample: Optional[SampleRecords] = None
+        self._digest_task: Optional[asyncio.Task] = None
     
-    title = random.choice(template["titles"])
-    message = random.choice(template["messages"]).format(**values)
+    async def start(self) -> None:
+        """Attach the ``notification`` table as the store when a database is configured,
+        and start delivery, streaming, counter reconciliation and digest flushes."""
+        pool = await get_pool()
+        if pool is not None:
+            try:
+                await pool.fetchval("SELECT 1 FROM notification LIMIT 1")
+                self.store = PostgresNotificationStore(pool)
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Notification table unavailable, using memory: %s", e)
+        table = self.store if isinstance(self.store, PostgresNotificationStore) else None
+        await notification_delivery.start(table)
+        await notification_stream.start(table)
+        if table is not None:
+            notification_counters.start(pool)
+        if self._digest_task is None:
+            self._digest_task = asyncio.create_task(
+                self._digest_loop(get_settings().notification_digest_flush_seconds)
+            )
     
-    return Notification(
-        id=f"notif-{uuid.uuid4().hex[:8]}",
-        vehicle_id=vehicle_id or f"veh-{uuid.uuid4().hex[:8]}",
-        owner_id=owner_id or f"own-{uuid.uuid4().hex[:8]}",
-        title=title,
-        message=message,
-        priority=template["priority"],
-        notification_type=notification_type,
-        category=template["category"],
-        status="unread",
-        action_url=f"/{template['category']}",
-        action_label="View Details",
-        created_at=datetime.now()
-    )
-
-
-class NotificationService:
-    """Mock notification service."""
+    async def stop(self) -> None:
+        """Stop digest flushes, counter reconciliation, streaming and delivery."""
+        if self._digest_task is not None:
+            self._digest_task.cancel()
+            await asyncio.gather(self._digest_task, return_exceptions=True)
+            self._digest_task = None
+        await notification_counters.stop()
+        await notification_stream.stop()
+        await notification_delivery.stop()
     
-    def __init__(self):
-        self.notifications: list[Notification] = []
+    async def _publish(self, notifications: list[Notification]) -> list[Notification]:
+        """Store notifications, then deliver and stream those stored (in-memory store)."""
+        added = await self.store.add_many(notifications)
+        notification_delivery.submit(added)
+        notification_stream.publish(added)
+        return added
+    
+    async def _generate_in_memory(self, rules: list[NotificationRule]) -> list[Notification]:
+        """Evaluate rules against the sample fleet (mock mode, in-memory store only).
+        
+        Returns every new notification, including those held for a digest.
+        """
+        if not get_settings().use_mock_apis or self.store.name != "memory":
+            return []
+        if self._sample is None:
+            self._sample = SampleRecords.generate()
+        today = date.today()
+        # evaluate() adds the keys of what it generates, so hand it a copy;
+        # notifications waiting in or summarized by an unread digest count as unread
+        unread = set(self.store.unread_keys()) | notification_digests.open_keys()
+        generated = []
+        for rule in rules:
+            generated.extend(self._sample.evaluate(rule, today, unread))
+        await self._publish(notification_digests.submit(generated))
+        return generated
+    
+    async def _generate_sample(self) -> None:
+        """Fill an empty in-memory store with the sample fleet's notifications and digests."""
+        await self.generate(NotificationGenerateRequest())
+        await self.flush_digests(force=True)
     
     async def generate(
         self, request: NotificationGenerateRequest
     ) -> NotificationGenerateResponse:
-        """Generate notifications based on request."""
-        generated = []
-        by_type = {}
-        by_priority = {p.value: 0 for p in Priority}
-        
-        # Generate notifications for each enabled type
-        if request.check_services:
-            for _ in range(random.randint(1, 3)):
-                notif = _generate_mock_notification("service_due")
-                generated.append(notif)
-                by_type["service_due"] = by_type.get("service_due", 0) + 1
-                by_priority[notif.priority.value] += 1
-        
-        if request.check_insurance:
-            for _ in range(random.randint(0, 2)):
-                notif = _generate_mock_notification("insurance_expiring")
-                generated.append(notif)
-                by_type["insurance_expiring"] = by_type.get("insurance_expiring", 0) + 1
-                by_priority[notif.priority.value] += 1
-        
-        if request.check_inspections:
-            for _ in range(random.randint(0, 2)):
-                notif = _generate_mock_notification("inspection_due")
-                generated.append(notif)
-                by_type["inspection_due"] = by_type.get("inspection_due", 0) + 1
-                by_priority[notif.priority.value] += 1
+        """Evaluate the active notification rules the request enables.
         
-        if request.check_warranties:
-            for _ in range(random.randint(0, 1)):
-                notif = _generate_mock_notification("warranty_expiring")
-                generated.append(notif)
-                by_type["warranty_expiring"] = by_type.get("warranty_expiring", 0) + 1
-                by_priority[notif.priority.value] += 1
+        With a database every rule runs as one set-based statement that
+        inserts its notifications directly; otherwise the default rules
+        run against an in-memory sample fleet.
+        """
+        start = time.perf_counter()
+        enabled = {
+            rule_type
+            for flag, rule_types in REQUEST_RULE_TYPES.items() if getattr(request, flag)
+            for rule_type in rule_types
+        }
+        by_type: dict[str, int] = {}
+        by_priority = {p.value: 0 for p in Priority}
+        coalesced = 0
         
-        if request.check_recalls:
-            for _ in range(random.randint(0, 1)):
-                notif = _generate_mock_notification("recall_notice")
-                generated.append(notif)
-                by_type["recall_notice"] = by_type.get("recall_notice", 0) + 1
-                by_priority[notif.priority.value] += 1
+        pool = await get_pool() if self.store.name == "postgres" else None
+        rules = DEFAULT_RULES
+        if pool is not None:
+            try:
+                rules = await load_rules(pool)
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Notification rules unavailable, using defaults in memory: %s", e)
+                pool = None
+        rules = [rule for rule in rules if rule.rule_type in enabled]
+        skipped = [rule.name for rule in rules if rule.rule_type not in RULE_TYPES]
+        rules = [rule for rule in rules if rule.rule_type in RULE_TYPES]
         
-        if request.check_documents:
-            for _ in range(random.randint(0, 1)):
-                notif = _generate_mock_notification("document_expiring")
-                generated.append(notif)
-                by_type["document_expiring"] = by_type.get("document_expiring", 0) + 1
+        if pool is not None:
+            results = await evaluate_rules(pool, rules, notification_digests.coalesced_priorities())
+            for rule_type, result in results.items():
+                by_type[rule_type] = sum(result.by_priority.values())
+                for priority, count in result.by_priority.items():
+                    by_priority[priority] += count
+                coalesced += result.coalesced
+            notification_delivery.wake()
+        else:
+            for notif in await self._generate_in_memory(rules):
+                by_type[notif.notification_type] = by_type.get(notif.notification_type, 0) + 1
                 by_priority[notif.priority.value] += 1
-        
-        # Add prediction-based notification
-        if random.random() > 0.5:
-            notif = _generate_mock_notification("prediction_alert")
-            generated.append(notif)
-            by_type["prediction_alert"] = by_type.get("prediction_alert", 0) + 1
-            by_priority[notif.priority.value] += 1
-        
-        self.notifications.extend(generated)
+                if notif.priority.value in notification_digests.windows:
+                    coalesced += 1
         
         return NotificationGenerateResponse(
-            notifications_generated=len(generated),
+            notifications_generated=sum(by_type.values()),
             by_type=by_type,
-            by_priority=by_priority
+            by_priority=by_priority,
+            notifications_coalesced=coalesced,
+            rules_evaluated=len(rules),
+            rules_skipped=skipped,
+            generation_time_ms=int((time.perf_counter() - start) * 1000)
         )
     
     async def get_notifications(
         self,
         status: Optional[str] = None,
         priority: Optional[Priority] = None,
+        owner_id: Optional[str] = None,
         limit: int = 50
     ) -> list[Notification]:
-        """Get notifications with optional filters."""
+        """Get the newest notifications matching the filters."""
         # Generate some mock notifications if empty
-        if not self.notifications:
-            await self.generate(NotificationGenerateRequest())
-        
-        result = self.notifications.copy()
-        
-        if status:
-            result = [n for n in result if n.status == status]
-        if priority:
-            result = [n for n in result if n.priority == priority]
+        if self.store.name == "memory" and not len(self.store):
+            await self._generate_sample()
         
-        return sorted(result, key=lambda n: n.created_at, reverse=True)[:limit]
+        where = NotificationFilter(owner_id=owner_id, status=status, priority=priority)
+        return await self.store.list(where, limit)
+    
+    async def summary(self, owner_id: Optional[str] = None) -> NotificationSummary:
+        """Notification counts from the incrementally maintained counters."""
+        # Generate some mock notifications if empty
+        if self.store.name == "memory" and not len(self.store):
+            await self._generate_sample()
+        return notification_counters.summary(owner_id)
     
     async def mark_read(self, notification_id: str) -> bool:
         """Mark a notification as read."""
-        for notif in self.notifications:
-            if notif.id == notification_id:
-                notif.status = "read"
-                notif.read_at = datetime.now()
-                return True
-        return False
+        notification = await self.store.set_status(
+            notification_id, "read", datetime.now(timezone.utc)
+        )
+        self._status_changed(notification)
+        return notification is not None
     
     async def dismiss(self, notification_id: str) -> bool:
         """Dismiss a notification."""
-        for notif in self.notifications:
-            if notif.id == notification_id:
-                notif.status = "dismissed"
-                return True
-        return False
+        notification = await self.store.set_status(
+            notification_id, "dismissed", datetime.now(timezone.utc)
+        )
+        self._status_changed(notification)
+        return notification is not None
+    
+    @staticmethod
+    def _status_changed(notification: Optional[Notification]) -> None:
+        # A digest that is no longer unread stops suppressing its items
+        # (the table does this with a trigger)
+        if notification is not None and notification.notification_type == DIGEST_TYPE:
+            notification_digests.closed(notification.id)
+    
+    async def flush_digests(self, force: bool = False) -> DigestFlushResponse:
+        """Turn coalesced notifications whose window has passed (all when ``force``) into digests."""
+        if self.store.name == "postgres":
+            pool = await get_pool()
+            result = await notification_digests.flush_table(pool, force)
+            if result.digests:
+                notification_delivery.wake()
+            return result
+        digests = notification_digests.flush(force=force)
+        await self._publish(digests)
+        return DigestFlushResponse(
+            digests=len(digests),
+            items=sum(digest.metadata["items"] for digest in digests)
+        )
+    
+    async def _digest_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await self.flush_digests()
+                if result.digests:
+                    logger.info(
+                        "Sent %d notification digests covering %d notifications",
+                        result.digests, result.items
+                    )
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Notification digest flush failed: %s", e)
+            except Exception:
+                logger.exception("Notification digest flush failed")
+    
+    async def digest_items(self, notification_id: str, limit: int) -> Optional[DigestItemsResponse]:
+        """Per-vehicle items of a digest notification; ``None`` if it is not a digest."""
+        if self.store.name == "postgres":
+            return await notification_digests.table_items(await get_pool(), notification_id, limit)
+        return notification_digests.items(notification_id, limit)
 
 
 # Singleton instance
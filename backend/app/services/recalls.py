@@ -215,19 +215,32 @@ class RecallMatchingService:
         self,
         vehicles: list[dict]
     ) -> RecallCheckResponse:
-        """Check multiple vehicles for recalls."""
+        """Check multiple vehicles for recalls.
+        
+        Recalls are looked up once per distinct make, model and year.
+        """
         matches = []
+        recalls_by_vehicle: dict[tuple, list[RecallInfo]] = {}
         
         for v in vehicles:
-            match = await self.check_vehicle(
-                vehicle_id=v.get("id", v.get("vehicle_id", "")),
-                vin=v.get("vin", ""),
-                manufacturer=v.get("manufacturer", ""),
-                model=v.get("model", ""),
-                year=v.get("year", 2020)
-            )
-            if match:
-                matches.append(match)
+            manufacturer = v.get("manufacturer", "")
+            model = v.get("model", "")
+            year = v.get("year", 2020)
+            key = (manufacturer, model, year)
+            if key not in recalls_by_vehicle:
+                recalls_by_vehicle[key] = _find_matching_recalls(manufacturer, model, year)
+            recalls = recalls_by_vehicle[key]
+            if recalls:
+                matches.append(VehicleRecallMatch(
+                    vehicle_id=v.get("id", v.get("vehicle_id", "")),
+                    vin=v.get("vin", ""),
+                    manufacturer=manufacturer,
+                    model=model,
+                    year=year,
+                    recalls=recalls,
+                    priority=_calculate_priority(recalls),
+                    total_recalls=len(recalls)
+                ))
         
         total_recalls = sum(m.total_recalls for m in matches)
         
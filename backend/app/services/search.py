@@ -6,208 +6,472 @@ import re
 from typing import Optional, Any
 from datetime import date, timedelta
 
+from dateutil.relativedelta import relativedelta
+
 from app.schemas.search import (
     NLSearchRequest,
     NLSearchResponse,
     ParsedQuery,
-    ParsedFilter
+    ParsedFilter,
+    SearchCacheStatsResponse
 )
+from app.services.search_cache import normalize_query, parse_cache, plan_cache
+from app.services.search_executor import compile_query
+from app.services.search_rollups import plan_aggregate
+
 
+# Query phrases are matched on word tokens. "<num>" matches a number
+# token (commas allowed) whose value is captured for the filter.
 
-# Entity detection patterns
+# Entity detection phrases, in priority order
 ENTITY_PATTERNS = {
     "vehicle": [
-        r"vehicle[s]?", r"car[s]?", r"truck[s]?", r"suv[s]?", r"auto[s]?"
+        "vehicle", "vehicles", "car", "cars", "truck", "trucks",
+        "suv", "suvs", "auto", "autos"
     ],
     "owner": [
-        r"owner[s]?", r"customer[s]?", r"client[s]?"
+        "owner", "owners", "customer", "customers", "client", "clients"
     ],
     "service_record": [
-        r"service[s]?", r"maintenance", r"repair[s]?", r"service record[s]?"
+        "service", "services", "maintenance", "repair", "repairs",
+        "service record", "service records"
     ],
     "inspection": [
-        r"inspection[s]?", r"emission[s]?"
+        "inspection", "inspections", "emission", "emissions"
     ],
     "insurance_policy": [
-        r"insurance", r"polic(?:y|ies)", r"coverage"
+        "insurance", "policy", "policies", "coverage"
     ],
     "warranty": [
-        r"warrant(?:y|ies)"
+        "warranty", "warranties"
     ],
     "recall": [
-        r"recall[s]?"
+        "recall", "recalls"
     ],
     "accident": [
-        r"accident[s]?", r"crash(?:es)?", r"collision[s]?"
+        "accident", "accidents", "crash", "crashes", "collision", "collisions"
     ],
     "fuel_record": [
-        r"fuel", r"gas", r"mileage"
+        "fuel", "gas", "mileage"
     ]
 }
 
-# Field detection patterns
+# Field detection phrases
 FIELD_PATTERNS = {
     "status": [
-        (r"active", "active"),
-        (r"sold", "sold"),
-        (r"overdue", "overdue"),
-        (r"expired", "expired"),
-        (r"pending", "pending"),
-        (r"completed", "completed"),
-    ],
-    "year": [
-        (r"(\d{4})", None),  # Extract the year
+        ("active", "active"),
+        ("sold", "sold"),
+        ("overdue", "overdue"),
+        ("expired", "expired"),
+        ("pending", "pending"),
+        ("completed", "completed"),
     ],
     "mileage": [
-        (r"over (\d+(?:,\d+)?)\s*(?:miles|mi)", "gt"),
-        (r"under (\d+(?:,\d+)?)\s*(?:miles|mi)", "lt"),
-        (r"high mileage", "gt:100000"),
-        (r"low mileage", "lt:50000"),
+        ("over <num> miles", "gt"),
+        ("over <num> mi", "gt"),
+        ("under <num> miles", "lt"),
+        ("under <num> mi", "lt"),
+        ("high mileage", "gt:100000"),
+        ("low mileage", "lt:50000"),
     ],
     "manufacturer": [
-        (r"toyota", "Toyota"),
-        (r"honda", "Honda"),
-        (r"ford", "Ford"),
-        (r"chevrolet|chevy", "Chevrolet"),
-        (r"bmw", "BMW"),
-        (r"mercedes", "Mercedes-Benz"),
-        (r"tesla", "Tesla"),
-        (r"nissan", "Nissan"),
-        (r"jeep", "Jeep"),
+        ("toyota", "Toyota"),
+        ("honda", "Honda"),
+        ("ford", "Ford"),
+        ("chevrolet", "Chevrolet"),
+        ("chevy", "Chevrolet"),
+        ("bmw", "BMW"),
+        ("mercedes", "Mercedes-Benz"),
+        ("tesla", "Tesla"),
+        ("nissan", "Nissan"),
+        ("jeep", "Jeep"),
+        ("toyotas", "Toyota"),
+        ("hondas", "Honda"),
+        ("fords", "Ford"),
+        ("chevys", "Chevrolet"),
+        ("bmws", "BMW"),
+        ("teslas", "Tesla"),
+        ("nissans", "Nissan"),
+        ("jeeps", "Jeep"),
+    ],
+    "service_type": [
+        ("repair", "repair"),
+        ("repairs", "repair"),
+        ("maintenance", "maintenance"),
     ],
     "date_range": [
-        (r"this month", "this_month"),
-        (r"last month", "last_month"),
-        (r"this year", "this_year"),
-        (r"last year", "last_year"),
-        (r"past (\d+) days?", "days"),
-        (r"past (\d+) weeks?", "weeks"),
-        (r"past (\d+) months?", "months"),
+        ("this month", "this_month"),
+        ("last month", "last_month"),
+        ("this year", "this_year"),
+        ("last year", "last_year"),
+        ("past <num> days", "days"),
+        ("past <num> day", "days"),
+        ("past <num> weeks", "weeks"),
+        ("past <num> week", "weeks"),
+        ("past <num> months", "months"),
+        ("past <num> month", "months"),
     ]
 }
 
-# Intent patterns
+# Intent phrases, in priority order
 INTENT_PATTERNS = [
-    (r"how many|count|total number", "count"),
-    (r"list|show|find|get|display", "search"),
-    (r"compare", "compare"),
-    (r"average|sum|total cost", "aggregate"),
+    ("how many", "count"),
+    ("count", "count"),
+    ("total number", "count"),
+    ("number of", "count"),
+    ("average", "aggregate"),
+    ("avg", "aggregate"),
+    ("mean", "aggregate"),
+    ("sum", "aggregate"),
+    ("total cost", "aggregate"),
+    ("total", "total"),  # An aggregate only when paired with a metric (see _lex)
+    ("minimum", "aggregate"),
+    ("maximum", "aggregate"),
+    ("list", "search"),
+    ("show", "search"),
+    ("find", "search"),
+    ("get", "search"),
+    ("display", "search"),
+    ("compare", "compare"),
+]
+
+# Aggregate function phrases, in priority order
+AGGREGATE_PATTERNS = [
+    ("average", "avg"),
+    ("avg", "avg"),
+    ("mean", "avg"),
+    ("sum", "sum"),
+    ("total", "sum"),
+    ("minimum", "min"),
+    ("cheapest", "min"),
+    ("maximum", "max"),
+    ("most expensive", "max"),
+]
+
+# Aggregated metric phrases, in priority order
+METRIC_PATTERNS = [
+    ("labor", "labor_cost"),
+    ("labour", "labor_cost"),
+    ("cost", "total_cost"),
+    ("costs", "total_cost"),
+    ("price", "total_cost"),
+    ("spend", "total_cost"),
+    ("spent", "total_cost"),
+    ("spending", "total_cost"),
+    ("value", "current_value"),
+    ("mileage", "mileage"),
+    ("miles", "mileage"),
 ]
 
+# Sort hint phrases: (phrase, hint)
+SORT_PATTERNS = [
+    ("newest", "newest"),
+    ("recent", "newest"),
+    ("recently", "newest"),
+    ("oldest", "oldest"),
+    ("highest", "highest"),
+    ("lowest", "lowest"),
+]
+
+# Other flag phrases
+FLAG_PATTERNS = [
+    ("overdue", "overdue"),
+    ("expiring", "expiring"),
+    ("expires soon", "expiring"),
+    ("mileage", "mileage"),
+]
+
+NUMBER_TOKEN = "<num>"
+
+DEFAULT_PAGE_SIZE = 50
+
+# One regex scan splits the query into number and word tokens;
+# a "k" suffix means thousands ("100k miles"), a "$" prefix an amount
+_TOKEN_RE = re.compile(r"(\$)?(\d[\d,]*)(k\b)?|([a-z][a-z0-9\-]*)")
+_YEAR_RE = re.compile(r"20\d{2}")
+
+# A number next to these words is a quantity or bound, not a model year
+_UNIT_WORDS = frozenset({"mi", "mile", "miles", "dollars", "usd", "days", "weeks", "months"})
+_COMPARISON_WORDS = frozenset({
+    "over", "under", "above", "below", "than", "least", "most", "past", "last"
+})
+
 
-def _detect_entity(query: str) -> str:
-    """Detect the main entity being queried."""
-    query_lower = query.lower()
+def _build_phrase_trie() -> dict:
+    """Compile all phrase tables into one token trie.
     
-    for entity, patterns in ENTITY_PATTERNS.items():
-        for pattern in patterns:
-            if re.search(pattern, query_lower):
-                return entity
+    Each trie node maps a token (or NUMBER_TOKEN) to a child node; the
+    special key None holds the actions of phrases ending at that node.
+    Actions are (kind, rank, payload) tuples, where rank is the phrase's
+    position in its table so table priority is preserved.
+    """
+    trie: dict = {}
     
-    return "vehicle"  # Default to vehicle
+    def add(phrase: str, action: tuple) -> None:
+        node = trie
+        for token in phrase.split():
+            node = node.setdefault(token, {})
+        node.setdefault(None, []).append(action)
+    
+    rank = 0
+    for entity, phrases in ENTITY_PATTERNS.items():
+        for phrase in phrases:
+            add(phrase, ("entity", rank, entity))
+        rank += 1
+    for kind, entries in FIELD_PATTERNS.items():
+        for rank, (phrase, value) in enumerate(entries):
+            add(phrase, (kind, rank, value))
+    for rank, (phrase, intent) in enumerate(INTENT_PATTERNS):
+        add(phrase, ("intent", rank, intent))
+    for rank, (phrase, hint) in enumerate(SORT_PATTERNS):
+        add(phrase, ("sort", rank, hint))
+    for rank, (phrase, flag) in enumerate(FLAG_PATTERNS):
+        add(phrase, ("flag", rank, flag))
+    for rank, (phrase, function) in enumerate(AGGREGATE_PATTERNS):
+        add(phrase, ("aggregate", rank, function))
+    for rank, (phrase, field) in enumerate(METRIC_PATTERNS):
+        add(phrase, ("metric", rank, field))
+    return trie
+
 
+_PHRASE_TRIE = _build_phrase_trie()
 
-def _detect_intent(query: str) -> str:
-    """Detect the query intent."""
-    query_lower = query.lower()
+
+class _Lexed:
+    """Everything extracted from a query in one pass over its tokens."""
+    
+    __slots__ = (
+        "entity", "entity_rank", "intent", "intent_rank", "total_rank", "statuses",
+        "year", "mileage", "manufacturer", "manufacturer_rank",
+        "date_range", "date_range_rank", "service_type", "service_type_rank",
+        "aggregate", "aggregate_rank", "metric", "metric_rank",
+        "flags", "sort_hints"
+    )
     
-    for pattern, intent in INTENT_PATTERNS:
-        if re.search(pattern, query_lower):
-            return intent
+    def __init__(self):
+        self.entity = "vehicle"  # Default to vehicle
+        self.entity_rank = len(ENTITY_PATTERNS)
+        self.intent = "search"
+        self.intent_rank = len(INTENT_PATTERNS)
+        self.total_rank = len(INTENT_PATTERNS)
+        self.statuses: dict[int, str] = {}
+        self.year: Optional[int] = None
+        self.mileage: dict[int, tuple[str, int]] = {}
+        self.manufacturer: Optional[str] = None
+        self.manufacturer_rank = len(FIELD_PATTERNS["manufacturer"])
+        self.date_range: Optional[tuple[str, Optional[int]]] = None
+        self.date_range_rank = len(FIELD_PATTERNS["date_range"])
+        self.service_type: Optional[str] = None
+        self.service_type_rank = len(FIELD_PATTERNS["service_type"])
+        self.aggregate: Optional[str] = None
+        self.aggregate_rank = len(AGGREGATE_PATTERNS)
+        self.metric: Optional[str] = None
+        self.metric_rank = len(METRIC_PATTERNS)
+        self.flags: set[str] = set()
+        self.sort_hints: set[str] = set()
     
-    return "search"
+    def apply(self, action: tuple, number: Optional[int]) -> None:
+        kind, rank, payload = action
+        if kind == "entity":
+            if rank < self.entity_rank:
+                self.entity, self.entity_rank = payload, rank
+        elif kind == "intent":
+            if payload == "total":
+                self.total_rank = min(self.total_rank, rank)
+            elif rank < self.intent_rank:
+                self.intent, self.intent_rank = payload, rank
+        elif kind == "status":
+            self.statuses.setdefault(rank, payload)
+        elif kind == "mileage":
+            if rank not in self.mileage:
+                if ":" in payload:
+                    op, value = payload.split(":")
+                    self.mileage[rank] = (op, int(value))
+                elif number is not None:
+                    self.mileage[rank] = (payload, number)
+        elif kind == "manufacturer":
+            if rank < self.manufacturer_rank:
+                self.manufacturer, self.manufacturer_rank = payload, rank
+        elif kind == "date_range":
+            if rank < self.date_range_rank:
+                self.date_range, self.date_range_rank = (payload, number), rank
+        elif kind == "service_type":
+            if rank < self.service_type_rank:
+                self.service_type, self.service_type_rank = payload, rank
+        elif kind == "aggregate":
+            if rank < self.aggregate_rank:
+                self.aggregate, self.aggregate_rank = payload, rank
+        elif kind == "metric":
+            if rank < self.metric_rank:
+                self.metric, self.metric_rank = payload, rank
+        elif kind == "sort":
+            self.sort_hints.add(payload)
+        elif kind == "flag":
+            self.flags.add(payload)
 
 
-def _extract_filters(query: str, entity: str) -> list[ParsedFilter]:
-    """Extract filters from the query."""
-    filters = []
-    query_lower = query.lower()
+def _lex(query: str) -> _Lexed:
+    """Tokenize a query once and match every phrase table in one pass."""
+    lexed = _Lexed()
+    tokens: list[str] = []
+    numbers: list[Optional[int]] = []
+    year_positions: list[int] = []  # Bare four-digit 20xx numbers
     
-    # Status filters
-    for pattern, value in FIELD_PATTERNS["status"]:
-        if re.search(pattern, query_lower):
-            filters.append(ParsedFilter(
-                field="status",
-                operator="eq",
-                value=value
-            ))
+    for dollar, number, thousands, word in _TOKEN_RE.findall(query.lower()):
+        if number:
+            if not dollar and not thousands and _YEAR_RE.fullmatch(number):
+                year_positions.append(len(tokens))
+            tokens.append(NUMBER_TOKEN)
+            value = int(number.replace(",", ""))
+            if thousands:
+                value *= 1000
+            numbers.append(value)
+        else:
+            tokens.append(word)
+            numbers.append(None)
     
-    # Year filter
-    year_match = re.search(r"\b(20\d{2})\b", query)
-    if year_match:
+    count = len(tokens)
+    consumed: set[int] = set()  # Number positions captured by a matched phrase
+    for start, token in enumerate(tokens):
+        node = _PHRASE_TRIE.get(token)
+        position = start
+        number = numbers[start]
+        while node is not None:
+            actions = node.get(None)
+            if actions:
+                for action in actions:
+                    lexed.apply(action, number)
+                consumed.update(
+                    i for i in range(start, position + 1) if numbers[i] is not None
+                )
+            position += 1
+            if position == count:
+                break
+            node = node.get(tokens[position])
+            if numbers[position] is not None:
+                number = numbers[position]
+    
+    for position in year_positions:
+        if position in consumed:
+            continue
+        if position + 1 < count and tokens[position + 1] in _UNIT_WORDS:
+            continue
+        if position > 0 and tokens[position - 1] in _COMPARISON_WORDS:
+            continue
+        lexed.year = numbers[position]
+        break
+    
+    # "total mileage" asks for a sum; in "show total vehicles" it is just a word
+    if lexed.metric is not None and lexed.total_rank < lexed.intent_rank:
+        lexed.intent, lexed.intent_rank = "aggregate", lexed.total_rank
+    
+    return lexed
+
+
+def _date_range_filters(
+    range_type: str,
+    amount: Optional[int],
+    today: date
+) -> list[ParsedFilter]:
+    """Resolve a relative date range against today's date."""
+    if range_type == "this_month":
+        return [ParsedFilter(
+            field="created_at",
+            operator="gte",
+            value=today.replace(day=1).isoformat()
+        )]
+    if range_type == "last_month":
+        first_of_month = today.replace(day=1)
+        last_month_end = first_of_month - timedelta(days=1)
+        last_month_start = last_month_end.replace(day=1)
+        return [
+            ParsedFilter(
+                field="created_at",
+                operator="gte",
+                value=last_month_start.isoformat()
+            ),
+            ParsedFilter(
+                field="created_at",
+                operator="lte",
+                value=last_month_end.isoformat()
+            ),
+        ]
+    if range_type == "this_year":
+        return [ParsedFilter(
+            field="created_at",
+            operator="gte",
+            value=today.replace(month=1, day=1).isoformat()
+        )]
+    if range_type == "last_year":
+        return [
+            ParsedFilter(
+                field="created_at",
+                operator="gte",
+                value=date(today.year - 1, 1, 1).isoformat()
+            ),
+            ParsedFilter(
+                field="created_at",
+                operator="lte",
+                value=date(today.year - 1, 12, 31).isoformat()
+            ),
+        ]
+    if amount is None:
+        return []
+    if range_type == "days":
+        start = today - timedelta(days=amount)
+    elif range_type == "weeks":
+        start = today - timedelta(weeks=amount)
+    elif range_type == "months":
+        start = today - relativedelta(months=amount)
+    else:
+        return []
+    return [ParsedFilter(
+        field="created_at",
+        operator="gte",
+        value=start.isoformat()
+    )]
+
+
+def _build_filters(lexed: _Lexed, today: date) -> list[ParsedFilter]:
+    """Turn lexed query features into filters."""
+    filters = [
+        ParsedFilter(field="status", operator="eq", value=value)
+        for _, value in sorted(lexed.statuses.items())
+    ]
+    
+    if lexed.year is not None:
         filters.append(ParsedFilter(
             field="year",
             operator="eq",
-            value=int(year_match.group(1))
+            value=lexed.year
         ))
     
-    # Mileage filters
-    for pattern, op_type in FIELD_PATTERNS["mileage"]:
-        match = re.search(pattern, query_lower)
-        if match:
-            if ":" in str(op_type):
-                op, val = op_type.split(":")
-                filters.append(ParsedFilter(
-                    field="mileage",
-                    operator=op,
-                    value=int(val)
-                ))
-            elif match.groups():
-                mileage_val = int(match.group(1).replace(",", ""))
-                filters.append(ParsedFilter(
-                    field="mileage",
-                    operator=op_type,
-                    value=mileage_val
-                ))
+    for _, (op, value) in sorted(lexed.mileage.items()):
+        filters.append(ParsedFilter(
+            field="mileage",
+            operator=op,
+            value=value
+        ))
     
-    # Manufacturer filter
-    for pattern, value in FIELD_PATTERNS["manufacturer"]:
-        if re.search(pattern, query_lower):
-            filters.append(ParsedFilter(
-                field="manufacturer",
-                operator="eq",
-                value=value
-            ))
-            break
+    if lexed.manufacturer is not None:
+        filters.append(ParsedFilter(
+            field="manufacturer",
+            operator="eq",
+            value=lexed.manufacturer
+        ))
     
-    # Date range filters
-    today = date.today()
-    for pattern, range_type in FIELD_PATTERNS["date_range"]:
-        match = re.search(pattern, query_lower)
-        if match:
-            if range_type == "this_month":
-                start = today.replace(day=1)
-                filters.append(ParsedFilter(
-                    field="created_at",
-                    operator="gte",
-                    value=start.isoformat()
-                ))
-            elif range_type == "last_month":
-                first_of_month = today.replace(day=1)
-                last_month_end = first_of_month - timedelta(days=1)
-                last_month_start = last_month_end.replace(day=1)
-                filters.append(ParsedFilter(
-                    field="created_at",
-                    operator="gte",
-                    value=last_month_start.isoformat()
-                ))
-                filters.append(ParsedFilter(
-                    field="created_at",
-                    operator="lte",
-                    value=last_month_end.isoformat()
-                ))
-            elif range_type == "days" and match.groups():
-                days = int(match.group(1))
-                start = today - timedelta(days=days)
-                filters.append(ParsedFilter(
-                    field="created_at",
-                    operator="gte",
-                    value=start.isoformat()
-                ))
-            break
+    if lexed.service_type is not None and lexed.entity == "service_record":
+        filters.append(ParsedFilter(
+            field="service_type",
+            operator="eq",
+            value=lexed.service_type
+        ))
+    
+    if lexed.date_range is not None:
+        filters.extend(_date_range_filters(*lexed.date_range, today))
     
     # Overdue inspection filter
-    if "overdue" in query_lower and entity == "inspection":
+    if "overdue" in lexed.flags and lexed.entity == "inspection":
         filters.append(ParsedFilter(
             field="expiration_date",
             operator="lt",
@@ -215,7 +479,7 @@ def _extract_filters(query: str, entity: str) -> list[ParsedFilter]:
         ))
     
     # Expiring soon filter
-    if "expiring" in query_lower or "expires soon" in query_lower:
+    if "expiring" in lexed.flags:
         filters.append(ParsedFilter(
             field="expiration_date",
             operator="lte",
@@ -230,33 +494,18 @@ def _extract_filters(query: str, entity: str) -> list[ParsedFilter]:
     return filters
 
 
-def _generate_sql_equivalent(parsed: ParsedQuery) -> str:
-    """Generate SQL-like query for explanation."""
-    sql = f"SELECT * FROM {parsed.entity}"
-    
-    if parsed.filters:
-        conditions = []
-        for f in parsed.filters:
-            op_map = {
-                "eq": "=",
-                "gt": ">",
-                "lt": "<",
-                "gte": ">=",
-                "lte": "<=",
-                "contains": "LIKE"
-            }
-            op = op_map.get(f.operator, "=")
-            val = f"'{f.value}'" if isinstance(f.value, str) else f.value
-            conditions.append(f"{f.field} {op} {val}")
-        sql += " WHERE " + " AND ".join(conditions)
-    
-    if parsed.sort_field:
-        sql += f" ORDER BY {parsed.sort_field} {parsed.sort_direction.upper()}"
-    
-    if parsed.limit:
-        sql += f" LIMIT {parsed.limit}"
-    
-    return sql
+def _sort_from_hints(lexed: _Lexed) -> tuple[Optional[str], str]:
+    """Pick the sort field and direction from lexed sort hints."""
+    hints = lexed.sort_hints
+    if "newest" in hints:
+        return "created_at", "desc"
+    if "oldest" in hints:
+        return "created_at", "asc"
+    if "highest" in hints and "mileage" in lexed.flags:
+        return "mileage", "desc"
+    if "lowest" in hints and "mileage" in lexed.flags:
+        return "mileage", "asc"
+    return None, "desc"
 
 
 def _generate_suggestions(query: str, entity: str) -> list[str]:
@@ -285,38 +534,75 @@ def _generate_suggestions(query: str, entity: str) -> list[str]:
     return suggestions[:3]
 
 
+def _is_date_relative(lexed: _Lexed) -> bool:
+    """Check whether a query's filters depend on today's date."""
+    return lexed.date_range is not None or bool(lexed.flags & {"overdue", "expiring"})
+
+
+class _CachedParse:
+    """A cached parse with what is needed to re-resolve its dates."""
+    
+    __slots__ = ("response", "lexed", "resolved_on")
+    
+    def __init__(self, response: NLSearchResponse, lexed: _Lexed, resolved_on: date):
+        self.response = response
+        self.lexed = lexed
+        self.resolved_on = resolved_on
+
+
 class NaturalLanguageSearchService:
     """Mock natural language search service."""
     
+    def __init__(self):
+        self.date_refreshes = 0
+    
     async def parse(self, request: NLSearchRequest) -> NLSearchResponse:
-        """Parse a natural language query."""
-        query = request.query.strip()
+        """Parse a natural language query.
         
-        # Detect main entity
-        entity = _detect_entity(query)
-        
-        # Detect intent
-        intent = _detect_intent(query)
-        
-        # Extract filters
-        filters = _extract_filters(query, entity)
+        Results are cached by normalized query text. Relative date
+        filters are rebuilt from the cached lex result when the day
+        has changed since the entry was resolved.
+        """
+        query = request.query.strip()
+        key = (normalize_query(query), request.max_results)
+        today = date.today()
         
-        # Determine sort
-        sort_field = None
-        sort_direction = "desc"
+        cached = parse_cache.get(key)
+        if cached is not None:
+            if cached.resolved_on != today and _is_date_relative(cached.lexed):
+                cached.response = self._build_response(
+                    query, cached.lexed, request.max_results, today
+                )
+                cached.resolved_on = today
+                self.date_refreshes += 1
+            return cached.response.model_copy(update={"original_query": query})
         
-        if "newest" in query.lower() or "recent" in query.lower():
-            sort_field = "created_at"
-            sort_direction = "desc"
-        elif "oldest" in query.lower():
-            sort_field = "created_at"
-            sort_direction = "asc"
-        elif "highest" in query.lower() and "mileage" in query.lower():
-            sort_field = "mileage"
-            sort_direction = "desc"
-        elif "lowest" in query.lower() and "mileage" in query.lower():
-            sort_field = "mileage"
-            sort_direction = "asc"
+        # Entity, intent, filter and sort features in a single pass
+        lexed = _lex(key[0])
+        response = self._build_response(query, lexed, request.max_results, today)
+        parse_cache.put(key, _CachedParse(response, lexed, today))
+        return response
+    
+    def cache_stats(self) -> SearchCacheStatsResponse:
+        """Get parse-result and query-plan cache metrics."""
+        return SearchCacheStatsResponse(
+            parse=parse_cache.stats(),
+            plans=plan_cache.stats(),
+            date_refreshes=self.date_refreshes
+        )
+    
+    def _build_response(
+        self,
+        query: str,
+        lexed: _Lexed,
+        max_results: int,
+        today: date
+    ) -> NLSearchResponse:
+        """Build the parse response from lexed query features."""
+        entity = lexed.entity
+        intent = lexed.intent
+        filters = _build_filters(lexed, today)
+        sort_field, sort_direction = _sort_from_hints(lexed)
         
         # Determine joins
         joins = []
@@ -325,6 +611,13 @@ class NaturalLanguageSearchService:
                 joins.append("vehicle_model")
                 joins.append("manufacturer")
         
+        # Count and aggregate intents produce a single value
+        aggregate_function = None
+        if intent == "count":
+            aggregate_function = "count"
+        elif intent == "aggregate":
+            aggregate_function = lexed.aggregate or "avg"
+        
         # Build parsed query
         parsed = ParsedQuery(
             entity=entity,
@@ -332,12 +625,17 @@ class NaturalLanguageSearchService:
             joins=joins,
             sort_field=sort_field,
             sort_direction=sort_direction,
-            limit=request.max_results,
-            intent=intent
+            limit=max_results,
+            intent=intent,
+            aggregate_function=aggregate_function,
+            aggregate_field=lexed.metric if intent == "aggregate" else None
         )
         
-        # Generate SQL equivalent
-        sql = _generate_sql_equivalent(parsed)
+        # Parameterized SQL the executor would run for this query
+        if aggregate_function:
+            sql = plan_aggregate(parsed).sql
+        else:
+            sql = compile_query(parsed, parsed.limit or DEFAULT_PAGE_SIZE).sql
         
         # Generate explanation
         explanation = f"Searching {entity.replace('_', ' ')}s"
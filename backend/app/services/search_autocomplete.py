@@ -0,0 +1,308 @@
+"""Search Autocomplete.
+
+Type-ahead completions for the SmartSearch box. Phrases come from three
+sources: manufacturer and model names weighted by how many vehicles use
+them, recent successful queries in ``nl_query_log`` weighted by how often
+they were run, and the field vocabulary the parser understands. They are
+stored in a compressed prefix (radix) trie whose nodes carry their top-k
+completions, so a lookup costs one walk down the typed prefix.
+
+The trie is rebuilt in the background and swapped in atomically; lookups
+never see a partially built trie.
+"""
+import asyncio
+from dataclasses import dataclass
+import heapq
+from itertools import islice
+import logging
+from typing import Iterable, Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.db import get_pool
+from app.services.search import FIELD_PATTERNS, NUMBER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each phrase source; weights within a source are
+# scaled to [0, 1] first so large fleets do not drown out query history
+SOURCE_WEIGHTS = {
+    "query": 1.0,
+    "name": 0.6,
+    "vocabulary": 0.3,
+}
+
+MAX_PHRASE_LENGTH = 120
+
+_NAMES_SQL = """
+    SELECT m.name AS manufacturer, vm.name AS model, count(v.id) AS vehicles
+    FROM vehicle_model vm
+    JOIN manufacturer m ON m.id = vm.manufacturer_id
+    LEFT JOIN vehicle v ON v.vehicle_model_id = vm.id
+    GROUP BY m.name, vm.name
+"""
+
+_QUERIES_SQL = """
+    SELECT min(original_query) AS query, count(*) AS uses
+    FROM nl_query_log
+    WHERE was_successful AND created_at > now() - make_interval(days => $1)
+    GROUP BY lower(btrim(original_query))
+    ORDER BY uses DESC
+    LIMIT $2
+"""
+
+
+@dataclass(frozen=True)
+class Completion:
+    """A suggested phrase and its ranking weight."""
+    text: str
+    weight: float
+
+
+def _sort_key(completion: Completion) -> tuple:
+    return (-completion.weight, len(completion.text), completion.text)
+
+
+def normalize_prefix(text: str) -> str:
+    """Lowercase and collapse whitespace, keeping one trailing space.
+
+    The trailing space matters while typing: "ford " should only complete
+    to phrases that continue past the word "ford".
+    """
+    key = " ".join(text.lower().split())
+    if key and text[-1:].isspace():
+        key += " "
+    return key
+
+
+class _Node:
+    __slots__ = ("label", "children", "completion", "top")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.children: dict[str, "_Node"] = {}
+        self.completion: Optional[Completion] = None
+        self.top: tuple[Completion, ...] = ()
+
+
+class PrefixTrie:
+    """Compressed prefix trie with precomputed top-k completions per node.
+
+    Built once from a phrase -> completion mapping and read-only afterwards.
+    """
+
+    def __init__(self, phrases: dict[str, Completion], top_k: int):
+        self.top_k = top_k
+        self._root = _Node("")
+        for key, completion in phrases.items():
+            self._insert(key, completion)
+        self._finalize(self._root)
+        self._size = len(phrases)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _insert(self, key: str, completion: Completion) -> None:
+        node, i = self._root, 0
+        while i < len(key):
+            child = node.children.get(key[i])
+            if child is None:
+                leaf = _Node(key[i:])
+                leaf.completion = completion
+                node.children[key[i]] = leaf
+                return
+            label = child.label
+            common = 0
+            limit = min(len(label), len(key) - i)
+            while common < limit and label[common] == key[i + common]:
+                common += 1
+            if common < len(label):
+                # Split the edge where the key diverges from it
+                middle = _Node(label[:common])
+                child.label = label[common:]
+                middle.children[child.label[0]] = child
+                node.children[key[i]] = middle
+                child = middle
+            node = child
+            i += common
+        node.completion = completion
+
+    def _finalize(self, node: _Node) -> None:
+        """Compute each node's top-k from its own phrase and its children's."""
+        ranked = []
+        if node.completion is not None:
+            ranked.append((node.completion,))
+        for child in node.children.values():
+            self._finalize(child)
+            ranked.append(child.top)
+        node.top = tuple(islice(heapq.merge(*ranked, key=_sort_key), self.top_k))
+
+    def lookup(self, prefix: str) -> tuple[Completion, ...]:
+        """Top-k completions of a normalized prefix, best first."""
+        node, i = self._root, 0
+        while i < len(prefix):
+            child = node.children.get(prefix[i])
+            if child is None:
+                return ()
+            label = child.label
+            if prefix.startswith(label, i):
+                i += len(label)
+                node = child
+            elif label.startswith(prefix[i:]):
+                return child.top
+            else:
+                return ()
+        return node.top
+
+
+def _vocabulary_phrases() -> Iterable[str]:
+    """Field phrases the parser understands, minus number templates."""
+    for patterns in FIELD_PATTERNS.values():
+        for phrase, _ in patterns:
+            if NUMBER_TOKEN not in phrase:
+                yield phrase
+
+
+def build_phrases(
+    names: Iterable[tuple[str, str, int]] = (),
+    queries: Iterable[tuple[str, int]] = ()
+) -> dict[str, Completion]:
+    """Merge weighted phrases from every source, keyed by normalized text.
+
+    ``names`` are (manufacturer, model, vehicle count) rows and ``queries``
+    are (query text, times run) rows. A phrase found in several sources
+    sums its weights; catalog names keep their canonical spelling, otherwise
+    the display text of the strongest source wins.
+    """
+    phrases: dict[str, Completion] = {}
+
+    def add(text: str, weight: float, canonical: bool = False) -> None:
+        text = " ".join(text.split())
+        key = text.lower()
+        if not key or len(key) > MAX_PHRASE_LENGTH:
+            return
+        existing = phrases.get(key)
+        if existing is None:
+            phrases[key] = Completion(text, weight)
+        else:
+            display = text if canonical or weight > existing.weight else existing.text
+            phrases[key] = Completion(display, existing.weight + weight)
+
+    for phrase in _vocabulary_phrases():
+        add(phrase, SOURCE_WEIGHTS["vocabulary"])
+
+    name_counts: dict[str, int] = {}
+    for manufacturer, model, vehicles in names:
+        # +1 so models without vehicles yet are still suggested
+        for name in (manufacturer, f"{manufacturer} {model}", model):
+            name_counts[name] = name_counts.get(name, 0) + vehicles + 1
+    if name_counts:
+        most = max(name_counts.values())
+        for name, count in name_counts.items():
+            add(name, SOURCE_WEIGHTS["name"] * count / most, canonical=True)
+
+    queries = list(queries)
+    if queries:
+        most = max(uses for _, uses in queries)
+        for query, uses in queries:
+            add(query, SOURCE_WEIGHTS["query"] * uses / most)
+
+    return phrases
+
+
+class SearchAutocomplete:
+    """Serves completions from the current trie and rebuilds it periodically."""
+
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self._trie = PrefixTrie(build_phrases(), top_k)
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._trie)
+
+    def complete(self, text: str, limit: int = 8) -> list[str]:
+        """Complete the typed text, best first.
+
+        Completions of the whole input come first. When there are fewer
+        than ``limit``, the trailing words are completed on their own and
+        appended to what was typed before them, so "show all toy" still
+        suggests "show all Toyota".
+        """
+        trie = self._trie  # One read, so a concurrent swap is never mixed
+        key = normalize_prefix(text)
+        if not key.strip():
+            return []
+        head = text.strip().split()
+        suggestions: list[str] = []
+        seen: set[str] = set()
+
+        def take(completions: Iterable[Completion], prefix_words: list[str]) -> bool:
+            for completion in completions:
+                suggestion = " ".join(prefix_words + [completion.text])
+                folded = suggestion.lower()
+                if folded not in seen:
+                    seen.add(folded)
+                    suggestions.append(suggestion)
+                    if len(suggestions) >= limit:
+                        return True
+            return False
+
+        if take(trie.lookup(key), []):
+            return suggestions
+        words = key.split(" ")
+        for start in range(1, len(words)):
+            suffix = " ".join(words[start:])
+            if suffix.strip() and take(trie.lookup(suffix), head[:start]):
+                break
+        return suggestions
+
+    async def rebuild(self) -> bool:
+        """Rebuild the trie from the database and swap it in."""
+        pool = await get_pool()
+        if pool is None:
+            return False
+        settings = get_settings()
+        names = await pool.fetch(_NAMES_SQL)
+        queries = await pool.fetch(
+            _QUERIES_SQL,
+            settings.search_autocomplete_query_days,
+            settings.search_autocomplete_max_queries
+        )
+        phrases = build_phrases(
+            [(r["manufacturer"], r["model"], r["vehicles"]) for r in names],
+            [(r["query"], r["uses"]) for r in queries]
+        )
+        # Building is CPU-bound; keep it off the event loop
+        trie = await asyncio.to_thread(PrefixTrie, phrases, self.top_k)
+        self._trie = trie
+        return True
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                await self.rebuild()
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Search autocomplete rebuild failed: %s", e)
+            await asyncio.sleep(interval)
+
+    async def start(self) -> None:
+        """Start periodic rebuilds when a database is configured."""
+        if self._task is None and await get_pool() is not None:
+            interval = get_settings().search_autocomplete_refresh_seconds
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stop periodic rebuilds."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton instance
+search_autocomplete = SearchAutocomplete(top_k=get_settings().search_autocomplete_top_k)
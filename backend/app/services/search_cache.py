@@ -0,0 +1,85 @@
+"""Natural Language Search Caches.
+
+Dashboards and the SmartSearch UI send the same queries over and over.
+Parsed responses are cached by normalized query text, and compiled SQL
+plans are cached by filter shape so that identical SQL text reaches the
+database and asyncpg's per-connection statement cache reuses the
+prepared statement.
+"""
+from collections import OrderedDict
+import re
+from typing import Any, Hashable, Optional
+
+from app.config import get_settings
+from app.schemas.search import SearchCacheStats
+
+# Standalone numbers only; digits inside words are part of the word token
+_NUMBER_RE = re.compile(r"(?<![a-z0-9\-])\d[\d,]*")
+
+
+def _canonical_number(match: re.Match) -> str:
+    digits = match.group().replace(",", "")
+    return str(int(digits))
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookup.
+
+    Lowercases, collapses whitespace and rewrites numbers without
+    separators or leading zeros, so "Over 100,000 miles" and
+    "over  100000 miles" share an entry.
+    """
+    text = " ".join(query.lower().split())
+    return _NUMBER_RE.sub(_canonical_number, text)
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit-rate counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value, marking it most recently used."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> SearchCacheStats:
+        """Get cache hit-rate metrics."""
+        lookups = self.hits + self.misses
+        return SearchCacheStats(
+            entries=len(self._entries),
+            max_entries=self.max_entries,
+            lookups=lookups,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=round(self.hits / lookups, 4) if lookups else 0.0
+        )
+
+
+_settings = get_settings()
+
+# Singleton instances
+parse_cache = LRUCache(_settings.search_parse_cache_max_entries)
+plan_cache = LRUCache(_settings.search_plan_cache_max_entries)
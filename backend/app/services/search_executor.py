@@ -0,0 +1,601 @@
+"""Natural Language Query Executor.
+
+Compiles a ParsedQuery into parameterized SQL against the schema.sql /
+schema_enhancements.sql tables and runs it through the shared asyncpg
+pool. Only whitelisted tables and columns are ever interpolated into SQL
+text; all filter values are bound as parameters. Results are paginated
+with keyset cursors over (sort column, id). Compiled plans are cached by
+filter shape, keeping the SQL text stable for prepared statement reuse.
+"""
+from datetime import date, datetime, time as dt_time
+import json
+import logging
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+import asyncpg
+
+from app.db import DatabaseUnavailableError, get_pool
+from app.schemas.search import (
+    NLSearchExecuteRequest,
+    NLSearchExecuteResponse,
+    NLSearchRequest,
+    ParsedFilter,
+    ParsedQuery
+)
+from app.services.cursors import decode_cursor, encode_cursor
+from app.services.search_cache import plan_cache
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+
+# Finite sort substitutes for NULL dates, so keyset cursors round-trip
+NULL_DATE = "'1900-01-01'"
+NULL_DATE_LATE = "'9999-12-31'"
+
+NUMERIC_TYPES = ("int", "numeric")
+
+SQL_OPERATORS = {
+    "eq": "=",
+    "gt": ">",
+    "lt": "<",
+    "gte": ">=",
+    "lte": "<=",
+}
+
+
+class ColumnSpec(NamedTuple):
+    """A queryable column exposed to natural language filters."""
+    expr: str
+    sql_type: str  # text, int, numeric, date, timestamptz
+    allowed: Optional[frozenset] = None  # Allowed values for enum-like columns
+    null_fill: Optional[str] = None  # Sort substitute for NULLs (SQL literal)
+
+
+class EntitySpec(NamedTuple):
+    """How to query one entity table."""
+    from_clause: str
+    id_expr: str
+    select: tuple[str, ...]
+    fields: dict[str, ColumnSpec]
+    default_sort: str
+
+
+_VEHICLE_JOINS = (
+    "JOIN vehicle_model vm ON vm.id = v.vehicle_model_id "
+    "JOIN manufacturer m ON m.id = vm.manufacturer_id"
+)
+
+_VEHICLE_CONTEXT = (
+    "v.vin",
+    "v.license_plate",
+    "v.year",
+    "m.name AS manufacturer",
+    "vm.name AS model",
+)
+
+_VEHICLE_CONTEXT_FIELDS = {
+    "year": ColumnSpec("v.year", "int"),
+    "manufacturer": ColumnSpec("m.name", "text"),
+    "model": ColumnSpec("vm.name", "text"),
+}
+
+ENTITY_SPECS: dict[str, EntitySpec] = {
+    "vehicle": EntitySpec(
+        from_clause=f"vehicle v {_VEHICLE_JOINS}",
+        id_expr="v.id",
+        select=(
+            "v.id", *_VEHICLE_CONTEXT, "v.color", "v.mileage", "v.status",
+            "v.current_value", "v.owner_id", "v.created_at"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "status": ColumnSpec(
+                "v.status", "text",
+                allowed=frozenset({"active", "sold", "totaled", "stolen"})
+            ),
+            "mileage": ColumnSpec("v.mileage", "int", null_fill="-1"),
+            "current_value": ColumnSpec("v.current_value", "numeric", null_fill="-1"),
+            "created_at": ColumnSpec("v.created_at", "timestamptz", null_fill=NULL_DATE),
+        },
+        default_sort="created_at"
+    ),
+    "owner": EntitySpec(
+        from_clause="owner o",
+        id_expr="o.id",
+        select=(
+            "o.id", "o.first_name", "o.last_name", "o.email", "o.phone",
+            "o.owner_type", "o.city", "o.state", "o.created_at"
+        ),
+        fields={
+            "created_at": ColumnSpec("o.created_at", "timestamptz", null_fill=NULL_DATE),
+        },
+        default_sort="created_at"
+    ),
+    "service_record": EntitySpec(
+        from_clause=f"service_record sr JOIN vehicle v ON v.id = sr.vehicle_id {_VEHICLE_JOINS}",
+        id_expr="sr.id",
+        select=(
+            "sr.id", "sr.vehicle_id", *_VEHICLE_CONTEXT, "sr.service_date",
+            "sr.service_type", "sr.description", "sr.mileage_at_service",
+            "sr.labor_cost", "sr.total_cost", "sr.next_service_due_date"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "mileage": ColumnSpec("sr.mileage_at_service", "int", null_fill="-1"),
+            "created_at": ColumnSpec("sr.service_date", "date"),
+            "service_type": ColumnSpec(
+                "sr.service_type", "text",
+                allowed=frozenset({"maintenance", "repair", "inspection", "recall", "warranty"})
+            ),
+            "total_cost": ColumnSpec("sr.total_cost", "numeric", null_fill="-1"),
+            "labor_cost": ColumnSpec("sr.labor_cost", "numeric", null_fill="-1"),
+        },
+        default_sort="created_at"
+    ),
+    "inspection": EntitySpec(
+        from_clause=f"inspection i JOIN vehicle v ON v.id = i.vehicle_id {_VEHICLE_JOINS}",
+        id_expr="i.id",
+        select=(
+            "i.id", "i.vehicle_id", *_VEHICLE_CONTEXT, "i.inspection_type",
+            "i.inspection_date", "i.expiration_date", "i.passed",
+            "i.inspection_station"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "created_at": ColumnSpec("i.inspection_date", "date"),
+            "expiration_date": ColumnSpec("i.expiration_date", "date", null_fill=NULL_DATE),
+            "mileage": ColumnSpec("i.mileage_at_inspection", "int", null_fill="-1"),
+        },
+        default_sort="created_at"
+    ),
+    "insurance_policy": EntitySpec(
+        from_clause=f"insurance_policy ip JOIN vehicle v ON v.id = ip.vehicle_id {_VEHICLE_JOINS}",
+        id_expr="ip.id",
+        select=(
+            "ip.id", "ip.vehicle_id", *_VEHICLE_CONTEXT, "ip.insurance_company",
+            "ip.policy_number", "ip.policy_type", "ip.start_date", "ip.end_date",
+            "ip.premium_amount"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "created_at": ColumnSpec("ip.start_date", "date"),
+            "expiration_date": ColumnSpec("ip.end_date", "date"),
+            "total_cost": ColumnSpec("ip.premium_amount", "numeric", null_fill="-1"),
+        },
+        default_sort="created_at"
+    ),
+    "warranty": EntitySpec(
+        from_clause=f"warranty w JOIN vehicle v ON v.id = w.vehicle_id {_VEHICLE_JOINS}",
+        id_expr="w.id",
+        select=(
+            "w.id", "w.vehicle_id", *_VEHICLE_CONTEXT, "w.warranty_type",
+            "w.provider_name", "w.start_date", "w.end_date", "w.mileage_limit"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "created_at": ColumnSpec("w.start_date", "date"),
+            "expiration_date": ColumnSpec("w.end_date", "date", null_fill=NULL_DATE_LATE),
+        },
+        default_sort="created_at"
+    ),
+    "recall": EntitySpec(
+        from_clause="recall r LEFT JOIN manufacturer m ON m.id = r.manufacturer_id",
+        id_expr="r.id",
+        select=(
+            "r.id", "r.recall_number", "r.recall_date", "r.title",
+            "m.name AS manufacturer", "r.severity", "r.status"
+        ),
+        fields={
+            "manufacturer": ColumnSpec("m.name", "text"),
+            "created_at": ColumnSpec("r.recall_date", "date"),
+            "status": ColumnSpec(
+                "r.status", "text",
+                allowed=frozenset({"open", "resolved", "closed"})
+            ),
+        },
+        default_sort="created_at"
+    ),
+    "accident": EntitySpec(
+        from_clause=f"accident a JOIN vehicle v ON v.id = a.vehicle_id {_VEHICLE_JOINS}",
+        id_expr="a.id",
+        select=(
+            "a.id", "a.vehicle_id", *_VEHICLE_CONTEXT, "a.accident_date",
+            "a.accident_type", "a.severity", "a.damage_estimate"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "created_at": ColumnSpec("a.accident_date", "timestamptz"),
+            "total_cost": ColumnSpec("a.damage_estimate", "numeric", null_fill="-1"),
+        },
+        default_sort="created_at"
+    ),
+    "fuel_record": EntitySpec(
+        from_clause=f"fuel_record f JOIN vehicle v ON v.id = f.vehicle_id {_VEHICLE_JOINS}",
+        id_expr="f.id",
+        select=(
+            "f.id", "f.vehicle_id", *_VEHICLE_CONTEXT, "f.fuel_date",
+            "f.fuel_type", "f.gallons", "f.total_cost", "f.odometer_reading"
+        ),
+        fields={
+            **_VEHICLE_CONTEXT_FIELDS,
+            "created_at": ColumnSpec("f.fuel_date", "date"),
+            "mileage": ColumnSpec("f.odometer_reading", "int", null_fill="-1"),
+            "total_cost": ColumnSpec("f.total_cost", "numeric", null_fill="-1"),
+        },
+        default_sort="created_at"
+    ),
+}
+
+
+def _coerce(value: Any, sql_type: str) -> Any:
+    """Convert a parsed filter value to the Python type asyncpg expects."""
+    if sql_type == "int":
+        return int(value)
+    if sql_type == "numeric":
+        return float(value)
+    if sql_type == "date":
+        return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    if sql_type == "timestamptz":
+        if isinstance(value, datetime):
+            return value
+        text = str(value)
+        if len(text) > 10:
+            return datetime.fromisoformat(text)
+        return datetime.combine(date.fromisoformat(text), dt_time.min)
+    return str(value)
+
+
+def _sort_key_expr(column: ColumnSpec) -> str:
+    if column.null_fill is None:
+        return column.expr
+    return f"COALESCE({column.expr}, {column.null_fill}::{column.sql_type})"
+
+
+class CompiledQuery(NamedTuple):
+    """Parameterized SQL ready to execute."""
+    sql: str
+    params: list
+    sort_alias: str
+    warnings: list[str]
+
+
+class AggregateQuery(NamedTuple):
+    """Parameterized SQL returning one aggregate value."""
+    sql: str
+    params: list
+    source: str  # rollup or scan
+    function: str  # count, avg, sum, min, max
+    field: Optional[str]
+    warnings: list[str]
+
+
+class QueryPlan(NamedTuple):
+    """SQL text and parameter types for one filter shape."""
+    sql: str
+    param_types: tuple[str, ...]
+
+
+def validate_filters(
+    parsed: ParsedQuery,
+    spec: EntitySpec
+) -> tuple[list[ParsedFilter], list[str]]:
+    """Split filters into those the entity supports and warnings for the rest."""
+    accepted: list[ParsedFilter] = []
+    warnings: list[str] = []
+    for f in parsed.filters:
+        column = spec.fields.get(f.field)
+        if column is None:
+            warnings.append(f"Filter on '{f.field}' is not supported for {parsed.entity} and was ignored")
+        elif column.allowed is not None and str(f.value) not in column.allowed:
+            warnings.append(f"Value '{f.value}' is not valid for {parsed.entity}.{f.field} and was ignored")
+        elif f.operator not in SQL_OPERATORS and f.operator not in ("is_null", "contains"):
+            warnings.append(f"Operator '{f.operator}' is not supported and was ignored")
+        else:
+            accepted.append(f)
+    return accepted, warnings
+
+
+def _filter_values(filters: list[ParsedFilter]) -> list[Any]:
+    """Get the values to bind for filters, in placeholder order."""
+    values: list[Any] = []
+    for f in filters:
+        if f.operator == "contains":
+            values.append(f"%{f.value}%")
+        elif f.operator != "is_null":
+            values.append(f.value)
+    return values
+
+
+def _filter_conditions(
+    spec: EntitySpec,
+    filters: tuple[tuple[str, str], ...],
+    placeholder: Callable[[str], str]
+) -> list[str]:
+    """Build WHERE conditions for a filter shape."""
+    conditions: list[str] = []
+    for field, operator in filters:
+        column = spec.fields[field]
+        if operator == "is_null":
+            conditions.append(f"{column.expr} IS NULL")
+        elif operator == "contains":
+            conditions.append(f"{column.expr} ILIKE {placeholder('text')}")
+        else:
+            conditions.append(
+                f"{column.expr} {SQL_OPERATORS[operator]} {placeholder(column.sql_type)}"
+            )
+    return conditions
+
+
+def _build_plan(
+    spec: EntitySpec,
+    filters: tuple[tuple[str, str], ...],
+    sort_field: str,
+    direction: str,
+    has_cursor: bool
+) -> QueryPlan:
+    """Build the SQL for a filter shape; values are bound separately."""
+    param_types: list[str] = []
+
+    def placeholder(sql_type: str) -> str:
+        param_types.append(sql_type)
+        return f"${len(param_types)}::{sql_type}"
+
+    conditions = _filter_conditions(spec, filters, placeholder)
+
+    sort_column = spec.fields[sort_field]
+    sort_expr = _sort_key_expr(sort_column)
+
+    if has_cursor:
+        comparison = ">" if direction == "ASC" else "<"
+        conditions.append(
+            f"({sort_expr}, {spec.id_expr}) {comparison} "
+            f"({placeholder(sort_column.sql_type)}, {placeholder('uuid')})"
+        )
+
+    sql = (
+        f"SELECT {', '.join(spec.select)}, {sort_expr} AS _sort_key "
+        f"FROM {spec.from_clause}"
+    )
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY _sort_key {direction}, {spec.id_expr} {direction}"
+    param_types.append("int")
+    sql += f" LIMIT ${len(param_types)}"
+
+    return QueryPlan(sql=sql, param_types=tuple(param_types))
+
+
+def compile_query(
+    parsed: ParsedQuery,
+    page_size: int,
+    cursor: Optional[str] = None
+) -> CompiledQuery:
+    """Compile a parsed query into parameterized SQL with keyset paging.
+
+    Queries with the same entity, filter fields and operators, sort and
+    cursor presence share one cached plan, so the SQL text is identical
+    and the connection's prepared statement is reused.
+    """
+    spec = ENTITY_SPECS.get(parsed.entity)
+    if spec is None:
+        raise ValueError(f"Unsupported entity: {parsed.entity}")
+
+    filters, warnings = validate_filters(parsed, spec)
+    shape = tuple((f.field, f.operator) for f in filters)
+    values = _filter_values(filters)
+
+    sort_field = parsed.sort_field if parsed.sort_field in spec.fields else spec.default_sort
+    direction = "ASC" if parsed.sort_direction == "asc" else "DESC"
+
+    if cursor:
+        values.extend(decode_cursor(cursor))
+    values.append(page_size + 1)
+
+    key = (parsed.entity, shape, sort_field, direction, bool(cursor))
+    plan = plan_cache.get(key)
+    if plan is None:
+        plan = _build_plan(spec, key[1], sort_field, direction, bool(cursor))
+        plan_cache.put(key, plan)
+
+    params = [_coerce(value, sql_type) for value, sql_type in zip(values, plan.param_types)]
+    return CompiledQuery(sql=plan.sql, params=params, sort_alias="_sort_key", warnings=warnings)
+
+
+def resolve_metric(
+    parsed: ParsedQuery,
+    spec: EntitySpec
+) -> tuple[str, Optional[str], list[str]]:
+    """Get the aggregate function and numeric field for a count/aggregate query.
+
+    Falls back to a row count when the metric cannot be aggregated.
+    """
+    function = parsed.aggregate_function or "count"
+    field = parsed.aggregate_field
+    if function == "count":
+        return "count", None, []
+    column = spec.fields.get(field) if field else None
+    if column is None or column.sql_type not in NUMERIC_TYPES:
+        target = f"'{field}'" if field else "a metric"
+        return "count", None, [
+            f"Cannot compute {function} of {target} for {parsed.entity}; counting rows instead"
+        ]
+    return function, field, []
+
+
+def compile_aggregate(parsed: ParsedQuery) -> AggregateQuery:
+    """Compile a count/aggregate query that scans the entity tables."""
+    spec = ENTITY_SPECS.get(parsed.entity)
+    if spec is None:
+        raise ValueError(f"Unsupported entity: {parsed.entity}")
+
+    filters, warnings = validate_filters(parsed, spec)
+    function, field, metric_warnings = resolve_metric(parsed, spec)
+    param_types: list[str] = []
+
+    def placeholder(sql_type: str) -> str:
+        param_types.append(sql_type)
+        return f"${len(param_types)}::{sql_type}"
+
+    conditions = _filter_conditions(
+        spec, tuple((f.field, f.operator) for f in filters), placeholder
+    )
+    value_expr = "count(*)" if function == "count" else f"{function}({spec.fields[field].expr})"
+    sql = f"SELECT {value_expr} AS value, count(*) AS row_count FROM {spec.from_clause}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+
+    params = [
+        _coerce(value, sql_type)
+        for value, sql_type in zip(_filter_values(filters), param_types)
+    ]
+    return AggregateQuery(
+        sql=sql,
+        params=params,
+        source="scan",
+        function=function,
+        field=field,
+        warnings=warnings + metric_warnings
+    )
+
+
+class NLQueryExecutor:
+    """Runs parsed natural language queries against Postgres."""
+
+    async def execute(
+        self, request: NLSearchExecuteRequest
+    ) -> NLSearchExecuteResponse:
+        """Parse, compile and execute a natural language query."""
+        # Imported here to avoid a circular import with the parser
+        from app.services.search import natural_language_search_service
+
+        pool = await get_pool()
+        if pool is None:
+            raise DatabaseUnavailableError("Query execution requires DATABASE_URL to be configured")
+
+        start = time.perf_counter()
+        parsed_response = await natural_language_search_service.parse(
+            NLSearchRequest(query=request.query, max_results=request.page_size)
+        )
+        parsed = parsed_response.parsed_query
+        if parsed.aggregate_function:
+            return await self._execute_aggregate(pool, request.query, parsed, start)
+
+        page_size = min(request.page_size, MAX_PAGE_SIZE)
+        compiled = compile_query(parsed, page_size, request.cursor)
+
+        try:
+            records = await pool.fetch(compiled.sql, *compiled.params)
+        except asyncpg.PostgresError as e:
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            await self._log(request.query, parsed, None, elapsed_ms, str(e))
+            raise
+
+        has_more = len(records) > page_size
+        records = records[:page_size]
+        rows = []
+        for record in records:
+            row = dict(record)
+            row.pop(compiled.sort_alias, None)
+            rows.append(row)
+
+        next_cursor = None
+        if has_more and records:
+            last = records[-1]
+            next_cursor = encode_cursor(last[compiled.sort_alias], last["id"])
+
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        await self._log(request.query, parsed, len(rows), elapsed_ms, None)
+
+        return NLSearchExecuteResponse(
+            original_query=request.query,
+            parsed_query=parsed,
+            sql=compiled.sql,
+            rows=rows,
+            result_count=len(rows),
+            next_cursor=next_cursor,
+            execution_time_ms=elapsed_ms,
+            warnings=compiled.warnings
+        )
+
+    async def _execute_aggregate(
+        self,
+        pool: asyncpg.Pool,
+        query: str,
+        parsed: ParsedQuery,
+        start: float
+    ) -> NLSearchExecuteResponse:
+        """Run a count/aggregate query from a rollup, or a scan if it cannot."""
+        # Imported here to avoid a circular import with the rollup planner
+        from app.services.search_rollups import plan_aggregate
+
+        plan = plan_aggregate(parsed)
+        try:
+            try:
+                record = await pool.fetchrow(plan.sql, *plan.params)
+            except asyncpg.UndefinedTableError:
+                # Rollup migration not applied
+                plan = plan_aggregate(parsed, allow_rollup=False)
+                record = await pool.fetchrow(plan.sql, *plan.params)
+        except asyncpg.PostgresError as e:
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            await self._log(query, parsed, None, elapsed_ms, str(e))
+            raise
+
+        row = {
+            "function": plan.function,
+            "field": plan.field,
+            "value": record["value"],
+            "row_count": record["row_count"]
+        }
+        elapsed_ms = int((time.perf_counter() - start) * 1000)
+        await self._log(query, parsed, 1, elapsed_ms, None)
+
+        return NLSearchExecuteResponse(
+            original_query=query,
+            parsed_query=parsed,
+            sql=plan.sql,
+            rows=[row],
+            result_count=1,
+            execution_time_ms=elapsed_ms,
+            source=plan.source,
+            warnings=plan.warnings
+        )
+
+    async def _log(
+        self,
+        query: str,
+        parsed: ParsedQuery,
+        result_count: Optional[int],
+        execution_time_ms: int,
+        error: Optional[str]
+    ) -> None:
+        """Record an execution in nl_query_log."""
+        pool = await get_pool()
+        if pool is None:
+            return
+        try:
+            await pool.execute(
+                """
+                INSERT INTO nl_query_log (
+                    original_query, parsed_query, entities_detected,
+                    filters_applied, result_count, execution_time_ms,
+                    was_successful, error_message
+                ) VALUES ($1, $2::jsonb, $3, $4::jsonb, $5, $6, $7, $8)
+                """,
+                query,
+                parsed.model_dump_json(),
+                [parsed.entity],
+                json.dumps([f.model_dump() for f in parsed.filters]),
+                result_count,
+                execution_time_ms,
+                error is None,
+                error
+            )
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.warning("Failed to log NL query: %s", e)
+
+
+# Singleton instance
+nl_query_executor = NLQueryExecutor()
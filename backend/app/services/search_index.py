@@ -0,0 +1,641 @@
+"""Full-Text Search Index.
+
+In-process inverted index over vehicle VINs and license plates, owner
+names and emails, and service record descriptions. Free text and partial
+identifiers are matched by exact term, by prefix (the last query token is
+treated as still being typed) and, when neither matches, by trigram
+candidates within a small edit distance. Results are ranked with BM25.
+
+The index is loaded from Postgres in the background and kept current by
+incremental syncs on ``updated_at`` and on the tombstones deleted rows
+leave behind. Each sync re-reads a short overlap behind its watermark, as
+rows from a long transaction commit with an ``updated_at`` older than
+rows already synced. ``upsert`` and ``remove`` apply single-row changes
+directly.
+"""
+from array import array
+import asyncio
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+import math
+import re
+import sys
+import time
+from typing import Iterable, Optional, Sequence
+
+import asyncpg
+import numpy as np
+
+from app.config import get_settings
+from app.db import get_pool
+from app.schemas.search import TextSearchHit, TextSearchResponse
+
+logger = logging.getLogger(__name__)
+
+ENTITY_TYPES = ("vehicle", "owner", "service_record")
+
+# Fields that are identifiers: also indexed with separators removed, so
+# "ABC-1234" is found by "abc12" as well as by "abc" or "1234"
+IDENTIFIER_ENTITIES = frozenset({"vehicle"})
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+PREFIX_WEIGHT = 0.9
+FUZZY_WEIGHT = 0.6
+
+MAX_QUERY_TOKENS = 8
+MAX_EXPANSIONS = 50
+PREFIX_WINDOW = 2000  # Prefix completions considered before picking by frequency
+MIN_FUZZY_LENGTH = 3
+
+# Inserting new terms one at a time is cheaper than re-sorting below this
+_INSORT_LIMIT = 64
+_TERM_VECTOR_CACHE_SIZE = 4096
+
+_FIELD_SEPARATOR = "\x1f"
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_SYNC_QUERIES = {
+    "vehicle": """
+        SELECT id, updated_at, vin, license_plate
+        FROM vehicle
+        WHERE (updated_at, id) > ($1, $2)
+        ORDER BY updated_at, id
+        LIMIT $3
+    """,
+    "owner": """
+        SELECT id, updated_at, first_name, last_name, email
+        FROM owner
+        WHERE (updated_at, id) > ($1, $2)
+        ORDER BY updated_at, id
+        LIMIT $3
+    """,
+    "service_record": """
+        SELECT id, updated_at, description
+        FROM service_record
+        WHERE (updated_at, id) > ($1, $2)
+        ORDER BY updated_at, id
+        LIMIT $3
+    """,
+}
+
+_TOMBSTONE_QUERY = """
+    SELECT id, deleted_at AS updated_at, entity, entity_id
+    FROM search_index_tombstone
+    WHERE (deleted_at, id) > ($1, $2)
+    ORDER BY deleted_at, id
+    LIMIT $3
+"""
+
+_PRUNE_TOMBSTONES_SQL = """
+    DELETE FROM search_index_tombstone WHERE deleted_at < now() - $1::interval
+"""
+
+TOMBSTONE_RETENTION = timedelta(days=7)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_NIL_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+def _tokenize(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _document_terms(entity: str, fields: Sequence[str]) -> list[str]:
+    """Get the indexed terms for a document's fields."""
+    terms: list[str] = []
+    for value in fields:
+        parts = _tokenize(value)
+        terms.extend(parts)
+        if entity in IDENTIFIER_ENTITIES and len(parts) > 1:
+            terms.append("".join(parts))
+    return terms
+
+
+def _trigrams(term: str, whole: bool = True) -> set[str]:
+    """Get a term's trigrams; prefixes omit the end-of-word trigram."""
+    padded = "$$" + term + ("$" if whole else "")
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _distance_row(a: str, b: str, limit: int) -> Optional[list[int]]:
+    """Optimal string alignment distances from ``a`` to each prefix of ``b``.
+
+    Returns None as soon as every distance is known to exceed ``limit``.
+    """
+    previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + cost)
+            if (
+                previous is not None and i > 1 and j > 1
+                and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], previous[j - 2] + 1)
+        # A transposition can still reach back one row
+        if min(current) > limit and min(row) >= limit:
+            return None
+        previous, row = row, current
+    return row
+
+
+def _fuzzy_limit(token: str) -> int:
+    return 1 if len(token) < 8 else 2
+
+
+class SearchIndex:
+    """Inverted index with BM25 ranking, prefix and typo-tolerant matching.
+
+    Posting lists map document slot to term frequency and are updated in
+    place. Terms that occur in exactly one document with frequency one
+    (VINs, plates) store the slot directly instead of a dict, which keeps
+    a 1M-vehicle fleet within memory. Queries score against numpy term
+    vectors built from the postings on first use and cached until the
+    term changes.
+    """
+
+    def __init__(self, max_scan: int = 10_000):
+        self.max_scan = max_scan
+        self._postings: dict[str, object] = {}
+        self._terms: list[str] = []  # Sorted; may contain removed terms
+        self._new_terms: set[str] = set()
+        self._dead_terms = 0
+        self._trigram_index: dict[str, set[str]] = {}
+        self._vectors: OrderedDict[str, tuple[np.ndarray, np.ndarray, np.ndarray]] = OrderedDict()
+
+        # Document slots
+        self._doc_entity = array("b")
+        self._doc_id: list[Optional[str]] = []
+        self._doc_text: list[Optional[str]] = []
+        self._doc_len = array("i")
+        self._free: list[int] = []
+        self._slots: list[dict[str, int]] = [{} for _ in ENTITY_TYPES]
+        self._length_sum = [0] * len(ENTITY_TYPES)
+
+        # Per sync stream: the latest change read, and the rows read within
+        # the overlap behind it (id -> updated_at) so they are not re-applied
+        self._watermarks = {stream: _EPOCH for stream in ("tombstone", *ENTITY_TYPES)}
+        self._recent: dict[str, dict[str, datetime]] = {stream: {} for stream in self._watermarks}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(slots) for slots in self._slots)
+
+    # Postings
+
+    def _add_posting(self, term: str, doc: int, tf: int, fuzzy: bool) -> None:
+        postings = self._postings.get(term)
+        if fuzzy and term.isalpha() and len(term) >= MIN_FUZZY_LENGTH:
+            if term not in self._trigram_index.get("$$" + term[0], ()):
+                for gram in _trigrams(term):
+                    self._trigram_index.setdefault(gram, set()).add(term)
+        if postings is None:
+            self._postings[term] = doc if tf == 1 else {doc: tf}
+            self._new_terms.add(term)
+        elif isinstance(postings, int):
+            self._postings[term] = {postings: 1, doc: tf}
+        else:
+            postings[doc] = tf
+        self._vectors.pop(term, None)
+
+    def _remove_posting(self, term: str, doc: int) -> None:
+        postings = self._postings.get(term)
+        if postings is None:
+            return
+        if isinstance(postings, int):
+            empty = postings == doc
+        else:
+            postings.pop(doc, None)
+            empty = not postings
+        if empty:
+            del self._postings[term]
+            if term in self._new_terms:
+                self._new_terms.discard(term)
+            else:
+                self._dead_terms += 1
+            if term.isalpha() and len(term) >= MIN_FUZZY_LENGTH:
+                for gram in _trigrams(term):
+                    bucket = self._trigram_index.get(gram)
+                    if bucket is not None:
+                        bucket.discard(term)
+                        if not bucket:
+                            del self._trigram_index[gram]
+        self._vectors.pop(term, None)
+
+    def _df(self, term: str) -> int:
+        postings = self._postings.get(term)
+        if postings is None:
+            return 0
+        return 1 if isinstance(postings, int) else len(postings)
+
+    def _sorted_terms(self) -> list[str]:
+        """Get the sorted term list, folding in terms added since last use."""
+        if self._new_terms:
+            if len(self._new_terms) <= _INSORT_LIMIT and self._dead_terms < len(self._terms) // 4:
+                for term in self._new_terms:
+                    # A removed term may still be listed
+                    index = bisect_left(self._terms, term)
+                    if index == len(self._terms) or self._terms[index] != term:
+                        self._terms.insert(index, term)
+            else:
+                self._terms = sorted(self._postings)
+                self._dead_terms = 0
+            self._new_terms.clear()
+        return self._terms
+
+    # Documents
+
+    def upsert(self, entity: str, entity_id: str, fields: Sequence[Optional[str]]) -> None:
+        """Index a document, replacing any previous version."""
+        kind = ENTITY_TYPES.index(entity)
+        entity_id = str(entity_id)
+        self.remove(entity, entity_id)
+
+        values = [value for value in fields if value]
+        terms = [sys.intern(term) for term in _document_terms(entity, values)]
+        if not terms:
+            return
+
+        if self._free:
+            doc = self._free.pop()
+            self._doc_entity[doc] = kind
+            self._doc_id[doc] = entity_id
+            self._doc_text[doc] = _FIELD_SEPARATOR.join(values)
+            self._doc_len[doc] = len(terms)
+        else:
+            doc = len(self._doc_id)
+            self._doc_entity.append(kind)
+            self._doc_id.append(entity_id)
+            self._doc_text.append(_FIELD_SEPARATOR.join(values))
+            self._doc_len.append(len(terms))
+        self._slots[kind][entity_id] = doc
+        self._length_sum[kind] += len(terms)
+
+        # Identifiers are matched by prefix only, not by edit distance
+        fuzzy = entity not in IDENTIFIER_ENTITIES
+        for term, tf in Counter(terms).items():
+            self._add_posting(term, doc, tf, fuzzy)
+
+    def remove(self, entity: str, entity_id: str) -> bool:
+        """Remove a document from the index."""
+        kind = ENTITY_TYPES.index(entity)
+        doc = self._slots[kind].pop(str(entity_id), None)
+        if doc is None:
+            return False
+        text = self._doc_text[doc]
+        for term in set(_document_terms(entity, text.split(_FIELD_SEPARATOR))):
+            self._remove_posting(term, doc)
+        self._length_sum[kind] -= self._doc_len[doc]
+        self._doc_id[doc] = None
+        self._doc_text[doc] = None
+        self._doc_len[doc] = 0
+        self._free.append(doc)
+        return True
+
+    # Scoring
+
+    def _idf(self, df: int) -> float:
+        total = len(self)
+        return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+    def _term_vector(self, term: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get a term's document slots, BM25 weights without IDF, and the
+        positions ordered by descending weight.
+
+        Slots are sorted ascending. Weights use the average document length at build time; the vector
+        is rebuilt whenever the term's postings change.
+        """
+        vector = self._vectors.get(term)
+        if vector is not None:
+            self._vectors.move_to_end(term)
+            return vector
+
+        postings = self._postings[term]
+        if isinstance(postings, int):
+            docs = np.array([postings], dtype=np.int64)
+            tfs = np.ones(1)
+        else:
+            docs = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            order = np.argsort(docs)
+            docs, tfs = docs[order], tfs[order]
+
+        lengths = np.frombuffer(self._doc_len, dtype=np.intc)[docs]
+        kinds = np.frombuffer(self._doc_entity, dtype=np.int8)[docs]
+        averages = np.array([
+            total / max(len(slots), 1)
+            for total, slots in zip(self._length_sum, self._slots)
+        ])
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / averages[kinds])
+        weights = tfs * (BM25_K1 + 1) / (tfs + norms)
+        vector = (docs, weights, np.argsort(-weights, kind="stable"))
+
+        self._vectors[term] = vector
+        if len(self._vectors) > _TERM_VECTOR_CACHE_SIZE:
+            self._vectors.popitem(last=False)
+        return vector
+
+    # Matching
+
+    def _fuzzy_terms(self, token: str, prefix: bool) -> list[tuple[str, float]]:
+        """Find indexed words within a small edit distance of a token.
+
+        In prefix mode a word matches if any of its prefixes is close
+        enough, so a misspelled partial word still completes.
+        """
+        limit = _fuzzy_limit(token)
+        grams = _trigrams(token, whole=not prefix)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._trigram_index.get(gram, ()))
+
+        needed = max(1, len(grams) - 3 * limit)
+        matches = []
+        for term, count in shared.items():
+            if count < needed:
+                continue
+            if prefix:
+                if len(term) < len(token) - limit:
+                    continue
+                row = _distance_row(token, term[:len(token) + limit], limit)
+                distance = (
+                    limit + 1 if row is None
+                    else min(row[max(1, len(token) - limit):])
+                )
+            else:
+                if abs(len(term) - len(token)) > limit:
+                    continue
+                row = _distance_row(token, term, limit)
+                distance = limit + 1 if row is None else row[-1]
+            if 0 < distance <= limit:
+                matches.append((distance, term))
+
+        matches.sort()
+        return [
+            (term, FUZZY_WEIGHT / distance)
+            for distance, term in matches[:MAX_EXPANSIONS]
+        ]
+
+    def _expand(self, token: str, prefix: bool) -> list[tuple[str, float]]:
+        """Get the indexed terms a query token matches, with weights.
+
+        Completed tokens fall back to prefix matching only when they have
+        no exact match; the token being typed always expands.
+        """
+        expansions = []
+        if token in self._postings:
+            expansions.append((token, 1.0))
+        if prefix or not expansions:
+            # Prefer frequent completions, so words are not crowded out by
+            # the many identifiers (VINs) sharing a short prefix
+            terms = self._sorted_terms()
+            start = bisect_left(terms, token)
+            completions = []
+            for term in terms[start:start + PREFIX_WINDOW]:
+                if not term.startswith(token):
+                    break
+                if term != token and term in self._postings:
+                    completions.append(term)
+            expansions.extend(
+                (term, PREFIX_WEIGHT)
+                for term in heapq.nlargest(
+                    MAX_EXPANSIONS - len(expansions), completions, key=self._df
+                )
+            )
+        if not expansions and len(token) >= MIN_FUZZY_LENGTH and token.isalpha():
+            expansions = self._fuzzy_terms(token, prefix)
+        return expansions
+
+    def search(
+        self,
+        query: str,
+        entities: Optional[Iterable[str]] = None,
+        limit: int = 10
+    ) -> TextSearchResponse:
+        """Find documents matching every query token, ranked by BM25."""
+        start = time.perf_counter()
+        tokens = list(dict.fromkeys(_tokenize(query)))[:MAX_QUERY_TOKENS]
+        kinds = (
+            {ENTITY_TYPES.index(e) for e in entities}
+            if entities else set(range(len(ENTITY_TYPES)))
+        )
+
+        hits: list[TextSearchHit] = []
+        scanned = 0
+        if tokens:
+            # Only the last token is still being typed
+            expanded = [
+                [
+                    (term, weight, weight * self._idf(self._df(term)))
+                    for term, weight in self._expand(token, prefix=i == len(tokens) - 1)
+                ]
+                for i, token in enumerate(tokens)
+            ]
+            if all(expanded):
+                hits, scanned = self._rank(expanded, kinds, limit)
+
+        return TextSearchResponse(
+            query=query,
+            hits=hits,
+            documents_scanned=scanned,
+            indexed_documents=len(self),
+            took_ms=round((time.perf_counter() - start) * 1000, 3)
+        )
+
+    def _rank(
+        self,
+        expanded: list[list[tuple[str, float, float]]],
+        kinds: set[int],
+        limit: int
+    ) -> tuple[list[TextSearchHit], int]:
+        """Score documents matching every token.
+
+        The token with the fewest postings supplies the candidates; each
+        other token narrows them with a vectorized lookup into its term
+        vectors. A document's score for a token is its best-matching
+        expansion. At most ``max_scan`` candidates are scored, keeping
+        those the driving token ranks highest.
+        """
+        order = sorted(
+            range(len(expanded)),
+            key=lambda i: sum(self._df(term) for term, _, _ in expanded[i])
+        )
+
+        # Candidates from the driving token, best expansion per document.
+        # Each term contributes only its highest-weighted documents: the
+        # top ``limit`` when nothing else can change the ranking.
+        driver = expanded[order[0]]
+        restricted = len(kinds) < len(ENTITY_TYPES)
+        cap = limit if len(expanded) == 1 else self.max_scan
+        parts = []
+        for term, _, idf in driver:
+            term_docs, weights, by_weight = self._term_vector(term)
+            if len(term_docs) > cap and not restricted:
+                top = np.sort(by_weight[:cap])
+                term_docs, weights = term_docs[top], weights[top]
+            parts.append((term_docs, idf * weights))
+        docs = np.concatenate([d for d, _ in parts])
+        scores = np.concatenate([w for _, w in parts])
+        which = np.repeat(np.arange(len(driver)), [len(d) for d, _ in parts])
+        if len(driver) > 1:
+            by_doc = np.lexsort((-scores, docs))
+            docs, scores, which = docs[by_doc], scores[by_doc], which[by_doc]
+            first = np.ones(len(docs), dtype=bool)
+            first[1:] = docs[1:] != docs[:-1]
+            docs, scores, which = docs[first], scores[first], which[first]
+
+        if restricted:
+            entity = np.frombuffer(self._doc_entity, dtype=np.int8)[docs]
+            keep = np.isin(entity, list(kinds))
+            docs, scores, which = docs[keep], scores[keep], which[keep]
+
+        if len(docs) > self.max_scan:
+            # Sorted positions keep the candidates in slot order
+            keep = np.sort(np.argpartition(-scores, self.max_scan - 1)[:self.max_scan])
+            docs, scores, which = docs[keep], scores[keep], which[keep]
+        scanned = len(docs)
+
+        matched = {order[0]: which}
+        for token in order[1:]:
+            if not len(docs):
+                break
+            best = np.zeros(len(docs))
+            best_term = np.full(len(docs), -1)
+            for t, (term, _, idf) in enumerate(expanded[token]):
+                term_docs, weights, _ = self._term_vector(term)
+                # Search whichever side is smaller; both are sorted by slot
+                if len(term_docs) < len(docs):
+                    positions = np.minimum(np.searchsorted(docs, term_docs), len(docs) - 1)
+                    found = docs[positions] == term_docs
+                    positions = positions[found]
+                    term_scores = idf * weights[found]
+                else:
+                    lookup = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+                    found = term_docs[lookup] == docs
+                    positions = np.flatnonzero(found)
+                    term_scores = idf * weights[lookup[found]]
+                better = term_scores > best[positions]
+                best[positions[better]] = term_scores[better]
+                best_term[positions[better]] = t
+
+            keep = best_term >= 0
+            docs, scores = docs[keep], scores[keep] + best[keep]
+            matched = {i: m[keep] for i, m in matched.items()}
+            matched[token] = best_term[keep]
+
+        if len(docs) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(docs))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        hits = []
+        for i in top:
+            doc = int(docs[i])
+            hits.append(TextSearchHit(
+                entity=ENTITY_TYPES[self._doc_entity[doc]],
+                id=self._doc_id[doc],
+                title=self._doc_text[doc].replace(_FIELD_SEPARATOR, " · ")[:160],
+                score=round(float(scores[i]), 4),
+                matched_terms=[
+                    expanded[token][int(matched[token][i])][0]
+                    for token in range(len(expanded)) if token in matched
+                ]
+            ))
+        return hits, scanned
+
+    # Postgres sync
+
+    async def sync(self) -> int:
+        """Apply rows changed or deleted since the last sync. Returns rows applied."""
+        pool = await get_pool()
+        if pool is None:
+            return 0
+
+        settings = get_settings()
+        overlap = timedelta(seconds=settings.search_index_sync_overlap_seconds)
+        applied = 0
+        # Tombstones first, so a row deleted and re-created with the same id
+        # since the last sync stays indexed
+        for stream, query in (("tombstone", _TOMBSTONE_QUERY), *_SYNC_QUERIES.items()):
+            applied += await self._sync_stream(
+                pool, stream, query, overlap, settings.search_index_batch_size
+            )
+        await pool.execute(_PRUNE_TOMBSTONES_SQL, TOMBSTONE_RETENTION)
+        return applied
+
+    async def _sync_stream(
+        self,
+        pool: asyncpg.Pool,
+        stream: str,
+        query: str,
+        overlap: timedelta,
+        batch_size: int
+    ) -> int:
+        """Apply one stream's rows from the overlap behind its watermark."""
+        watermark = self._watermarks[stream]
+        recent = self._recent[stream]
+        cursor = (watermark - overlap, _NIL_UUID)
+        applied = 0
+        while True:
+            rows = await pool.fetch(query, *cursor, batch_size)
+            for row in rows:
+                row_id, updated_at = str(row["id"]), row["updated_at"]
+                if recent.get(row_id) == updated_at:
+                    continue
+                recent[row_id] = updated_at
+                if stream == "tombstone":
+                    self.remove(row["entity"], str(row["entity_id"]))
+                else:
+                    self.upsert(stream, row_id, list(row.values())[2:])
+                applied += 1
+            if rows:
+                cursor = (rows[-1]["updated_at"], str(rows[-1]["id"]))
+                watermark = max(watermark, cursor[0])
+                # Rows further back than the overlap are never read again
+                horizon = watermark - overlap
+                recent = {key: seen for key, seen in recent.items() if seen >= horizon}
+            if len(rows) < batch_size:
+                break
+            # Let requests run between batches of a large initial load
+            await asyncio.sleep(0)
+        self._watermarks[stream] = watermark
+        self._recent[stream] = recent
+        return applied
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            try:
+                indexed = await self.sync()
+                if indexed:
+                    logger.info("Search index synced %d rows (%d documents)", indexed, len(self))
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Search index sync failed: %s", e)
+            await asyncio.sleep(interval)
+
+    async def start(self) -> None:
+        """Start background loading and incremental sync from Postgres."""
+        if self._task is None and await get_pool() is not None:
+            interval = get_settings().search_index_refresh_seconds
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stop the background sync."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton instance
+search_index = SearchIndex(max_scan=get_settings().search_index_max_scan)
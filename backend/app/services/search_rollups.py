@@ -0,0 +1,231 @@
+"""Search Rollups.
+
+Answers count and aggregate natural language queries from the
+materialized rollup views created by ``migrations/add_search_rollups.sql``
+instead of scanning the entity tables. A query is answered from a rollup
+only when every filter lines up exactly with the rollup dimensions
+(manufacturer, model, model year, mileage bucket, service type, status,
+month); otherwise it falls back to a scan.
+"""
+import asyncio
+from datetime import date, timedelta
+import logging
+from typing import Any, NamedTuple, Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.db import get_pool
+from app.schemas.search import ParsedFilter, ParsedQuery
+from app.services.search_executor import (
+    ENTITY_SPECS,
+    SQL_OPERATORS,
+    AggregateQuery,
+    compile_aggregate,
+    resolve_metric,
+    validate_filters
+)
+
+logger = logging.getLogger(__name__)
+
+# Must match the bucket width used by the rollup views
+MILEAGE_BUCKET = 5000
+
+
+class RollupSpec(NamedTuple):
+    """A rollup view and the filters and metrics it can answer."""
+    view: str
+    dimensions: dict[str, str]  # filter field -> dimension kind
+    metrics: frozenset  # fields with <field>_count/_sum/_min/_max columns
+
+
+ROLLUP_SPECS: dict[str, RollupSpec] = {
+    "vehicle": RollupSpec(
+        view="mv_vehicle_rollup",
+        dimensions={
+            "manufacturer": "exact",
+            "model": "exact",
+            "year": "exact",
+            "status": "exact",
+            "mileage": "mileage",
+            "created_at": "month",
+        },
+        metrics=frozenset({"mileage", "current_value"})
+    ),
+    "service_record": RollupSpec(
+        view="mv_service_rollup",
+        dimensions={
+            "manufacturer": "exact",
+            "model": "exact",
+            "year": "exact",
+            "service_type": "exact",
+            "mileage": "mileage",
+            "created_at": "month",
+        },
+        metrics=frozenset({"mileage", "total_cost", "labor_cost"})
+    ),
+}
+
+ROLLUP_VIEWS = tuple(spec.view for spec in ROLLUP_SPECS.values())
+
+
+def _month_condition(f: ParsedFilter, bind) -> Optional[str]:
+    """Translate a date filter to a month condition, if it is month-aligned."""
+    try:
+        day = date.fromisoformat(str(f.value)[:10])
+    except ValueError:
+        return None
+    if f.operator in ("gte", "lt") and day.day == 1:
+        return f"month {SQL_OPERATORS[f.operator]} {bind(day, 'date')}"
+    if f.operator == "lte" and (day + timedelta(days=1)).day == 1:
+        return f"month <= {bind(day.replace(day=1), 'date')}"
+    return None
+
+
+def _mileage_condition(f: ParsedFilter, bind) -> Optional[str]:
+    """Translate a mileage filter to bucket conditions at a bucket boundary.
+
+    A bucket holds [b, b + MILEAGE_BUCKET); ``mileage_on_boundary`` marks
+    rows exactly at b, which separates "over" from "at least".
+    """
+    try:
+        value = int(f.value)
+    except (TypeError, ValueError):
+        return None
+    if value % MILEAGE_BUCKET:
+        return None
+    if f.operator == "gte":
+        return f"mileage_bucket >= {bind(value, 'int')}"
+    if f.operator == "lt":
+        return f"mileage_bucket >= 0 AND mileage_bucket < {bind(value, 'int')}"
+    if f.operator == "gt":
+        placeholder = bind(value, "int")
+        return (
+            f"mileage_bucket >= {placeholder} AND "
+            f"NOT (mileage_bucket = {placeholder} AND mileage_on_boundary)"
+        )
+    if f.operator == "lte":
+        placeholder = bind(value, "int")
+        return (
+            f"mileage_bucket >= 0 AND (mileage_bucket < {placeholder} OR "
+            f"(mileage_bucket = {placeholder} AND mileage_on_boundary))"
+        )
+    if f.operator == "eq":
+        return f"mileage_bucket = {bind(value, 'int')} AND mileage_on_boundary"
+    return None
+
+
+def _exact_condition(f: ParsedFilter, bind) -> Optional[str]:
+    if f.operator not in SQL_OPERATORS:
+        return None
+    sql_type = "int" if f.field == "year" else "text"
+    try:
+        value = int(f.value) if sql_type == "int" else str(f.value)
+    except (TypeError, ValueError):
+        return None
+    return f"{f.field} {SQL_OPERATORS[f.operator]} {bind(value, sql_type)}"
+
+
+_CONDITION_BUILDERS = {
+    "exact": _exact_condition,
+    "mileage": _mileage_condition,
+    "month": _month_condition,
+}
+
+
+def _compile_rollup(parsed: ParsedQuery) -> Optional[AggregateQuery]:
+    """Compile against the entity's rollup, or None if it cannot answer."""
+    rollup = ROLLUP_SPECS.get(parsed.entity)
+    if rollup is None:
+        return None
+    spec = ENTITY_SPECS[parsed.entity]
+    filters, warnings = validate_filters(parsed, spec)
+    function, field, metric_warnings = resolve_metric(parsed, spec)
+    if field is not None and field not in rollup.metrics:
+        return None
+
+    params: list[Any] = []
+
+    def bind(value: Any, sql_type: str) -> str:
+        params.append(value)
+        return f"${len(params)}::{sql_type}"
+
+    conditions = []
+    for f in filters:
+        kind = rollup.dimensions.get(f.field)
+        condition = _CONDITION_BUILDERS[kind](f, bind) if kind else None
+        if condition is None:
+            return None
+        conditions.append(condition)
+
+    if function == "count":
+        value_expr = "COALESCE(sum(row_count), 0)"
+    elif function == "avg":
+        value_expr = f"sum({field}_sum) / NULLIF(sum({field}_count), 0)"
+    else:
+        value_expr = f"{function}({field}_{function})"
+
+    sql = f"SELECT {value_expr} AS value, COALESCE(sum(row_count), 0) AS row_count FROM {rollup.view}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+
+    return AggregateQuery(
+        sql=sql,
+        params=params,
+        source="rollup",
+        function=function,
+        field=field,
+        warnings=warnings + metric_warnings
+    )
+
+
+def plan_aggregate(parsed: ParsedQuery, allow_rollup: bool = True) -> AggregateQuery:
+    """Plan a count/aggregate query, preferring a rollup over a scan."""
+    if allow_rollup:
+        rollup = _compile_rollup(parsed)
+        if rollup is not None:
+            return rollup
+    return compile_aggregate(parsed)
+
+
+class RollupRefresher:
+    """Keeps the rollup views current by refreshing them periodically."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        """Refresh every rollup view without blocking readers."""
+        pool = await get_pool()
+        if pool is None:
+            return
+        for view in ROLLUP_VIEWS:
+            await pool.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Search rollup refresh failed: %s", e)
+
+    async def start(self) -> None:
+        """Start periodic refreshes when a database is configured."""
+        if self._task is None and await get_pool() is not None:
+            interval = get_settings().search_rollup_refresh_seconds
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        """Stop periodic refreshes."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton instance
+rollup_refresher = RollupRefresher()
@@ -183,7 +183,20 @@ class VehicleValuationService:
     
     async def valuate(self, request: ValuationRequest) -> ValuationResponse:
         """Calculate vehicle valuation."""
+        return self._valuate(request, date.today(), _get_market_condition())
+    
+    async def valuate_batch(self, requests: list[ValuationRequest]) -> list[ValuationResponse]:
+        """Value several vehicles against a single market snapshot."""
         today = date.today()
+        market_condition = _get_market_condition()
+        return [self._valuate(request, today, market_condition) for request in requests]
+    
+    def _valuate(
+        self,
+        request: ValuationRequest,
+        today: date,
+        market_condition: str
+    ) -> ValuationResponse:
         age_years = today.year - request.year
         
         # Get base price
@@ -233,7 +246,6 @@ class VehicleValuationService:
             ))
         
         # Market condition
-        market_condition = _get_market_condition()
         market_mult = MARKET_CONDITIONS.get(market_condition, 1.0)
         value *= market_mult
         
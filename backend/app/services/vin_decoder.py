@@ -207,6 +207,16 @@ class VINDecoderService:
             is_valid=True
         )
     
+    async def decode_batch(self, vins: list[str]) -> list[VINDecodeResponse]:
+        """Decode several VINs, decoding each distinct VIN once.
+        
+        Mirrors the NHTSA batch endpoint (DecodeVINValuesBatch), which
+        accepts many VINs per request.
+        """
+        normalized = [vin.upper().strip() for vin in vins]
+        decoded = {vin: await self.decode(vin) for vin in dict.fromkeys(normalized)}
+        return [decoded[vin] for vin in normalized]
+    
     async def validate(self, vin: str) -> VINValidationResponse:
         """Validate a VIN and optionally decode it."""
         vin = vin.upper().strip()
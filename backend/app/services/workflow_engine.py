@@ -0,0 +1,479 @@
+"""Workflow Engine.
+
+Runs workflow instances and persists their progress after every step.
+Steps form a DAG through ``depends_on``; every step whose dependencies
+are finished runs concurrently, each under its own timeout, so an
+instance takes as long as its longest branch. When only ``wait`` steps
+remain, the instance is parked with a ``resume_at`` timestamp (its
+earliest pending wait) and handed to the timer scheduler; when the timer
+fires, an asyncio worker pool claims it and carries on.
+
+On start, instances that were mid-step when the process stopped are
+re-queued (the interrupted step runs again, so steps are at-least-once),
+and timers that came due while it was down fire immediately. One engine
+process per database is assumed.
+"""
+import asyncio
+from datetime import datetime, timedelta
+import logging
+from typing import NamedTuple, Optional
+import uuid
+
+import asyncpg
+
+from app.config import get_settings
+from app.db import get_pool
+from app.schemas.workflows import (
+    StepStatus,
+    WorkflowEngineStats,
+    WorkflowExecuteResponse,
+    WorkflowInstance,
+    WorkflowStatus,
+    WorkflowStep,
+    WorkflowTemplate,
+    WorkflowTriggerRequest
+)
+from app.services.workflow_scheduler import TimerScheduler, utcnow
+from app.services.workflow_steps import STEP_BATCHERS, STEP_EXECUTORS, noop_step
+from app.services.workflow_store import InMemoryWorkflowStore, PostgresWorkflowStore
+
+logger = logging.getLogger(__name__)
+
+def _wait_duration(step: WorkflowStep) -> timedelta:
+    return timedelta(
+        days=step.config.get("days", 0),
+        hours=step.config.get("hours", 0),
+        minutes=step.config.get("minutes", 0),
+        seconds=step.config.get("seconds", 0)
+    )
+
+
+class StepGraph(NamedTuple):
+    """Step ids and, for each step, the indexes of the steps it waits for."""
+    ids: list[str]
+    dependencies: list[tuple[int, ...]]
+
+
+def build_step_graph(template: WorkflowTemplate) -> StepGraph:
+    """Resolve step dependencies and reject unknown ids and cycles.
+
+    A step without ``depends_on`` follows the step listed before it, so
+    templates that never declare dependencies run sequentially.
+    """
+    ids = [step.id or f"step-{index + 1}" for index, step in enumerate(template.steps)]
+    positions: dict[str, int] = {}
+    for index, step_id in enumerate(ids):
+        if step_id in positions:
+            raise ValueError(f"Template {template.id}: duplicate step id {step_id!r}")
+        positions[step_id] = index
+
+    dependencies = []
+    for index, step in enumerate(template.steps):
+        if step.depends_on is None:
+            dependencies.append((index - 1,) if index else ())
+            continue
+        unknown = [d for d in step.depends_on if d not in positions]
+        if unknown:
+            raise ValueError(f"Template {template.id}: step {ids[index]!r} depends on unknown {unknown}")
+        dependencies.append(tuple(positions[d] for d in step.depends_on))
+
+    # Kahn's algorithm: every step must become ready eventually
+    remaining = [len(deps) for deps in dependencies]
+    dependents: list[list[int]] = [[] for _ in ids]
+    for index, deps in enumerate(dependencies):
+        for dep in deps:
+            dependents[dep].append(index)
+    ready = [index for index, count in enumerate(remaining) if count == 0]
+    visited = 0
+    while ready:
+        index = ready.pop()
+        visited += 1
+        for dependent in dependents[index]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if visited != len(ids):
+        raise ValueError(f"Template {template.id}: step dependencies form a cycle")
+    return StepGraph(ids, dependencies)
+
+
+def _step_log(
+    index: int, step_id: str, step: WorkflowStep, status: StepStatus, started_at: datetime
+) -> dict:
+    completed_at = utcnow()
+    return {
+        "step_index": index,
+        "step_id": step_id,
+        "step_name": step.name or f"Step {index + 1}",
+        "step_type": step.step_type,
+        "status": status.value,
+        "started_at": started_at.isoformat(),
+        "completed_at": completed_at.isoformat(),
+        "duration_ms": int((completed_at - started_at).total_seconds() * 1000)
+    }
+
+
+_FINISHED = frozenset({StepStatus.COMPLETED.value, StepStatus.SKIPPED.value})
+
+
+class WorkflowEngine:
+    """Executes instances, parks them on wait steps and resumes them."""
+
+    def __init__(self, templates: dict[str, WorkflowTemplate]):
+        self.templates = templates
+        self.store = InMemoryWorkflowStore()
+        self.scheduler: Optional[TimerScheduler] = None
+        self._graphs: dict[str, StepGraph] = {}
+        self.resumed = 0
+        self.recovered = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+
+    @staticmethod
+    def _new_instance(template: WorkflowTemplate, request: WorkflowTriggerRequest) -> WorkflowInstance:
+        return WorkflowInstance(
+            id=str(uuid.uuid4()),
+            template_id=template.id,
+            template_name=template.name,
+            vehicle_id=request.vehicle_id,
+            owner_id=request.owner_id,
+            status=WorkflowStatus.RUNNING,
+            current_step=0,
+            total_steps=len(template.steps),
+            started_at=utcnow(),
+            trigger_data=request.trigger_data
+        )
+
+    async def trigger(
+        self, template: WorkflowTemplate, request: WorkflowTriggerRequest
+    ) -> WorkflowExecuteResponse:
+        """Create an instance and run it up to its first wait."""
+        self._graph(template)
+        instance = self._new_instance(template, request)
+        await self.store.create(instance)
+        await self._advance(instance, template)
+        return self._response(instance, template)
+
+    async def trigger_many(
+        self, template: WorkflowTemplate, requests: list[WorkflowTriggerRequest]
+    ) -> int:
+        """Start a batch of instances of one template. Returns instances started.
+
+        Instances are inserted in one batch and then advanced concurrently,
+        at most ``workflow_dispatch_concurrency`` at a time, so that many
+        reach a batched step together.
+        """
+        self._graph(template)
+        instances = await self.store.create_many(
+            [self._new_instance(template, request) for request in requests]
+        )
+        limit = asyncio.Semaphore(get_settings().workflow_dispatch_concurrency)
+
+        async def advance(instance: WorkflowInstance) -> None:
+            async with limit:
+                await self._advance(instance, template)
+
+        await asyncio.gather(*(advance(i) for i in instances))
+        return len(instances)
+
+    def _graph(self, template: WorkflowTemplate) -> StepGraph:
+        graph = self._graphs.get(template.id)
+        if graph is None:
+            graph = self._graphs[template.id] = build_step_graph(template)
+        return graph
+
+    async def _run_step(self, step: WorkflowStep, instance: WorkflowInstance) -> dict:
+        executor = STEP_EXECUTORS.get(step.step_type, noop_step)
+        timeout = step.timeout_seconds or get_settings().workflow_step_timeout_seconds
+        try:
+            return await asyncio.wait_for(executor(step, instance), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"timed out after {timeout:g}s") from None
+
+    async def _advance(self, instance: WorkflowInstance, template: WorkflowTemplate) -> None:
+        """Run every ready step, concurrently, until only waits remain or all finish.
+
+        Progress is rebuilt from the execution log, so the same call
+        continues a fresh, resumed or recovered instance.
+        """
+        graph = self._graph(template)
+        steps = template.steps
+        logs = {log["step_index"]: log for log in instance.execution_log}
+        done = {index for index, log in logs.items() if log["status"] in _FINISHED}
+        waiting = {
+            index: datetime.fromisoformat(log["output"]["resume_at"])
+            for index, log in logs.items()
+            if log["status"] == StepStatus.PENDING.value
+        }
+        running: dict[asyncio.Task, tuple[int, datetime]] = {}
+        ending = False
+
+        try:
+            while True:
+                now = utcnow()
+                progressed = False
+                for index, resume_at in list(waiting.items()):
+                    if resume_at <= now:
+                        del waiting[index]
+                        done.add(index)
+                        instance.current_step = len(done)
+                        await self._finish_wait(instance, steps[index], logs[index], now)
+                        progressed = True
+
+                active = {index for index, _ in running.values()}
+                for index, step in enumerate(steps if not ending else ()):
+                    if index in done or index in waiting or index in active:
+                        continue
+                    if not all(dep in done for dep in graph.dependencies[index]):
+                        continue
+                    if step.step_type == "wait":
+                        waiting[index] = now + _wait_duration(step)
+                        logs[index] = await self._start_wait(
+                            instance, index, graph.ids[index], step, now, waiting[index]
+                        )
+                        progressed = True
+                    else:
+                        task = asyncio.create_task(self._run_step(step, instance))
+                        running[task] = (index, now)
+                if progressed:
+                    continue  # Zero-length waits and newly ready steps
+
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    index, started_at = running.pop(task)
+                    step = steps[index]
+                    error = task.exception()
+                    if error is not None:
+                        await self._fail(instance, index, graph.ids[index], step, started_at, error)
+                        return
+                    step_log = _step_log(index, graph.ids[index], step, StepStatus.COMPLETED, started_at)
+                    step_log["output"] = task.result()
+                    logs[index] = step_log
+                    instance.execution_log.append(step_log)
+                    done.add(index)
+                    instance.current_step = len(done)
+                    await self.store.record_step(instance.id, step, step_log)
+                    await self.store.save(instance)
+                    if step_log["output"].get("end_workflow"):
+                        ending = True
+        finally:
+            for task in running:
+                task.cancel()
+
+        if waiting and not ending:
+            await self._park(instance, min(waiting.values()))
+            return
+        if ending:
+            await self._skip_remaining(instance, template, done, logs)
+        instance.status = WorkflowStatus.COMPLETED
+        instance.completed_at = utcnow()
+        await self.store.save(instance)
+
+    async def _start_wait(
+        self,
+        instance: WorkflowInstance,
+        index: int,
+        step_id: str,
+        step: WorkflowStep,
+        started_at: datetime,
+        resume_at: datetime
+    ) -> dict:
+        step_log = _step_log(index, step_id, step, StepStatus.PENDING, started_at)
+        step_log["completed_at"] = None
+        step_log["duration_ms"] = None
+        step_log["output"] = {"waiting": True, "resume_at": resume_at.isoformat()}
+        instance.execution_log.append(step_log)
+        await self.store.record_step(instance.id, step, step_log)
+        return step_log
+
+    async def _finish_wait(
+        self, instance: WorkflowInstance, step: WorkflowStep, step_log: dict, now: datetime
+    ) -> None:
+        step_log["status"] = StepStatus.COMPLETED.value
+        step_log["completed_at"] = now.isoformat()
+        step_log["duration_ms"] = int(
+            (now - datetime.fromisoformat(step_log["started_at"])).total_seconds() * 1000
+        )
+        step_log["output"]["waiting"] = False
+        await self.store.record_step(instance.id, step, step_log)
+
+    async def _park(self, instance: WorkflowInstance, resume_at: datetime) -> None:
+        """Persist a waiting instance and hand its earliest wait to the scheduler."""
+        instance.resume_at = resume_at
+        await self.store.save(instance)
+        if self.scheduler is not None:
+            self.scheduler.schedule(instance.id, resume_at)
+
+    async def _fail(
+        self,
+        instance: WorkflowInstance,
+        index: int,
+        step_id: str,
+        step: WorkflowStep,
+        started_at: datetime,
+        error: BaseException
+    ) -> None:
+        now = utcnow()
+        template = self.templates[instance.template_id]
+        for pending in instance.execution_log:
+            if pending["status"] == StepStatus.PENDING.value:
+                pending["status"] = StepStatus.SKIPPED.value
+                pending["completed_at"] = now.isoformat()
+                await self.store.record_step(instance.id, template.steps[pending["step_index"]], pending)
+        step_log = _step_log(index, step_id, step, StepStatus.FAILED, started_at)
+        step_log["error"] = str(error)
+        instance.execution_log.append(step_log)
+        instance.status = WorkflowStatus.FAILED
+        instance.error_message = f"{step_log['step_name']}: {error}"
+        instance.completed_at = now
+        await self.store.record_step(instance.id, step, step_log)
+        await self.store.save(instance)
+
+    async def _skip_remaining(
+        self,
+        instance: WorkflowInstance,
+        template: WorkflowTemplate,
+        done: set[int],
+        logs: dict[int, dict]
+    ) -> None:
+        """Skip every unfinished step, including pending waits."""
+        graph = self._graph(template)
+        now = utcnow()
+        for index, step in enumerate(template.steps):
+            if index in done:
+                continue
+            step_log = logs.get(index)
+            if step_log is None:
+                step_log = _step_log(index, graph.ids[index], step, StepStatus.SKIPPED, now)
+                instance.execution_log.append(step_log)
+            else:
+                step_log["status"] = StepStatus.SKIPPED.value
+                step_log["completed_at"] = now.isoformat()
+            await self.store.record_step(instance.id, step, step_log)
+        instance.current_step = len(template.steps)
+
+    async def _resume(self, instance_id: str, timer: bool) -> None:
+        """Continue an instance whose timer fired or whose step was cut off."""
+        if timer:
+            instance = await self.store.claim(instance_id, utcnow())
+        else:
+            instance = await self.store.get(instance_id)
+        if instance is None or instance.template_id not in self.templates:
+            return
+        if timer:
+            self.resumed += 1
+        else:
+            self.recovered += 1
+        await self._advance(instance, self.templates[instance.template_id])
+
+    async def _abandon(self, instance_id: str, error: Exception) -> None:
+        """Fail an instance that could not be advanced, so it is not resumed again."""
+        instance = await self.store.get(instance_id)
+        if instance is None or instance.status != WorkflowStatus.RUNNING:
+            return
+        instance.status = WorkflowStatus.FAILED
+        instance.error_message = f"{type(error).__name__}: {error}"
+        instance.resume_at = None
+        instance.completed_at = utcnow()
+        await self.store.save(instance)
+
+    async def _work(self) -> None:
+        while True:
+            instance_id, timer = await self._queue.get()
+            try:
+                await self._resume(instance_id, timer)
+            except (asyncpg.PostgresError, OSError) as e:
+                # Left running; recovered on the next start
+                logger.warning("Workflow instance %s failed to resume: %s", instance_id, e)
+            except Exception as e:
+                logger.exception("Workflow instance %s failed", instance_id)
+                try:
+                    await self._abandon(instance_id, e)
+                except Exception:
+                    logger.exception("Marking workflow instance %s failed did not succeed", instance_id)
+            finally:
+                self._queue.task_done()
+
+    def _dispatch_timer(self, instance_id: str) -> None:
+        self._queue.put_nowait((instance_id, True))
+
+    def _response(self, instance: WorkflowInstance, template: WorkflowTemplate) -> WorkflowExecuteResponse:
+        next_step = None
+        pending = [log for log in instance.execution_log if log["status"] == StepStatus.PENDING.value]
+        if instance.resume_at is not None and pending:
+            log = min(pending, key=lambda log: log["output"]["resume_at"])
+            next_step = {
+                "step_index": log["step_index"],
+                "step_name": log["step_name"],
+                "scheduled_for": log["output"]["resume_at"]
+            }
+        return WorkflowExecuteResponse(
+            instance_id=instance.id,
+            status=instance.status,
+            steps_completed=sum(
+                1 for log in instance.execution_log if log["status"] == StepStatus.COMPLETED.value
+            ),
+            total_steps=len(template.steps),
+            execution_log=instance.execution_log,
+            next_scheduled_step=next_step
+        )
+
+    async def start(self) -> None:
+        """Attach the durable store, start workers and recover timers."""
+        if self._workers:
+            return
+        settings = get_settings()
+        pool = await get_pool()
+        if pool is not None:
+            store = PostgresWorkflowStore(pool, self.templates)
+            try:
+                await store.save_templates(list(self.templates.values()))
+                self.store = store
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Workflow store unavailable, using memory: %s", e)
+
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._work()) for _ in range(settings.workflow_workers)
+        ]
+        self.scheduler = TimerScheduler(
+            self.store,
+            self._dispatch_timer,
+            horizon_seconds=settings.workflow_timer_horizon_seconds,
+            batch_size=settings.workflow_timer_batch_size
+        )
+        self.scheduler.start()
+
+        try:
+            interrupted = await self.store.interrupted()
+        except (asyncpg.PostgresError, OSError) as e:
+            logger.warning("Workflow recovery failed: %s", e)
+            interrupted = []
+        for instance_id in interrupted:
+            self._queue.put_nowait((instance_id, False))
+
+    async def stop(self) -> None:
+        """Stop the scheduler and workers; pending waits stay persisted."""
+        if self.scheduler is not None:
+            await self.scheduler.stop()
+            self.scheduler = None
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> WorkflowEngineStats:
+        """Get scheduler and worker metrics."""
+        settings = get_settings()
+        return WorkflowEngineStats(
+            store=self.store.name,
+            workers=len(self._workers),
+            queued=self._queue.qsize() if self._queue is not None else 0,
+            timers_loaded=len(self.scheduler) if self.scheduler is not None else 0,
+            horizon_seconds=settings.workflow_timer_horizon_seconds,
+            resumed=self.resumed,
+            recovered=self.recovered,
+            step_batches={name: batcher.stats() for name, batcher in STEP_BATCHERS.items()}
+        )
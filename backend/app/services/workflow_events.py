@@ -0,0 +1,207 @@
+"""Workflow Event Dispatcher.
+
+Starts event-triggered workflows. Active templates with
+``trigger_type="event"`` are indexed by event name, and their
+``trigger_config["filter"]`` is compiled once into field -> allowed-values
+checks, so an incoming event is only tested against the templates that
+listen for it.
+
+Events arrive through the ingest API or from Postgres ``LISTEN`` on the
+``workflow_events`` channel, which the triggers in
+``migrations/add_workflow_event_triggers.sql`` publish on.
+Notifications are buffered briefly so that a bulk import, which the
+triggers already notify in chunks, starts its instances in a few batched
+inserts rather than one statement per row.
+"""
+import asyncio
+from collections import defaultdict
+import json
+import logging
+import time
+from typing import Any, Callable, Optional
+
+import asyncpg
+
+from app.config import get_settings
+from app.schemas.workflows import (
+    WorkflowEvent,
+    WorkflowEventIngestResponse,
+    WorkflowTemplate,
+    WorkflowTriggerRequest
+)
+from app.services.workflow_engine import WorkflowEngine
+
+logger = logging.getLogger(__name__)
+
+Predicate = Callable[[dict], bool]
+
+# Channel notify_workflow_events() publishes on
+WORKFLOW_EVENT_CHANNEL = "workflow_events"
+
+
+def compile_filter(spec: Optional[dict]) -> Predicate:
+    """Compile a trigger filter into a payload predicate.
+
+    Each key must be present in the payload; a list value allows any of
+    its items, a scalar must match exactly.
+    """
+    if not spec:
+        return lambda payload: True
+    checks = [
+        (field, frozenset(allowed) if isinstance(allowed, (list, tuple, set)) else frozenset([allowed]))
+        for field, allowed in spec.items()
+    ]
+
+    def matches(payload: dict) -> bool:
+        for field, allowed in checks:
+            value = payload.get(field)
+            try:
+                if value not in allowed:
+                    return False
+            except TypeError:  # Unhashable payload values never match
+                return False
+        return True
+
+    return matches
+
+
+class WorkflowEventDispatcher:
+    """Matches events to templates and starts their instances in batches."""
+
+    def __init__(self, templates: dict[str, WorkflowTemplate], engine: WorkflowEngine):
+        self.engine = engine
+        self._index: dict[str, list[tuple[WorkflowTemplate, Predicate]]] = {}
+        self._buffer: list[WorkflowEvent] = []
+        self._pending = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self.refresh(templates)
+
+    def refresh(self, templates: dict[str, WorkflowTemplate]) -> None:
+        """Rebuild the event index from the active event templates."""
+        index: dict[str, list[tuple[WorkflowTemplate, Predicate]]] = defaultdict(list)
+        for template in templates.values():
+            event = template.trigger_config.get("event")
+            if template.is_active and template.trigger_type == "event" and event:
+                index[event].append((template, compile_filter(template.trigger_config.get("filter"))))
+        self._index = dict(index)
+
+    def match(self, event: WorkflowEvent) -> list[WorkflowTemplate]:
+        """Templates triggered by an event."""
+        return [
+            template
+            for template, predicate in self._index.get(event.event, ())
+            if predicate(event.payload)
+        ]
+
+    async def dispatch(self, events: list[WorkflowEvent]) -> WorkflowEventIngestResponse:
+        """Match a batch of events and start the triggered workflows."""
+        start = time.perf_counter()
+        batches: dict[str, tuple[WorkflowTemplate, list[WorkflowTriggerRequest]]] = {}
+        for event in events:
+            for template in self.match(event):
+                _, requests = batches.setdefault(template.id, (template, []))
+                requests.append(WorkflowTriggerRequest(
+                    template_id=template.id,
+                    vehicle_id=event.vehicle_id or event.payload.get("vehicle_id"),
+                    owner_id=event.owner_id or event.payload.get("owner_id"),
+                    trigger_data={"event": event.event, **event.payload}
+                ))
+
+        batch_size = get_settings().workflow_event_batch_size
+        started: dict[str, int] = {}
+        for template_id, (template, requests) in batches.items():
+            started[template_id] = 0
+            for offset in range(0, len(requests), batch_size):
+                started[template_id] += await self.engine.trigger_many(
+                    template, requests[offset:offset + batch_size]
+                )
+
+        return WorkflowEventIngestResponse(
+            events=len(events),
+            instances_started=sum(started.values()),
+            by_template=started,
+            took_ms=round((time.perf_counter() - start) * 1000, 2)
+        )
+
+    def enqueue(self, events: list[WorkflowEvent]) -> None:
+        """Buffer events for the next background dispatch."""
+        self._buffer.extend(events)
+        self._pending.set()
+
+    async def _flush_loop(self, delay: float) -> None:
+        while True:
+            await self._pending.wait()
+            # Collect the rest of a burst before dispatching
+            await asyncio.sleep(delay)
+            events, self._buffer = self._buffer, []
+            self._pending.clear()
+            try:
+                await self.dispatch(events)
+            except Exception:
+                # Keep dispatching later events whatever went wrong with this batch
+                logger.exception("Workflow event dispatch failed for %d events", len(events))
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        """Turn a trigger notification into buffered events.
+
+        Notifications carry ``{"event", "vehicle_key", "rows"}``; each row
+        becomes one event.
+        """
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed workflow notification on %s", channel)
+            return
+        vehicle_key = message.get("vehicle_key") or "vehicle_id"
+        self.enqueue([
+            WorkflowEvent(
+                event=message["event"],
+                payload=row,
+                vehicle_id=row.get(vehicle_key),
+                owner_id=row.get("owner_id")
+            )
+            for row in message.get("rows") or []
+        ])
+
+    async def _listen(self, dsn: str, channel: str) -> None:
+        """Hold a LISTEN connection, reconnecting after failures."""
+        while True:
+            closed = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(dsn)
+                connection.add_termination_listener(lambda c: closed.set())
+                await connection.add_listener(channel, self._on_notify)
+                try:
+                    await closed.wait()
+                finally:
+                    await connection.close()
+            except (asyncpg.PostgresError, OSError) as e:
+                logger.warning("Workflow event listener failed: %s", e)
+            await asyncio.sleep(5)
+
+    async def start(self) -> None:
+        """Start buffered dispatch and, with a database, the LISTEN source."""
+        if self._tasks:
+            return
+        settings = get_settings()
+        self._tasks.append(asyncio.create_task(
+            self._flush_loop(settings.workflow_event_batch_delay_ms / 1000)
+        ))
+        if settings.database_url:
+            self._tasks.append(asyncio.create_task(
+                self._listen(settings.database_url, WORKFLOW_EVENT_CHANNEL)
+            ))
+
+    async def stop(self) -> None:
+        """Stop listening and dispatch whatever is still buffered."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        events, self._buffer = self._buffer, []
+        self._pending.clear()
+        if events:
+            try:
+                await self.dispatch(events)
+            except Exception:
+                logger.exception("Workflow event dispatch failed for %d events", len(events))
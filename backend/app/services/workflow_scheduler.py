@@ -0,0 +1,137 @@
+"""Workflow Timer Scheduler.
+
+Resumes waiting workflow instances when their ``resume_at`` comes due.
+Only timers due within a sliding horizon (an hour by default) are held in
+an in-memory min-heap; later timers stay in the store and are loaded in
+``(resume_at, id)`` order as the horizon advances. Millions of long waits
+such as 30-day insurance reminders therefore cost one indexed range read
+per half-horizon instead of memory or a tight polling loop, and timers
+that came due while the process was down are loaded on start.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+from typing import Callable, Optional
+
+import asyncpg
+
+from app.services.workflow_store import TimerCursor
+
+logger = logging.getLogger(__name__)
+
+LOAD_RETRY = timedelta(seconds=5)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class TimerScheduler:
+    """Min-heap of near-term wait timers fed from the instance store.
+
+    A timer may be pushed more than once (when it is scheduled while its
+    range is being loaded); the store's ``claim`` makes the resumption
+    idempotent.
+    """
+
+    def __init__(
+        self,
+        store,
+        dispatch: Callable[[str], None],
+        horizon_seconds: float,
+        batch_size: int
+    ):
+        self.store = store
+        self.horizon = timedelta(seconds=horizon_seconds)
+        self.batch_size = batch_size
+        self._dispatch = dispatch
+        self._heap: list[tuple[datetime, str]] = []
+        self._cursor: Optional[TimerCursor] = None
+        self._horizon_end: Optional[datetime] = None
+        self._reload = False  # The last load failed part way
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, instance_id: str, resume_at: datetime) -> None:
+        """Track a timer that was just persisted by the store."""
+        if self._horizon_end is None or resume_at > self._horizon_end:
+            return  # Loaded from the store when the horizon reaches it
+        heapq.heappush(self._heap, (resume_at, instance_id))
+        if self._heap[0][1] == instance_id:
+            self._wake.set()
+
+    async def _load(self, now: datetime) -> None:
+        """Extend the horizon and load store timers that fall inside it."""
+        # Set first so timers scheduled during the load are pushed directly
+        self._horizon_end = now + self.horizon
+        while True:
+            timers = await self.store.due_timers(self._cursor, self._horizon_end, self.batch_size)
+            for timer in timers:
+                heapq.heappush(self._heap, timer)
+            if timers:
+                self._cursor = timers[-1]
+            if len(timers) < self.batch_size:
+                return
+            # Let requests run between batches of a large backlog
+            await asyncio.sleep(0)
+
+    def _fire_due(self, now: datetime) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            _, instance_id = heapq.heappop(self._heap)
+            self._dispatch(instance_id)
+
+    async def _run(self) -> None:
+        half_horizon = self.horizon / 2
+        while True:
+            now = utcnow()
+            try:
+                if (
+                    self._reload
+                    or self._horizon_end is None
+                    or now >= self._horizon_end - half_horizon
+                ):
+                    self._reload = True
+                    await self._load(now)
+                    self._reload = False
+                wake_at = self._horizon_end - half_horizon
+            except (asyncpg.PostgresError, OSError) as e:
+                # The horizon is kept so timers scheduled meanwhile, which may
+                # fall before the cursor, are still pushed; the load is retried
+                # from the cursor
+                logger.warning("Workflow timer load failed: %s", e)
+                wake_at = now + LOAD_RETRY
+            self._fire_due(now)
+
+            if self._heap:
+                wake_at = min(wake_at, self._heap[0][0])
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(),
+                    timeout=max((wake_at - utcnow()).total_seconds(), 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Start loading and firing timers."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the scheduler; unfired timers stay in the store."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._heap.clear()
+        self._cursor = None
+        self._horizon_end = None
+        self._reload = False
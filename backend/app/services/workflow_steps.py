@@ -0,0 +1,185 @@
+"""Workflow Step Executors.
+
+Executors for each workflow ``step_type``. Onboarding steps call the VIN
+decoder, recall matching and valuation services in process. Calls from
+concurrently running instances are coalesced by micro-batchers, so a burst
+of 5,000 new vehicles makes a handful of batched decodes rather than
+5,000 single ones.
+"""
+from typing import Any, Awaitable, Callable, Optional
+import uuid
+
+from app.config import get_settings
+from app.schemas.recalls import VehicleRecallMatch
+from app.schemas.valuations import ValuationRequest, ValuationResponse
+from app.schemas.workflows import StepStatus, WorkflowInstance, WorkflowStep
+from app.services.batching import MicroBatcher
+from app.services.recalls import recall_matching_service
+from app.services.valuations import vehicle_valuation_service
+from app.services.vin_decoder import vin_decoder_service
+
+StepExecutor = Callable[[WorkflowStep, WorkflowInstance], Awaitable[dict]]
+
+
+async def _check_recalls_batch(vehicles: list[dict]) -> list[Optional[VehicleRecallMatch]]:
+    # Positions stand in for vehicle ids so duplicates map back correctly
+    response = await recall_matching_service.check_fleet(
+        [{**vehicle, "id": str(position)} for position, vehicle in enumerate(vehicles)]
+    )
+    results: list[Optional[VehicleRecallMatch]] = [None] * len(vehicles)
+    for match in response.matches:
+        results[int(match.vehicle_id)] = match
+    return results
+
+
+_settings = get_settings()
+_max_delay = _settings.workflow_batch_max_delay_ms / 1000
+
+vin_batcher = MicroBatcher(vin_decoder_service.decode_batch, _settings.workflow_batch_max_size, _max_delay)
+recall_batcher = MicroBatcher(_check_recalls_batch, _settings.workflow_batch_max_size, _max_delay)
+valuation_batcher = MicroBatcher(
+    vehicle_valuation_service.valuate_batch, _settings.workflow_batch_max_size, _max_delay
+)
+
+STEP_BATCHERS: dict[str, MicroBatcher] = {
+    "decode_vin": vin_batcher,
+    "check_recalls": recall_batcher,
+    "generate_valuation": valuation_batcher,
+}
+
+
+def _vehicle_context(instance: WorkflowInstance) -> dict[str, Any]:
+    """Vehicle facts from decoded VIN data, overridden by the trigger data."""
+    context: dict[str, Any] = {}
+    for log in instance.execution_log:
+        if log["step_type"] == "enrich_data" and log["status"] == StepStatus.COMPLETED.value:
+            context.update(log["output"].get("vehicle") or {})
+    context.update({k: v for k, v in instance.trigger_data.items() if v is not None})
+    if instance.vehicle_id:
+        context.setdefault("vehicle_id", instance.vehicle_id)
+    return context
+
+
+async def _send_email(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    return {
+        "email_sent": True,
+        "template": step.config.get("template"),
+        "recipient": "owner@example.com"
+    }
+
+
+async def _send_sms(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    return {
+        "sms_sent": True,
+        "template": step.config.get("template")
+    }
+
+
+async def _create_notification(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    return {
+        "notification_created": True,
+        "notification_id": f"notif-{uuid.uuid4().hex[:8]}"
+    }
+
+
+async def _condition(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    """Evaluate a check against the trigger data.
+
+    Threshold checks pass when the value is missing or within the
+    threshold (the trigger already selected the record); other checks pass
+    when the trigger data sets them. ``if_true``/``if_false`` set to
+    "end" finish the workflow early.
+    """
+    check = step.config.get("check")
+    value = instance.trigger_data.get(check)
+    if "threshold" in step.config:
+        met = value is None or value <= step.config["threshold"]
+    else:
+        met = bool(value)
+    branch = step.config.get("if_true" if met else "if_false")
+    return {
+        "condition_met": met,
+        "checked": check,
+        "end_workflow": branch == "end"
+    }
+
+
+async def _enrich_data(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    """Decode the vehicle's VIN; the result feeds later onboarding steps."""
+    if step.config.get("action") != "decode_vin":
+        return {"success": True}
+    vin = instance.trigger_data.get("vin")
+    if not vin:
+        return {"decoded": False, "reason": "No VIN in trigger data"}
+    decoded = await vin_batcher.submit(vin)
+    if not decoded.is_valid:
+        return {"decoded": False, "reason": decoded.error_message}
+    return {
+        "decoded": True,
+        "vehicle": {
+            "vin": decoded.vin,
+            "manufacturer": decoded.manufacturer,
+            "model": decoded.model,
+            "year": decoded.year,
+            "vehicle_type": decoded.vehicle_type
+        }
+    }
+
+
+async def _check_recalls(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    vehicle = _vehicle_context(instance)
+    if not vehicle.get("manufacturer") or not vehicle.get("model"):
+        return {"checked": False, "reason": "Vehicle make and model unknown"}
+    match = await recall_batcher.submit({
+        "vehicle_id": vehicle.get("vehicle_id", ""),
+        "vin": vehicle.get("vin", ""),
+        "manufacturer": vehicle["manufacturer"],
+        "model": vehicle["model"],
+        "year": vehicle.get("year", 2020)
+    })
+    if match is None:
+        return {"checked": True, "recalls_found": 0}
+    return {
+        "checked": True,
+        "recalls_found": match.total_recalls,
+        "priority": match.priority,
+        "recall_numbers": [r.recall_number for r in match.recalls]
+    }
+
+
+async def _generate_valuation(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    vehicle = _vehicle_context(instance)
+    if not vehicle.get("manufacturer") or not vehicle.get("model") or not vehicle.get("year"):
+        return {"valued": False, "reason": "Vehicle make, model and year unknown"}
+    valuation: ValuationResponse = await valuation_batcher.submit(ValuationRequest(
+        vehicle_id=vehicle.get("vehicle_id") or instance.id,
+        vin=vehicle.get("vin"),
+        manufacturer=vehicle["manufacturer"],
+        model=vehicle["model"],
+        year=vehicle["year"],
+        mileage=vehicle.get("mileage") or 0,
+        vehicle_type=(vehicle.get("vehicle_type") or "sedan").lower()
+    ))
+    return {
+        "valued": True,
+        "estimated_value": valuation.estimated_value,
+        "value_low": valuation.value_low,
+        "value_high": valuation.value_high,
+        "confidence_level": valuation.confidence_level.value
+    }
+
+
+async def noop_step(step: WorkflowStep, instance: WorkflowInstance) -> dict:
+    """Executor for step types without side effects."""
+    return {"success": True}
+
+
+STEP_EXECUTORS: dict[str, StepExecutor] = {
+    "send_email": _send_email,
+    "send_sms": _send_sms,
+    "create_notification": _create_notification,
+    "condition": _condition,
+    "enrich_data": _enrich_data,
+    "check_recalls": _check_recalls,
+    "generate_valuation": _generate_valuation,
+}
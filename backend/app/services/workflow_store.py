@@ -0,0 +1,575 @@
+"""Workflow Instance Store.
+
+Persistence for workflow instances, their step executions and their wait
+timers. ``PostgresWorkflowStore`` writes to ``workflow_instance`` and
+``workflow_step_execution`` so running workflows survive restarts;
+``InMemoryWorkflowStore`` keeps the same interface in process memory when
+no database is configured.
+
+Waiting instances are ``running`` with a ``resume_at`` timestamp. A timer
+is consumed by ``claim``, which clears ``resume_at`` atomically, so a
+timer that is loaded twice still resumes its instance only once.
+
+Instances are listed newest first, by ``(started_at, id)``, with keyset
+cursors; both stores answer status, template and vehicle filters from an
+index rather than by scanning history.
+"""
+import bisect
+from collections import defaultdict
+from datetime import datetime
+import heapq
+import json
+import logging
+import uuid
+from typing import Iterator, NamedTuple, Optional
+
+import asyncpg
+
+from app.schemas.workflows import (
+    WorkflowInstance,
+    WorkflowStatus,
+    WorkflowStep,
+    WorkflowTemplate
+)
+
+logger = logging.getLogger(__name__)
+
+# Built-in templates have string ids ("wf-001"); their workflow_template
+# rows use a stable UUID derived from that id
+TEMPLATE_NAMESPACE = uuid.UUID("6f1d3c2e-8b7a-4f0e-9c55-2a4e7d9b1f30")
+
+_INSERT_INSTANCE_SQL = """
+    INSERT INTO workflow_instance (
+        id, template_id, vehicle_id, owner_id, trigger_data,
+        current_step, status, started_at, resume_at, execution_log
+    ) VALUES ($1, $2, $3, $4, $5::jsonb, $6, $7, $8, $9, $10::jsonb)
+"""
+
+# Position of a timer load; timers are read in (resume_at, id) order
+TimerCursor = tuple[datetime, str]
+
+# Position in an instance listing; instances are listed by (started_at, id)
+# descending
+InstanceCursor = tuple[datetime, str]
+
+
+def template_uuid(template_id: str) -> uuid.UUID:
+    """Database id of a template."""
+    return uuid.uuid5(TEMPLATE_NAMESPACE, template_id)
+
+
+def _uuid_or_none(value: Optional[str]) -> Optional[uuid.UUID]:
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+class InstanceFilter(NamedTuple):
+    """Instance listing filters; ``started_before`` is exclusive."""
+    status: Optional[WorkflowStatus] = None
+    template_id: Optional[str] = None
+    vehicle_id: Optional[str] = None
+    started_after: Optional[datetime] = None
+    started_before: Optional[datetime] = None
+
+
+def _bucket(started_at: datetime) -> int:
+    """Start-time bucket (epoch minute) of the in-memory time index."""
+    return int(started_at.timestamp()) // 60
+
+
+class _InstanceRecord:
+    """Compact in-memory form of a workflow instance."""
+
+    __slots__ = (
+        "id", "template_id", "template_name", "vehicle_id", "owner_id",
+        "status", "current_step", "total_steps", "started_at", "completed_at",
+        "resume_at", "error_message", "trigger_data", "execution_log"
+    )
+
+    def __init__(self, instance: WorkflowInstance):
+        self.id = instance.id
+        self.template_id = instance.template_id
+        self.template_name = instance.template_name
+        self.vehicle_id = instance.vehicle_id
+        self.owner_id = instance.owner_id
+        self.started_at = instance.started_at
+        self.trigger_data = instance.trigger_data
+        self.update(instance)
+
+    def update(self, instance: WorkflowInstance) -> None:
+        self.status = instance.status
+        self.current_step = instance.current_step
+        self.total_steps = instance.total_steps
+        self.completed_at = instance.completed_at
+        self.resume_at = instance.resume_at
+        self.error_message = instance.error_message
+        self.execution_log = list(instance.execution_log)
+
+    def sort_key(self) -> InstanceCursor:
+        return (self.started_at, self.id)
+
+    def to_instance(self) -> WorkflowInstance:
+        return WorkflowInstance.model_construct(
+            id=self.id,
+            template_id=self.template_id,
+            template_name=self.template_name,
+            vehicle_id=self.vehicle_id,
+            owner_id=self.owner_id,
+            status=self.status,
+            current_step=self.current_step,
+            total_steps=self.total_steps,
+            started_at=self.started_at,
+            completed_at=self.completed_at,
+            resume_at=self.resume_at,
+            error_message=self.error_message,
+            trigger_data=self.trigger_data,
+            execution_log=list(self.execution_log)
+        )
+
+
+class InMemoryWorkflowStore:
+    """Process-local store used when no database is configured.
+
+    Instances are held as slotted records with secondary indexes on
+    status, template and vehicle, plus a start-time index. A listing
+    reads the smallest matching index, or walks the start-time index
+    newest first, so neither listing running instances nor paging recent
+    history scans everything.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._records: dict[str, _InstanceRecord] = {}
+        self._by_status: dict[WorkflowStatus, set[str]] = defaultdict(set)
+        self._by_template: dict[str, set[str]] = defaultdict(set)
+        self._by_vehicle: dict[str, set[str]] = defaultdict(set)
+        self._by_bucket: dict[int, set[str]] = defaultdict(set)
+        self._buckets: list[int] = []  # Sorted keys of _by_bucket
+        self._timers: list[tuple[datetime, str]] = []
+
+    async def save_templates(self, templates: list[WorkflowTemplate]) -> None:
+        """Nothing to persist; templates live in the service."""
+
+    def _add(self, instance: WorkflowInstance) -> None:
+        record = _InstanceRecord(instance)
+        self._records[record.id] = record
+        self._by_status[record.status].add(record.id)
+        self._by_template[record.template_id].add(record.id)
+        if record.vehicle_id:
+            self._by_vehicle[record.vehicle_id].add(record.id)
+        bucket = _bucket(record.started_at)
+        if bucket not in self._by_bucket:
+            bisect.insort(self._buckets, bucket)
+        self._by_bucket[bucket].add(record.id)
+
+    async def create(self, instance: WorkflowInstance) -> None:
+        self._add(instance)
+
+    async def create_many(self, instances: list[WorkflowInstance]) -> list[WorkflowInstance]:
+        for instance in instances:
+            self._add(instance)
+        return instances
+
+    async def save(self, instance: WorkflowInstance) -> None:
+        record = self._records.get(instance.id)
+        if record is None:
+            self._add(instance)
+        else:
+            if record.status != instance.status:
+                self._by_status[record.status].discard(record.id)
+                self._by_status[instance.status].add(record.id)
+            record.update(instance)
+        if instance.resume_at is not None:
+            heapq.heappush(self._timers, (instance.resume_at, instance.id))
+
+    async def record_step(self, instance_id: str, step: WorkflowStep, step_log: dict) -> None:
+        """Step logs are kept on the instance's execution_log."""
+
+    async def get(self, instance_id: str) -> Optional[WorkflowInstance]:
+        record = self._records.get(instance_id)
+        return record.to_instance() if record else None
+
+    def _smallest_index(self, where: InstanceFilter) -> Optional[set[str]]:
+        """Ids from the most selective index that applies, if any."""
+        indexes = []
+        if where.status is not None:
+            indexes.append(self._by_status.get(where.status, set()))
+        if where.template_id is not None:
+            indexes.append(self._by_template.get(where.template_id, set()))
+        if where.vehicle_id is not None:
+            indexes.append(self._by_vehicle.get(where.vehicle_id, set()))
+        return min(indexes, key=len) if indexes else None
+
+    def _newest_first(
+        self, lower: Optional[datetime], upper: Optional[datetime]
+    ) -> Iterator[list[_InstanceRecord]]:
+        """Records grouped by start-time bucket, newest bucket first."""
+        start = 0 if lower is None else bisect.bisect_left(self._buckets, _bucket(lower))
+        end = len(self._buckets) if upper is None else bisect.bisect_right(self._buckets, _bucket(upper))
+        for position in range(end - 1, start - 1, -1):
+            yield [self._records[i] for i in self._by_bucket[self._buckets[position]]]
+
+    async def list_instances(
+        self, where: InstanceFilter, after: Optional[InstanceCursor], limit: int
+    ) -> list[WorkflowInstance]:
+        """Matching instances after ``after``, newest first.
+
+        A small index is read whole; otherwise start-time buckets are
+        walked newest first until the page fills, which is cheaper when
+        most records match.
+        """
+        def matches(record: _InstanceRecord) -> bool:
+            return (
+                (where.status is None or record.status == where.status)
+                and (where.template_id is None or record.template_id == where.template_id)
+                and (where.vehicle_id is None or record.vehicle_id == where.vehicle_id)
+                and (where.started_after is None or record.started_at >= where.started_after)
+                and (where.started_before is None or record.started_at < where.started_before)
+                and (after is None or record.sort_key() < after)
+            )
+
+        index = self._smallest_index(where)
+        # Reading the index costs len(index); walking buckets costs about
+        # limit * total / len(index) records
+        if index is not None and len(index) ** 2 <= limit * len(self._records):
+            records = (self._records[i] for i in index)
+            page = heapq.nlargest(limit, filter(matches, records), key=_InstanceRecord.sort_key)
+            return [record.to_instance() for record in page]
+
+        upper = min(
+            (bound for bound in (after and after[0], where.started_before) if bound is not None),
+            default=None
+        )
+        page: list[_InstanceRecord] = []
+        for bucket in self._newest_first(where.started_after, upper):
+            page.extend(heapq.nlargest(
+                limit - len(page), filter(matches, bucket), key=_InstanceRecord.sort_key
+            ))
+            if len(page) >= limit:
+                break
+        return [record.to_instance() for record in page]
+
+    async def claim(self, instance_id: str, now: datetime) -> Optional[WorkflowInstance]:
+        """Consume a due timer, returning the instance to resume."""
+        record = self._records.get(instance_id)
+        if (
+            record is None
+            or record.status != WorkflowStatus.RUNNING
+            or record.resume_at is None
+            or record.resume_at > now
+        ):
+            return None
+        record.resume_at = None
+        return record.to_instance()
+
+    async def due_timers(
+        self, after: Optional[TimerCursor], until: datetime, limit: int
+    ) -> list[TimerCursor]:
+        """Pending timers due by ``until``, earliest first.
+
+        Timers are popped as they are returned, so ``after`` is implied.
+        Stale entries (instances that already resumed) are dropped here.
+        """
+        due = []
+        while self._timers and self._timers[0][0] <= until and len(due) < limit:
+            resume_at, instance_id = heapq.heappop(self._timers)
+            record = self._records.get(instance_id)
+            if record is not None and record.resume_at == resume_at:
+                due.append((resume_at, instance_id))
+        return due
+
+    async def interrupted(self) -> list[str]:
+        """Instances cut off mid-step; none survive a restart in memory."""
+        return []
+
+
+class PostgresWorkflowStore:
+    """Store backed by workflow_instance and workflow_step_execution."""
+
+    name = "postgres"
+
+    def __init__(self, pool: asyncpg.Pool, templates: dict[str, WorkflowTemplate]):
+        self._pool = pool
+        self._templates = templates
+        self._template_ids = {template_uuid(t): t for t in templates}
+
+    async def save_templates(self, templates: list[WorkflowTemplate]) -> None:
+        """Upsert built-in templates so instances can reference them."""
+        await self._pool.executemany(
+            """
+            INSERT INTO workflow_template (
+                id, name, description, category, trigger_type,
+                trigger_config, steps, is_active
+            ) VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7::jsonb, $8)
+            ON CONFLICT (id) DO UPDATE SET
+                name = EXCLUDED.name,
+                description = EXCLUDED.description,
+                category = EXCLUDED.category,
+                trigger_type = EXCLUDED.trigger_type,
+                trigger_config = EXCLUDED.trigger_config,
+                steps = EXCLUDED.steps,
+                is_active = EXCLUDED.is_active
+            """,
+            [
+                (
+                    template_uuid(t.id),
+                    t.name,
+                    t.description,
+                    t.category,
+                    t.trigger_type,
+                    json.dumps(t.trigger_config),
+                    json.dumps([s.model_dump() for s in t.steps]),
+                    t.is_active
+                )
+                for t in templates
+            ]
+        )
+
+    @staticmethod
+    def _insert_args(instance: WorkflowInstance) -> tuple:
+        # Non-UUID vehicle/owner ids (demo data) are kept in trigger_data only
+        trigger_data = dict(instance.trigger_data)
+        for key in ("vehicle_id", "owner_id"):
+            value = getattr(instance, key)
+            if value is not None and _uuid_or_none(value) is None:
+                trigger_data[key] = value
+        return (
+            uuid.UUID(instance.id),
+            template_uuid(instance.template_id),
+            _uuid_or_none(instance.vehicle_id),
+            _uuid_or_none(instance.owner_id),
+            json.dumps(trigger_data),
+            instance.current_step,
+            instance.status.value,
+            instance.started_at,
+            instance.resume_at,
+            json.dumps(instance.execution_log)
+        )
+
+    async def create(self, instance: WorkflowInstance) -> None:
+        try:
+            await self._pool.execute(_INSERT_INSTANCE_SQL, *self._insert_args(instance))
+        except asyncpg.ForeignKeyViolationError as e:
+            raise ValueError(f"Unknown vehicle or owner: {e.detail}") from e
+
+    async def create_many(self, instances: list[WorkflowInstance]) -> list[WorkflowInstance]:
+        """Insert instances in one batch; returns those that were created.
+
+        If any row references an unknown vehicle or owner the batch is
+        retried row by row and the offending rows are dropped.
+        """
+        try:
+            await self._pool.executemany(
+                _INSERT_INSTANCE_SQL, [self._insert_args(i) for i in instances]
+            )
+            return instances
+        except asyncpg.ForeignKeyViolationError:
+            pass
+        created = []
+        for instance in instances:
+            try:
+                await self.create(instance)
+                created.append(instance)
+            except ValueError as e:
+                logger.warning("Skipping workflow instance for %s: %s", instance.template_id, e)
+        return created
+
+    async def save(self, instance: WorkflowInstance) -> None:
+        await self._pool.execute(
+            """
+            UPDATE workflow_instance
+            SET current_step = $2, status = $3, completed_at = $4,
+                resume_at = $5, error_message = $6, execution_log = $7::jsonb
+            WHERE id = $1
+            """,
+            uuid.UUID(instance.id),
+            instance.current_step,
+            instance.status.value,
+            instance.completed_at,
+            instance.resume_at,
+            instance.error_message,
+            json.dumps(instance.execution_log)
+        )
+
+    async def record_step(self, instance_id: str, step: WorkflowStep, step_log: dict) -> None:
+        """Insert a step execution, or complete the pending row of a wait."""
+        output = json.dumps(step_log.get("output"))
+        updated = await self._pool.execute(
+            """
+            UPDATE workflow_step_execution
+            SET status = $3, output_data = $4::jsonb, completed_at = $5,
+                duration_ms = $6, error_message = $7
+            WHERE instance_id = $1 AND step_index = $2 AND status = 'pending'
+            """,
+            uuid.UUID(instance_id),
+            step_log["step_index"],
+            step_log["status"],
+            output,
+            _parse_time(step_log.get("completed_at")),
+            step_log.get("duration_ms"),
+            step_log.get("error")
+        )
+        if updated != "UPDATE 0":
+            return
+        await self._pool.execute(
+            """
+            INSERT INTO workflow_step_execution (
+                instance_id, step_index, step_name, step_type, step_config,
+                status, output_data, started_at, completed_at, duration_ms,
+                error_message
+            ) VALUES ($1, $2, $3, $4, $5::jsonb, $6, $7::jsonb, $8, $9, $10, $11)
+            """,
+            uuid.UUID(instance_id),
+            step_log["step_index"],
+            step_log.get("step_name"),
+            step_log["step_type"],
+            json.dumps(step.config),
+            step_log["status"],
+            output,
+            _parse_time(step_log.get("started_at")),
+            _parse_time(step_log.get("completed_at")),
+            step_log.get("duration_ms"),
+            step_log.get("error")
+        )
+
+    def _to_instance(self, row: asyncpg.Record) -> Optional[WorkflowInstance]:
+        template = self._template_ids.get(row["template_id"])
+        if template is None:
+            return None
+        trigger_data = json.loads(row["trigger_data"] or "{}")
+        vehicle_id = row["vehicle_id"]
+        owner_id = row["owner_id"]
+        return WorkflowInstance(
+            id=str(row["id"]),
+            template_id=template,
+            template_name=self._templates[template].name,
+            vehicle_id=str(vehicle_id) if vehicle_id else trigger_data.get("vehicle_id"),
+            owner_id=str(owner_id) if owner_id else trigger_data.get("owner_id"),
+            status=WorkflowStatus(row["status"]),
+            current_step=row["current_step"],
+            total_steps=len(self._templates[template].steps),
+            started_at=row["started_at"],
+            completed_at=row["completed_at"],
+            resume_at=row["resume_at"],
+            error_message=row["error_message"],
+            trigger_data=trigger_data,
+            execution_log=json.loads(row["execution_log"] or "[]")
+        )
+
+    async def get(self, instance_id: str) -> Optional[WorkflowInstance]:
+        key = _uuid_or_none(instance_id)
+        if key is None:
+            return None
+        row = await self._pool.fetchrow("SELECT * FROM workflow_instance WHERE id = $1", key)
+        return self._to_instance(row) if row else None
+
+    async def list_instances(
+        self, where: InstanceFilter, after: Optional[InstanceCursor], limit: int
+    ) -> list[WorkflowInstance]:
+        """Matching instances after ``after``, newest first.
+
+        Each filter combination is served by one of the
+        ``(column, started_at DESC, id DESC)`` indexes, with the cursor as
+        a keyset bound, so a page costs the same at any depth.
+        """
+        conditions: list[str] = []
+        params: list = []
+
+        def param(value) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        if where.status is not None:
+            conditions.append(f"status = {param(where.status.value)}")
+        if where.template_id is not None:
+            if where.template_id not in self._templates:
+                return []
+            conditions.append(f"template_id = {param(template_uuid(where.template_id))}")
+        if where.vehicle_id is not None:
+            vehicle_key = _uuid_or_none(where.vehicle_id)
+            if vehicle_key is not None:
+                conditions.append(f"vehicle_id = {param(vehicle_key)}")
+            else:  # Demo ids are only kept in trigger_data
+                conditions.append(f"trigger_data->>'vehicle_id' = {param(where.vehicle_id)}")
+        if where.started_after is not None:
+            conditions.append(f"started_at >= {param(where.started_after)}")
+        if where.started_before is not None:
+            conditions.append(f"started_at < {param(where.started_before)}")
+        if after is not None:
+            after_id = _uuid_or_none(after[1])
+            if after_id is None:
+                raise ValueError("Invalid cursor")
+            conditions.append(f"(started_at, id) < ({param(after[0])}, {param(after_id)})")
+
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = await self._pool.fetch(
+            f"""
+            SELECT * FROM workflow_instance
+            {where_sql}
+            ORDER BY started_at DESC, id DESC
+            LIMIT {param(limit)}
+            """,
+            *params
+        )
+        return [i for i in map(self._to_instance, rows) if i is not None]
+
+    async def claim(self, instance_id: str, now: datetime) -> Optional[WorkflowInstance]:
+        """Consume a due timer, returning the instance to resume."""
+        row = await self._pool.fetchrow(
+            """
+            UPDATE workflow_instance
+            SET resume_at = NULL
+            WHERE id = $1 AND status = 'running' AND resume_at <= $2
+            RETURNING *
+            """,
+            uuid.UUID(instance_id),
+            now
+        )
+        return self._to_instance(row) if row else None
+
+    async def due_timers(
+        self, after: Optional[TimerCursor], until: datetime, limit: int
+    ) -> list[TimerCursor]:
+        """Pending timers after ``after`` and due by ``until``, earliest first."""
+        if after is None:
+            rows = await self._pool.fetch(
+                """
+                SELECT resume_at, id FROM workflow_instance
+                WHERE status = 'running' AND resume_at <= $1
+                ORDER BY resume_at, id
+                LIMIT $2
+                """,
+                until,
+                limit
+            )
+        else:
+            rows = await self._pool.fetch(
+                """
+                SELECT resume_at, id FROM workflow_instance
+                WHERE status = 'running' AND resume_at <= $1
+                  AND (resume_at, id) > ($2, $3)
+                ORDER BY resume_at, id
+                LIMIT $4
+                """,
+                until,
+                after[0],
+                uuid.UUID(after[1]),
+                limit
+            )
+        return [(row["resume_at"], str(row["id"])) for row in rows]
+
+    async def interrupted(self) -> list[str]:
+        """Running instances with no timer: a step was cut off by a crash."""
+        rows = await self._pool.fetch(
+            "SELECT id FROM workflow_instance WHERE status = 'running' AND resume_at IS NULL"
+        )
+        return [str(row["id"]) for row in rows]
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
@@ -1,20 +1,27 @@
-"""Mock Workflow Automation Service.
+"""Workflow Automation Service.
 
-Simulates workflow execution engine.
+Predefined workflow templates and the service facade used by the API.
+Instances are executed and persisted by the workflow engine.
 """
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from typing import Optional
-import uuid
 
 from app.schemas.workflows import (
     WorkflowTemplate,
     WorkflowInstance,
+    WorkflowInstancePage,
     WorkflowStep,
     WorkflowStatus,
-    StepStatus,
     WorkflowTriggerRequest,
-    WorkflowExecuteResponse
+    WorkflowExecuteResponse,
+    WorkflowEngineStats,
+    WorkflowEvent,
+    WorkflowEventIngestResponse
 )
+from app.services.cursors import decode_cursor, encode_cursor
+from app.services.workflow_engine import WorkflowEngine
+from app.services.workflow_events import WorkflowEventDispatcher
+from app.services.workflow_store import InstanceFilter
 
 
 # Predefined workflow templates
@@ -143,6 +150,7 @@ DEFAULT_TEMPLATES = [
         },
         steps=[
             WorkflowStep(
+                id="notify",
                 step_type="create_notification",
                 config={
                     "type": "recall_notice",
@@ -151,19 +159,25 @@ DEFAULT_TEMPLATES = [
                 name="Create recall notification"
             ),
             WorkflowStep(
+                id="email",
                 step_type="send_email",
                 config={
                     "template": "recall_notice",
                     "subject": "Important Safety Recall Notice"
                 },
-                name="Send recall email"
+                name="Send recall email",
+                depends_on=["notify"],
+                timeout_seconds=30
             ),
             WorkflowStep(
+                id="sms",
                 step_type="send_sms",
                 config={
                     "template": "recall_sms"
                 },
-                name="Send recall SMS"
+                name="Send recall SMS",
+                depends_on=["notify"],
+                timeout_seconds=30
             )
         ]
     ),
@@ -178,39 +192,54 @@ DEFAULT_TEMPLATES = [
         },
         steps=[
             WorkflowStep(
+                id="decode_vin",
                 step_type="enrich_data",
                 config={"action": "decode_vin"},
                 name="Decode VIN information"
             ),
             WorkflowStep(
+                id="check_recalls",
                 step_type="check_recalls",
                 config={},
-                name="Check for open recalls"
+                name="Check for open recalls",
+                depends_on=["decode_vin"]
             ),
             WorkflowStep(
+                id="valuation",
+                step_type="generate_valuation",
+                config={},
+                name="Generate initial valuation",
+                depends_on=["decode_vin"]
+            ),
+            WorkflowStep(
+                id="notify",
                 step_type="create_notification",
                 config={
                     "type": "vehicle_added",
                     "priority": "low"
                 },
-                name="Notify owner of setup"
-            ),
-            WorkflowStep(
-                step_type="generate_valuation",
-                config={},
-                name="Generate initial valuation"
+                name="Notify owner of setup",
+                depends_on=["check_recalls", "valuation"]
             )
         ]
     )
 ]
 
 
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Naive filter times are taken as UTC, matching instance timestamps
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
 class WorkflowAutomationService:
-    """Mock workflow automation service."""
+    """Workflow automation service backed by the durable workflow engine."""
     
     def __init__(self):
         self.templates = {t.id: t for t in DEFAULT_TEMPLATES}
-        self.instances: dict[str, WorkflowInstance] = {}
+        self.engine = WorkflowEngine(self.templates)
+        self.events = WorkflowEventDispatcher(self.templates, self.engine)
     
     async def list_templates(self) -> list[WorkflowTemplate]:
         """List all workflow templates."""
@@ -223,130 +252,70 @@ class WorkflowAutomationService:
     async def trigger_workflow(
         self, request: WorkflowTriggerRequest
     ) -> WorkflowExecuteResponse:
-        """Trigger a workflow execution."""
+        """Start a workflow and run it until its first wait step."""
         template = self.templates.get(request.template_id)
         if not template:
             raise ValueError(f"Template {request.template_id} not found")
-        
-        # Create instance
-        instance_id = f"inst-{uuid.uuid4().hex[:8]}"
-        now = datetime.now()
-        
-        instance = WorkflowInstance(
-            id=instance_id,
-            template_id=template.id,
-            template_name=template.name,
-            vehicle_id=request.vehicle_id,
-            owner_id=request.owner_id,
-            status=WorkflowStatus.RUNNING,
-            current_step=0,
-            total_steps=len(template.steps),
-            started_at=now,
-            execution_log=[]
-        )
-        
-        # Simulate step execution
-        execution_log = []
-        completed_steps = 0
-        
-        for i, step in enumerate(template.steps):
-            step_log = {
-                "step_index": i,
-                "step_name": step.name or f"Step {i+1}",
-                "step_type": step.step_type,
-                "status": "completed",
-                "started_at": (now + timedelta(seconds=i)).isoformat(),
-                "completed_at": (now + timedelta(seconds=i+1)).isoformat(),
-                "duration_ms": 100 + (i * 50)
-            }
-            
-            # Simulate step-specific behavior
-            if step.step_type == "wait":
-                step_log["output"] = {
-                    "waiting": True,
-                    "resume_at": (now + timedelta(
-                        hours=step.config.get("hours", 0),
-                        days=step.config.get("days", 0)
-                    )).isoformat()
-                }
-                step_log["status"] = "pending"  # Wait steps are pending
-            elif step.step_type == "send_email":
-                step_log["output"] = {
-                    "email_sent": True,
-                    "template": step.config.get("template"),
-                    "recipient": "owner@example.com"
-                }
-            elif step.step_type == "create_notification":
-                step_log["output"] = {
-                    "notification_created": True,
-                    "notification_id": f"notif-{uuid.uuid4().hex[:8]}"
-                }
-            elif step.step_type == "condition":
-                step_log["output"] = {
-                    "condition_met": True,
-                    "checked": step.config.get("check")
-                }
-            else:
-                step_log["output"] = {"success": True}
-            
-            execution_log.append(step_log)
-            
-            if step_log["status"] == "completed":
-                completed_steps += 1
-            elif step_log["status"] == "pending":
-                # Stop at wait steps
-                break
-        
-        # Determine final status
-        if completed_steps == len(template.steps):
-            final_status = WorkflowStatus.COMPLETED
-        else:
-            final_status = WorkflowStatus.RUNNING
-        
-        instance.execution_log = execution_log
-        instance.current_step = completed_steps
-        instance.status = final_status
-        
-        if final_status == WorkflowStatus.COMPLETED:
-            instance.completed_at = now + timedelta(seconds=len(template.steps))
-        
-        self.instances[instance_id] = instance
-        
-        # Find next scheduled step if any
-        next_step = None
-        if completed_steps < len(template.steps):
-            pending_step = template.steps[completed_steps]
-            if pending_step.step_type == "wait":
-                next_step = {
-                    "step_index": completed_steps,
-                    "step_name": pending_step.name,
-                    "scheduled_for": execution_log[-1].get("output", {}).get("resume_at")
-                }
-        
-        return WorkflowExecuteResponse(
-            instance_id=instance_id,
-            status=final_status,
-            steps_completed=completed_steps,
-            total_steps=len(template.steps),
-            execution_log=execution_log,
-            next_scheduled_step=next_step
-        )
+        return await self.engine.trigger(template, request)
+    
+    async def ingest_events(self, events: list[WorkflowEvent]) -> WorkflowEventIngestResponse:
+        """Start the workflows triggered by a batch of events."""
+        return await self.events.dispatch(events)
     
     async def get_instance(self, instance_id: str) -> Optional[WorkflowInstance]:
         """Get a workflow instance."""
-        return self.instances.get(instance_id)
+        return await self.engine.store.get(instance_id)
     
     async def list_instances(
         self,
-        status: Optional[WorkflowStatus] = None
-    ) -> list[WorkflowInstance]:
-        """List workflow instances."""
-        instances = list(self.instances.values())
-        if status:
-            instances = [i for i in instances if i.status == status]
-        return instances
+        status: Optional[WorkflowStatus] = None,
+        template_id: Optional[str] = None,
+        vehicle_id: Optional[str] = None,
+        started_after: Optional[datetime] = None,
+        started_before: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> WorkflowInstancePage:
+        """List workflow instances newest first, one page at a time.
+        
+        Raises ValueError for a cursor that was not issued by this method.
+        """
+        after = None
+        if cursor:
+            started_at, instance_id = decode_cursor(cursor)
+            try:
+                after = (_as_utc(datetime.fromisoformat(started_at)), instance_id)
+            except (TypeError, ValueError) as e:
+                raise ValueError("Invalid cursor") from e
+        where = InstanceFilter(
+            status=status,
+            template_id=template_id,
+            vehicle_id=vehicle_id,
+            started_after=_as_utc(started_after),
+            started_before=_as_utc(started_before)
+        )
+        # One extra row tells whether another page follows
+        items = await self.engine.store.list_instances(where, after, limit + 1)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1].started_at, items[-1].id)
+        return WorkflowInstancePage(items=items, next_cursor=next_cursor)
+    
+    def engine_stats(self) -> WorkflowEngineStats:
+        """Get workflow engine metrics."""
+        return self.engine.stats()
+    
+    async def start(self) -> None:
+        """Start the workflow engine and event sources."""
+        await self.engine.start()
+        await self.events.start()
+    
+    async def stop(self) -> None:
+        """Stop the event sources and the workflow engine."""
+        await self.events.stop()
+        await self.engine.stop()
 
 
 # Singleton instance
 workflow_automation_service = WorkflowAutomationService()
-
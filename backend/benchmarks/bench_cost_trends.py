@@ -0,0 +1,99 @@
+"""Cost trend detection benchmark.
+
+Builds service aggregates for thousands of segments over years of
+monthly history, with a linear cost trend planted in a share of them,
+and times full-history trend detection (series pivot, then Mann-Kendall,
+Sen's slope and Pettitt across every series). Reports series per second
+and how many planted trends were found versus flat series flagged.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_cost_trends --segments 5000 --months 60
+"""
+import argparse
+from datetime import date
+import json
+import random
+import time
+
+from app.services.cost_trends import aggregate_series, analyze, significant_trends
+from app.services.fleet_aggregates import (
+    FleetAggregates,
+    SAMPLE_MANUFACTURERS,
+    Segment,
+    ServiceCounts,
+    month_from_index,
+    month_index
+)
+
+
+def build_aggregates(
+    segments: int, months: int, trend_share: float, trend_percent: float, seed: int, end_month: int
+) -> tuple[FleetAggregates, set[Segment]]:
+    """Aggregates over ``months`` complete months, and the segments given a trend."""
+    rng = random.Random(seed)
+    aggregates = FleetAggregates(source="synthetic")
+    trending: set[Segment] = set()
+    for i in range(segments):
+        segment = Segment(
+            f"owner-{i // 4:06d}",
+            rng.choice(["individual", "dealership", "fleet"]),
+            SAMPLE_MANUFACTURERS[i % len(SAMPLE_MANUFACTURERS)]
+        )
+        base = rng.uniform(150, 500)
+        growth = 0.0
+        if rng.random() < trend_share:
+            trending.add(segment)
+            growth = rng.choice([-1, 1]) * trend_percent / 100 / months
+        volume = rng.randint(5, 40)
+        for age in range(months, 0, -1):
+            services = max(0, int(rng.gauss(volume, volume ** 0.5)))
+            level = base * (1 + growth * (months - age))
+            aggregates.services[(segment, month_from_index(end_month - age))] = ServiceCounts(
+                services=services,
+                repairs=services // 3,
+                total_cost=sum(rng.gauss(level, level * 0.5) for _ in range(services))
+            )
+    return aggregates, trending
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segments", type=int, default=5_000)
+    parser.add_argument("--months", type=int, default=60, help="Months of history per segment")
+    parser.add_argument("--trend-share", type=float, default=0.2, help="Share of segments given a trend")
+    parser.add_argument("--trend-percent", type=float, default=30.0, help="Planted change over the history")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    end_month = month_index(date.today())
+    aggregates, trending = build_aggregates(
+        args.segments, args.months, args.trend_share, args.trend_percent, args.seed, end_month
+    )
+
+    start = time.perf_counter()
+    keys, series = aggregate_series(aggregates, "segment", end_month)
+    pivot_s = time.perf_counter() - start
+    start = time.perf_counter()
+    found = significant_trends(analyze(series))
+    analyze_s = time.perf_counter() - start
+
+    planted = [Segment(*key) in trending for key in keys]
+    hits = sum(1 for row in found if planted[row])
+    print(json.dumps({
+        "benchmark": "cost_trends",
+        "series": len(keys),
+        "months": series.services.shape[1],
+        "aggregate_rows": len(aggregates),
+        "pivot_s": round(pivot_s, 4),
+        "analyze_s": round(analyze_s, 4),
+        "series_per_sec": round(len(keys) / (pivot_s + analyze_s), 1),
+        "planted_trends": sum(planted),
+        "detected_planted": hits,
+        "recall": round(hits / max(sum(planted), 1), 3),
+        "flagged_flat": len(found) - hits,
+        "false_positive_rate": round((len(found) - hits) / max(len(keys) - sum(planted), 1), 4)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
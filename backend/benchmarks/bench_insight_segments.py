@@ -0,0 +1,138 @@
+"""Segmented insight generation benchmark.
+
+Builds synthetic fleet aggregates for thousands of owners and times
+insight generation per owner (or owner type) across process pools of
+increasing size, reporting segments per second and the speedup over an
+in-process run. Both include column conversion, which happens in the
+parent process; it is also reported on its own.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_insight_segments --owners 5000 --workers 1,2,4,8
+"""
+import argparse
+import asyncio
+from datetime import date, timedelta
+import json
+import os
+import random
+import time
+
+from app.config import get_settings
+from app.services.fleet_aggregates import (
+    EXPIRY_KINDS,
+    FleetAggregates,
+    SAMPLE_MANUFACTURERS,
+    Segment,
+    ServiceCounts,
+    VehicleCounts,
+    month_start
+)
+from app.services.insight_segments import (
+    generate_partition,
+    generate_segments,
+    merge_partitions,
+    shutdown_segment_pool,
+    to_columns
+)
+from app.services.insights import analysis_months
+
+
+def build_aggregates(owners: int, seed: int, today: date) -> FleetAggregates:
+    """Aggregates for ``owners`` owners with a few manufacturers each."""
+    rng = random.Random(seed)
+    aggregates = FleetAggregates(source="synthetic")
+    for i in range(owners):
+        owner_type = rng.choice(["individual", "dealership", "fleet"])
+        for manufacturer in rng.sample(SAMPLE_MANUFACTURERS, rng.randint(1, 4)):
+            segment = Segment(f"owner-{i:06d}", owner_type, manufacturer)
+            for model_year in rng.sample(range(today.year - 15, today.year + 1), rng.randint(1, 6)):
+                vehicles = rng.randint(1, 40)
+                aggregates.vehicles[(segment, model_year)] = VehicleCounts(
+                    vehicles=vehicles,
+                    high_mileage=rng.randint(0, vehicles),
+                    mileage_sum=vehicles * rng.randint(5_000, 150_000),
+                    open_recall_vehicles=rng.randint(0, vehicles) if rng.random() < 0.1 else 0
+                )
+            for _ in range(rng.randint(5, 30)):
+                key = (segment, rng.choice(EXPIRY_KINDS), today + timedelta(days=rng.randint(-60, 365)))
+                aggregates.expirations[key] = aggregates.expirations.get(key, 0) + rng.randint(1, 5)
+            month = month_start(today)
+            for _ in range(24):
+                month = month_start(month - timedelta(days=1))
+                services = rng.randint(0, 60)
+                aggregates.services[(segment, month)] = ServiceCounts(
+                    services=services,
+                    repairs=rng.randint(0, services),
+                    total_cost=services * rng.uniform(100, 600)
+                )
+    return aggregates
+
+
+async def run_pool(aggregates: FleetAggregates, segment_by: str, today: date, months: int, repeat: int) -> float:
+    # The first run starts the worker processes
+    await generate_segments(aggregates, segment_by, today, months)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await generate_segments(aggregates, segment_by, today, months)
+    return (time.perf_counter() - start) / repeat
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    today = date.today()
+    months = analysis_months(args.time_range_days)
+    aggregates = build_aggregates(args.owners, args.seed, today)
+
+    start = time.perf_counter()
+    columns = to_columns(aggregates, args.segment_by)
+    columns_s = time.perf_counter() - start
+    results = merge_partitions(
+        [generate_partition(columns, args.segment_by, today, months)], args.segment_by
+    )
+    in_process_s = time.perf_counter() - start
+    segments = len(results)
+
+    runs = []
+    for workers in (int(w) for w in args.workers.split(",")):
+        get_settings().insight_segment_workers = workers
+        shutdown_segment_pool()
+        try:
+            seconds = await run_pool(aggregates, args.segment_by, today, months, args.repeat)
+        finally:
+            shutdown_segment_pool()
+        runs.append({
+            "workers": workers,
+            "seconds": round(seconds, 4),
+            "segments_per_sec": round(segments / seconds, 1),
+            "speedup": round(in_process_s / seconds, 2)
+        })
+
+    return {
+        "benchmark": "insight_segments",
+        "cpus": os.cpu_count(),
+        "segment_by": args.segment_by,
+        "segments": segments,
+        "aggregate_rows": len(aggregates),
+        "insights": sum(len(insights) for _, _, insights in results),
+        "to_columns_s": round(columns_s, 4),
+        "in_process": {
+            "seconds": round(in_process_s, 4),
+            "segments_per_sec": round(segments / in_process_s, 1)
+        },
+        "pools": runs
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--owners", type=int, default=5_000)
+    parser.add_argument("--segment-by", choices=["owner", "owner_type"], default="owner")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated pool sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per pool size")
+    parser.add_argument("--time-range-days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
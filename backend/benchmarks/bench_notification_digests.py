@@ -0,0 +1,93 @@
+"""Notification digest benchmark.
+
+Evaluates the default notification rules over an in-memory fleet of
+``--owners`` fleet managers with ``--vehicles-per-owner`` vehicles each,
+coalesces the notifications with the configured digest windows and
+reports notifications matched, notifications written and delivered
+(urgent ones plus digests) with and without coalescing, the reduction
+factor overall and among the coalesced priorities (notifications of
+rules declared urgent, recalls by default, are never coalesced), and the
+time to coalesce, flush and read a digest's items.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_notification_digests --owners 50 --vehicles-per-owner 2000
+"""
+import argparse
+from datetime import date
+import json
+import random
+import time
+import uuid
+
+from app.services.notification_digests import DigestCoalescer
+from app.services.notification_rules import DEFAULT_RULES, SampleRecords
+
+
+def deliveries(notifications: list) -> int:
+    return sum(len((n.metadata or {}).get("channels") or ()) for n in notifications)
+
+
+def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    owners = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(args.owners)]
+    sample = SampleRecords.generate(vehicles=args.owners * args.vehicles_per_owner, seed=args.seed)
+    today = date.today()
+    unread: set = set()
+    notifications = [n for rule in DEFAULT_RULES for n in sample.evaluate(rule, today, unread)]
+    # The sample fleet has 20 vehicles per owner; hand vehicles to the fleet managers instead
+    fleet = {}
+    for notification in notifications:
+        owner_id = fleet.get(notification.vehicle_id)
+        if owner_id is None:
+            owner_id = fleet[notification.vehicle_id] = owners[len(fleet) % len(owners)]
+        notification.owner_id = owner_id
+
+    coalescer = DigestCoalescer.from_settings()
+    start = time.perf_counter()
+    immediate = coalescer.submit(notifications, now=0.0)
+    submit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    digests = coalescer.flush(now=max(coalescer.windows.values(), default=0.0))
+    flush_s = time.perf_counter() - start
+
+    largest = max(digests, key=lambda d: d.metadata["items"], default=None)
+    items_s = 0.0
+    if largest is not None:
+        start = time.perf_counter()
+        coalescer.items(largest.id, limit=100)
+        items_s = time.perf_counter() - start
+
+    written = len(immediate) + len(digests)
+    return {
+        "owners": args.owners,
+        "vehicles": args.owners * args.vehicles_per_owner,
+        "vehicles_notified": len(fleet),
+        "windows": coalescer.windows,
+        "notifications_matched": len(notifications),
+        "urgent_immediate": len(immediate),
+        "coalesced": coalescer.coalesced,
+        "digests": len(digests),
+        "largest_digest_items": largest.metadata["items"] if largest is not None else 0,
+        "rows_written": written,
+        "write_reduction": round(len(notifications) / max(1, written), 1),
+        "coalesced_reduction": round(coalescer.coalesced / max(1, len(digests)), 1),
+        "deliveries_without_digests": deliveries(notifications),
+        "deliveries_with_digests": deliveries(immediate) + deliveries(digests),
+        "submit_ms": round(submit_s * 1000, 2),
+        "flush_ms": round(flush_s * 1000, 2),
+        "largest_digest_items_ms": round(items_s * 1000, 3)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--owners", type=int, default=50)
+    parser.add_argument("--vehicles-per-owner", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    result = run(args)
+    print(json.dumps({"benchmark": "notification_digests", **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Notification store benchmark.
+
+Fills the in-memory notification store with ``--notifications``
+notifications spread over ``--owners`` owners, then times newest-N
+listings (all, per owner, unread, dismissed, by priority), read /
+dismiss flips and summaries from the maintained counters. Listings and
+summaries are reported per call; flips per second.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_notification_store --notifications 1000000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+import json
+import random
+import time
+import uuid
+
+from app.schemas.common import Priority
+from app.schemas.notifications import Notification
+from app.services.notification_counters import NotificationCounters
+from app.services.notification_store import InMemoryNotificationStore, NotificationFilter
+
+
+def build(count: int, owners: int, seed: int) -> list[Notification]:
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    priorities = list(Priority)
+    return [
+        Notification.model_construct(
+            id=str(uuid.UUID(int=rng.getrandbits(128))),
+            rule_id=None,
+            vehicle_id=f"vehicle-{rng.randrange(count // 2 + 1):07d}",
+            owner_id=f"owner-{rng.randrange(owners):06d}",
+            title="Notification",
+            message="",
+            priority=rng.choice(priorities),
+            notification_type="service_due",
+            category="maintenance",
+            status="unread",
+            action_url=None,
+            action_label=None,
+            metadata={"source_id": str(i)},
+            created_at=start + timedelta(seconds=i * 31_536_000 / count),
+            read_at=None
+        )
+        for i in range(count)
+    ]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    notifications = build(args.notifications, args.owners, args.seed)
+    counters = NotificationCounters()
+    store = InMemoryNotificationStore(counters)
+    start = time.perf_counter()
+    await store.add_many(notifications)
+    load_s = time.perf_counter() - start
+
+    rng = random.Random(args.seed)
+    ids = [n.id for n in rng.sample(notifications, min(args.flips, len(notifications)))]
+    at = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    for i, notification_id in enumerate(ids):
+        await store.set_status(notification_id, "dismissed" if i % 10 == 0 else "read", at)
+    flip_s = time.perf_counter() - start
+
+    owner = notifications[-1].owner_id
+    listings = {
+        "all": NotificationFilter(),
+        "owner": NotificationFilter(owner_id=owner),
+        "owner_unread": NotificationFilter(owner_id=owner, status="unread"),
+        "unread": NotificationFilter(status="unread"),
+        "dismissed": NotificationFilter(status="dismissed"),
+        "urgent": NotificationFilter(priority=Priority.URGENT),
+    }
+    list_ms = {}
+    for name, where in listings.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            await store.list(where, args.limit)
+        list_ms[name] = round((time.perf_counter() - start) / args.repeat * 1000, 4)
+
+    summary_ms = {}
+    for name, owner_id in (("fleet", None), ("owner", owner)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            counters.summary(owner_id)
+        summary_ms[name] = round((time.perf_counter() - start) / args.repeat * 1000, 4)
+
+    return {
+        "notifications": len(store),
+        "owners": args.owners,
+        "load_s": round(load_s, 3),
+        "flips_per_sec": round(len(ids) / flip_s, 1),
+        "limit": args.limit,
+        "list_ms": list_ms,
+        "summary_ms": summary_ms
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notifications", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=20_000)
+    parser.add_argument("--flips", type=int, default=100_000, help="Read/dismiss updates to time")
+    parser.add_argument("--limit", type=int, default=50, help="Listing page size")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per listing")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps({"benchmark": "notification_store", **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
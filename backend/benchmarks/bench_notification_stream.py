@@ -0,0 +1,122 @@
+"""Notification stream benchmark.
+
+Opens ``--connections`` idle event streams on the notification broker,
+each consumed by its own task the way a server response would be, and
+reports memory per idle connection (broker subscriber, stream generator
+and consumer task; the HTTP server's own per-connection state comes on
+top). Then publishes ``--notifications`` notifications across the
+owners and times delivery to every stream, and times one keep-alive
+round over all connections.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_notification_stream --connections 50000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import gc
+import json
+import random
+import time
+import tracemalloc
+import uuid
+
+from app.schemas.common import Priority
+from app.schemas.notifications import Notification
+from app.services.notification_stream import HEARTBEAT_FRAME, NotificationBroker
+
+
+def notification(owner_id: str) -> Notification:
+    return Notification.model_construct(
+        id=str(uuid.uuid4()),
+        rule_id=None,
+        vehicle_id=None,
+        owner_id=owner_id,
+        title="Service Due Soon",
+        message="Your vehicle is due for service.",
+        priority=Priority.MEDIUM,
+        notification_type="service_due",
+        category="maintenance",
+        status="unread",
+        action_url=None,
+        action_label=None,
+        metadata=None,
+        created_at=datetime.now(timezone.utc),
+        read_at=None
+    )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    broker = NotificationBroker(heartbeat_seconds=3600, max_pending=100)
+    owners = [f"owner-{i:06d}" for i in range(args.owners)]
+    received = {"events": 0, "heartbeats": 0}
+    settled = asyncio.Event()
+    target = {"events": 0, "heartbeats": 0}
+
+    async def consume(owner_id: str) -> None:
+        async for chunk in broker.events(owner_id):
+            if chunk == HEARTBEAT_FRAME:
+                received["heartbeats"] += 1
+            else:
+                received["events"] += chunk.count(b"event: notification")
+            if all(received[k] >= target[k] > 0 for k in target if target[k]):
+                settled.set()
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(consume(owners[i % len(owners)])) for i in range(args.connections)]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    gc.collect()
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / args.connections
+    tracemalloc.stop()
+
+    rng = random.Random(args.seed)
+    batch = [notification(rng.choice(owners)) for _ in range(args.notifications)]
+    streams_per_owner = args.connections / len(owners)
+    start = time.perf_counter()
+    target["events"] = broker.publish(batch)
+    publish_s = time.perf_counter() - start
+    await asyncio.wait_for(settled.wait(), 120)
+    fanout_s = time.perf_counter() - start
+
+    settled.clear()
+    target["events"] = 0
+    target["heartbeats"] = args.connections
+    start = time.perf_counter()
+    broker.heartbeat()
+    await asyncio.wait_for(settled.wait(), 120)
+    heartbeat_s = time.perf_counter() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "connections": args.connections,
+        "owners": args.owners,
+        "bytes_per_idle_connection": round(per_connection),
+        "notifications": args.notifications,
+        "streams_per_owner": round(streams_per_owner, 2),
+        "events_delivered": received["events"],
+        "publish_s": round(publish_s, 4),
+        "fanout_s": round(fanout_s, 4),
+        "events_per_sec": round(received["events"] / fanout_s),
+        "heartbeat_round_s": round(heartbeat_s, 4),
+        "connections_after_close": broker.connections
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=50_000)
+    parser.add_argument("--owners", type=int, default=40_000)
+    parser.add_argument("--notifications", type=int, default=20_000, help="Published across random owners")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    result = asyncio.run(run(args))
+    print(json.dumps({"benchmark": "notification_stream", **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
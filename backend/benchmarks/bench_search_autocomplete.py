@@ -0,0 +1,90 @@
+"""Search autocomplete benchmark.
+
+Builds the autocomplete trie from a synthetic catalog and query log, then
+replays every keystroke of sampled queries and reports per-keystroke
+completion latency percentiles as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_search_autocomplete --logged-queries 200000
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.search_autocomplete import PrefixTrie, SearchAutocomplete, build_phrases
+from benchmarks.bench_search_parse import build_corpus, percentile
+
+
+MAKES = ["Toyota", "Honda", "Ford", "Chevrolet", "BMW", "Mercedes-Benz", "Tesla", "Nissan", "Jeep", "Hyundai"]
+
+
+def build_catalog(models_per_make: int, seed: int) -> list[tuple[str, str, int]]:
+    """Generate (manufacturer, model, vehicle count) rows."""
+    rng = random.Random(seed)
+    return [
+        (make, f"{make[:3].upper()}-{i:03d}", int(rng.paretovariate(1.2) * 100))
+        for make in MAKES
+        for i in range(models_per_make)
+    ]
+
+
+def run(autocomplete: SearchAutocomplete, queries: list[str], limit: int) -> dict:
+    samples = []
+    start = time.perf_counter()
+    for query in queries:
+        for end in range(1, len(query) + 1):
+            t0 = time.perf_counter_ns()
+            autocomplete.complete(query[:end], limit)
+            samples.append((time.perf_counter_ns() - t0) / 1000)
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        "keystrokes": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "keystrokes_per_sec": round(len(samples) / elapsed, 1),
+        "latency_us": {
+            "p50": round(percentile(samples, 0.50), 1),
+            "p90": round(percentile(samples, 0.90), 1),
+            "p99": round(percentile(samples, 0.99), 1),
+            "max": round(samples[-1], 1),
+            "mean": round(sum(samples) / len(samples), 1)
+        }
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logged-queries", type=int, default=200_000)
+    parser.add_argument("--models-per-make", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=2_000, help="Queries replayed keystroke by keystroke")
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    log = build_corpus(args.logged_queries, args.seed)
+    uses: dict[str, int] = {}
+    for query in log:
+        uses[query] = uses.get(query, 0) + rng.randint(1, 5)
+
+    start = time.perf_counter()
+    phrases = build_phrases(build_catalog(args.models_per_make, args.seed), uses.items())
+    autocomplete = SearchAutocomplete(top_k=args.top_k)
+    autocomplete._trie = PrefixTrie(phrases, args.top_k)
+    build_s = time.perf_counter() - start
+
+    replay = build_corpus(args.queries, args.seed + 1)
+    result = {
+        "benchmark": "search_autocomplete",
+        "phrases": len(autocomplete),
+        "build_s": round(build_s, 2),
+        **run(autocomplete, replay, args.limit)
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
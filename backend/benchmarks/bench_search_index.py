@@ -0,0 +1,171 @@
+"""Full-text search index benchmark.
+
+Builds the in-process search index over a synthetic fleet and reports
+type-ahead query latency percentiles as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_search_index --vehicles 1000000
+"""
+import argparse
+import json
+import random
+import resource
+import string
+import time
+import uuid
+
+from app.services.search_index import SearchIndex
+
+
+VIN_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+FIRST_NAMES = [
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael",
+    "Linda", "David", "Elizabeth", "William", "Barbara", "Richard", "Susan",
+    "Joseph", "Jessica", "Thomas", "Sarah", "Carlos", "Maria", "Wei", "Priya"
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Wilson",
+    "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Nguyen"
+]
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "fleetco.com", "example.com"]
+SERVICE_PHRASES = [
+    "oil change and filter replacement", "front brake pads replaced",
+    "brake squeal on light braking", "rotated tires and balanced wheels",
+    "replaced cabin air filter", "transmission fluid flush",
+    "check engine light diagnosed misfire", "replaced serpentine belt",
+    "coolant leak at water pump", "battery replaced and terminals cleaned",
+    "alignment after pothole damage", "rear wiper blade replaced",
+    "ac compressor clutch noise", "spark plugs and ignition coils replaced",
+    "recall campaign airbag inflator", "suspension clunk over bumps"
+]
+
+
+def _vin(rng: random.Random) -> str:
+    return "".join(rng.choice(VIN_CHARS) for _ in range(17))
+
+
+def _plate(rng: random.Random) -> str:
+    letters = "".join(rng.choice(string.ascii_uppercase) for _ in range(3))
+    return f"{letters}-{rng.randint(0, 9999):04d}"
+
+
+def build_index(vehicles: int, owners: int, services: int, seed: int) -> tuple[SearchIndex, dict]:
+    """Index a reproducible synthetic fleet."""
+    rng = random.Random(seed)
+    index = SearchIndex()
+    samples = {"vins": [], "plates": [], "names": []}
+
+    for i in range(vehicles):
+        vin, plate = _vin(rng), _plate(rng)
+        index.upsert("vehicle", str(uuid.UUID(int=rng.getrandbits(128))), [vin, plate])
+        if i % 1000 == 0:
+            samples["vins"].append(vin)
+            samples["plates"].append(plate)
+
+    for i in range(owners):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = f"{first}.{last}{rng.randint(1, 999)}@{rng.choice(DOMAINS)}".lower()
+        index.upsert("owner", str(uuid.UUID(int=rng.getrandbits(128))), [first, last, email])
+        if i % 1000 == 0:
+            samples["names"].append(f"{first} {last}")
+
+    for _ in range(services):
+        description = rng.choice(SERVICE_PHRASES)
+        if rng.random() < 0.5:
+            description += ", " + rng.choice(SERVICE_PHRASES)
+        index.upsert("service_record", str(uuid.UUID(int=rng.getrandbits(128))), [description])
+
+    return index, samples
+
+
+def build_queries(samples: dict, count: int, seed: int) -> list[str]:
+    """Generate type-ahead queries: partial identifiers, names and typos."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        kind = rng.randrange(6)
+        if kind == 0:
+            vin = rng.choice(samples["vins"])
+            queries.append(vin[:rng.randint(4, 17)])
+        elif kind == 1:
+            plate = rng.choice(samples["plates"])
+            queries.append(plate[:rng.randint(3, 8)])
+        elif kind == 2:
+            name = rng.choice(samples["names"])
+            queries.append(name[:rng.randint(3, len(name))])
+        elif kind == 3:
+            phrase = rng.choice(SERVICE_PHRASES)
+            queries.append(phrase[:rng.randint(3, len(phrase))])
+        elif kind == 4:
+            # One dropped letter in a service word
+            word = rng.choice(rng.choice(SERVICE_PHRASES).split())
+            if len(word) > 4:
+                cut = rng.randrange(1, len(word) - 1)
+                word = word[:cut] + word[cut + 1:]
+            queries.append(word)
+        else:
+            queries.append(rng.choice(["brake squ", "brak squeal", "oil chan", "airbag", "coolant lea"]))
+    return queries
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(index: SearchIndex, queries: list[str], warmup: int) -> dict:
+    for query in queries[:warmup]:
+        index.search(query)
+
+    samples = []
+    start = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter_ns()
+        index.search(query)
+        samples.append((time.perf_counter_ns() - t0) / 1_000_000)
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        "queries": len(queries),
+        "elapsed_s": round(elapsed, 3),
+        "queries_per_sec": round(len(queries) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(samples, 0.50), 3),
+            "p90": round(percentile(samples, 0.90), 3),
+            "p99": round(percentile(samples, 0.99), 3),
+            "max": round(samples[-1], 3),
+            "mean": round(sum(samples) / len(samples), 3)
+        }
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=None, help="Defaults to vehicles / 4")
+    parser.add_argument("--service-records", type=int, default=None, help="Defaults to vehicles / 2")
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    owners = args.owners if args.owners is not None else args.vehicles // 4
+    services = args.service_records if args.service_records is not None else args.vehicles // 2
+
+    start = time.perf_counter()
+    index, samples = build_index(args.vehicles, owners, services, args.seed)
+    build_s = time.perf_counter() - start
+
+    result = {
+        "benchmark": "search_index",
+        "documents": len(index),
+        "build_s": round(build_s, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **run(index, build_queries(samples, args.queries, args.seed), args.warmup)
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Natural language query parser benchmark.
+
+Parses a synthetic corpus of natural-language queries and reports
+per-query parse latency percentiles as JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_search_parse --queries 100000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from app.schemas.search import NLSearchRequest
+from app.services.search import natural_language_search_service
+
+
+VERBS = ["Show", "List", "Find", "How many", "Count", "Display", "Get", "Compare"]
+SUBJECTS = [
+    "vehicles", "cars", "trucks", "SUVs", "owners", "service records",
+    "repairs", "inspections", "insurance policies", "warranties",
+    "recalls", "accidents", "fuel records"
+]
+MAKES = ["Toyota", "Honda", "Ford", "Chevy", "BMW", "Mercedes", "Tesla", "Nissan", "Jeep", ""]
+QUALIFIERS = [
+    "", "active", "sold", "overdue", "expired", "pending", "completed",
+    "with high mileage", "with low mileage", "expiring soon"
+]
+RANGES = [
+    "", "this month", "last month", "this year", "last year",
+    "from the past {n} days", "from the past {n} weeks"
+]
+SORTS = ["", "newest first", "oldest first", "highest mileage first", "most recent"]
+
+
+def build_corpus(size: int, seed: int) -> list[str]:
+    """Generate a reproducible corpus of natural-language queries."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        parts = [
+            rng.choice(VERBS),
+            rng.choice(QUALIFIERS),
+            rng.choice(MAKES),
+            rng.choice(SUBJECTS),
+        ]
+        if rng.random() < 0.4:
+            parts.append(f"from {rng.randint(2010, 2024)}")
+        if rng.random() < 0.4:
+            parts.append(f"{rng.choice(['over', 'under'])} {rng.randint(10, 200) * 1000:,} miles")
+        parts.append(rng.choice(RANGES).format(n=rng.randint(7, 90)))
+        parts.append(rng.choice(SORTS))
+        corpus.append(" ".join(p for p in parts if p))
+    return corpus
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run(corpus: list[str], warmup: int) -> dict:
+    service = natural_language_search_service
+    requests = [NLSearchRequest(query=q) for q in corpus]
+
+    for request in requests[:warmup]:
+        await service.parse(request)
+
+    samples = []
+    start = time.perf_counter()
+    for request in requests:
+        t0 = time.perf_counter_ns()
+        await service.parse(request)
+        samples.append((time.perf_counter_ns() - t0) / 1000)
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        "benchmark": "search_parse",
+        "queries": len(corpus),
+        "elapsed_s": round(elapsed, 3),
+        "queries_per_sec": round(len(corpus) / elapsed, 1),
+        "latency_us": {
+            "p50": round(percentile(samples, 0.50), 2),
+            "p90": round(percentile(samples, 0.90), 2),
+            "p99": round(percentile(samples, 0.99), 2),
+            "max": round(samples[-1], 2),
+            "mean": round(sum(samples) / len(samples), 2)
+        },
+        "cache": service.cache_stats().model_dump()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--warmup", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.queries, args.seed)
+    print(json.dumps(asyncio.run(run(corpus, args.warmup)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Workflow engine load benchmark.
+
+Drives ``WorkflowAutomationService`` with synthetic event streams (service
+records, new vehicles, recall matches and the daily insurance-expiry
+sweep) at a fixed rate, lets every instance run to completion, and
+reports trigger-to-completion latency percentiles, wait-step scheduler
+lag, throughput and memory per pending instance as JSON.
+
+Wait steps are shortened to ``--wait-seconds`` so that runs finish in
+seconds; scheduler lag is measured against each wait's ``resume_at``.
+Runs offline against the in-memory store, or against a local Postgres
+with ``--database-url`` (schema and workflow migrations applied).
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_workflows --rate 2000 --duration 10
+"""
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import random
+import time
+import tracemalloc
+import uuid
+
+from app.config import get_settings
+from app.db import close_pool
+from app.schemas.workflows import (
+    WorkflowEvent,
+    WorkflowInstance,
+    WorkflowStatus,
+    WorkflowTriggerRequest
+)
+from app.services.workflows import WorkflowAutomationService
+from benchmarks.bench_search_parse import percentile
+
+
+VINS = [
+    "1HGCM82633A004352", "5YJ3E1EA7KF317000", "1FTFW1ET5DFC10312",
+    "JTDKN3DU0A0123456", "WBA3A5C51CF256789", "1G1ZT53826F109149"
+]
+SERVICE_TYPES = ["repair", "maintenance", "inspection", "oil_change"]
+
+# Share of generated events per stream
+STREAMS = {
+    "service_record_created": 0.5,
+    "vehicle_created": 0.2,
+    "recall_matched": 0.1,
+    "insurance_expiring": 0.2,
+}
+
+# The insurance reminder is schedule-triggered; its sweep starts instances directly
+SCHEDULED_TEMPLATE = "wf-002"
+
+
+def _payload(stream: str, rng: random.Random) -> dict:
+    payload = {"emitted_at": time.time()}
+    if stream == "service_record_created":
+        payload["service_type"] = rng.choice(SERVICE_TYPES)
+    elif stream == "vehicle_created":
+        payload["vin"] = rng.choice(VINS)
+        payload["mileage"] = rng.randint(0, 120_000)
+    elif stream == "recall_matched":
+        payload["recall_number"] = f"{rng.randint(18, 25)}V-{rng.randint(100, 999)}"
+    else:
+        payload["days_until_expiration"] = rng.randint(1, 45)
+    return payload
+
+
+def shorten_waits(service: WorkflowAutomationService, seconds: float) -> None:
+    """Replace every wait step's duration so instances finish during the run."""
+    for template_id, template in service.templates.items():
+        steps = [
+            step.model_copy(update={"config": {"seconds": seconds}})
+            if step.step_type == "wait" else step
+            for step in template.steps
+        ]
+        service.templates[template_id] = template.model_copy(update={"steps": steps})
+    service.events.refresh(service.templates)
+
+
+async def generate(
+    service: WorkflowAutomationService, rate: float, duration: float, tick: float, seed: int
+) -> dict[str, int]:
+    """Emit events at ``rate`` per second for ``duration`` seconds."""
+    rng = random.Random(seed)
+    streams, weights = list(STREAMS), list(STREAMS.values())
+    emitted = {stream: 0 for stream in streams}
+    scheduled = service.templates[SCHEDULED_TEMPLATE]
+    start = time.perf_counter()
+    owed = 0.0
+    sweeps: list[asyncio.Task] = []
+    while (elapsed := time.perf_counter() - start) < duration:
+        owed += rate * tick
+        count, owed = int(owed), owed - int(owed)
+        events, sweep = [], []
+        for stream in rng.choices(streams, weights, k=count):
+            emitted[stream] += 1
+            vehicle_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            if stream == "insurance_expiring":
+                sweep.append(WorkflowTriggerRequest(
+                    template_id=SCHEDULED_TEMPLATE,
+                    vehicle_id=vehicle_id,
+                    trigger_data=_payload(stream, rng)
+                ))
+            else:
+                events.append(WorkflowEvent(
+                    event=stream, payload=_payload(stream, rng), vehicle_id=vehicle_id
+                ))
+        service.events.enqueue(events)
+        if sweep:
+            sweeps.append(asyncio.create_task(service.engine.trigger_many(scheduled, sweep)))
+        await asyncio.sleep(max(0.0, start + elapsed + tick - time.perf_counter()))
+    await asyncio.gather(*sweeps)
+    return emitted
+
+
+async def drain(service: WorkflowAutomationService, timeout: float) -> bool:
+    """Wait until no instance is running; False on timeout."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        page = await service.list_instances(status=WorkflowStatus.RUNNING, limit=1)
+        if not page.items and not service.events._buffer:
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def collect(service: WorkflowAutomationService) -> list[WorkflowInstance]:
+    instances, cursor = [], None
+    while True:
+        page = await service.list_instances(cursor=cursor, limit=500)
+        instances.extend(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return instances
+
+
+def _summary(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    samples.sort()
+    return {
+        "count": len(samples),
+        "p50": round(percentile(samples, 0.50), 2),
+        "p90": round(percentile(samples, 0.90), 2),
+        "p99": round(percentile(samples, 0.99), 2),
+        "max": round(samples[-1], 2),
+        "mean": round(sum(samples) / len(samples), 2)
+    }
+
+
+def measure(instances: list[WorkflowInstance]) -> dict:
+    """Latency per template and scheduler lag from instance execution logs."""
+    latency: dict[str, list[float]] = {}
+    lag: list[float] = []
+    statuses: dict[str, int] = {}
+    for instance in instances:
+        statuses[instance.status.value] = statuses.get(instance.status.value, 0) + 1
+        emitted_at = instance.trigger_data.get("emitted_at")
+        if instance.completed_at is not None and emitted_at is not None:
+            latency.setdefault(instance.template_id, []).append(
+                (instance.completed_at.timestamp() - emitted_at) * 1000
+            )
+        for log in instance.execution_log:
+            resume_at = (log.get("output") or {}).get("resume_at")
+            if resume_at and log["status"] == "completed":
+                lag.append((
+                    datetime.fromisoformat(log["completed_at"]) - datetime.fromisoformat(resume_at)
+                ).total_seconds() * 1000)
+    return {
+        "statuses": statuses,
+        "latency_ms": {template_id: _summary(v) for template_id, v in sorted(latency.items())},
+        "scheduler_lag_ms": _summary(lag)
+    }
+
+
+async def measure_pending(service: WorkflowAutomationService, count: int) -> dict:
+    """Memory held per instance parked on a (real, 24 hour) wait step."""
+    template = service.templates["wf-001"]
+    requests = [
+        WorkflowTriggerRequest(
+            template_id=template.id,
+            vehicle_id=str(uuid.uuid4()),
+            trigger_data={"event": "service_record_created", "service_type": "repair"}
+        )
+        for _ in range(count)
+    ]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await service.engine.trigger_many(template, requests)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {
+        "instances": count,
+        "bytes_per_instance": round((after - before) / count, 1)
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    get_settings().database_url = args.database_url or ""
+
+    service = WorkflowAutomationService()
+    shorten_waits(service, args.wait_seconds)
+    await service.start()
+    try:
+        start = time.perf_counter()
+        emitted = await generate(service, args.rate, args.duration, args.tick, args.seed)
+        drained = await drain(service, args.wait_seconds + args.drain_timeout)
+        elapsed = time.perf_counter() - start
+        instances = [
+            i for i in await collect(service) if i.trigger_data.get("emitted_at") is not None
+        ]
+        stats = service.engine_stats()
+        result = {
+            "benchmark": "workflows",
+            "store": stats.store,
+            "rate_per_sec": args.rate,
+            "duration_s": args.duration,
+            "wait_seconds": args.wait_seconds,
+            "events": emitted,
+            "instances": len(instances),
+            "drained": drained,
+            "elapsed_s": round(elapsed, 3),
+            "instances_per_sec": round(len(instances) / elapsed, 1),
+            **measure(instances),
+            "step_batches": {
+                name: batcher.model_dump() for name, batcher in stats.step_batches.items()
+            }
+        }
+        # A fresh service so the measurement excludes the load phase's history
+        pending_service = WorkflowAutomationService()
+        await pending_service.start()
+        try:
+            result["pending_memory"] = await measure_pending(pending_service, args.pending)
+        finally:
+            await pending_service.stop()
+        return result
+    finally:
+        await service.stop()
+        await close_pool()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=2_000, help="Events per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of event generation")
+    parser.add_argument("--wait-seconds", type=float, default=2.0, help="Duration of every wait step")
+    parser.add_argument("--tick", type=float, default=0.05, help="Generator emit interval in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=60.0)
+    parser.add_argument("--pending", type=int, default=20_000, help="Parked instances for the memory probe")
+    parser.add_argument("--database-url", default=None, help="Use the Postgres store instead of memory")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+-- Add content fingerprints to document processing jobs
+-- Lets the backend reuse earlier extractions for re-uploaded documents
+
+ALTER TABLE document_processing_job
+ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_doc_job_content_sha256
+    ON document_processing_job(content_sha256)
+    WHERE status = 'completed';
+
+COMMENT ON COLUMN document_processing_job.content_sha256 IS 'SHA-256 of the processed file content, used for dedup';
\ No newline at end of file
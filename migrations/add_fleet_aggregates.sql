@@ -0,0 +1,328 @@
+-- Add incrementally maintained fleet aggregates for AI insights
+-- The backend computes insights from these tables, so generating the full
+-- insight set reads a few rows per segment instead of scanning the fleet.
+--
+-- fleet_vehicle_state holds one row per vehicle with everything the
+-- aggregates need (segment, mileage, latest inspection and insurance
+-- expiry, open recall count). Triggers on vehicle, inspection,
+-- insurance_policy and vehicle_recall_status keep it current, and a
+-- trigger on the state table applies each change to the aggregates as a
+-- delta (subtract the old row, add the new one). Service records are
+-- aggregated by month directly from service_record.
+--
+-- A segment is (owner_id, manufacturer); owner_type is carried along for
+-- partitioning, and a trigger on owner rewrites it when it changes. High
+-- mileage is >= 100,000 (HIGH_MILEAGE in fleet_aggregates.py). Only active
+-- vehicles are counted, and aggregate rows whose count drops to zero are
+-- deleted.
+
+CREATE TABLE IF NOT EXISTS fleet_vehicle_state (
+    vehicle_id UUID PRIMARY KEY REFERENCES vehicle(id) ON DELETE CASCADE,
+    owner_id UUID NOT NULL,
+    owner_type VARCHAR(20) NOT NULL,
+    manufacturer VARCHAR(100) NOT NULL,
+    model_year INTEGER NOT NULL,
+    mileage INTEGER NOT NULL DEFAULT 0,
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    inspection_expires DATE,
+    insurance_expires DATE,
+    open_recalls INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS fleet_vehicle_aggregate (
+    owner_id UUID NOT NULL,
+    owner_type VARCHAR(20) NOT NULL,
+    manufacturer VARCHAR(100) NOT NULL,
+    model_year INTEGER NOT NULL,
+    vehicle_count INTEGER NOT NULL DEFAULT 0,
+    high_mileage_count INTEGER NOT NULL DEFAULT 0,
+    mileage_sum BIGINT NOT NULL DEFAULT 0,
+    open_recall_vehicles INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner_id, manufacturer, model_year)
+);
+
+-- Vehicles by the day their inspection, insurance, or both ('compliance')
+-- stop being current
+CREATE TABLE IF NOT EXISTS fleet_expiry_aggregate (
+    owner_id UUID NOT NULL,
+    owner_type VARCHAR(20) NOT NULL,
+    manufacturer VARCHAR(100) NOT NULL,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('inspection', 'insurance', 'compliance')),
+    expires_on DATE NOT NULL,
+    vehicle_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner_id, manufacturer, kind, expires_on)
+);
+
+CREATE TABLE IF NOT EXISTS fleet_service_aggregate (
+    owner_id UUID NOT NULL,
+    owner_type VARCHAR(20) NOT NULL,
+    manufacturer VARCHAR(100) NOT NULL,
+    month DATE NOT NULL,
+    service_count INTEGER NOT NULL DEFAULT 0,
+    repair_count INTEGER NOT NULL DEFAULT 0,
+    total_cost_sum NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner_id, manufacturer, month)
+);
+
+-- Aggregate deltas ----------------------------------------------------------
+
+CREATE OR REPLACE FUNCTION fleet_expiry_delta(
+    s fleet_vehicle_state, expiry_kind TEXT, expires DATE, delta INTEGER
+) RETURNS void AS $$
+BEGIN
+    IF expires IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO fleet_expiry_aggregate AS a (owner_id, owner_type, manufacturer, kind, expires_on, vehicle_count)
+    VALUES (s.owner_id, s.owner_type, s.manufacturer, expiry_kind, expires, delta)
+    ON CONFLICT (owner_id, manufacturer, kind, expires_on) DO UPDATE
+        SET vehicle_count = a.vehicle_count + EXCLUDED.vehicle_count,
+            owner_type = EXCLUDED.owner_type;
+    -- Renewals move vehicles to later days; drop the emptied ones
+    DELETE FROM fleet_expiry_aggregate
+    WHERE owner_id = s.owner_id AND manufacturer = s.manufacturer
+      AND kind = expiry_kind AND expires_on = expires AND vehicle_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fleet_state_delta(s fleet_vehicle_state, delta INTEGER)
+RETURNS void AS $$
+BEGIN
+    IF NOT s.active THEN
+        RETURN;
+    END IF;
+    INSERT INTO fleet_vehicle_aggregate AS a (
+        owner_id, owner_type, manufacturer, model_year,
+        vehicle_count, high_mileage_count, mileage_sum, open_recall_vehicles
+    ) VALUES (
+        s.owner_id, s.owner_type, s.manufacturer, s.model_year,
+        delta,
+        CASE WHEN s.mileage >= 100000 THEN delta ELSE 0 END,
+        delta * s.mileage::BIGINT,
+        CASE WHEN s.open_recalls > 0 THEN delta ELSE 0 END
+    )
+    ON CONFLICT (owner_id, manufacturer, model_year) DO UPDATE SET
+        owner_type = EXCLUDED.owner_type,
+        vehicle_count = a.vehicle_count + EXCLUDED.vehicle_count,
+        high_mileage_count = a.high_mileage_count + EXCLUDED.high_mileage_count,
+        mileage_sum = a.mileage_sum + EXCLUDED.mileage_sum,
+        open_recall_vehicles = a.open_recall_vehicles + EXCLUDED.open_recall_vehicles;
+    DELETE FROM fleet_vehicle_aggregate
+    WHERE owner_id = s.owner_id AND manufacturer = s.manufacturer
+      AND model_year = s.model_year AND vehicle_count = 0;
+
+    PERFORM fleet_expiry_delta(s, 'inspection', s.inspection_expires, delta);
+    PERFORM fleet_expiry_delta(s, 'insurance', s.insurance_expires, delta);
+    IF s.inspection_expires IS NOT NULL AND s.insurance_expires IS NOT NULL THEN
+        PERFORM fleet_expiry_delta(s, 'compliance', LEAST(s.inspection_expires, s.insurance_expires), delta);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fleet_apply_state() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fleet_state_delta(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fleet_state_delta(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_vehicle_state_aggregate ON fleet_vehicle_state;
+CREATE TRIGGER fleet_vehicle_state_aggregate
+    AFTER INSERT OR UPDATE OR DELETE ON fleet_vehicle_state
+    FOR EACH ROW EXECUTE FUNCTION fleet_apply_state();
+
+-- Vehicle state from source tables -----------------------------------------
+
+CREATE OR REPLACE FUNCTION fleet_sync_vehicle() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO fleet_vehicle_state AS s (
+        vehicle_id, owner_id, owner_type, manufacturer, model_year, mileage, active
+    )
+    SELECT NEW.id, NEW.owner_id, o.owner_type, m.name, NEW.year,
+           COALESCE(NEW.mileage, 0), COALESCE(NEW.status, 'active') = 'active'
+    FROM owner o, vehicle_model vm
+    JOIN manufacturer m ON m.id = vm.manufacturer_id
+    WHERE o.id = NEW.owner_id AND vm.id = NEW.vehicle_model_id
+    ON CONFLICT (vehicle_id) DO UPDATE SET
+        owner_id = EXCLUDED.owner_id,
+        owner_type = EXCLUDED.owner_type,
+        manufacturer = EXCLUDED.manufacturer,
+        model_year = EXCLUDED.model_year,
+        mileage = EXCLUDED.mileage,
+        active = EXCLUDED.active;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_vehicle_insert ON vehicle;
+CREATE TRIGGER fleet_vehicle_insert
+    AFTER INSERT ON vehicle
+    FOR EACH ROW EXECUTE FUNCTION fleet_sync_vehicle();
+
+DROP TRIGGER IF EXISTS fleet_vehicle_update ON vehicle;
+CREATE TRIGGER fleet_vehicle_update
+    AFTER UPDATE ON vehicle
+    FOR EACH ROW
+    WHEN ((OLD.owner_id, OLD.vehicle_model_id, OLD.year, OLD.mileage, OLD.status)
+          IS DISTINCT FROM (NEW.owner_id, NEW.vehicle_model_id, NEW.year, NEW.mileage, NEW.status))
+    EXECUTE FUNCTION fleet_sync_vehicle();
+
+CREATE OR REPLACE FUNCTION fleet_sync_inspection() RETURNS trigger AS $$
+DECLARE
+    target UUID := CASE WHEN TG_OP = 'DELETE' THEN OLD.vehicle_id ELSE NEW.vehicle_id END;
+BEGIN
+    UPDATE fleet_vehicle_state s
+    SET inspection_expires = latest.expires
+    FROM (
+        SELECT MAX(expiration_date) AS expires
+        FROM inspection WHERE vehicle_id = target AND passed
+    ) latest
+    WHERE s.vehicle_id = target
+      AND s.inspection_expires IS DISTINCT FROM latest.expires;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_inspection_change ON inspection;
+CREATE TRIGGER fleet_inspection_change
+    AFTER INSERT OR UPDATE OR DELETE ON inspection
+    FOR EACH ROW EXECUTE FUNCTION fleet_sync_inspection();
+
+CREATE OR REPLACE FUNCTION fleet_sync_insurance() RETURNS trigger AS $$
+DECLARE
+    target UUID := CASE WHEN TG_OP = 'DELETE' THEN OLD.vehicle_id ELSE NEW.vehicle_id END;
+BEGIN
+    UPDATE fleet_vehicle_state s
+    SET insurance_expires = latest.expires
+    FROM (SELECT MAX(end_date) AS expires FROM insurance_policy WHERE vehicle_id = target) latest
+    WHERE s.vehicle_id = target
+      AND s.insurance_expires IS DISTINCT FROM latest.expires;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_insurance_change ON insurance_policy;
+CREATE TRIGGER fleet_insurance_change
+    AFTER INSERT OR UPDATE OR DELETE ON insurance_policy
+    FOR EACH ROW EXECUTE FUNCTION fleet_sync_insurance();
+
+CREATE OR REPLACE FUNCTION fleet_sync_recalls() RETURNS trigger AS $$
+DECLARE
+    target UUID := CASE WHEN TG_OP = 'DELETE' THEN OLD.vehicle_id ELSE NEW.vehicle_id END;
+BEGIN
+    UPDATE fleet_vehicle_state s
+    SET open_recalls = open.total
+    FROM (
+        SELECT COUNT(*)::INTEGER AS total
+        FROM vehicle_recall_status
+        WHERE vehicle_id = target AND COALESCE(status, 'notified') IN ('notified', 'scheduled')
+    ) open
+    WHERE s.vehicle_id = target AND s.open_recalls <> open.total;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_recall_status_change ON vehicle_recall_status;
+CREATE TRIGGER fleet_recall_status_change
+    AFTER INSERT OR UPDATE OR DELETE ON vehicle_recall_status
+    FOR EACH ROW EXECUTE FUNCTION fleet_sync_recalls();
+
+CREATE OR REPLACE FUNCTION fleet_sync_owner_type() RETURNS trigger AS $$
+BEGIN
+    -- The state trigger moves the owner's vehicles to the new owner_type
+    UPDATE fleet_vehicle_state SET owner_type = NEW.owner_type WHERE owner_id = NEW.id;
+    UPDATE fleet_service_aggregate SET owner_type = NEW.owner_type WHERE owner_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_owner_type_change ON owner;
+CREATE TRIGGER fleet_owner_type_change
+    AFTER UPDATE OF owner_type ON owner
+    FOR EACH ROW
+    WHEN (OLD.owner_type IS DISTINCT FROM NEW.owner_type)
+    EXECUTE FUNCTION fleet_sync_owner_type();
+
+-- Service records, attributed to the vehicle's segment at write time --------
+
+CREATE OR REPLACE FUNCTION fleet_service_delta(r service_record, delta INTEGER)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO fleet_service_aggregate AS a (
+        owner_id, owner_type, manufacturer, month,
+        service_count, repair_count, total_cost_sum
+    )
+    SELECT s.owner_id, s.owner_type, s.manufacturer, date_trunc('month', r.service_date)::date,
+           delta,
+           CASE WHEN r.service_type = 'repair' THEN delta ELSE 0 END,
+           delta * COALESCE(r.total_cost, 0)
+    FROM fleet_vehicle_state s
+    WHERE s.vehicle_id = r.vehicle_id
+    ON CONFLICT (owner_id, manufacturer, month) DO UPDATE SET
+        service_count = a.service_count + EXCLUDED.service_count,
+        repair_count = a.repair_count + EXCLUDED.repair_count,
+        total_cost_sum = a.total_cost_sum + EXCLUDED.total_cost_sum;
+    DELETE FROM fleet_service_aggregate a
+    USING fleet_vehicle_state s
+    WHERE s.vehicle_id = r.vehicle_id
+      AND a.owner_id = s.owner_id AND a.manufacturer = s.manufacturer
+      AND a.month = date_trunc('month', r.service_date)::date
+      AND a.service_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fleet_apply_service() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM fleet_service_delta(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM fleet_service_delta(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fleet_service_record_change ON service_record;
+CREATE TRIGGER fleet_service_record_change
+    AFTER INSERT OR UPDATE OR DELETE ON service_record
+    FOR EACH ROW EXECUTE FUNCTION fleet_apply_service();
+
+-- Backfill ------------------------------------------------------------------
+
+INSERT INTO fleet_vehicle_state (
+    vehicle_id, owner_id, owner_type, manufacturer, model_year, mileage, active,
+    inspection_expires, insurance_expires, open_recalls
+)
+SELECT
+    v.id, v.owner_id, o.owner_type, m.name, v.year,
+    COALESCE(v.mileage, 0), COALESCE(v.status, 'active') = 'active',
+    (SELECT MAX(i.expiration_date) FROM inspection i WHERE i.vehicle_id = v.id AND i.passed),
+    (SELECT MAX(p.end_date) FROM insurance_policy p WHERE p.vehicle_id = v.id),
+    (SELECT COUNT(*) FROM vehicle_recall_status rs
+     WHERE rs.vehicle_id = v.id AND COALESCE(rs.status, 'notified') IN ('notified', 'scheduled'))
+FROM vehicle v
+JOIN owner o ON o.id = v.owner_id
+JOIN vehicle_model vm ON vm.id = v.vehicle_model_id
+JOIN manufacturer m ON m.id = vm.manufacturer_id
+ON CONFLICT (vehicle_id) DO NOTHING;
+
+INSERT INTO fleet_service_aggregate (
+    owner_id, owner_type, manufacturer, month, service_count, repair_count, total_cost_sum
+)
+SELECT s.owner_id, s.owner_type, s.manufacturer, date_trunc('month', sr.service_date)::date,
+       COUNT(*), COUNT(*) FILTER (WHERE sr.service_type = 'repair'), COALESCE(SUM(sr.total_cost), 0)
+FROM service_record sr
+JOIN fleet_vehicle_state s ON s.vehicle_id = sr.vehicle_id
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (owner_id, manufacturer, month) DO NOTHING;
+
+COMMENT ON TABLE fleet_vehicle_state IS 'Per-vehicle inputs to the fleet aggregates, maintained by triggers';
+COMMENT ON TABLE fleet_vehicle_aggregate IS 'Active vehicle counts and mileage by owner, manufacturer and model year';
+COMMENT ON TABLE fleet_expiry_aggregate IS 'Active vehicles by the day their inspection, insurance or full compliance lapses';
+COMMENT ON TABLE fleet_service_aggregate IS 'Service counts and costs by owner, manufacturer and month';
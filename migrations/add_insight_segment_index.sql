@@ -0,0 +1,11 @@
+-- Active insight lookup by segmentation
+-- Segmented insight generation writes one set of active insights per
+-- segmentation (details->>'segment_by' = 'owner' or 'owner_type') next to
+-- the fleet-wide set (no segment_by). Each run replaces only its own set,
+-- which with thousands of segments can be tens of thousands of rows; this
+-- index keeps both the replacement and the fleet-wide active read to the
+-- rows of one set.
+
+CREATE INDEX IF NOT EXISTS idx_ai_insight_active_segment_by
+    ON ai_insight ((details->>'segment_by'), created_at DESC)
+    WHERE is_active;
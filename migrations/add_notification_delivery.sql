@@ -0,0 +1,44 @@
+-- Notification delivery outbox and dead letters
+-- The backend delivers notifications over email, SMS and webhooks. Rows with
+-- sent_at NULL are the outbox: delivery claims them urgent first, oldest first,
+-- with FOR UPDATE SKIP LOCKED, by setting delivery_claimed_at. The claim is a
+-- lease the claiming process renews while it holds the notification (including
+-- retry backoff); if that process dies, the lease lapses and another process
+-- claims the row again. Each channel that completes (sent, or dead-lettered
+-- after its last attempt) is recorded in notification_delivery_channel and is
+-- skipped when a notification is claimed again; sent_at is set once every
+-- channel has completed. Deliveries that fail every retry are recorded in
+-- notification_dead_letter.
+
+-- Existing notifications predate delivery and are not sent retroactively
+UPDATE notification SET sent_at = created_at WHERE sent_at IS NULL;
+
+ALTER TABLE notification ADD COLUMN IF NOT EXISTS delivery_claimed_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_notification_undelivered
+    ON notification((priority = 'urgent'), created_at)
+    WHERE sent_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS notification_delivery_channel (
+    notification_id UUID REFERENCES notification(id) ON DELETE CASCADE,
+    channel VARCHAR(50) NOT NULL,
+    completed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (notification_id, channel)
+);
+
+CREATE TABLE IF NOT EXISTS notification_dead_letter (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    notification_id UUID REFERENCES notification(id) ON DELETE CASCADE,
+    channel VARCHAR(50) NOT NULL,
+    provider VARCHAR(100) NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    payload JSONB NOT NULL,
+    first_queued_at TIMESTAMP WITH TIME ZONE,
+    failed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_dead_letter_failed
+    ON notification_dead_letter(failed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notification_dead_letter_notification
+    ON notification_dead_letter(notification_id);
@@ -0,0 +1,63 @@
+-- Notification digests
+-- The backend coalesces low, medium and high priority notifications into one
+-- digest notification per owner and category and time window (urgent ones are
+-- always sent individually). Rule evaluation stages those matches here instead
+-- of inserting them into notification; a periodic flush turns every group whose
+-- earliest window has passed into a digest row (notification_type 'digest') and
+-- sets digest_id on its items, which keep each vehicle's detail.
+-- An item stays open, and suppresses new items for the same vehicle and source
+-- record like an unread notification does, while it is pending or while its
+-- digest is unread; the trigger below closes items when their digest is read,
+-- dismissed or actioned.
+
+CREATE TABLE IF NOT EXISTS notification_digest_item (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    digest_id UUID REFERENCES notification(id) ON DELETE CASCADE,
+    rule_id UUID REFERENCES notification_rule(id) ON DELETE SET NULL,
+    vehicle_id UUID REFERENCES vehicle(id) ON DELETE CASCADE,
+    owner_id UUID REFERENCES owner(id) ON DELETE CASCADE,
+    notification_type VARCHAR(50) NOT NULL,
+    category VARCHAR(50) NOT NULL DEFAULT 'general',
+    priority VARCHAR(20) NOT NULL CHECK (priority IN ('low', 'medium', 'high', 'urgent')),
+    title VARCHAR(500) NOT NULL,
+    message TEXT NOT NULL,
+    action_url VARCHAR(500),
+    channels VARCHAR(50)[],
+    dedup_key TEXT,
+    due_on DATE,
+    is_open BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Pending groups for the flush, and the items of a digest
+CREATE INDEX IF NOT EXISTS idx_notification_digest_item_pending
+    ON notification_digest_item(owner_id, category, created_at)
+    WHERE digest_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notification_digest_item_digest
+    ON notification_digest_item(digest_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_digest_item_open_dedup
+    ON notification_digest_item(notification_type, vehicle_id, dedup_key)
+    WHERE is_open;
+
+CREATE OR REPLACE FUNCTION close_notification_digest_items()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE notification_digest_item i
+    SET is_open = FALSE
+    FROM new_rows n
+    JOIN old_rows o ON o.id = n.id
+    WHERE i.digest_id = n.id
+      AND n.notification_type = 'digest'
+      AND o.status = 'unread'
+      AND n.status <> 'unread'
+      AND i.is_open;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notification_digest_items_close ON notification;
+CREATE TRIGGER notification_digest_items_close
+    AFTER UPDATE ON notification
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION close_notification_digest_items();
@@ -0,0 +1,85 @@
+-- Add notification events for server-sent event streams and summary counters
+-- Changes to notification are published on the notification_events channel
+-- (NOTIFICATION_EVENT_CHANNEL in app/services/notification_stream.py) once per
+-- statement: inserted and deleted rows (including owner or vehicle cascades)
+-- as [id, owner_id, status, priority, category], and status changes as
+-- [owner_id, old_status, new_status]. Payloads are
+-- {"op": "insert" | "status" | "delete", "xid": ..., "rows": [...]}, in chunks
+-- of 50 rows to stay under the NOTIFY payload limit. xid is the writing
+-- transaction, so a counter rebuild can tell which events its snapshot has
+-- already counted. Each backend process listens, updates its counters and
+-- loads only the inserted rows one of its connected streams is waiting for.
+-- Transition tables cannot be combined with UPDATE OF column lists, so the
+-- update trigger fires for every update and only publishes rows whose status
+-- changed.
+
+CREATE OR REPLACE FUNCTION notify_notification_events()
+RETURNS TRIGGER AS $$
+DECLARE
+    batch JSONB;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        FOR batch IN
+            SELECT jsonb_agg(jsonb_build_array(owner_id, old_status, new_status))
+            FROM (
+                SELECT n.owner_id, o.status AS old_status, n.status AS new_status,
+                       (row_number() OVER () - 1) / 50 AS chunk
+                FROM new_rows n
+                JOIN old_rows o ON o.id = n.id
+                WHERE o.status IS DISTINCT FROM n.status
+            ) chunked
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('notification_events', jsonb_build_object(
+                'op', 'status', 'xid', txid_current(), 'rows', batch
+            )::text);
+        END LOOP;
+    ELSIF TG_OP = 'INSERT' THEN
+        FOR batch IN
+            SELECT jsonb_agg(jsonb_build_array(id, owner_id, status, priority, category))
+            FROM (
+                SELECT *, (row_number() OVER () - 1) / 50 AS chunk FROM new_rows
+            ) chunked
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('notification_events', jsonb_build_object(
+                'op', 'insert', 'xid', txid_current(), 'rows', batch
+            )::text);
+        END LOOP;
+    ELSE
+        FOR batch IN
+            SELECT jsonb_agg(jsonb_build_array(id, owner_id, status, priority, category))
+            FROM (
+                SELECT *, (row_number() OVER () - 1) / 50 AS chunk FROM old_rows
+            ) chunked
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('notification_events', jsonb_build_object(
+                'op', 'delete', 'xid', txid_current(), 'rows', batch
+            )::text);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS notification_created ON notification;
+CREATE TRIGGER notification_created
+    AFTER INSERT ON notification
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_notification_events();
+
+DROP TRIGGER IF EXISTS notification_status_changed ON notification;
+CREATE TRIGGER notification_status_changed
+    AFTER UPDATE ON notification
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_notification_events();
+
+DROP TRIGGER IF EXISTS notification_deleted ON notification;
+CREATE TRIGGER notification_deleted
+    AFTER DELETE ON notification
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_notification_events();
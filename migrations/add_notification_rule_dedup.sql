@@ -0,0 +1,32 @@
+-- Set-based notification rule evaluation
+-- The backend evaluates each active notification_rule as one
+-- INSERT ... SELECT over the rule's source table. A vehicle is not
+-- notified again about the same source record (policy, inspection,
+-- warranty, service record or recall) while an earlier notification for
+-- it is unread: the partial unique index below makes such inserts
+-- conflict, and the rule statement skips them with ON CONFLICT DO NOTHING.
+
+ALTER TABLE notification ADD COLUMN IF NOT EXISTS dedup_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_unread_dedup
+    ON notification(notification_type, vehicle_id, dedup_key)
+    WHERE status = 'unread';
+
+-- Rule sources: a date range scan, then "is there a later record for this
+-- vehicle" anti-joins served by (vehicle_id, date) indexes
+CREATE INDEX IF NOT EXISTS idx_service_record_next_due
+    ON service_record(next_service_due_date)
+    WHERE next_service_due_date IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_service_record_vehicle_date
+    ON service_record(vehicle_id, service_date DESC);
+
+CREATE INDEX IF NOT EXISTS idx_insurance_policy_vehicle_end
+    ON insurance_policy(vehicle_id, end_date DESC);
+
+CREATE INDEX IF NOT EXISTS idx_inspection_vehicle_expiration
+    ON inspection(vehicle_id, expiration_date DESC);
+
+CREATE INDEX IF NOT EXISTS idx_vehicle_recall_status_open
+    ON vehicle_recall_status(recall_id)
+    WHERE status NOT IN ('completed', 'declined');
@@ -0,0 +1,23 @@
+-- Composite indexes for notification listings
+-- The backend lists notifications newest first by (created_at, id), optionally
+-- for one owner and/or status, and marks them read or dismissed by primary
+-- key. Each index serves one filter combination plus the sort, so a page of
+-- an owner's unread notifications reads only the rows it returns.
+
+CREATE INDEX IF NOT EXISTS idx_notification_owner_status_created
+    ON notification(owner_id, status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_notification_owner_created
+    ON notification(owner_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_notification_status_created
+    ON notification(status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_notification_created_id
+    ON notification(created_at DESC, id DESC);
+
+-- The composites lead with the same columns, so the single-column indexes
+-- from schema_ai.sql only add write cost
+DROP INDEX IF EXISTS idx_notification_owner;
+DROP INDEX IF EXISTS idx_notification_status;
+DROP INDEX IF EXISTS idx_notification_created;
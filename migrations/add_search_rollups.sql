@@ -0,0 +1,66 @@
+-- Add rollup views for natural language count and aggregate queries
+-- The backend answers "how many" / "average" queries from these views when
+-- the filters line up with their dimensions, and refreshes them periodically.
+-- Mileage buckets are 5,000 miles wide (MILEAGE_BUCKET in search_rollups.py);
+-- mileage_on_boundary marks rows exactly at the bucket start.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_vehicle_rollup AS
+SELECT
+    m.name AS manufacturer,
+    vm.name AS model,
+    v.year,
+    COALESCE(v.status, '') AS status,
+    COALESCE((v.mileage / 5000) * 5000, -1) AS mileage_bucket,
+    COALESCE(v.mileage % 5000 = 0, FALSE) AS mileage_on_boundary,
+    COALESCE(date_trunc('month', v.created_at)::date, DATE '1900-01-01') AS month,
+    COUNT(*) AS row_count,
+    COUNT(v.mileage) AS mileage_count,
+    SUM(v.mileage) AS mileage_sum,
+    MIN(v.mileage) AS mileage_min,
+    MAX(v.mileage) AS mileage_max,
+    COUNT(v.current_value) AS current_value_count,
+    SUM(v.current_value) AS current_value_sum,
+    MIN(v.current_value) AS current_value_min,
+    MAX(v.current_value) AS current_value_max
+FROM vehicle v
+JOIN vehicle_model vm ON vm.id = v.vehicle_model_id
+JOIN manufacturer m ON m.id = vm.manufacturer_id
+GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+-- Required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_vehicle_rollup_key
+    ON mv_vehicle_rollup(manufacturer, model, year, status, mileage_bucket, mileage_on_boundary, month);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_service_rollup AS
+SELECT
+    m.name AS manufacturer,
+    vm.name AS model,
+    v.year,
+    sr.service_type,
+    COALESCE((sr.mileage_at_service / 5000) * 5000, -1) AS mileage_bucket,
+    COALESCE(sr.mileage_at_service % 5000 = 0, FALSE) AS mileage_on_boundary,
+    date_trunc('month', sr.service_date)::date AS month,
+    COUNT(*) AS row_count,
+    COUNT(sr.mileage_at_service) AS mileage_count,
+    SUM(sr.mileage_at_service) AS mileage_sum,
+    MIN(sr.mileage_at_service) AS mileage_min,
+    MAX(sr.mileage_at_service) AS mileage_max,
+    COUNT(sr.total_cost) AS total_cost_count,
+    SUM(sr.total_cost) AS total_cost_sum,
+    MIN(sr.total_cost) AS total_cost_min,
+    MAX(sr.total_cost) AS total_cost_max,
+    COUNT(sr.labor_cost) AS labor_cost_count,
+    SUM(sr.labor_cost) AS labor_cost_sum,
+    MIN(sr.labor_cost) AS labor_cost_min,
+    MAX(sr.labor_cost) AS labor_cost_max
+FROM service_record sr
+JOIN vehicle v ON v.id = sr.vehicle_id
+JOIN vehicle_model vm ON vm.id = v.vehicle_model_id
+JOIN manufacturer m ON m.id = vm.manufacturer_id
+GROUP BY 1, 2, 3, 4, 5, 6, 7;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_service_rollup_key
+    ON mv_service_rollup(manufacturer, model, year, service_type, mileage_bucket, mileage_on_boundary, month);
+
+COMMENT ON MATERIALIZED VIEW mv_vehicle_rollup IS 'Vehicle counts and metric sums by make, model, year, status, mileage bucket and month';
+COMMENT ON MATERIALIZED VIEW mv_service_rollup IS 'Service counts and cost sums by make, model, year, service type, mileage bucket and month';
@@ -0,0 +1,52 @@
+-- Add change tracking for the backend full-text search index
+-- The index loads and syncs rows in (updated_at, id) order, re-reading a short
+-- overlap behind its watermark because updated_at is the transaction start
+-- time and a long transaction can commit rows older than rows already synced.
+-- Deleted rows (including cascades) leave a tombstone that the sync reads the
+-- same way; the sync prunes tombstones once they are a week old.
+
+CREATE INDEX IF NOT EXISTS idx_vehicle_updated_at_id
+    ON vehicle(updated_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_owner_updated_at_id
+    ON owner(updated_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_service_record_updated_at_id
+    ON service_record(updated_at, id);
+
+CREATE TABLE IF NOT EXISTS search_index_tombstone (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    entity VARCHAR(20) NOT NULL,
+    entity_id UUID NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_index_tombstone_deleted_at_id
+    ON search_index_tombstone(deleted_at, id);
+
+CREATE OR REPLACE FUNCTION record_search_index_tombstones()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO search_index_tombstone (entity, entity_id)
+    SELECT TG_ARGV[0], id FROM old_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS vehicle_search_tombstones ON vehicle;
+CREATE TRIGGER vehicle_search_tombstones
+    AFTER DELETE ON vehicle
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_search_index_tombstones('vehicle');
+
+DROP TRIGGER IF EXISTS owner_search_tombstones ON owner;
+CREATE TRIGGER owner_search_tombstones
+    AFTER DELETE ON owner
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_search_index_tombstones('owner');
+
+DROP TRIGGER IF EXISTS service_record_search_tombstones ON service_record;
+CREATE TRIGGER service_record_search_tombstones
+    AFTER DELETE ON service_record
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_search_index_tombstones('service_record');
@@ -0,0 +1,57 @@
+-- Add workflow event notifications for the backend event dispatcher
+-- Inserts are published on the workflow_events channel (WORKFLOW_EVENT_CHANNEL
+-- in app/services/workflow_events.py) once per statement, in chunks of at most
+-- about 7,000 bytes so a bulk import stays under the 8,000-byte NOTIFY payload
+-- limit.
+-- Trigger arguments: event name, vehicle id column, then payload columns.
+
+CREATE OR REPLACE FUNCTION notify_workflow_events()
+RETURNS TRIGGER AS $$
+DECLARE
+    columns TEXT[] := TG_ARGV[2:TG_NARGS - 1];
+    header JSONB := jsonb_build_object('event', TG_ARGV[0], 'vehicle_key', TG_ARGV[1]);
+    row_payload JSONB;
+    row_bytes INTEGER;
+    batch JSONB := '[]'::jsonb;
+    batch_bytes INTEGER := 0;
+BEGIN
+    FOR row_payload IN
+        SELECT (SELECT jsonb_object_agg(col, to_jsonb(n) -> col) FROM unnest(columns) AS col)
+        FROM new_rows n
+    LOOP
+        row_bytes := octet_length(row_payload::text) + 2;
+        IF batch_bytes > 0 AND batch_bytes + row_bytes > 7000 THEN
+            PERFORM pg_notify('workflow_events', (header || jsonb_build_object('rows', batch))::text);
+            batch := '[]'::jsonb;
+            batch_bytes := 0;
+        END IF;
+        batch := batch || jsonb_build_array(row_payload);
+        batch_bytes := batch_bytes + row_bytes;
+    END LOOP;
+    IF batch_bytes > 0 THEN
+        PERFORM pg_notify('workflow_events', (header || jsonb_build_object('rows', batch))::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS workflow_service_record_created ON service_record;
+CREATE TRIGGER workflow_service_record_created
+    AFTER INSERT ON service_record
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_workflow_events('service_record_created', 'vehicle_id', 'id', 'vehicle_id', 'service_type', 'service_date');
+
+DROP TRIGGER IF EXISTS workflow_vehicle_created ON vehicle;
+CREATE TRIGGER workflow_vehicle_created
+    AFTER INSERT ON vehicle
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_workflow_events('vehicle_created', 'id', 'id', 'owner_id', 'vin', 'year');
+
+DROP TRIGGER IF EXISTS workflow_recall_matched ON vehicle_recall_status;
+CREATE TRIGGER workflow_recall_matched
+    AFTER INSERT ON vehicle_recall_status
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_workflow_events('recall_matched', 'vehicle_id', 'id', 'vehicle_id', 'recall_id');
@@ -0,0 +1,23 @@
+-- Composite indexes for paginated workflow instance listings
+-- The backend lists instances newest first by (started_at, id) with a keyset
+-- cursor, optionally filtered by status, template or vehicle. Each index
+-- serves one filter plus the sort, so a page reads only the rows it returns
+-- however much completed history the table holds.
+
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_status_started
+    ON workflow_instance(status, started_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_template_started
+    ON workflow_instance(template_id, started_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_vehicle_started
+    ON workflow_instance(vehicle_id, started_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_started
+    ON workflow_instance(started_at DESC, id DESC);
+
+-- The composites lead with the same columns, so the single-column indexes
+-- from schema_ai.sql only add write cost
+DROP INDEX IF EXISTS idx_workflow_instance_status;
+DROP INDEX IF EXISTS idx_workflow_instance_template;
+DROP INDEX IF EXISTS idx_workflow_instance_vehicle;
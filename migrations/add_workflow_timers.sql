@@ -0,0 +1,18 @@
+-- Add durable wait timers for the backend workflow engine
+-- A running instance parked on a wait step has resume_at set; the engine
+-- loads timers in (resume_at, id) order as its scheduling horizon advances
+-- and clears resume_at when it claims a due timer.
+
+ALTER TABLE workflow_instance
+    ADD COLUMN IF NOT EXISTS resume_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_workflow_instance_resume
+    ON workflow_instance(resume_at, id)
+    WHERE status = 'running' AND resume_at IS NOT NULL;
+
+-- Completing a wait step updates its pending step execution row
+CREATE INDEX IF NOT EXISTS idx_workflow_step_instance_index
+    ON workflow_step_execution(instance_id, step_index)
+    WHERE status = 'pending';
+
+COMMENT ON COLUMN workflow_instance.resume_at IS 'When a waiting instance resumes; NULL unless parked on a wait step';